@@ -1,61 +1,23 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import *
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items, bulk_write_stream
+from rfli_utils.partitioning import partition_items, set_active_date
+from rfli_utils.streaming import is_streaming_mode, stream_query
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
+from rfli_utils.shadow import run_shadowed
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: "+parameter_name)
-    ssm_client = bt3_client('ssm')
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response['Parameter']['Value']))
-    return response['Parameter']['Value']
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -193,11 +155,15 @@ class EodIsinTrack:
         self.track_folios_collection_name = "dnb-rfli-isin-track-folios"
         self.user_isines_collection_name = "dnb-rfli-isin-track-user-isines"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.final_eod_time = int(get_parameter_store(get_enviroment_variable("FINAL_EOD_TIME")))
-        self.pre_eod_time = int(get_parameter_store(get_enviroment_variable("PRE_EOD_TIME")))
-        self.dynamodb_session = bt3_resource('dynamodb')
+        market_schedule = get_market_schedule(["FINAL_EOD_TIME", "PRE_EOD_TIME"])
+        self.final_eod_time = market_schedule["FINAL_EOD_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
         
         
+    @record_run_manifest("isin-track", "eod")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             bogota_current_datetime = get_bogota_current_time()
@@ -206,6 +172,10 @@ class EodIsinTrack:
             ).timestamp()+get_seconds_from_ssm(self.pre_eod_time))
             if bogota_current_datetime.timestamp()>=prelim_start_timestamp:
                 logger.info("Iniciando proceso de ISIN-TACK-INTRADIA.")
+                if is_streaming_mode():
+                    self.run_streaming()
+                    self.update_last_version_info()
+                    return
                 (
                     origin_data_isines,
                     origin_data_folios
@@ -232,10 +202,15 @@ class EodIsinTrack:
                     transformed_all_isines,
                     transformed_folios,
                     transformed_user_isines,
-                ) = self.transform_isines_folios_data(
-                    isines_dictionary,
-                    folios_dictionary,
-                    user_isines_params
+                ) = run_shadowed(
+                    self,
+                    self.transform_isines_folios_data,
+                    (isines_dictionary, folios_dictionary, user_isines_params),
+                    (
+                        self.all_isines_collection_name,
+                        self.track_folios_collection_name,
+                        self.user_isines_collection_name,
+                    ),
                 )
                 del user_isines_params
                 logger.info(f"Insertando datos de isines. {'Sin embargo, No hay información de isines para este momento. Insercion vacia.' if not transformed_all_isines else ''}")
@@ -263,10 +238,33 @@ class EodIsinTrack:
             send_error_mail()
 
 
+    def run_streaming(self):
+        isines_dictionary, folios_dictionary = self.stream_origin_data()
+        logger.info("Iniciando lectura de usuarios disponibles.")
+        user_isines_params = self.read_all_user_params()
+        logger.info("Insertando datos de isines.")
+        self.save_data_into_dynamo(
+            self.all_isines_collection_name,
+            self.iter_all_isines_items(isines_dictionary),
+        )
+        logger.info("Insertando datos de folios.")
+        self.save_data_into_dynamo(
+            self.track_folios_collection_name,
+            self.iter_folios_items(isines_dictionary, folios_dictionary),
+        )
+        del folios_dictionary
+        logger.info("Insertando datos de isines en los usuarios.")
+        self.save_data_into_dynamo(
+            self.user_isines_collection_name,
+            self.transform_user_isines(isines_dictionary, user_isines_params),
+        )
+
+
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
 
 
+    @measure_stage("transform")
     def merge_all_isines_data(self, today_isines, today_category, categories):
         logger.info(
                     "Iniciando proceso de merge entre isines y categorias."
@@ -276,46 +274,123 @@ class EodIsinTrack:
         for current_isin in today_isines:
             current_isin_code = current_isin["isin_code"]
             if (current_isin_code in today_category_temp_dictionary):
-                
-                pbs_change = current_isin["pbs_change"]
-                new_isin_object = {
-                    "isin_code": current_isin_code,
-                    "instrument": current_isin["instrument"],
-                    "yesterday_yield": current_isin["yesterday_yield"],
-                    "instrument_issuer": today_category_temp_dictionary[current_isin_code][
-                        "instrument_issuer"
-                    ],
-                    "issuer_name":today_category_temp_dictionary[current_isin_code][
-                        "issuer_name"
-                    ],
-                    "yield": current_isin["yield"],
-                    "pbs_change": pbs_change,
-                    "margin_origin": today_category_temp_dictionary[current_isin_code][
-                        "margin_origin"
-                    ],
-                    "margin_type": today_category_temp_dictionary[current_isin_code][
-                        "margin_type"
-                    ],
-                    "category_id": current_isin["category_id"],
-                    "equivalent_margin": current_isin["equivalent_margin"],
-                    "margin": current_isin["margin"],
-                    "spread": current_isin["spread"],
-                    "cc_curve": today_category_temp_dictionary.get(current_isin_code)[
-                        "cc_curve"
-                    ],
-                    "mean_price": current_isin["mean_price"],
-                    "clean_price": current_isin["clean_price"],
-                    "yesterday_mean_price": current_isin["yesterday_mean_price"],
-                    "issue_date": current_isin["issue_date"],
-                    "maturity_date": current_isin["maturity_date"],
-                    "rating": current_isin["real_rating"]
-                    }
+                new_isin_object = self.merge_isin(
+                    current_isin, today_category_temp_dictionary[current_isin_code]
+                )
             result_list.append(new_isin_object)
         logger.info(
                     f"Se juntaron un total de {len(result_list)} isines."
                 )
         return result_list
 
+
+    def merge_isin(self, current_isin, current_category):
+        return {
+            "isin_code": current_isin["isin_code"],
+            "instrument": current_isin["instrument"],
+            "yesterday_yield": current_isin["yesterday_yield"],
+            "instrument_issuer": current_category["instrument_issuer"],
+            "issuer_name": current_category["issuer_name"],
+            "yield": current_isin["yield"],
+            "pbs_change": current_isin["pbs_change"],
+            "margin_origin": current_category["margin_origin"],
+            "margin_type": current_category["margin_type"],
+            "category_id": current_isin["category_id"],
+            "equivalent_margin": current_isin["equivalent_margin"],
+            "margin": current_isin["margin"],
+            "spread": current_isin["spread"],
+            "cc_curve": current_category["cc_curve"],
+            "mean_price": current_isin["mean_price"],
+            "clean_price": current_isin["clean_price"],
+            "yesterday_mean_price": current_isin["yesterday_mean_price"],
+            "issue_date": current_isin["issue_date"],
+            "maturity_date": current_isin["maturity_date"],
+            "rating": current_isin["real_rating"]
+        }
+
+
+    # Version en streaming de get_origin_data (--STREAMING_EXTRACTION true): las categorias del
+    # dia se cargan completas para el merge, y los isines y folios se leen con un cursor del
+    # lado del servidor directo a los diccionarios por isin y por categoria, sin fetchall ni
+    # copias intermedias de cada fila
+    @measure_stage("extract")
+    def stream_origin_data(self):
+        logger.info("Iniciando carga de información desde BASE DE DATOS SQL en modo streaming.")
+        isines_dictionary = {}
+        folios_dictionary = {}
+        connection_credentials = get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))
+        try:
+            with pymysql.connect(
+                host=connection_credentials["host"],
+                port=int(connection_credentials["port"]),
+                user=connection_credentials["username"],
+                password=connection_credentials["password"],
+                cursorclass=PlanCapturingCursor,
+            ) as connection:
+                with connection.cursor() as cursor_connection:
+                    logger.info("Consultando información de la categoria para hoy.")
+                    cursor_connection.execute(self.get_all_categories_query)
+                    today_category = {
+                        x["isin_code"]: x for x in cursor_connection.fetchall()
+                    }
+                logger.info(f"Total de isines categorizados para hoy: {len(today_category)}")
+                logger.info("Consultando información de todos los isines para hoy.")
+                for current_isin in stream_query(connection, self.get_all_isines_today_query):
+                    current_category = today_category.get(current_isin["isin_code"])
+                    if current_category is not None:
+                        isines_dictionary[current_isin["isin_code"]] = self.merge_isin(
+                            current_isin, current_category
+                        )
+                del today_category
+                logger.info(f"Se juntaron un total de {len(isines_dictionary)} isines.")
+                logger.info("Consultando información de los folios asociados a isines")
+                for current_folio in stream_query(connection, self.get_folios_isines_query):
+                    if current_folio["yield"] != 100:
+                        folios_dictionary.setdefault(current_folio["category_id"], []).append(
+                            current_folio
+                        )
+        except pymysql.err.MySQLError as MySQL_Error:
+            error_code = MySQL_Error.args[0]
+            exception_line = sys_exc_info()[2].tb_lineno
+            if error_code == 3024:
+                logger.error(
+                    "Tiempo de ejeucion excedido. Se detuvo el proceso de consulta en base de datos."
+                )
+                send_error_mail(timeout=True)
+            else:
+                logger.error(
+                    "No se pudo cargar la información desde el origen correctamente."
+                )
+            current_error = MySQL_Error
+            logger.error(
+                current_error.__class__.__name__
+                + "["
+                + str(exception_line)
+                + "] "
+                + str(current_error)
+            )
+            raise
+        if not isines_dictionary:
+            logger.error("No se encontró información de los isines.")
+        logger.info("Se terminó el proceso de carga de información.")
+        return isines_dictionary, folios_dictionary
+
+
+    def iter_all_isines_items(self, isines_dictionary):
+        for isin, isin_data in isines_dictionary.items():
+            yield {
+                "isin": isin,
+                "data": {k: v for k, v in isin_data.items() if k != "isin_code"},
+            }
+
+
+    def iter_folios_items(self, isines_dictionary, folios_dictionary):
+        for isin, isin_data in isines_dictionary.items():
+            isin_folios = folios_dictionary.get(isin_data["category_id"], [])
+            if len(isin_folios) > 0:
+                yield {"isin": isin, "folios": isin_folios}
+
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información desde BASE DE DATOS SQL.")
         isines = []
@@ -327,7 +402,7 @@ class EodIsinTrack:
                 port=int(connection_credentials["port"]),
                 user=connection_credentials["username"],
                 password=connection_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,
+                cursorclass=PlanCapturingCursor,
             ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
@@ -415,6 +490,7 @@ class EodIsinTrack:
         return isines, folios
 
     
+    @measure_stage("extract")
     def read_all_user_params(self):
         user_params_table = self.dynamodb_session.Table(self.user_params_collection_name)
         response = user_params_table.scan()
@@ -423,13 +499,15 @@ class EodIsinTrack:
         return []
     
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self,collection_name, data):
         try:
-            if len(data)>0:
+            data = partition_items(collection_name, data, self.full_valuation_date)
+            if not isinstance(data, list):
+                bulk_write_stream(self.dynamodb_session.Table(collection_name), data)
+            elif len(data)>0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                bulk_write_items(table, data)
             else:
                 logger.info("No hay data para insertar en la tabla "+collection_name)
         except Exception as save_data_into_dynamo_exception:
@@ -441,6 +519,7 @@ class EodIsinTrack:
                         "[" + str(exception_line) + "] " + str(current_error))
 
 
+    @measure_stage("version")
     def update_last_version_info(self):
         try:
             logger.info("Iniciando actualización de versión.")
@@ -453,6 +532,7 @@ class EodIsinTrack:
                 item = response['Item']
                 logger.info("Se carga la siguiente data de versión: "+str(item))
                 item['version'] = int(item['version'])+1
+                set_active_date(item, self.full_valuation_date)
                 item['next_update'] = int(current_day.timestamp())+get_seconds_from_ssm(self.final_eod_time)
                 item['next_status'] = "final_eod"
                 logger.info("Se actualiza la data de versión con la siguiente informacion: "+str(item))
@@ -470,6 +550,7 @@ class EodIsinTrack:
             raise
 
     
+    @measure_stage("transform")
     def transform_isines_folios_data(
         self,
         origin_data_isines,
@@ -524,24 +605,9 @@ class EodIsinTrack:
             logger.info(
                 f"Se encontraron {calculated_isines_number} isines de tipo Calculado con folios."
             )
-            logger.info(f"Formateando isines para los usuarios.")
-            for i in range(len(user_isines_params)):
-                current_user_isines = []
-                for j in range(len(list(user_isines_params[i]["isines"]))):
-                    current_isin = list(user_isines_params[i]["isines"])[j]
-                    if list(user_isines_params[i]["isines"])[j] in origin_data_isines.keys():
-                        current_user_isines.append({
-                            "isin":current_isin,
-                            "data":origin_data_isines[current_isin].copy()
-                        }
-                        )
-                        del current_user_isines[-1]['data']["isin_code"]
-                final_users_isines.append(
-                    {
-                        "user_id": user_isines_params[i]["user_id"],
-                        "isines": current_user_isines.copy(),
-                    }
-                )
+            final_users_isines = self.transform_user_isines(
+                origin_data_isines, user_isines_params
+            )
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error("Error formateando los datos.")
@@ -554,6 +620,31 @@ class EodIsinTrack:
                 + str(current_error)
             )
         return final_isines_data, final_folios_data, final_users_isines
+
+
+    @measure_stage("transform")
+    def transform_user_isines(self, origin_data_isines, user_isines_params):
+        logger.info(f"Formateando isines para los usuarios.")
+        final_users_isines = []
+        for i in range(len(user_isines_params)):
+            current_user_isines = []
+            for current_isin in list(user_isines_params[i]["isines"]):
+                if current_isin in origin_data_isines:
+                    current_user_isines.append({
+                        "isin":current_isin,
+                        "data":{
+                            k: v for k, v in origin_data_isines[current_isin].items()
+                            if k != "isin_code"
+                        }
+                    }
+                    )
+            final_users_isines.append(
+                {
+                    "user_id": user_isines_params[i]["user_id"],
+                    "isines": current_user_isines,
+                }
+            )
+        return final_users_isines
             
 
 if __name__ == "__main__":
@@ -1,60 +1,26 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import *
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_optional_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.database import db_connection
+from rfli_utils.worker import is_worker_mode, run_intraday_worker
+from rfli_utils.change_probe import run_change_probe, FINGERPRINT_ATTRIBUTE
+from rfli_utils.freshness import set_freshness
+from rfli_utils.delta_writer import save_changed_items
+from rfli_utils.partitioning import partition_items, set_active_date
+from rfli_utils.snapshot import get_market_snapshot, filter_published_isines, index_by_isin, round_half_up
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.structured_logging import setup_logging
+from rfli_utils.shadow import run_shadowed
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " + str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -127,34 +93,6 @@ class IntradayIsinTrack:
         self.yesterday_full_valuation_date = self.full_valuation_date - dt.timedelta(
             days=1
         )
-        self.get_all_isines_today_query = f"SELECT {self.create_string_query(self.query_timeout)} \
-                    today_prices.isin_code,\
-                    today_prices.instrument,\
-                    today_prices.yield,\
-                    today_prices.equivalent_margin,\
-                    round(today_prices.margin_value, 4) as margin,\
-                    today_prices.spread,\
-                    today_prices.mean_price,\
-                    today_prices.clean_price,\
-                    cast(today_prices.issue_date As CHAR) AS issue_date,\
-                    cast(today_prices.maturity_date As CHAR) AS maturity_date,\
-                    today_prices.category_id,\
-                    yesterday_prices.yesterday_yield,\
-                    yesterday_prices.yesterday_mean_price,\
-                    ((today_prices.yield - yesterday_prices.yesterday_yield)*100) AS pbs_change\
-                FROM precia_published.pub_rfl_prices AS today_prices\
-                    LEFT JOIN (\
-                        SELECT isin_code AS yesterday_isin_code,\
-                            yield as yesterday_yield,\
-                            mean_price as yesterday_mean_price\
-                        FROM precia_published.pub_rfl_prices\
-                        WHERE valuation_date = '{self.yesterday_full_valuation_date.date().strftime('%Y-%m-%d')}'\
-                            AND isin_code != ''\
-                            AND instrument NOT IN('TIDISDVL', 'CERTS')\
-                    ) AS yesterday_prices ON today_prices.isin_code = yesterday_prices.yesterday_isin_code\
-                WHERE today_prices.valuation_date = '{self.full_valuation_date.date().strftime('%Y-%m-%d')}'\
-                    AND today_prices.isin_code != ''\
-                    AND today_prices.instrument NOT IN('TIDISDVL', 'CERTS');"
         self.get_all_categories_query = f"SELECT {self.create_string_query(self.query_timeout)} \
                     isin_code,\
                     CASE\
@@ -202,9 +140,6 @@ class IntradayIsinTrack:
                 JOIN precia_process.prc_rfl_operations ON curve_instrument.operation_date = prc_rfl_operations.operation_date\
                 AND curve_instrument.instrument = prc_rfl_operations.instrument\
                 AND prc_rfl_operations.num_control = 1 AND prc_rfl_operations.yield!=100;"
-        self.get_categories_query = f"SELECT {self.create_string_query(self.query_timeout)} category_id,\
-                rating_group\
-                FROM precia_sources.src_rfl_category;"
         self.category_definition = {
             10:"Sin calificación",
             20:"E",
@@ -227,25 +162,41 @@ class IntradayIsinTrack:
         self.track_folios_collection_name = "dnb-rfli-isin-track-folios"
         self.user_isines_collection_name = "dnb-rfli-isin-track-user-isines"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.market_close_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_CLOSE_TIME"))
-        )
-        self.market_open_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_OPEN_TIME"))
+        market_schedule = get_market_schedule()
+        self.market_close_time = market_schedule["MARKET_CLOSE_TIME"]
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
+        self.probe_sources = (
+            "pub_rfl_prices",
+            "prc_rfl_get_category",
+            "prc_rfl_basket_tes",
+            "prc_rfl_corporative_basket",
+            "prc_rfl_operations",
         )
-        self.pre_eod_time = int(
-            get_parameter_store(get_enviroment_variable("PRE_EOD_TIME"))
-        )
-        self.intra_rate_time = int(
-            get_parameter_store(get_enviroment_variable("INTRA_RATE_TIME"))
-        )
-        self.dynamodb_session = bt3_resource("dynamodb")
+        self.source_fingerprint = None
+        self.snapshot_location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
 
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
 
+    @record_run_manifest("isin-track", "intra")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
+            source_unchanged, self.source_fingerprint = run_change_probe(
+                get_enviroment_variable("FLASH_ORIGIN_DB"),
+                self.probe_sources,
+                self.full_valuation_date,
+                self.dynamodb_session.Table(self.version_collection_name),
+                "isin-track",
+                self.create_string_query(self.query_timeout),
+            )
+            if source_unchanged:
+                self.update_last_version_info(data_changed=False)
+                return
             logger.info("Iniciando proceso de ISIN-TACK-INTRADIA.")
             (
                 origin_data_isines,
@@ -274,11 +225,15 @@ class IntradayIsinTrack:
                 transformed_all_isines,
                 transformed_folios,
                 transformed_user_isines,
-            ) = self.transform_isines_folios_data(
-                isines_dictionary,
-                folios_dictionary,
-                user_isines_params,
-                eod_isines
+            ) = run_shadowed(
+                self,
+                self.transform_isines_folios_data,
+                (isines_dictionary, folios_dictionary, user_isines_params, eod_isines),
+                (
+                    self.all_isines_collection_name,
+                    self.track_folios_collection_name,
+                    self.user_isines_collection_name,
+                ),
             )
             del user_isines_params
             logger.info(f"Insertando datos de isines. {'Sin embargo, No hay información de isines para este momento. Insercion vacia.' if not transformed_all_isines else ''}")
@@ -307,6 +262,39 @@ class IntradayIsinTrack:
             )
             send_error_mail()
 
+    @measure_stage("transform")
+    def get_today_isines(self, market_snapshot):
+        yesterday_prices = index_by_isin(
+            filter_published_isines(market_snapshot.prices_yesterday)
+        )
+        today_isines = []
+        for today_price in filter_published_isines(market_snapshot.prices_today):
+            yesterday_price = yesterday_prices.get(today_price["isin_code"], {})
+            yesterday_yield = yesterday_price.get("yield")
+            pbs_change = None
+            if today_price["yield"] is not None and yesterday_yield is not None:
+                pbs_change = (today_price["yield"] - yesterday_yield) * 100
+            today_isines.append(
+                {
+                    "isin_code": today_price["isin_code"],
+                    "instrument": today_price["instrument"],
+                    "yield": today_price["yield"],
+                    "equivalent_margin": today_price["equivalent_margin"],
+                    "margin": round_half_up(today_price["margin_value"], 4),
+                    "spread": today_price["spread"],
+                    "mean_price": today_price["mean_price"],
+                    "clean_price": today_price["clean_price"],
+                    "issue_date": today_price["issue_date"],
+                    "maturity_date": today_price["maturity_date"],
+                    "category_id": today_price["category_id"],
+                    "yesterday_yield": yesterday_yield,
+                    "yesterday_mean_price": yesterday_price.get("mean_price"),
+                    "pbs_change": pbs_change,
+                }
+            )
+        return today_isines
+
+    @measure_stage("transform")
     def merge_all_isines_data(self, today_isines, today_category, categories):
         try:
             logger.info(
@@ -379,27 +367,28 @@ class IntradayIsinTrack:
             raise
         
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información desde BASE DE DATOS SQL.")
         isines = []
         folios = []
-        connection_credentials = get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))
         try:
-            with pymysql.connect(
-                host=connection_credentials["host"],
-                port=int(connection_credentials["port"]),
-                user=connection_credentials["username"],
-                password=connection_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,
-            ) as connection:
+            with db_connection(get_enviroment_variable("FLASH_ORIGIN_DB")) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info(
                             "Consultando información de todos los isines para hoy."
                         )
-                        cursor_connection.execute(self.get_all_isines_today_query)
-                        if cursor_connection.rowcount > 0:
-                            today_isines = cursor_connection.fetchall()
+                        market_snapshot = get_market_snapshot(
+                            cursor_connection,
+                            self.full_valuation_date,
+                            self.snapshot_location,
+                            self.intra_rate_time // 2,
+                            self.create_string_query(self.query_timeout),
+                            self.source_fingerprint,
+                        )
+                        today_isines = self.get_today_isines(market_snapshot)
+                        if len(today_isines) > 0:
                             logger.info(
                                 "Consultando información de la categoria para hoy."
                             )
@@ -409,8 +398,7 @@ class IntradayIsinTrack:
                             logger.info(
                                 "Consultando información de las categorias."
                             )
-                            cursor_connection.execute(self.get_categories_query)
-                            all_categories = cursor_connection.fetchall()
+                            all_categories = market_snapshot.categories
                             isines, eod_isines = self.merge_all_isines_data(
                                 today_isines, today_category, categories=all_categories
                             )
@@ -477,6 +465,7 @@ class IntradayIsinTrack:
             logger.info("Se terminó el proceso de carga de información.")
         return isines, folios, eod_isines
 
+    @measure_stage("extract")
     def read_all_user_params(self):
         user_params_table = self.dynamodb_session.Table(
             self.user_params_collection_name
@@ -486,13 +475,15 @@ class IntradayIsinTrack:
             return response["Items"]
         return []
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
+            data = partition_items(collection_name, data, self.full_valuation_date)
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                save_changed_items(
+                    table, data, self.snapshot_location, self.full_valuation_date
+                )
             else:
                 logger.info("No hay data para insertar en la tabla " + collection_name)
         except Exception as save_data_into_dynamo_exception:
@@ -510,6 +501,7 @@ class IntradayIsinTrack:
                 + "] "
                 + str(current_error)
             )
+            raise
 
     def calculate_last_execution(self):
         start_minutes = self.market_open_time // 100 * 60 + self.market_open_time % 100
@@ -522,7 +514,8 @@ class IntradayIsinTrack:
         return last_exe_final_hour
     
     
-    def update_last_version_info(self):
+    @measure_stage("version")
+    def update_last_version_info(self, data_changed=True):
         logger.info("Iniciando actualización de versión.")
         table = self.dynamodb_session.Table(self.version_collection_name)
         response = table.get_item(Key={"component": "isin-track"})
@@ -534,7 +527,16 @@ class IntradayIsinTrack:
         if "Item" in response:
             item = response["Item"]
             logger.info("Se carga la siguiente data de versión: " + str(item))
-            item["version"] = int(item["version"]) + 1
+            if data_changed:
+                item["version"] = int(item["version"]) + 1
+                set_active_date(item, self.full_valuation_date)
+                set_freshness(item, self.source_fingerprint)
+                if self.source_fingerprint is not None:
+                    item[FINGERPRINT_ATTRIBUTE] = self.source_fingerprint
+                else:
+                    item.pop(FINGERPRINT_ATTRIBUTE, None)
+            else:
+                logger.info("El origen no cambió. Se conserva la versión actual.")
             if self.full_valuation_date.timestamp() >= (
                 current_day.timestamp() + get_seconds_from_ssm(self.calculate_last_execution())
             ):
@@ -562,6 +564,7 @@ class IntradayIsinTrack:
                 "No se encontró información de versión para 'isin-track'. No se cambia el versionado."
             )
 
+    @measure_stage("transform")
     def transform_isines_folios_data(
         self,
         origin_data_isines,
@@ -657,4 +660,7 @@ class IntradayIsinTrack:
 
 
 if __name__ == "__main__":
-    IntradayIsinTrack().run()
+    if is_worker_mode():
+        run_intraday_worker(IntradayIsinTrack)
+    else:
+        IntradayIsinTrack().run()
@@ -1,35 +1,49 @@
-import json
 import boto3
-import os
-import logging 
-import decimal
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_event, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json, from_attribute_value
+from rfli_lambda_utils.versions import add_freshness, get_time_to_wait, get_version_item
+from rfli_lambda_utils.responses import add_etag, get_conditional_response
+from rfli_lambda_utils.partitioning import get_partition_key
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
 
 FOLIOS_TABLE = "dnb-rfli-isin-track-folios"
 
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb = boto3.resource("dynamodb")
 
+
+#Cliente de bajo nivel para leer los folios en formato AttributeValue y convertirlos a JSON en
+#una sola pasada, sin crear un Decimal por cada numero como el recurso de DynamoDB
+dynamodb_client = boto3.client("dynamodb")
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     
-    dynamodb = boto3.resource("dynamodb")
-    #table = dynamodb.Table(os.environ["TABLE_NAME"])
-    table = dynamodb.Table(FOLIOS_TABLE)
-    
-    logger.info(f'[lambda_handler] event de entrada:\n{event}')
+    logger.info(f'[lambda_handler] event de entrada: {summarize_event(event)}')
     
     isin = event["queryStringParameters"]["isin"]
     
-    response = table.get_item(
+    version_data = get_version_item('isin-track') or {}
+    
+    time_to_wait = get_time_to_wait(version_data)
+    
+    if 'version' in version_data:
+        conditional_response = get_conditional_response(event, {'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
+                                                        version_data, time_to_wait, version_data.get('next_status'))
+        if conditional_response is not None:
+            return conditional_response
+    
+    response = dynamodb_client.get_item(
+            TableName = FOLIOS_TABLE,
             Key = {
-                'isin': isin
-            }
+                'isin': {'S': get_partition_key(version_data, isin)}
+            },
+            ProjectionExpression = 'folios'
         )
         
     if 'Item' not in response:
@@ -42,20 +56,22 @@ def lambda_handler(event, context):
     data = response['Item']
     
     final_object = {
-        'version': None,
-        'next_update': None,
-        'data': data['folios']
+        'version': version_data.get('version'),
+        'next_update': time_to_wait,
+        'data': from_attribute_value(data['folios'])
     }
     
-    final_response = {
-        'headers':{ 
+    headers = { 
                 'Access-Control-Allow-Headers': '*', 
                 'Access-Control-Allow-Origin' : '*', 
-                'Access-Control-Allow-Methods': '*'  }, 
+                'Access-Control-Allow-Methods': '*'  }
+    
+    final_response = {
+        'headers': add_etag(headers, version_data) if 'version' in version_data else headers, 
                 
-        'body' : json.dumps(final_object, cls=DecimalEncoder)
+        'body' : encode_json(add_freshness(final_object, version_data))
        }
      
-    logger.info(f'{final_response}')
+    logger.info(f'[lambda_handler] Respuesta: {summarize_payload(final_response["body"])}')
        
     return final_response
\ No newline at end of file
@@ -1,26 +1,19 @@
 import json
 import base64
-import logging  
 import sys  
-import jwt  
-import requests
-from cryptography.x509 import load_pem_x509_certificate
-from cryptography.hazmat.backends import default_backend
 import boto3
-import decimal
 from boto3.dynamodb.conditions import Key, Attr
 import time
 import datetime 
 import os
+from rfli_lambda_utils.request_logging import log_request, setup_logging
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import get_version_item
+from rfli_lambda_utils.parameters import get_parameter_value
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
 
 GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*', 
                     'Access-Control-Allow-Origin' : '*', 
@@ -29,7 +22,6 @@ GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*',
 DEFAULT_USER = 'default'
 
 USER_ISINES_TABLE = 'dnb-rfli-isin-track-user-isines'
-DATA_VERSION_TABLE = 'dnb-rfli-data-version-intra'
 
 
 def get_user(token):     
@@ -41,10 +33,14 @@ def get_user(token):
     return user
 
 
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb = boto3.resource("dynamodb")
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     
-    dynamodb = boto3.resource("dynamodb")
-    param_store = boto3.client("ssm")
     
     
     
@@ -52,22 +48,13 @@ def lambda_handler(event, context):
     intradiapp_user = get_user(event['headers']['Authorization'])
   
     market_rate_env    = os.environ['MARKET_RATE']
-    market_rate = int(param_store.get_parameter(Name=market_rate_env, WithDecryption=True)['Parameter']['Value'])
+    market_rate = int(get_parameter_value(market_rate_env))
     
     user_isines_table = dynamodb.Table(USER_ISINES_TABLE)
-    version_table     = dynamodb.Table(DATA_VERSION_TABLE)
-    
-    market_rate_env    = os.environ['MARKET_RATE']
     
-    market_rate = int(param_store.get_parameter(Name=market_rate_env, WithDecryption=True)['Parameter']['Value'])
-    
-    version_response  = version_table.get_item(
-        Key = {
-                'component': 'isin-track'
-            }
-        )
+    version_data = get_version_item('isin-track')
 
-    if 'Item' not in version_response:
+    if version_data is None:
         logger.info('No se encontro version en la tabla')
         return {
                 'headers':{ 'Access-Control-Allow-Headers': '*',
@@ -78,8 +65,6 @@ def lambda_handler(event, context):
                     'message': 'No hay data de versión en la tabla'}
             };
     
-    version_data = version_response['Item']
-    
     
     #if next_status == 'intraday':
     
@@ -170,7 +155,7 @@ def lambda_handler(event, context):
         
     final_response = {
         'headers': GENERIC_HEADERS, 
-        'body' : json.dumps(final_object, cls=DecimalEncoder)
+        'body' : encode_json(final_object)
        }
     
     return final_response
\ No newline at end of file
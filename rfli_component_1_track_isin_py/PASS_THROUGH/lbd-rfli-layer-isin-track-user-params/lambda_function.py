@@ -1,27 +1,21 @@
 import json
 import base64
-import logging  
 import sys  
-import jwt  
-import requests
-from cryptography.x509 import load_pem_x509_certificate
-from cryptography.hazmat.backends import default_backend
 import boto3
-import decimal
 import os
 from boto3.dynamodb.conditions import Key, Attr
 import time
 import datetime  
 from decimal import Decimal 
+from rfli_lambda_utils.request_logging import LOG_MAX_CHARS, log_request, setup_logging, summarize_event, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import get_version_item
+from rfli_lambda_utils.parameters import get_parameter_value
+from rfli_lambda_utils.partitioning import get_partition_key, remove_partition
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
 
 GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*', 
                     'Access-Control-Allow-Origin' : '*', 
@@ -32,12 +26,10 @@ DEFAULT_USER = 'default'
 USER_PARAMS_TABLE  = 'dnb-rfli-isin-track-user-params'
 USER_ISINES_TABLE  = 'dnb-rfli-isin-track-user-isines' 
 ALL_ISINES_TABLE   = 'dnb-rfli-isin-track-all-isines'
-DATA_VERSION_TABLE = 'dnb-rfli-data-version-intra'
 
 
 dynamodb = boto3.resource("dynamodb")
 
-param_store = boto3.client("ssm")
 
 def get_user(token):     
     payload = token.split('.')[1]   
@@ -48,59 +40,54 @@ def get_user(token):
     return user
 
 
-def get_items_from_tab(items, table):
+def get_items_from_tab(items, table, version_data):
     
     isines = []
    
     for item in items:
         
         temp_key = {
-            "isin": item
+            "isin": get_partition_key(version_data, item)
         }
         
         temp_item = table.get_item(Key = temp_key)
         
         if('Item' in temp_item):
-            isines.append(temp_item['Item'])
+            isines.append(remove_partition(temp_item['Item']))
             
     return isines
 
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     # TODO implement
-    logger.info(f"event {event}")
+    logger.info(f"event {summarize_event(event)}")
     logger.info("entrando a lambda")
     
     user_params_table  = dynamodb.Table(USER_PARAMS_TABLE)
     all_isines_table   = dynamodb.Table(ALL_ISINES_TABLE)
     user_isines_table  = dynamodb.Table(USER_ISINES_TABLE)
-    version_table      = dynamodb.Table(DATA_VERSION_TABLE)
     
     market_rate_env    = os.environ['MARKET_RATE']
-    market_rate = int(param_store.get_parameter(Name=market_rate_env, WithDecryption=True)['Parameter']['Value'])
+    market_rate = int(get_parameter_value(market_rate_env))
 
     #body_object = json.loads(event['body'], parse_float=Decimal)
     
     body_object = json.loads(event['body'])
-    print(body_object)  
     
     request_isines = body_object["isines"]
     
        
     
-    logger.info(f"isines de entrada {request_isines}")
+    logger.info(f"isines de entrada {summarize_payload(request_isines)}")
      
     
     intradiapp_user = get_user(event['headers']['Authorization'])
     
-    logger.info(str(event))
-    
-    version_response  = version_table.get_item(
-        Key = {
-                'component': 'isin-track'
-            }
-        )
+    version_data = get_version_item('isin-track')
 
-    if 'Item' not in version_response:
+    if version_data is None:
         logger.info('No se encontro version en la tabla')
         
         return {
@@ -112,8 +99,6 @@ def lambda_handler(event, context):
                     'message': 'No hay data de versión en la tabla'}
             };
     
-    version_data = version_response['Item']
-    
     current_version = version_data['version']
     next_status = version_data['next_status']
     next_update = version_data['next_update']
@@ -143,7 +128,7 @@ def lambda_handler(event, context):
             'isines': request_isines
         }
         
-        logger.info('Isines solicitados: '+str(request_isines))
+        logger.debug('Isines solicitados: '+str(request_isines)[:LOG_MAX_CHARS])
         
         #arreglo de keys para hacer request a dynamo
         batch_keys = []
@@ -165,18 +150,15 @@ def lambda_handler(event, context):
         logger.info('removiendo isines duplicados')
         
         request_isines = list(set(request_isines))
-        get_response_isines =  get_items_from_tab(request_isines, all_isines_table)
+        get_response_isines =  get_items_from_tab(request_isines, all_isines_table, version_data)
             
         
-        logger.info(get_response_isines)
-        
             
         #Extraer isines obtenidos de la respuesta
         #response_isines = get_response_isines['Responses']['dnb-rfli-isin-track-all-isines']  
         response_isines = get_response_isines
         
-        logger.info(f"Isines obtenidos: {response_isines} ")
-        print(json.dumps(response_isines, cls=DecimalEncoder))
+        logger.info(f"Isines obtenidos: {summarize_payload(response_isines)}")
         
         #Compare amount of request isines vs response isines
         if len(response_isines) != len(request_isines):
@@ -226,7 +208,7 @@ def lambda_handler(event, context):
                 
             final_response = {
             'headers': GENERIC_HEADERS, 
-            'body' : json.dumps(final_object, cls=DecimalEncoder)
+            'body' : encode_json(final_object)
             }
             
             return final_response
@@ -258,7 +240,7 @@ def lambda_handler(event, context):
       
         final_response = {
             'headers': GENERIC_HEADERS, 
-            'body' : json.dumps(final_object, cls=DecimalEncoder)
+            'body' : encode_json(final_object)
         }
         
         
@@ -1,58 +1,21 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import *
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: "+parameter_name)
-    ssm_client = bt3_client('ssm')
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: "+str(response['Parameter']['Value']))
-    return response['Parameter']['Value']
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail():
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -170,15 +133,19 @@ class IntradayCompareCurves:
         self.curves_collection_name = "dnb-rfli-curve-compare-curves-eod"
         self.folios_collection_name = "dnb-rfli-curve-compare-folios-eod"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.final_eod_time = int(get_parameter_store(get_enviroment_variable("FINAL_EOD_TIME")))
-        self.pre_eod_time = int(get_parameter_store(get_enviroment_variable("PRE_EOD_TIME")))
-        self.dynamodb_session = bt3_resource('dynamodb')
+        market_schedule = get_market_schedule(["FINAL_EOD_TIME", "PRE_EOD_TIME"])
+        self.final_eod_time = market_schedule["FINAL_EOD_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
 
 
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
     
 
+    @record_run_manifest("compare-curves", "eod")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             bogota_current_datetime = get_bogota_current_time()
@@ -188,7 +155,7 @@ class IntradayCompareCurves:
             if bogota_current_datetime.timestamp()>=prelim_start_timestamp:
                 origin_data_curves, origin_data_folios = self.get_origin_data()
                 transformed_curve_info, transformed_folios_info = self.transform_curves_folios_data(origin_data_curves, origin_data_folios)
-                self.save_data_into_dynamo(self.curves_collection_name, transformed_curve_info)
+                self.save_data_into_dynamo(self.curves_collection_name, add_payloads(transformed_curve_info))
                 self.save_data_into_dynamo(self.folios_collection_name, transformed_folios_info)
                 self.update_last_version_info()
             else:
@@ -203,12 +170,11 @@ class IntradayCompareCurves:
             send_error_mail()
 
     
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self,collection_name, data):
         try:
             table = self.dynamodb_session.Table(collection_name)
-            with table.batch_writer() as batch:
-                for item in data:
-                    batch.put_item(Item=item)
+            bulk_write_items(table, data)
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -219,16 +185,19 @@ class IntradayCompareCurves:
             raise
 
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información.")
         curves = []
         folios = []
         try:
-            with pymysql.connect(host=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['host'],
-                                        port=int(get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['port']),
-                                        user=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['username'],
-                                        password=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['password'],
-                                        cursorclass=pymysql.cursors.DictCursor
+            connection_credentials = get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))
+            with pymysql.connect(
+                host=connection_credentials['host'],
+                port=int(connection_credentials['port']),
+                user=connection_credentials['username'],
+                password=connection_credentials['password'],
+                cursorclass=PlanCapturingCursor,
             ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
@@ -263,6 +232,7 @@ class IntradayCompareCurves:
         return curves, folios
     
 
+    @measure_stage("extract")
     def consult_current_curves(self):
         curves_dynamo_table = self.dynamodb_session.Table(self.curves_collection_name)
         dynamo_response = curves_dynamo_table.scan(
@@ -274,6 +244,7 @@ class IntradayCompareCurves:
         return curves_list
     
 
+    @measure_stage("transform")
     def transform_curves_folios_data(self, curves_data, folios_data):
         initial_dictionary = {}
         transformed_folios_data = []
@@ -343,6 +314,7 @@ class IntradayCompareCurves:
         return transformed_curves_data, transformed_folios_data
     
 
+    @measure_stage("version")
     def update_last_version_info(self):
         try:
             logger.info("Iniciando actualización de versión.")
@@ -1,60 +1,23 @@
 import datetime as dt
-import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import *
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_optional_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.database import db_connection
+from rfli_utils.worker import is_worker_mode, run_intraday_worker
+from rfli_utils.change_probe import run_change_probe, FINGERPRINT_ATTRIBUTE
+from rfli_utils.freshness import set_freshness
+from rfli_utils.delta_writer import save_changed_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " + str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail():
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -192,27 +155,43 @@ class IntradayCompareCurves:
         self.curves_collection_name = "dnb-rfli-curve-compare-curves-intra"
         self.folios_collection_name = "dnb-rfli-curve-compare-folios-intra"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.market_close_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_CLOSE_TIME"))
-        )
-        self.market_open_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_OPEN_TIME"))
-        )
-        self.pre_eod_time = int(
-            get_parameter_store(get_enviroment_variable("PRE_EOD_TIME"))
-        )
-        self.intra_rate_time = int(
-            get_parameter_store(get_enviroment_variable("INTRA_RATE_TIME"))
+        market_schedule = get_market_schedule()
+        self.market_close_time = market_schedule["MARKET_CLOSE_TIME"]
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
+        self.probe_sources = (
+            "pub_rfl_betas",
+            "src_rfl_parameters",
+            "prc_rfl_basket_tes",
+            "prc_rfl_corporative_basket",
+            "prc_rfl_operations",
         )
-        self.dynamodb_session = bt3_resource("dynamodb")
+        self.source_fingerprint = None
+        self.snapshot_location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
 
     
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
     
     
+    @record_run_manifest("compare-curves", "intra")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
+            source_unchanged, self.source_fingerprint = run_change_probe(
+                get_enviroment_variable("FLASH_ORIGIN_DB"),
+                self.probe_sources,
+                self.full_valuation_date,
+                self.dynamodb_session.Table(self.version_collection_name),
+                "compare-curves",
+                self.create_string_query(self.query_timeout),
+            )
+            if source_unchanged:
+                self.update_last_version_info(data_changed=False)
+                return
             origin_data_curves, origin_data_folios = self.get_origin_data()
             (
                 transformed_curve_info,
@@ -222,7 +201,7 @@ class IntradayCompareCurves:
             )
             logger.info(f"Insertando datos de curvas. {'Sin embargo, No hay información de isines para este momento. Insercion vacia.' if not origin_data_curves else ''}")
             self.save_data_into_dynamo(
-                self.curves_collection_name, transformed_curve_info
+                self.curves_collection_name, add_payloads(transformed_curve_info)
             )
             logger.info(f"Insertando datos de folios. {'Sin embargo, No hay información de isines para este momento. Insercion vacia.' if not origin_data_folios else ''}")
             self.save_data_into_dynamo(
@@ -242,12 +221,13 @@ class IntradayCompareCurves:
             )
             send_error_mail()
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
             table = self.dynamodb_session.Table(collection_name)
-            with table.batch_writer() as batch:
-                for item in data:
-                    batch.put_item(Item=item)
+            save_changed_items(
+                table, data, self.snapshot_location, self.full_valuation_date
+            )
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -265,22 +245,13 @@ class IntradayCompareCurves:
             )
             raise
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información.")
         curves = []
         folios = []
         try:
-            with pymysql.connect(
-                host=get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))["host"],
-                port=int(
-                    get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))["port"]
-                ),
-                user=get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))["username"],
-                password=get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))[
-                    "password"
-                ],
-                cursorclass=pymysql.cursors.DictCursor,
-            ) as connection:
+            with db_connection(get_enviroment_variable("FLASH_ORIGIN_DB")) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Consultando información de curvas.")
@@ -327,6 +298,7 @@ class IntradayCompareCurves:
         return curves, folios
 
 
+    @measure_stage("extract")
     def consult_current_curves(self):
         curves_dynamo_table = self.dynamodb_session.Table(self.curves_collection_name)
         dynamo_response = curves_dynamo_table.scan(
@@ -338,6 +310,7 @@ class IntradayCompareCurves:
         return curves_list
     
 
+    @measure_stage("transform")
     def transform_curves_folios_data(self, curves_data, folios_data):
         
         initial_dictionary = {}
@@ -423,7 +396,8 @@ class IntradayCompareCurves:
         return last_exe_final_hour
     
     
-    def update_last_version_info(self):
+    @measure_stage("version")
+    def update_last_version_info(self, data_changed=True):
         logger.info("Iniciando actualización de versión.")
         table = self.dynamodb_session.Table(self.version_collection_name)
         response = table.get_item(Key={"component": "compare-curves"})
@@ -435,7 +409,15 @@ class IntradayCompareCurves:
         if "Item" in response:
             item = response["Item"]
             logger.info("Se carga la siguiente data de versión: " + str(item))
-            item["version"] = int(item["version"]) + 1
+            if data_changed:
+                item["version"] = int(item["version"]) + 1
+                set_freshness(item, self.source_fingerprint)
+                if self.source_fingerprint is not None:
+                    item[FINGERPRINT_ATTRIBUTE] = self.source_fingerprint
+                else:
+                    item.pop(FINGERPRINT_ATTRIBUTE, None)
+            else:
+                logger.info("El origen no cambió. Se conserva la versión actual.")
             if self.full_valuation_date.timestamp() >= (
                 current_day.timestamp() + get_seconds_from_ssm(self.calculate_last_execution())
             ):
@@ -465,4 +447,7 @@ class IntradayCompareCurves:
 
 
 if __name__ == "__main__":
-    IntradayCompareCurves().run()
+    if is_worker_mode():
+        run_intraday_worker(IntradayCompareCurves)
+    else:
+        IntradayCompareCurves().run()
@@ -1,48 +1,19 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
-from awsglue.utils import getResolvedOptions
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from sys import exc_info as sys_exc_info
+from rfli_utils.config import get_enviroment_variable, get_secret, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging, summarize_payload
 
 
 logger = setup_logging()
 
 
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
 class IntradayCompareCurves:
 
     def __init__(self):
@@ -128,9 +99,12 @@ class IntradayCompareCurves:
             folio;"
         self.curves_collection_name = "dnb-rfli-curve-compare-curves-eod"
         self.folios_collection_name = "dnb-rfli-curve-compare-folios-eod"
-        self.dynamodb_session = bt3_resource('dynamodb')
+        self.dynamodb_session = get_aws_resource("dynamodb")
 
 
+    @record_run_manifest("compare-curves", "historical")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             origin_data_curves, origin_data_folios = self.get_historical_data()
@@ -138,7 +112,7 @@ class IntradayCompareCurves:
             del origin_data_curves
             del origin_data_folios
             logger.info("Insertando curvas."+str(len(transformed_curve_info)))
-            self.save_data_into_dynamo(self.curves_collection_name, transformed_curve_info)
+            self.save_data_into_dynamo(self.curves_collection_name, add_payloads(transformed_curve_info))
             del transformed_curve_info
             logger.info("Insertando folios."+str(len(transformed_folios_info)))
             self.save_data_into_dynamo(self.folios_collection_name, transformed_folios_info)
@@ -156,6 +130,7 @@ class IntradayCompareCurves:
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
 
 
+    @measure_stage("extract")
     def get_historical_data(self):
         logger.info("Iniciando carga de información.")
         curves = []
@@ -166,7 +141,7 @@ class IntradayCompareCurves:
                                         port=int(connection_credentials['port']),
                                         user=connection_credentials['username'],
                                         password=connection_credentials['password'],
-                                        cursorclass=pymysql.cursors.DictCursor
+                                        cursorclass=PlanCapturingCursor
             ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
@@ -215,6 +190,7 @@ class IntradayCompareCurves:
                         "[" + str(exception_line) + "] " + str(current_error))
             raise
     
+    @measure_stage("transform")
     def transform_curves_folios_data(self, curves_data, folios_data):
         initial_dictionary = {}
         transformed_folios_data = []
@@ -251,7 +227,7 @@ class IntradayCompareCurves:
                             transformed_curves_data[-1]['data']['beta_1_r'] = ordened_curves_current_date[4]['beta_1']
                             transformed_curves_data[-1]['data']['beta_2_r'] = ordened_curves_current_date[4]['beta_2']
                             transformed_curves_data[-1]['data']['tau_r'] = ordened_curves_current_date[4]['tau']
-            print(str(transformed_curves_data))
+            logger.info(f"Curvas transformadas: {summarize_payload(transformed_curves_data)}")
         else:
             logger.info("No hay información de curvas que transformar.")
         logger.info("Finalizando transformación de curvas.")
@@ -284,21 +260,20 @@ class IntradayCompareCurves:
         return transformed_curves_data, transformed_folios_data
 
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self,collection_name, data):
         table = self.dynamodb_session.Table(collection_name)
-        with table.batch_writer() as batch:
-            logger.info("Insertando "+str(len(data))+" registros.")
-            for item in data:
-                try:
-                    batch.put_item(Item=item)
-                except Exception as insert_in_destination_exception:
-                    exception_line = sys_exc_info()[2].tb_lineno
-                    logger.error(
-                        "Error insertando el item: "+str(item))
-                    current_error = insert_in_destination_exception
-                    logger.error(current_error.__class__.__name__ +
-                                "[" + str(exception_line) + "] " + str(current_error))
-                    continue
+        logger.info("Insertando "+str(len(data))+" registros.")
+        try:
+            bulk_write_items(table, data)
+        except Exception as insert_in_destination_exception:
+            exception_line = sys_exc_info()[2].tb_lineno
+            logger.error(
+                "Error insertando datos en dynamoDB para la tabla "+collection_name+".")
+            current_error = insert_in_destination_exception
+            logger.error(current_error.__class__.__name__ +
+                        "[" + str(exception_line) + "] " + str(current_error))
+            raise
 
 
 if __name__ == "__main__":
@@ -1,61 +1,25 @@
 import datetime as dt
 from dateutil import tz
-from boto3 import client as bt3_client, resource as bt3_resource
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
-from awsglue.utils import getResolvedOptions
+from sys import exc_info as sys_exc_info
 from email_utils.email_utils import *
-from json import loads as json_loads
 import pymysql.cursors
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: "+parameter_name)
-    ssm_client = bt3_client('ssm')
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: "+str(response['Parameter']['Value']))
-    return response['Parameter']['Value']
-
-
 def get_seconds_from_ssm(hour_to_parse):
     seconds = (int(hour_to_parse/100)*3600)+(int(hour_to_parse % 100)*60)
     logger.info("Se transformó la hora militar "+str(hour_to_parse)+" a segundos: "+str(seconds))
     return seconds
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        logger.info("Intentando acceder al secreto: "+str(secret_name))
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-        logger.info("Secreto cargado correctamente: "+str(secret_name))
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
 def get_bogota_current_time():
     try:
         logger.info('Configurando la hora Colombia.')
@@ -71,11 +35,6 @@ def get_bogota_current_time():
                      "[" + str(exception_line) + "] " + str(current_error))
 
 
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail():
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -105,12 +64,16 @@ class InitDataVersion:
             "isin-search",
             "top-delta-category"
         ]
-        self.market_open_time = int(get_parameter_store(get_enviroment_variable("MARKET_OPEN_TIME")))
-        self.intra_rate_time = int(get_parameter_store(get_enviroment_variable("INTRA_RATE_TIME")))
+        market_schedule = get_market_schedule(["MARKET_OPEN_TIME", "INTRA_RATE_TIME"])
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
         self.market_open_time_seconds = get_seconds_from_ssm(
             self.market_open_time)
-        self.dynamodb_session = bt3_resource('dynamodb')
+        self.dynamodb_session = get_aws_resource("dynamodb")
 
+    @record_run_manifest("data-version", "init")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             if self.validate_business_day():
@@ -131,15 +94,14 @@ class InitDataVersion:
     
     def validate_business_day(self):
         try:
-            with pymysql.connect(host=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['host'],
-                                 port=int(get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['port']),
-                                 user=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['username'],
-                                 password=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['password'],
-                                 cursorclass=pymysql.cursors.DictCursor
-                                 ) as connection:
+            connection_credentials = get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))
+            with pymysql.connect(
+                host=connection_credentials['host'],
+                port=int(connection_credentials['port']),
+                user=connection_credentials['username'],
+                password=connection_credentials['password'],
+                cursorclass=PlanCapturingCursor,
+            ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Consultando si el dia es laboral.")
@@ -170,6 +132,7 @@ class InitDataVersion:
             raise
     
 
+    @measure_stage("version")
     def reset_versions(self):
         try:
             version_table = self.dynamodb_session.Table(
@@ -184,7 +147,9 @@ class InitDataVersion:
                     "component": component_name,
                     "next_update": int(current_day.timestamp())+(self.market_open_time_seconds+self.intra_rate_time),
                     "version": 1,
-                    "next_status": "intraday"
+                    "next_status": "intraday",
+                    #Las versiones se reinician en 1 cada dia, los lambdas arman el ETag con la fecha y la version
+                    "version_date": current_day.strftime("%Y-%m-%d")
                 }
                 logger.info("La respuesta ha sido, para el componente "+component_name+" la siguiente: "+str(response))
                 data_to_insert.append(new_data)
@@ -10,7 +10,14 @@ def lambda_handler(event, context):
     try:
         client = boto3.client('glue')
         glue_job_name = os.environ['JOB_NAME']
-        response = client.start_job_run(JobName = glue_job_name)
+        try:
+            response = client.start_job_run(JobName = glue_job_name)
+        except client.exceptions.ConcurrentRunsExceededException:
+            logger.info("El Glue ya se encuentra en ejecución en modo worker. No se lanza una nueva ejecución.")
+            return {
+                'statusCode': 200,
+                'body': json.dumps('El Glue ya se encuentra en ejecución')
+            }
         job_run_id = response["JobRunId"]
         logger.info(f"Se lanzó el Glue - Compare Curves Intradia con el id {job_run_id}.")
         return {
@@ -1,43 +1,39 @@
-import json
 import boto3
 import os
 import logging
-import decimal
 import time
 import datetime 
 import sys
-from boto3.dynamodb.conditions import Key, Attr
-import os
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.versions import get_version_item
+from rfli_lambda_utils.parameters import get_parameter_value
+from rfli_lambda_utils.responses import build_response, get_memoized_payload, get_version_tag
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
         
         
-logger = logging.getLogger()
-logger.setLevel(logging.ERROR)
+logger = setup_logging(logging.ERROR)
+
+
 dynamodb = boto3.resource("dynamodb")
-param_store = boto3.client("ssm")
 
 
 eod_table_name = "dnb-rfli-curve-compare-curves-eod" #** cambiar data_table_name
 version_table_name = "dnb-rfli-data-version-intra" #** cambiar version_table_name
 
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     
     table = dynamodb.Table(eod_table_name)
-    version_table = dynamodb.Table(version_table_name)
-    version_response = version_table.query(KeyConditionExpression=Key('component').eq('compare-curves'), Limit = 1, ScanIndexForward = False)
-    print(version_response)
-    print(len(version_response['Items']))
+    version_data = get_version_item('compare-curves', version_table_name)
     
 
     
-    market_time = int(param_store.get_parameter(Name=os.environ['RATE_TIME'], WithDecryption=True)['Parameter']['Value'])
+    market_time = int(get_parameter_value(os.environ['RATE_TIME']))
     
-    if len(version_response['Items'])==0:
+    if version_data is None:
         return {
                 'headers':{ 'Access-Control-Allow-Headers': '*', 
                             'Access-Control-Allow-Origin': '*', 
@@ -45,13 +41,26 @@ def lambda_handler(event, context):
                 'statusCode': 400,
                 'body': 'No se encontró el elemento'
             };
+ 
     
-    
-    version_data = version_response['Items'][0]
     curve          = event["queryStringParameters"]["cc_curve"]
     
     valuation_date = event["queryStringParameters"]["valuation_date"]
     
+    payload = None
+    
+    def read_curve(curve_date):
+        #Data de la curva en la fecha, leida de DynamoDB y serializada una vez por version
+        def read_item():
+            response = table.get_item(
+                Key={
+                    'valuation_date': curve_date,
+                    'cc_curve': curve
+                }
+            )
+            return response.get('Item')
+        return get_memoized_payload(('compare-curves', get_version_tag(version_data), curve, curve_date), read_item)
+    
     
     if 'version' in event["queryStringParameters"]:
         
@@ -62,7 +71,7 @@ def lambda_handler(event, context):
         db_version = version_data['version']
         today = str(datetime.date.today())
         
-        print(today)
+        logger.debug(f'[lambda_handler] Fecha de la consulta: {today}')
         
         aux_date = datetime.datetime.now();
         hour = (int(aux_date.strftime("%H"))) 
@@ -74,13 +83,9 @@ def lambda_handler(event, context):
         if float(user_version) == float(db_version): 
             
             if next_status == 'pre_eod':
-                print('por aca')
-                
                 wait_time = next_update - int(now)
-                print(now)
                 
                 final_object = {
-                    'data': None,
                     'version': db_version,
                     'next_update': wait_time if wait_time >= 0 else market_time,
                     'next_status': next_status
@@ -88,26 +93,18 @@ def lambda_handler(event, context):
                 
             elif next_status == 'final_eod':
                 
-                response = table.get_item(
-                    Key={
-                        'valuation_date': today,
-                        'cc_curve': curve
-                    }
-                )
+                payload = read_curve(today)
                 
                 
                 
-                if 'Item' in response:
-                    
-                    data = response['Item']['data']
+                if payload is not None:
                   
                     wait_time = (20 - hour + 5)*3600 - minutes*60 - seconds
                 
                     final_object = {
                         'version': db_version,
                         'next_update': wait_time,
-                        'next_status': next_status,
-                        'data': data
+                        'next_status': next_status
                     }
                     
                 else:
@@ -115,8 +112,7 @@ def lambda_handler(event, context):
                     final_object = {
                         'version': db_version,
                         'next_update': market_time,
-                        'next_status': next_status,
-                        'data': None
+                        'next_status': next_status
                     }
                 
             
@@ -124,22 +120,15 @@ def lambda_handler(event, context):
         else:
             
             
-            response = table.get_item(
-            Key={
-                'cc_curve': curve,
-                'valuation_date': today
-                }
-            )
+            payload = read_curve(today)
         
-            if 'Item' in response:
-                data = response['Item']
+            if payload is not None:
                 wait_time = (20 - hour + 5)*3600 - minutes*60 - seconds
                 
                 final_object = {
                     'version': db_version,
                     'next_update': wait_time,
-                    'next_status': next_status,
-                    'data': data['data']
+                    'next_status': next_status
                 }
                 
             else:
@@ -147,41 +136,31 @@ def lambda_handler(event, context):
                 final_object = {
                     'version': db_version,
                     'next_update': market_time,
-                    'next_status': next_status,
-                    'data': None
+                    'next_status': next_status
                 }
                 
     else:
         
-        response = table.get_item(
-            Key={
-                'cc_curve': curve,
-                'valuation_date': valuation_date
-            }
-        )
+        payload = read_curve(valuation_date)
 
         #logger.info('%s', check_intra)
-        print(valuation_date)
-        print('else')
+        logger.debug(f'[lambda_handler] Fecha de valoracion consultada: {valuation_date}')
     
-        if 'Item' not in response:
+        if payload is None:
             return {
                 'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
                 'statusCode': 400,
                 'body': 'No se encontró el elemento'
             };
     
-        logger.info(response['Item'])
-        data = response['Item']
+        logger.debug(f"[lambda_handler] Curvas consultadas: {summarize_payload(payload['json'])}")
     
         final_object = {
             'version': None,
-            'next_update': None,
-            "data": data['data']
+            'next_update': None
         }
     
-    final_response = {  'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'}, 
-                        'body' : json.dumps(final_object, cls=DecimalEncoder)
-                      }
+    final_response = build_response(event, {'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
+                                    final_object, payload)
     #logger.info(f'{final_response}')
     return final_response
\ No newline at end of file
@@ -1,48 +1,42 @@
-import json
 import boto3
-import os
-import logging
-import decimal
 import datetime
 import time
 
 import sys
-from boto3.dynamodb.conditions import Key, Attr
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_event, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.versions import add_freshness, get_version_item
+from rfli_lambda_utils.responses import add_etag, build_response, get_conditional_response, get_memoized_payload, get_version_tag
 
-#Conversion de Decimal a Float
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
         
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)  
+logger = setup_logging()
+
 
 dynamodb = boto3.resource("dynamodb")
     
 intra_table_name = "dnb-rfli-curve-compare-curves-intra" #** cambiar data_table_name
 version_table_name = "dnb-rfli-data-version-intra" #** cambiar version_table_name
     
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
 
     table = dynamodb.Table(intra_table_name) #tabla de curvas intra
-    version_table = dynamodb.Table(version_table_name) #tabla de versiones
     
-    logger.info('[lambda_handler] event de entrada:%s',event)
+    logger.info(f'[lambda_handler] event de entrada: {summarize_event(event)}')
     
     curve = event["queryStringParameters"]["cc_curve"]
     
-    version_request = event["queryStringParameters"]["version"]
-    
     #response = None
-    data = None
+    payload = None
     #final_object = None
 
-    version_response = version_table.query(KeyConditionExpression=Key('component').eq('compare-curves'), Limit = 1, ScanIndexForward = False)
+    version_data = get_version_item('compare-curves', version_table_name)
     
-    if len(version_response['Items'])==0:
+    if version_data is None:
         return {
                 'headers':{ 'Access-Control-Allow-Headers': '*', 
                             'Access-Control-Allow-Origin': '*', 
@@ -51,19 +45,7 @@ def lambda_handler(event, context):
                 'body': 'No se encontró el elemento'
             };
             
-            
-    print(version_response)
-    
-    if len(version_response['Items'])==0:
-        logger.error('No se encontro version en la tabla')
-        return {
-                'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
-                'statusCode': 500,
-                'body': {
-                    'message': 'Error interno'}
-                };
         
-    version_data = version_response['Items'][0]
     current_version = version_data['version']
     next_update = version_data['next_update']
     next_status = version_data['next_status']
@@ -72,7 +54,7 @@ def lambda_handler(event, context):
     #now  = datetime.datetime.timestamp(present_date)*1000
     now = time.time()
     
-    print(now)
+    logger.debug(f'[lambda_handler] Hora de la consulta: {now}')
     
     time_to_wait = float(next_update) - now;
 
@@ -80,24 +62,28 @@ def lambda_handler(event, context):
         time_to_wait = 0
         
     
-    if float(version_request) != float(current_version):
+    conditional_response = get_conditional_response(event, {'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
+                                                    version_data, time_to_wait, next_status)
+    
+    if conditional_response is None:
         
         try:
         
-            response = table.get_item(
-                Key={
-                    'cc_curve': curve
-                }
-            )
+            def read_item():
+                response = table.get_item(
+                    Key={
+                        'cc_curve': curve
+                    }
+                )
+                return response['Item']
 
         
-            data = response['Item']
+            payload = get_memoized_payload(('compare-curves', get_version_tag(version_data), curve), read_item)
         
             final_object = {
                 'version':current_version,
                 'next_update': time_to_wait,
-                'next_status': next_status,
-                'data':data['data']
+                'next_status': next_status
             }
         
         except (Exception, ):
@@ -114,20 +100,15 @@ def lambda_handler(event, context):
     #24 - pre_eod --version se mantiene    
     else:
         
-        final_object = {
-                'version':current_version,
-                'next_update': None,
-                'next_status': next_status,
-                'data': None
-            }
+        return conditional_response
         
     #logger.info(response)
     
     
     final_response = {
         'statusCode': 200,
-        'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'}, 
-        'body' : json.dumps(final_object, cls=DecimalEncoder)
+        **build_response(event, add_etag({'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'}, version_data),
+                         add_freshness(final_object, version_data), payload)
        }
-    logger.info(f'{final_response}')
+    logger.info(f'[lambda_handler] Respuesta: {summarize_payload(final_response["body"])}')
     return final_response 
\ No newline at end of file
@@ -1,29 +1,31 @@
-import json
 import boto3
-import os
-import logging
-import decimal
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_event, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json, from_attribute_value
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
+logger = setup_logging()
+
+
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion. Los folios se
+#leen con el cliente de bajo nivel, en formato AttributeValue, y se convierten a JSON en una sola
+#pasada, sin crear un Decimal por cada numero como el recurso de DynamoDB
+dynamodb_client = boto3.client("dynamodb")
 
-def lambda_handler(event, context):
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
 
-    dynamodb = boto3.resource("dynamodb")
+@log_request
+@report_consumed_capacity
+def lambda_handler(event, context):
 
-    table = dynamodb.Table("dnb-rfli-curve-compare-folios-intra")
     
-    logger.info(f'[lambda_handler] event de entrada:\n{event}')
+    logger.info(f'[lambda_handler] event de entrada: {summarize_event(event)}')
    
     curve = event["queryStringParameters"]["cc_curve"]
-    response = table.get_item(
+    response = dynamodb_client.get_item(
+        TableName="dnb-rfli-curve-compare-folios-intra",
+        ProjectionExpression="#data",
+        ExpressionAttributeNames={"#data": "data"},
         Key={
-            'cc_curve': curve
+            'cc_curve': {'S': curve}
         }
     )
     
@@ -35,7 +37,7 @@ def lambda_handler(event, context):
         };
         
     
-    data = response['Item']['data']
+    data = from_attribute_value(response['Item']['data'])
     
     
     finalObject = {
@@ -44,11 +46,7 @@ def lambda_handler(event, context):
         'data':data
     }
     
-    #jsonBonito = json.loads(json.dumps(data, cls=DecimalEncoder))
-    
-    #json.dumps(data, cls=DecimalEncoder)
-    
-    final_response = {'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'}, 'body' : json.dumps(finalObject, cls=DecimalEncoder)
+    final_response = {'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'}, 'body' : encode_json(finalObject)
        }
-    logger.info(f'{final_response}')
+    logger.info(f'[lambda_handler] Respuesta: {summarize_payload(final_response["body"])}')
     return final_response
\ No newline at end of file
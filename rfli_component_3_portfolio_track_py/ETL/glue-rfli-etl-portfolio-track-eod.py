@@ -1,57 +1,20 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-import time
 from email_utils.email_utils import *
+from rfli_utils.config import get_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items
+from rfli_utils.partitioning import partition_items, set_active_date
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
 
 
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
-
 logger = setup_logging()
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: "+parameter_name)
-    ssm_client = bt3_client('ssm')
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response['Parameter']['Value']))
-    return response['Parameter']['Value']
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
 def send_error_mail():
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -97,13 +60,10 @@ class IntradayFolios:
         self.yesterday_full_valuation_date = self.full_valuation_date - dt.timedelta(
             days=1
         )
-        self.final_eod_time = int(
-            get_parameter_store(get_enviroment_variable("FINAL_EOD_TIME"))
-        )
-        self.pre_eod_time = int(
-            get_parameter_store(get_enviroment_variable("PRELIM_EOD_TIME"))
-        )
-        self.dynamodb_session = bt3_resource("dynamodb")
+        market_schedule = get_market_schedule(["FINAL_EOD_TIME", "PRELIM_EOD_TIME"])
+        self.final_eod_time = market_schedule["FINAL_EOD_TIME"]
+        self.pre_eod_time = market_schedule["PRELIM_EOD_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
         self.user_params_collection_name = "dnb-rfli-portfolio-track-params-isines"
 
         self.get_data_pub_rfl_prices = f"SELECT {self.create_string_query(self.query_timeout)} rfl_prices.isin_code,\
@@ -142,21 +102,19 @@ class IntradayFolios:
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
     
     
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información.")
         isines = []
         instruments = []
         try:
+            connection_credentials = get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))
             with pymysql.connect(
-                host=get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))["host"],
-                port=int(
-                    get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))["port"]
-                ),
-                user=get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))["username"],
-                password=get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))[
-                    "password"
-                ],
-                cursorclass=pymysql.cursors.DictCursor,
+                host=connection_credentials["host"],
+                port=int(connection_credentials["port"]),
+                user=connection_credentials["username"],
+                password=connection_credentials["password"],
+                cursorclass=PlanCapturingCursor,
             ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
@@ -212,6 +170,7 @@ class IntradayFolios:
         ]
         return new_dictionary
 
+    @measure_stage("version")
     def update_last_version_info(self):
         try:
             logger.info("Iniciando actualización de versión.")
@@ -224,6 +183,7 @@ class IntradayFolios:
                 item = response["Item"]
                 logger.info("Se carga la siguiente data de versión: " + str(item))
                 item["version"] = int(item["version"]) + 1
+                set_active_date(item, self.full_valuation_date)
                 item["next_update"] = int(
                     current_day.timestamp()
                 ) + get_seconds_from_ssm(self.final_eod_time)
@@ -253,6 +213,7 @@ class IntradayFolios:
             )
             raise
 
+    @measure_stage("transform")
     def make_dictionary(self, dictionary_1, dictionary_2):
         map = {}
         for dictionary in dictionary_1:
@@ -268,14 +229,14 @@ class IntradayFolios:
         final_dictionary = self.reformat_dictionary(final_dictionary)
         return final_dictionary
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
+            data = partition_items(collection_name, data, self.full_valuation_date)
             logger.info("Comienza escritura en Dynamo")
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                bulk_write_items(table, data)
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -292,6 +253,7 @@ class IntradayFolios:
                 + str(current_error)
             )
 
+    @measure_stage("extract")
     def read_all_user_params(self):
         user_params_table = self.dynamodb_session.Table(
             self.user_params_collection_name
@@ -305,6 +267,9 @@ class IntradayFolios:
         item_list = filter(lambda item: item["isin"] in params["isines"], data)
         return {"user_id": params["user_id"], "isines": list(item_list)}
 
+    @record_run_manifest("portfolio-track", "eod")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             bogota_current_datetime = get_bogota_current_time()
@@ -312,7 +277,6 @@ class IntradayFolios:
                 hour=0, minute=0, second=0, microsecond=0
             ).timestamp()+get_seconds_from_ssm(self.pre_eod_time))
             if bogota_current_datetime.timestamp()>=prelim_start_timestamp:
-                inicio = time.time()
                 result_isin, result_instrument = self.get_origin_data()
                 data = self.make_dictionary(result_isin, result_instrument)
                 self.save_data_into_dynamo("dnb-rfli-portfolio-track-all-isines", data)
@@ -324,8 +288,6 @@ class IntradayFolios:
                     "dnb-rfli-portfolio-track-user-isines", all_user_list
                 )
                 self.update_last_version_info()
-                fin = time.time()
-                logger.info("Tiempo transcurrido: ", fin - inicio)
             else:
                 logger.info(f"Aun no se ha entrado en periodo preliminar. No se ejecuta el Glue.")
         except Exception as IntradayFolios:
@@ -1,57 +1,23 @@
 import datetime as dt
-import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
-from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-import time
 from email_utils.email_utils import *
+from rfli_utils.config import get_enviroment_variable, get_optional_enviroment_variable, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.database import db_connection
+from rfli_utils.worker import is_worker_mode, run_intraday_worker
+from rfli_utils.change_probe import run_change_probe, FINGERPRINT_ATTRIBUTE
+from rfli_utils.freshness import set_freshness
+from rfli_utils.delta_writer import save_changed_items
+from rfli_utils.partitioning import partition_items, set_active_date
+from rfli_utils.snapshot import get_market_snapshot, filter_published_isines, index_by_isin, round_half_up
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.structured_logging import setup_logging
 
 
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
-
 logger = setup_logging()
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: "+parameter_name)
-    ssm_client = bt3_client('ssm')
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response['Parameter']['Value']))
-    return response['Parameter']['Value']
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
 def send_error_mail():
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -94,49 +60,18 @@ class IntradayFolios:
         self.query_timeout = int(get_enviroment_variable("QUERY_TIMEOUT"))
         self.full_valuation_date = get_bogota_current_time()
         self.yesterday_full_valuation_date = (self.full_valuation_date - dt.timedelta(days=1))
-        self.dynamodb_session = bt3_resource('dynamodb')
+        self.dynamodb_session = get_aws_resource("dynamodb")
+        self.probe_sources = (
+            "pub_rfl_prices",
+        )
+        self.source_fingerprint = None
         self.user_params_collection_name = 'dnb-rfli-portfolio-track-params-isines'
-        self.market_close_time = int(get_parameter_store(
-            get_enviroment_variable("MARKET_CLOSE_TIME")))
-        self.market_open_time = int(get_parameter_store(
-            get_enviroment_variable("MARKET_OPEN_TIME")))
-        self.pre_eod_time = int(get_parameter_store(
-            get_enviroment_variable("PRE_EOD_TIME")))
-        self.intra_rate_time = int(get_parameter_store(
-            get_enviroment_variable("INTRA_RATE_TIME")))
+        market_schedule = get_market_schedule()
+        self.market_close_time = market_schedule["MARKET_CLOSE_TIME"]
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
        
-        self.get_data_pub_rfl_prices = f"SELECT {self.create_string_query(self.query_timeout)} rfl_prices.isin_code,\
-                cast(rfl_prices.maturity_date As CHAR) AS maturity_date,\
-                rfl_prices.yield,\
-                rfl_prices_yesterday.yield AS 'yesterday_yield',\
-                rfl_prices.clean_price,\
-                rfl_prices.accrued_interest,\
-                rfl_prices_yesterday.clean_price AS 'clean_price_yesterday',\
-                (rfl_prices.clean_price - rfl_prices_yesterday.clean_price) * 100 AS 'difference',\
-                rfl_prices.instrument,\
-                cast(rfl_prices.issue_date AS CHAR) AS issue_date,\
-                rfl_prices.spread,\
-                rfl_prices.payment_frequency,\
-                rfl_prices.mean_price,\
-                rfl_prices_yesterday.mean_price AS 'mean_price_yesterday',\
-                ROUND(rfl_prices.margin_value, 4) AS 'margin_value',\
-                rfl_prices.category_id as category_id,\
-                rfl_prices.equivalent_margin\
-            FROM precia_published.pub_rfl_prices rfl_prices\
-            INNER JOIN precia_published.pub_rfl_prices rfl_prices_yesterday ON rfl_prices.isin_code = rfl_prices_yesterday.isin_code\
-            WHERE rfl_prices.valuation_date = '{self.full_valuation_date.date()}' AND rfl_prices_yesterday.valuation_date = '{self.yesterday_full_valuation_date.date()}' AND rfl_prices.isin_code != ''\
-                AND rfl_prices.instrument NOT IN('TIDISDVL','CERTS') AND rfl_prices_yesterday.maturity_date>'{self.full_valuation_date.date()}';"
-        self.get_data_rfl_instrument = f"SELECT {self.create_string_query(self.query_timeout)} rfl_instrument.issuer,\
-                issuer_information.name AS issuer_name,\
-				rfl_instrument.cc_curve,\
-				rfl_instrument.isin_code\
-			FROM precia_sources.src_rfl_instrument AS rfl_instrument\
-            LEFT JOIN precia_sources.src_rfl_issuer AS issuer_information \
-            ON rfl_instrument.issuer = issuer_information.issuer\
-			WHERE rfl_instrument.isin_code != '';"
-        self.get_categories_query = f"SELECT {self.create_string_query(self.query_timeout)} category_id,\
-                rating_group\
-                FROM precia_sources.src_rfl_category;"
         self.category_definition = {
             10:"Sin calificación",
             20:"E",
@@ -155,41 +90,40 @@ class IntradayFolios:
             100:"Multilaterales"
         }        
         self.version_collection_name = "dnb-rfli-data-version-intra"
+        self.snapshot_location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
     
     
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información.")
         isines = []
         instruments = []
         categories = []
         try:
-            with pymysql.connect(host=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['host'],
-                                 port=int(get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['port']),
-                                 user=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['username'],
-                                 password=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['password'],
-                                 cursorclass=pymysql.cursors.DictCursor
-                                ) as connection:
+            with db_connection(get_enviroment_variable('FLASH_ORIGIN_DB')) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Consultando información de curvas.")
-                        cursor_connection.execute(self.get_data_pub_rfl_prices)                        
-                        if cursor_connection.rowcount > 0:
-                            isines = cursor_connection.fetchall()
+                        market_snapshot = get_market_snapshot(
+                            cursor_connection,
+                            self.full_valuation_date,
+                            self.snapshot_location,
+                            self.intra_rate_time // 2,
+                            self.create_string_query(self.query_timeout),
+                            self.source_fingerprint,
+                        )
+                        isines = self.get_today_isines(market_snapshot)
+                        if len(isines) > 0:
                             logger.info(
                                 "Consultando información de la categoria asociadas a isines.")
-                            cursor_connection.execute(self.get_data_rfl_instrument)                        
-                            if cursor_connection.rowcount > 0:
-                                instruments = cursor_connection.fetchall()
+                            instruments = self.get_instruments(market_snapshot)
+                            if len(instruments) > 0:
                                 logger.info(
                                 "Consultando información de todas las categorias.")
-                                cursor_connection.execute(self.get_categories_query)
-                                categories = cursor_connection.fetchall()
+                                categories = market_snapshot.categories
                     except Exception as insert_in_destination_exe_exception:
                         exception_line = sys_exc_info()[2].tb_lineno
                         current_error = insert_in_destination_exe_exception
@@ -208,6 +142,61 @@ class IntradayFolios:
             logger.info("Se terminó el proceso de carga de información.")
         return isines,instruments,categories
     
+    @measure_stage("transform")
+    def get_today_isines(self, market_snapshot):
+        today_date = self.full_valuation_date.strftime("%Y-%m-%d")
+        yesterday_prices = index_by_isin(
+            [
+                yesterday_price
+                for yesterday_price in market_snapshot.prices_yesterday
+                if yesterday_price["maturity_date"] > today_date
+            ]
+        )
+        isines = []
+        for today_price in filter_published_isines(market_snapshot.prices_today):
+            yesterday_price = yesterday_prices.get(today_price["isin_code"])
+            if yesterday_price is None:
+                continue
+            difference = None
+            if today_price["clean_price"] is not None and yesterday_price["clean_price"] is not None:
+                difference = (today_price["clean_price"] - yesterday_price["clean_price"]) * 100
+            isines.append(
+                {
+                    "isin_code": today_price["isin_code"],
+                    "maturity_date": today_price["maturity_date"],
+                    "yield": today_price["yield"],
+                    "yesterday_yield": yesterday_price["yield"],
+                    "clean_price": today_price["clean_price"],
+                    "accrued_interest": today_price["accrued_interest"],
+                    "clean_price_yesterday": yesterday_price["clean_price"],
+                    "difference": difference,
+                    "instrument": today_price["instrument"],
+                    "issue_date": today_price["issue_date"],
+                    "spread": today_price["spread"],
+                    "payment_frequency": today_price["payment_frequency"],
+                    "mean_price": today_price["mean_price"],
+                    "mean_price_yesterday": yesterday_price["mean_price"],
+                    "margin_value": round_half_up(today_price["margin_value"], 4),
+                    "category_id": today_price["category_id"],
+                    "equivalent_margin": today_price["equivalent_margin"],
+                }
+            )
+        return isines
+
+    @measure_stage("transform")
+    def get_instruments(self, market_snapshot):
+        issuer_names = market_snapshot.get_issuer_names()
+        return [
+            {
+                "issuer": instrument["issuer"],
+                "issuer_name": issuer_names.get(instrument["issuer"]),
+                "cc_curve": instrument["cc_curve"],
+                "isin_code": instrument["isin_code"],
+            }
+            for instrument in market_snapshot.instruments
+            if instrument["isin_code"] != ""
+        ]
+
     def reformat_dictionary(self, data):
         new_dictionary = [{'isin': d['isin_code'], 'data': {k: v for k, v in d.items() if k != 'isin_code'}} 
                                               for d in data]
@@ -224,7 +213,8 @@ class IntradayFolios:
         return last_exe_final_hour
     
     
-    def update_last_version_info(self):
+    @measure_stage("version")
+    def update_last_version_info(self, data_changed=True):
         logger.info("Iniciando actualización de versión.")
         table = self.dynamodb_session.Table(self.version_collection_name)
         response = table.get_item(Key={"component": "portfolio-track"})
@@ -236,7 +226,16 @@ class IntradayFolios:
         if "Item" in response:
             item = response["Item"]
             logger.info("Se carga la siguiente data de versión: " + str(item))
-            item["version"] = int(item["version"]) + 1
+            if data_changed:
+                item["version"] = int(item["version"]) + 1
+                set_active_date(item, self.full_valuation_date)
+                set_freshness(item, self.source_fingerprint)
+                if self.source_fingerprint is not None:
+                    item[FINGERPRINT_ATTRIBUTE] = self.source_fingerprint
+                else:
+                    item.pop(FINGERPRINT_ATTRIBUTE, None)
+            else:
+                logger.info("El origen no cambió. Se conserva la versión actual.")
             if self.full_valuation_date.timestamp() >= (
                 current_day.timestamp() + get_seconds_from_ssm(self.calculate_last_execution())
             ):
@@ -264,6 +263,7 @@ class IntradayFolios:
                 "No se encontró información de versión para 'portfolio-track'. No se cambia el versionado."
             )
     
+    @measure_stage("transform")
     def make_dictionary(self,dictionary_1,dictionary_2, categories):
         categories_dictionary = {x["category_id"]:x["rating_group"] for x in categories}
         map = {}
@@ -284,14 +284,16 @@ class IntradayFolios:
         final_dictionary = self.reformat_dictionary(final_dictionary)
         return final_dictionary
         
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self,collection_name, data):
         try:
+            data = partition_items(collection_name, data, self.full_valuation_date)
             logger.info("Comienza escritura en Dynamo")
             if len(data)>0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                save_changed_items(
+                    table, data, self.snapshot_location, self.full_valuation_date
+                )
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -299,7 +301,9 @@ class IntradayFolios:
             current_error = save_data_into_dynamo_exception
             logger.error(current_error.__class__.__name__ +
                         "[" + str(exception_line) + "] " + str(current_error))
+            raise
                         
+    @measure_stage("extract")
     def read_all_user_params(self):
         user_params_table = self.dynamodb_session.Table(self.user_params_collection_name)
         response = user_params_table.scan()
@@ -311,9 +315,22 @@ class IntradayFolios:
         item_list = filter(lambda item: item['isin'] in params['isines'], data)
         return {'user_id' : params['user_id'], 'isines' : list(item_list)}
                         
+    @record_run_manifest("portfolio-track", "intra")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
-            inicio = time.time()
+            source_unchanged, self.source_fingerprint = run_change_probe(
+                get_enviroment_variable("FLASH_ORIGIN_DB"),
+                self.probe_sources,
+                self.full_valuation_date,
+                self.dynamodb_session.Table(self.version_collection_name),
+                "portfolio-track",
+                self.create_string_query(self.query_timeout),
+            )
+            if source_unchanged:
+                self.update_last_version_info(data_changed=False)
+                return
             result_isin, result_instrument, categories = self.get_origin_data()
             data = self.make_dictionary(result_isin, result_instrument, categories)
             self.save_data_into_dynamo('dnb-rfli-portfolio-track-all-isines', data)
@@ -321,8 +338,6 @@ class IntradayFolios:
             all_user_list = list(map(lambda object: self.make_user_dictionary(object,data),user_params))
             self.save_data_into_dynamo('dnb-rfli-portfolio-track-user-isines', all_user_list)
             self.update_last_version_info()
-            fin = time.time()
-            logger.info("Tiempo transcurrido: ", fin - inicio)
         except Exception as IntradayFolios:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -333,5 +348,7 @@ class IntradayFolios:
             send_error_mail()
         
 if __name__ == "__main__":
-    data = IntradayFolios()
-    data.run()
\ No newline at end of file
+    if is_worker_mode():
+        run_intraday_worker(IntradayFolios)
+    else:
+        IntradayFolios().run()
@@ -1,61 +1,28 @@
 import datetime as dt
 from dateutil import tz
-from boto3 import client as bt3_client, resource as bt3_resource
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
-from awsglue.utils import getResolvedOptions
+from sys import exc_info as sys_exc_info
 from email_utils.email_utils import *
-from json import loads as json_loads
 import pymysql.cursors
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_secret, get_aws_resource
+from rfli_utils.partitioning import ISIN_COLLECTIONS, PARTITIONED_COLLECTIONS, is_partitioned_mode
+from rfli_utils.delta_writer import reset_content_hashes
+from rfli_utils.table_reset import delete_isines, wipe_table
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: "+parameter_name)
-    ssm_client = bt3_client('ssm')
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: "+str(response['Parameter']['Value']))
-    return response['Parameter']['Value']
-
-
 def get_seconds_from_ssm(hour_to_parse):
     seconds = (int(hour_to_parse/100)*3600)+(int(hour_to_parse % 100)*60)
     logger.info("Se transformó la hora militar "+str(hour_to_parse)+" a segundos: "+str(seconds))
     return seconds
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        logger.info("Intentando acceder al secreto: "+str(secret_name))
-        secrets_manager_client = bt3_client('secretsmanager')
-        get_secret_value_response = secrets_manager_client.get_secret_value(SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        parameters = json_loads(secret)
-        logger.info("Secreto cargado correctamente: "+str(secret_name))
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto "+secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
 def get_bogota_current_time():
     try:
         logger.info('Configurando la hora Colombia.')
@@ -71,11 +38,6 @@ def get_bogota_current_time():
                      "[" + str(exception_line) + "] " + str(current_error))
 
 
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -108,7 +70,7 @@ class IntradayInitPortfolio:
         self.dynamo_db_collections_intra = [
             "dnb-rfli-portfolio-track-all-isines"
         ]
-        self.dynamodb_session = bt3_resource('dynamodb')
+        self.dynamodb_session = get_aws_resource("dynamodb")
         self.inactive_isines = self.get_yesterday_inactive_isnes()
         self.empty_all_isines = True if get_enviroment_variable('EMPTY_ALL_ISINES')=='YES' else False
 
@@ -117,6 +79,9 @@ class IntradayInitPortfolio:
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
     
     
+    @record_run_manifest("portfolio-track", "init")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             if self.validate_business_day():
@@ -130,6 +95,7 @@ class IntradayInitPortfolio:
                          "[" + str(exception_line) + "] " + str(current_error))
             send_error_mail()
 
+    @measure_stage("extract")
     def get_yesterday_inactive_isnes(self):
         full_valuation_date = get_bogota_current_time()
         yesterday_full_valuation_date = full_valuation_date - dt.timedelta(
@@ -144,15 +110,14 @@ class IntradayInitPortfolio:
                     AND maturity_date <= STR_TO_DATE('{full_valuation_date.date().strftime('%Y-%m-%d')}', '%Y-%m-%d')\
                     AND isin_code != '';"
         try:
-            with pymysql.connect(host=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['host'],
-                                 port=int(get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['port']),
-                                 user=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['username'],
-                                 password=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['password'],
-                                 cursorclass=pymysql.cursors.DictCursor
-                                 ) as connection:
+            connection_credentials = get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))
+            with pymysql.connect(
+                host=connection_credentials['host'],
+                port=int(connection_credentials['port']),
+                user=connection_credentials['username'],
+                password=connection_credentials['password'],
+                cursorclass=PlanCapturingCursor,
+            ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         lista_isines = []
@@ -163,7 +128,7 @@ class IntradayInitPortfolio:
                             isines = cursor_connection.fetchall()
                             lista_isines = [isin['isin_code'] for isin in isines]
                             logger.info(f"Retornando {len(lista_isines)} isines vencidos.")
-                            return lista_isines
+                        return lista_isines
                     except pymysql.err.MySQLError as MySQL_Error:
                         error_code = MySQL_Error.args[0]
                         exception_line = sys_exc_info()[2].tb_lineno
@@ -196,15 +161,14 @@ class IntradayInitPortfolio:
 
     def validate_business_day(self):
         try:
-            with pymysql.connect(host=get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))['host'],
-                                 port=int(get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['port']),
-                                 user=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['username'],
-                                 password=get_secret(get_enviroment_variable(
-                                     'FLASH_ORIGIN_DB'))['password'],
-                                 cursorclass=pymysql.cursors.DictCursor
-                                 ) as connection:
+            connection_credentials = get_secret(get_enviroment_variable('FLASH_ORIGIN_DB'))
+            with pymysql.connect(
+                host=connection_credentials['host'],
+                port=int(connection_credentials['port']),
+                user=connection_credentials['username'],
+                password=connection_credentials['password'],
+                cursorclass=PlanCapturingCursor,
+            ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Consultando si el dia es laboral.")
@@ -248,41 +212,20 @@ class IntradayInitPortfolio:
                          "[" + str(exception_line) + "] " + str(current_error))
             raise
 
+    @measure_stage("load")
     def empty_table_data(self, table_name):
         try:
-            logger.info("Inicializando cliente Dynamo para la eliminación.")
-            dynamodb_client = bt3_client('dynamodb')
-            logger.info("Recolectando metadata de la tabla.")
-            collection_metadata = dynamodb_client.describe_table(TableName=table_name)
-            key_list = collection_metadata['Table']['KeySchema']
-            primary_key = None
-            sort_key = None
-            logger.info("Organizando llaves para la eliminación.")
-            for key in key_list:
-                key_type = key['KeyType']
-                key_name = key['AttributeName']
-                if key_type == 'HASH':
-                    primary_key = key_name
-                elif key_type == 'RANGE':
-                    sort_key = key_name
-            if primary_key is None:
-                logger.error("No se pudo encontrar llave primaria. Limpieza de tabla ",table_name," fallida.")
-                return
-            logger.info("Se inicia el scaneo de items y se crean las solicitudes.")
             table_to_empty = self.dynamodb_session.Table(table_name)
-            all_table_items = []
-            projection_definition = f"{primary_key}{f', {sort_key}'if sort_key!=None else ''}"
-            response = table_to_empty.scan(ProjectionExpression=projection_definition)
-            all_table_items.extend([{k: item[k] for k in item} for item in response['Items']])
-            while 'LastEvaluatedKey' in response:
-                response = table_to_empty.scan(ProjectionExpression=projection_definition, ExclusiveStartKey=response['LastEvaluatedKey'])
-                all_table_items.extend([{k: item[k] for k in item} for item in response['Items']])
-            with table_to_empty.batch_writer() as batch:
-                for key in all_table_items:
-                    if (table_name=='dnb-rfli-portfolio-track-all-isines'
-                        ) and key not in self.inactive_isines and not self.empty_all_isines:
-                        continue
-                    batch.delete_item(Key=key)
+            if table_name in PARTITIONED_COLLECTIONS and is_partitioned_mode():
+                logger.info(f"La tabla {table_name} está particionada por fecha. No se eliminan items: la fecha activa cambia con la primera versión del día y los datos anteriores expiran por TTL.")
+                return
+            if table_name in ISIN_COLLECTIONS and not self.empty_all_isines:
+                logger.info(f"Eliminando {len(self.inactive_isines)} isines vencidos de la tabla {table_name}.")
+                delete_isines(table_to_empty, self.inactive_isines)
+            else:
+                logger.info(f"Eliminando todos los items de la tabla {table_name}.")
+                wipe_table(table_to_empty)
+            reset_content_hashes(table_name, get_bogota_current_time())
         except Exception as insert_in_destination_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -293,6 +236,7 @@ class IntradayInitPortfolio:
             raise
 
 
+    @measure_stage("version")
     def reset_versions(self):
         try:
             for table_to_drop in self.dynamo_db_collections_intra:
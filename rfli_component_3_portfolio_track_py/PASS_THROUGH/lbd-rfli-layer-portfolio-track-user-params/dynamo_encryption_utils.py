@@ -1,11 +1,3 @@
-from dynamodb_encryption_sdk.encrypted import CryptoConfig
-from dynamodb_encryption_sdk.encrypted.item import decrypt_python_item, encrypt_python_item
-from dynamodb_encryption_sdk.identifiers import CryptoAction
-from dynamodb_encryption_sdk.material_providers.aws_kms import AwsKmsCryptographicMaterialsProvider
-from dynamodb_encryption_sdk.structures import AttributeActions, EncryptionContext, TableInfo
-from dynamodb_encryption_sdk.transform import dict_to_ddb
-
-
 import boto3
 import json
 import logging
@@ -14,18 +6,43 @@ from boto3.dynamodb.conditions import Key, Attr
 
 dynamodb                    = boto3.resource("dynamodb")
 
+#dynamodb_encryption_sdk (y con el, cryptography) se importa en la primera encriptacion o
+#desencriptacion y no al cargar el lambda, para no cargarlo en los arranques que no lo usan
+TABLE_INFOS                 = {}
+MATERIALS_PROVIDERS         = {}
+
+
+def get_table_info(table):
+    #Llaves e indices de la tabla, consultados con DescribeTable una vez por contenedor
+    from dynamodb_encryption_sdk.structures import TableInfo
+    if table.name not in TABLE_INFOS:
+        table_info = TableInfo(name=table.name)
+        table_info.refresh_indexed_attributes(table.meta.client)
+        TABLE_INFOS[table.name] = table_info
+    return TABLE_INFOS[table.name]
+
+
+def get_materials_provider(kms_id):
+    #El proveedor guarda sus clientes de KMS, por lo que se reusa entre invocaciones
+    from dynamodb_encryption_sdk.material_providers.aws_kms import AwsKmsCryptographicMaterialsProvider
+    if kms_id not in MATERIALS_PROVIDERS:
+        MATERIALS_PROVIDERS[kms_id] = AwsKmsCryptographicMaterialsProvider(kms_id)
+    return MATERIALS_PROVIDERS[kms_id]
+
+
 def encrypt_portf(user, portfolio, table_name, kms_id):
+    from dynamodb_encryption_sdk.encrypted import CryptoConfig
+    from dynamodb_encryption_sdk.encrypted.item import encrypt_python_item
+    from dynamodb_encryption_sdk.identifiers import CryptoAction
+    from dynamodb_encryption_sdk.structures import AttributeActions, EncryptionContext
     obj = {
         "user_id": user,
         "portfolios": portfolio
     }
     
-    encrypted_attributes = set(obj.keys())
-    
     table = dynamodb.Table(table_name)
-    table_info = TableInfo(name=table_name)
-    table_info.refresh_indexed_attributes(table.meta.client)
-    aws_kms_cmp = AwsKmsCryptographicMaterialsProvider(kms_id)
+    table_info = get_table_info(table)
+    aws_kms_cmp = get_materials_provider(kms_id)
     encryption_context = EncryptionContext(
         table_name=table_name,
         partition_key_name=table_info.primary_index.partition
@@ -50,10 +67,17 @@ def encrypt_portf(user, portfolio, table_name, kms_id):
 def decrypt_item(user, table_name, kms_id):
     table = dynamodb.Table(table_name)
     
-    table_info = TableInfo(name=table_name)
-    table_info.refresh_indexed_attributes(table.meta.client)
+    read_item = table.get_item(Key = {"user_id": user})
+    if 'Item' not in read_item:
+        return {}
+    
+    from dynamodb_encryption_sdk.encrypted import CryptoConfig
+    from dynamodb_encryption_sdk.encrypted.item import decrypt_python_item
+    from dynamodb_encryption_sdk.identifiers import CryptoAction
+    from dynamodb_encryption_sdk.structures import AttributeActions, EncryptionContext
+    table_info = get_table_info(table)
     
-    aws_kms_cmp = AwsKmsCryptographicMaterialsProvider(kms_id)
+    aws_kms_cmp = get_materials_provider(kms_id)
     
     encryption_context = EncryptionContext(
         table_name=table_name,
@@ -69,11 +93,5 @@ def decrypt_item(user, table_name, kms_id):
         materials_provider=aws_kms_cmp, encryption_context=encryption_context, attribute_actions=actions
     )
     
-    read_item = table.get_item(Key = {"user_id": user})
-    if 'Item' in read_item:
-        
-        decrypted_item = decrypt_python_item(read_item["Item"], crypto_config)
-    
-    else: 
-        return {}
-    return decrypted_item
\ No newline at end of file
+    decrypted_item = decrypt_python_item(read_item["Item"], crypto_config)
+    return decrypted_item
@@ -1,21 +1,17 @@
-from dynamodb_encryption_sdk.encrypted import CryptoConfig
-from dynamodb_encryption_sdk.encrypted.item import decrypt_python_item, encrypt_python_item
-from dynamodb_encryption_sdk.identifiers import CryptoAction
-from dynamodb_encryption_sdk.material_providers.aws_kms import AwsKmsCryptographicMaterialsProvider
-from dynamodb_encryption_sdk.structures import AttributeActions, EncryptionContext, TableInfo
-from dynamodb_encryption_sdk.transform import dict_to_ddb
-
-import decimal 
-from decimal import Decimal
 import boto3
 import json
-import logging
 import os
 import base64
 import time
 from datetime import datetime 
 from boto3.dynamodb.conditions import Key, Attr
 from dynamo_encryption_utils import encrypt_portf, decrypt_item
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_event
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import add_freshness, get_version_item
+from rfli_lambda_utils.parameters import get_parameter_value
+from rfli_lambda_utils.partitioning import get_partition_key, remove_partition
 
 def get_user(token):     
     payload = token.split('.')[1]   
@@ -25,14 +21,8 @@ def get_user(token):
     user = payload_decoded['unique_name']
     return user
     
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
         
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
 
 GENERIC_HEADERS             = {'Access-Control-Allow-Headers': '*', 
                                'Access-Control-Allow-Origin' : '*', 
@@ -45,35 +35,36 @@ ISINES_PARAMS_TABLE         = 'dnb-rfli-portfolio-track-params-isines'
 ISINES_PARAMS_HIST_TABLE    = 'dnb-rfli-portfolio-track-params-isines-hist'
 ALL_ISINES_TABLE            = 'dnb-rfli-portfolio-track-all-isines'
 USER_ISINES_TABLE           = 'dnb-rfli-portfolio-track-user-isines'
-DATA_VERSION_TABLE          = 'dnb-rfli-data-version-intra'
+
 
 dynamodb                    = boto3.resource("dynamodb")
-param_store                 = boto3.client("ssm")
 
-def get_items_from_tab(items, table):
+def get_items_from_tab(items, table, version_data):
     
     isines = []
    
     for item in items:
         
         temp_key = {
-            "isin": item
+            "isin": get_partition_key(version_data, item)
         }
         
         temp_item = table.get_item(Key = temp_key)
         
         if('Item' in temp_item):
-            isines.append(temp_item['Item'])
+            isines.append(remove_partition(temp_item['Item']))
             
     return isines
     
  
  
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
      
-    print(type(event['body'])) 
-     
-    #print(event['body']['portfolios']) 
+    logger.info(f'[lambda_handler] event de entrada: {summarize_event(event)}')
     
     port_param_tab   = dynamodb.Table(PORTFOLIO_PARAMS_TABLE)
     port_param_tab_h = dynamodb.Table(PORTFOLIO_PARAMS_HIST_TABLE)
@@ -81,34 +72,23 @@ def lambda_handler(event, context):
     isin_param_tab_h = dynamodb.Table(ISINES_PARAMS_HIST_TABLE)
     isin_all_tab     = dynamodb.Table(ALL_ISINES_TABLE)
     isin_user_tab    = dynamodb.Table(USER_ISINES_TABLE)
-    data_version_tab = dynamodb.Table(DATA_VERSION_TABLE) 
      
     market_rate_env  = os.environ['MARKET_RATE']
     kms_id           = os.environ['KMS_ID']
-    market_rate      = int(param_store.get_parameter(Name=market_rate_env, WithDecryption=True)['Parameter']['Value'])
+    market_rate      = int(get_parameter_value(market_rate_env))
     
     request_body     = json.loads(event['body'])
     portfolios       = request_body["portfolios"]
-    print(request_body)
     
     request_isines   = request_body["isines"]
     
-    response_isines  = get_items_from_tab(request_isines, isin_all_tab)
-    
     intradiapp_user  = get_user(event['headers']['Authorization'])
     
     logger.info(intradiapp_user) 
     
-    logger.info(f"isines solicitados {len(request_isines)}")
-    logger.info(f"isines encontrados {len(response_isines)}")
-    
-    version_response = data_version_tab.get_item(
-        Key = {
-            'component': 'portfolio-track'
-            }
-        )
+    version_data = get_version_item('portfolio-track')
         
-    if 'Item' not in version_response:
+    if version_data is None:
         logger.info('No se encontro version en la tabla')
         
         return {
@@ -119,8 +99,11 @@ def lambda_handler(event, context):
                 'body': {
                     'message': 'No hay data de versión en la tabla'}
             };
-            
-    version_data = version_response['Item']
+    
+    response_isines  = get_items_from_tab(request_isines, isin_all_tab, version_data)
+    
+    logger.info(f"isines solicitados {len(request_isines)}")
+    logger.info(f"isines encontrados {len(response_isines)}")
     
     current_version = version_data['version']
     next_status = version_data['next_status']
@@ -183,8 +166,6 @@ def lambda_handler(event, context):
                 Item = user_isines
                 )
                 
-            print(str(portfolios))     
-            
             portfolio_object = {
                 "portfolios": portfolios,
                 "isines": response_isines
@@ -200,7 +181,7 @@ def lambda_handler(event, context):
                 
             final_response = {
                 'headers': GENERIC_HEADERS, 
-                'body' : json.dumps(final_object, cls=DecimalEncoder)
+                'body' : encode_json(add_freshness(final_object, version_data))
             }    
             
             
@@ -210,11 +191,6 @@ def lambda_handler(event, context):
             
             encrypted_portfolio.update({"update_date": str(datetime.now())})
             
-            print(encrypted_portfolio) 
-            
-            print("hola")
-            #print(decrypt_item(intradiapp_user, PORTFOLIO_PARAMS_TABLE, kms_id))
-            
             logger.info('Encriptando y guardando portafolio histórico')
             
             port_param_tab_h.put_item(Item = encrypted_portfolio)
@@ -260,7 +236,7 @@ def lambda_handler(event, context):
                  
             final_response = {
                 'headers': GENERIC_HEADERS, 
-                'body' : json.dumps(final_object, cls=DecimalEncoder) 
+                'body' : encode_json(add_freshness(final_object, version_data)) 
             } 
             
             encrypted_portfolio = encrypt_portf(intradiapp_user, portfolios, PORTFOLIO_PARAMS_TABLE, kms_id)
@@ -1,21 +1,17 @@
-from dynamodb_encryption_sdk.encrypted import CryptoConfig
-from dynamodb_encryption_sdk.encrypted.item import decrypt_python_item, encrypt_python_item
-from dynamodb_encryption_sdk.identifiers import CryptoAction
-from dynamodb_encryption_sdk.material_providers.aws_kms import AwsKmsCryptographicMaterialsProvider
-from dynamodb_encryption_sdk.structures import AttributeActions, EncryptionContext, TableInfo
-from dynamodb_encryption_sdk.transform import dict_to_ddb
-
-import decimal
 from decimal import Decimal
 import boto3
 import json
-import logging
 import os
 import base64
 import time
 from datetime import datetime 
 from boto3.dynamodb.conditions import Key, Attr
 from dynamo_encryption_utils import encrypt_portf, decrypt_item
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import add_freshness, get_version_item
+from rfli_lambda_utils.parameters import get_parameter_value
 
 GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*', 
                     'Access-Control-Allow-Origin' : '*', 
@@ -30,10 +26,9 @@ ISINES_PARAMS_TABLE         = 'dnb-rfli-portfolio-track-params-isines'
 ISINES_PARAMS_HIST_TABLE    = 'dnb-rfli-portfolio-track-params-isines-hist'
 ALL_ISINES_TABLE            = 'dnb-rfli-portfolio-track-all-isines'
 USER_ISINES_TABLE           = 'dnb-rfli-portfolio-track-user-isines'
-DATA_VERSION_TABLE          = 'dnb-rfli-data-version-intra'
+
 
 dynamodb                    = boto3.resource("dynamodb")
-param_store                 = boto3.client("ssm")
 
 def get_user(token):     
     payload = token.split('.')[1]   
@@ -43,15 +38,12 @@ def get_user(token):
     user = payload_decoded['unique_name']
     return user
     
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
         
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
+
 
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
 
     port_param_tab   = dynamodb.Table(PORTFOLIO_PARAMS_TABLE)
@@ -60,21 +52,16 @@ def lambda_handler(event, context):
     isin_param_tab_h = dynamodb.Table(ISINES_PARAMS_HIST_TABLE)
     isin_all_tab     = dynamodb.Table(ALL_ISINES_TABLE)
     isin_user_tab    = dynamodb.Table(USER_ISINES_TABLE)
-    data_version_tab = dynamodb.Table(DATA_VERSION_TABLE)
   
     intradiapp_user = get_user(event['headers']['Authorization'])
     market_rate_env    = os.environ['MARKET_RATE']
-    market_rate = int(param_store.get_parameter(Name=market_rate_env, WithDecryption=True)['Parameter']['Value'])
+    market_rate = int(get_parameter_value(market_rate_env))
     kms_id           = os.environ['KMS_ID']
     
     
-    version_response = data_version_tab.get_item(
-        Key = {
-            'component': 'portfolio-track'
-            }
-        )
+    version_data = get_version_item('portfolio-track')
 
-    if 'Item' not in version_response:
+    if version_data is None:
         logger.info('No se encontro version en la tabla')
         
         return {
@@ -85,8 +72,6 @@ def lambda_handler(event, context):
                 'body': {
                     'message': 'No hay data de versión en la tabla'}
             };
-            
-    version_data = version_response['Item']
     
     current_version = version_data['version']
     next_status = version_data['next_status']
@@ -110,8 +95,7 @@ def lambda_handler(event, context):
         
     user_portfolio_response = decrypt_item(intradiapp_user, PORTFOLIO_PARAMS_TABLE, kms_id)
      
-    print('user portfolio respons')
-    print(user_portfolio_response) 
+    logger.info(f"Portafolios del usuario: {summarize_payload(user_portfolio_response.get('portfolios', []))}")
         
     if 'Item' not in user_isines_response:
         
@@ -177,7 +161,7 @@ def lambda_handler(event, context):
     
     final_response = {
         'headers': GENERIC_HEADERS, 
-        'body' : json.dumps(final_object, cls=DecimalEncoder)
+        'body' : encode_json(add_freshness(final_object, version_data))
        } 
    
     return final_response
\ No newline at end of file
@@ -7,6 +7,10 @@ from dynamodb_encryption_sdk.transform import dict_to_ddb
 
 import boto3
 import os
+from rfli_lambda_utils.request_logging import log_request
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.partitioning import get_partition_key, remove_partition
+
 
 dynamodb                    = boto3.resource("dynamodb")
 
@@ -75,23 +79,25 @@ def decrypt_item(user, table_name, kms_id):
         return {}
     return decrypted_item
     
-def get_items_from_tab(items, table):
+def get_items_from_tab(items, table, version_data):
     
     isines = []
    
     for item in items:
         
         temp_key = {
-            "isin": item
+            "isin": get_partition_key(version_data, item)
         }
         
         temp_item = table.get_item(Key = temp_key)
         
         if('Item' in temp_item):
-            isines.append(temp_item['Item'])
+            isines.append(remove_partition(temp_item['Item']))
             
     return isines
 
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
   
     kms_id           = os.environ['KMS_ID']
@@ -120,7 +126,12 @@ def lambda_handler(event, context):
     
     ALL_ISINES_TABLE='dnb-rfli-portfolio-track-all-isines'
     isin_all_tab     = dynamodb.Table(ALL_ISINES_TABLE)
-    default_isines_value = get_items_from_tab(default_isines['isines'], isin_all_tab)
+    version_data     = dynamodb.Table('dnb-rfli-data-version-intra').get_item(
+        Key = {
+            'component': 'portfolio-track'
+            }
+        ).get('Item', {})
+    default_isines_value = get_items_from_tab(default_isines['isines'], isin_all_tab, version_data)
     
     
     user_isines = {
@@ -1,85 +1,30 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import *
 from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
 import re
 import os
-import sys
-import traceback
 from decimal import Decimal
-from functools import wraps
+from rfli_utils.config import get_enviroment_variable, get_parameter_store, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging, truncate_text
+from rfli_utils.shadow import run_shadowed
 
-def debugger_wrapper(error_log):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                resultado = func(*args, **kwargs)
-                return resultado
-            except Exception as e:
-                logger.error(f"[{func.__name__}] {error_log}, linea: {get_especific_error_line(func.__name__)}, motivo: {str(e)}")
-                raise Exception(f"{error_log}")
-        return wrapper
-    return decorator
-    
-def get_especific_error_line(func_name):
-    _, _, exc_tb = sys.exc_info()
-    for trace in traceback.extract_tb(exc_tb):
-        if func_name in trace:
-            return str(trace[1])
 
 running_context = 'dev' #'real'
 use_query_time_out = False
 
-def setup_logging():
-    PRECIA_LOG_FORMAT = ("%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s")
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
-
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " + str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -297,9 +242,10 @@ class IntradayTopDeltaCategory:
         self.top_category_intra_collection_name = "dnb-rfli-top-delta-category"
         self.details_category_intra_collection_name = "dnb-rfli-top-delta-category-details"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.final_eod_time = int(get_parameter_store(get_enviroment_variable("FINAL_EOD_TIME")))
-        self.pre_eod_time = int(get_parameter_store(get_enviroment_variable("PRE_EOD_TIME")))
-        self.dynamodb_session = bt3_resource('dynamodb')
+        market_schedule = get_market_schedule(["FINAL_EOD_TIME", "PRE_EOD_TIME"])
+        self.final_eod_time = market_schedule["FINAL_EOD_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
 
 
 
@@ -311,6 +257,9 @@ class IntradayTopDeltaCategory:
             return f" MAX_EXECUTION_TIME({seconds*1000}) "
         return ""
 
+    @record_run_manifest("top-delta-category", "eod")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             bogota_current_datetime = get_bogota_current_time()
@@ -319,7 +268,12 @@ class IntradayTopDeltaCategory:
                 # EXTRACT
             origin_data_top_delta, curve_change_details, category_type, folios = self.get_origin_data()
             # TRANSFORM
-            data_to_insert_top_delta, data_to_insert_details = self.transform_data(origin_data_top_delta, curve_change_details, category_type, folios)
+            data_to_insert_top_delta, data_to_insert_details = run_shadowed(
+                self,
+                self.transform_data,
+                (origin_data_top_delta, curve_change_details, category_type, folios),
+                (self.top_category_intra_collection_name, self.details_category_intra_collection_name),
+            )
             # LOAD
             self.save_data_into_dynamo(self.top_category_intra_collection_name, data_to_insert_top_delta)
             self.save_data_into_dynamo(self.details_category_intra_collection_name, data_to_insert_details)
@@ -335,6 +289,7 @@ class IntradayTopDeltaCategory:
             send_error_mail()
 
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información para el componente 5 - top delta category.")
         top_delta = []
@@ -347,13 +302,13 @@ class IntradayTopDeltaCategory:
                 port=int(connection_db_credentials["port"]),
                 user=connection_db_credentials["username"],
                 password=connection_db_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor) as connection:
+                cursorclass=PlanCapturingCursor) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Iniciando proceso de extracción de información - Consulta en base de datos para componente 5 Top Delta.")
                         
                         logger.info("Consultando el top categorias del día. Por volumne de isines")
-                        logger.warning(f'[get_origin_data] Query para obtener las categorías con mayor volumen de isines:\n{self.get_top_info_isines_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener las categorías con mayor volumen de isines: {truncate_text(self.get_top_info_isines_query)}')
                         cursor_connection.execute(self.get_top_info_isines_query)
                         top_delta_isines = cursor_connection.fetchall()
                         excluded_categories = [str(top_item.get('category_id',0)) for top_item in top_delta_isines]
@@ -361,7 +316,7 @@ class IntradayTopDeltaCategory:
                         
                         logger.info("Consultando el top categorias del día. Por variación")
                         self.get_top_info_query = self.get_top_info_query.format(**{'timeout_string':self.timeout_string, 'today_date':self.full_valuation_date_str, 'yesterday_date':self.yesterday_full_valuation_date_str, 'excluded_category_classes':self.excluded_category_classes, 'excluded_categories': excluded_categories_full_string})
-                        logger.warning(f'[get_origin_data] Query para obtener las categorías con mayor yield en promedio:\n{self.get_top_info_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener las categorías con mayor yield en promedio: {truncate_text(self.get_top_info_query)}')
                         cursor_connection.execute(self.get_top_info_query)
                         top_delta = cursor_connection.fetchall()
                         
@@ -372,7 +327,7 @@ class IntradayTopDeltaCategory:
                         logger.info("Consultando definición de categorias - Historicas y calculadas.")
                         category_id_list_str = ','.join(category_id_list)
                         self.get_categories_details_query = self.get_categories_details_query.format(**{'timeout_string':self.timeout_string, 'today_date':self.full_valuation_date_str, 'included_categories':category_id_list_str})
-                        logger.warning(f'[get_origin_data] Query para obtener definicion de categorias:\n{self.get_categories_details_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener definicion de categorias: {truncate_text(self.get_categories_details_query)}')
                         cursor_connection.execute(self.get_categories_details_query)
                         category_type = cursor_connection.fetchall()
                         
@@ -397,13 +352,13 @@ class IntradayTopDeltaCategory:
                         
                         logger.info("Consultando isines minimos y máximos por categorias.")
                         self.get_min_max_category_isins_query = self.get_min_max_category_isins_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'included_categories': category_id_list_str})
-                        logger.warning(f'[get_origin_data] Query para obtener isines minimos y máximos por categoría:\n{self.get_min_max_category_isins_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener isines minimos y máximos por categoría: {truncate_text(self.get_min_max_category_isins_query)}')
                         cursor_connection.execute(self.get_min_max_category_isins_query)
                         self.min_max_isin_information = cursor_connection.fetchall()
                         
                         logger.info("Consultando isines medios por categorias.")
                         self.get_median_isins_query = self.get_median_isins_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'included_categories': category_id_list_str})
-                        logger.warning(f'[get_origin_data] Query para obtener isines medios por categoría:\n{self.get_median_isins_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener isines medios por categoría: {truncate_text(self.get_median_isins_query)}')
                         cursor_connection.execute(self.get_median_isins_query)
                         self.median_isin_information = cursor_connection.fetchall()
                         
@@ -412,7 +367,7 @@ class IntradayTopDeltaCategory:
                         detailed_isin_list = [f'"{item}"' for item in detailed_isin_list]
                         detailed_isin_str = ','.join(detailed_isin_list)
                         self.yesterday_isines_query = self.yesterday_isines_query.format(**{'timeout_string':self.timeout_string, 'yesterday_date': self.yesterday_full_valuation_date_str, 'detailed_isin_list': detailed_isin_str})
-                        logger.warning(f'[get_origin_data] Query para obtener detalles de los isines en el día anterior:\n{self.yesterday_isines_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener detalles de los isines en el día anterior: {truncate_text(self.yesterday_isines_query)}')
                         cursor_connection.execute(self.yesterday_isines_query)
                         self.yesterday_isin_information = cursor_connection.fetchall()
                         
@@ -421,13 +376,13 @@ class IntradayTopDeltaCategory:
                         instruments_list = [f'"{item}"' for item in instruments_list]
                         instruments_list = ','.join(instruments_list)
                         self.instruments_issuer_query = self.instruments_issuer_query.format(**{'timeout_string':self.timeout_string, 'found_instruments': instruments_list})
-                        logger.warning(f'[get_origin_data] Query para obtener los emisores de los instrumentos encontrados:\n{self.instruments_issuer_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener los emisores de los instrumentos encontrados: {truncate_text(self.instruments_issuer_query)}')
                         cursor_connection.execute(self.instruments_issuer_query)
                         self.instrument_issuer_directory = {row['instrument']:row['name'] for row in cursor_connection.fetchall()}
                         
                         logger.info("Consultando nombres de emisores de instrumentos.")
                         self.category_issin_counter_query = self.category_issin_counter_query.format(**{'timeout_string':self.timeout_string, 'included_categories': category_id_list_str, 'today_date': self.full_valuation_date_str})
-                        logger.warning(f'[get_origin_data] Query para obtener la cantidad de isines por categoría:\n{self.category_issin_counter_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener la cantidad de isines por categoría: {truncate_text(self.category_issin_counter_query)}')
                         cursor_connection.execute(self.category_issin_counter_query)
                         self.category_isines_count_directory = {row['category_id']:row['isin_count'] for row in cursor_connection.fetchall()}
                         
@@ -460,6 +415,7 @@ class IntradayTopDeltaCategory:
             raise
 
 
+    @measure_stage("transform")
     def transform_data(self, origin_data_top_delta, curve_details, category_details, folios_details):
         logger.info("Generando diccionarios para la transformacion.")
         final_data_to_insert_top = []
@@ -540,7 +496,7 @@ class IntradayTopDeltaCategory:
                 return curve
         return None
 
-    @debugger_wrapper('Error organizando detalles de isines para la categoria')
+    @measure_stage("transform", error_log="Error organizando detalles de isines para la categoria")
     def organize_category_isin_details(self, category_id):
         logger.info(f'Organizando la categoria: {category_id}')
         min_max_row = next(row for row in self.min_max_isin_information if row['category_id'] == category_id)
@@ -575,13 +531,12 @@ class IntradayTopDeltaCategory:
                         'variation': min_max_row['min_yield'] - max_isin_yesterday_yield}
         return min_object, median_object, max_object
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                bulk_write_items(table, add_payloads(data))
             else:
                 logger.info("No hay data para insertar en la tabla " + collection_name)
         except Exception as save_data_into_dynamo_exception:
@@ -591,6 +546,7 @@ class IntradayTopDeltaCategory:
             logger.error(current_error.__class__.__name__ + "[" + str(exception_line) + "] " + str(current_error))
     
     
+    @measure_stage("version")
     def update_last_version_info(self):
         try:
             logger.info("Iniciando actualización de versión.")
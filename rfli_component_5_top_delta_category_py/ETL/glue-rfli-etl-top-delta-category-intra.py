@@ -1,85 +1,33 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import ReportEmail
 from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
 import re
-import os
-import sys
-import traceback
 from decimal import Decimal
-from functools import wraps
-
-def debugger_wrapper(error_log):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                resultado = func(*args, **kwargs)
-                return resultado
-            except Exception as e:
-                logger.error(f"[{func.__name__}] {error_log}, linea: {get_especific_error_line(func.__name__)}, motivo: {str(e)}")
-                raise Exception(f"{error_log}")
-        return wrapper
-    return decorator
-    
-def get_especific_error_line(func_name):
-    _, _, exc_tb = sys.exc_info()
-    for trace in traceback.extract_tb(exc_tb):
-        if func_name in trace:
-            return str(trace[1])
+from rfli_utils.config import get_enviroment_variable, get_optional_enviroment_variable, get_parameter_store, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.database import db_connection
+from rfli_utils.worker import is_worker_mode, run_intraday_worker
+from rfli_utils.change_probe import run_change_probe, FINGERPRINT_ATTRIBUTE
+from rfli_utils.freshness import set_freshness
+from rfli_utils.delta_writer import save_changed_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.snapshot import get_market_snapshot, round_half_up
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.structured_logging import setup_logging, summarize_payload, truncate_text
+from rfli_utils.shadow import run_shadowed
+
 
 running_context = 'dev' #'real'
 use_query_time_out = False
 
-def setup_logging():
-    PRECIA_LOG_FORMAT = ("%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s")
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
-
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(SecretId=secret_name)
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -136,54 +84,6 @@ class IntradayTopDeltaCategory:
         self.yesterday_full_valuation_date_str = self.yesterday_full_valuation_date.strftime("%Y-%m-%d")
         self.included_category_classes = get_enviroment_variable("INCLUDED_CATEGORY_CLASSES")
         
-        #Este query trae las 10 categorías con mayor cantidad de isines
-        self.get_top_info_isines_query = f"""
-                SELECT {self.timeout_string} 
-                prices_consult.category_id,
-                prices_consult.tir_variation,
-                prices_consult.abs_tir_variation,
-                CONVERT(category_info.class,DECIMAL(3,0)) AS category_class,
-                category_info.currency_group AS currency_group,
-                category_info.rate_group AS rate_group,
-                category_info.rating_group AS rating_group,
-                category_info.maturity_range AS maturity_range
-                FROM 
-                    (SELECT today_prices.category_id AS category_id, ROUND((today_prices.promedio_valor - yesterday_prices.promedio_valor) * 100, 2) AS tir_variation,
-                    ROUND(ABS(today_prices.promedio_valor - yesterday_prices.promedio_valor) * 100,2) AS abs_tir_variation,today_prices.category_volume AS category_volume
-                    FROM 
-                        (SELECT category_id, AVG(yield) AS promedio_valor, COUNT(isin_code) AS category_volume
-                        FROM precia_published.pub_rfl_prices WHERE valuation_date = '{self.full_valuation_date_str}' GROUP BY category_id) AS today_prices
-                    JOIN 
-                        (SELECT category_id, AVG(yield) AS promedio_valor
-                        FROM precia_published.pub_rfl_prices WHERE valuation_date = '{self.yesterday_full_valuation_date_str}' GROUP BY category_id) AS yesterday_prices 
-                    ON today_prices.category_id = yesterday_prices.category_id ORDER BY category_volume DESC) AS prices_consult
-                RIGHT JOIN precia_sources.src_rfl_category AS category_info ON prices_consult.category_id = category_info.category_id
-                WHERE category_info.class IN({self.included_category_classes}) ORDER BY prices_consult.category_volume DESC LIMIT 10;"""
-                    
-        #este query trae los 20 con mayor movimiento tipo avg(yield)
-        self.get_top_info_query = """
-                SELECT {timeout_string} 
-                prices_consult.category_id,
-                prices_consult.tir_variation,
-                prices_consult.abs_tir_variation,
-                CONVERT(category_info.class,DECIMAL(3,0)) AS category_class,
-                category_info.currency_group AS currency_group,
-                category_info.rate_group AS rate_group,
-                category_info.rating_group AS rating_group,
-                category_info.maturity_range AS maturity_range
-                FROM 
-                    (SELECT today_prices.category_id AS category_id, ROUND((today_prices.promedio_valor - yesterday_prices.promedio_valor)*100, 2) AS tir_variation,
-                    ROUND(ABS((today_prices.promedio_valor - yesterday_prices.promedio_valor)*100), 2) AS abs_tir_variation
-                    FROM 
-                        (SELECT category_id, AVG(yield) AS promedio_valor
-                        FROM precia_published.pub_rfl_prices WHERE valuation_date = '{today_date}' GROUP BY category_id) AS today_prices
-                    JOIN 
-                        (SELECT category_id, AVG(yield) AS promedio_valor
-                        FROM precia_published.pub_rfl_prices WHERE valuation_date = '{yesterday_date}' GROUP BY category_id ) AS yesterday_prices 
-                    ON today_prices.category_id = yesterday_prices.category_id ORDER BY abs_tir_variation DESC) AS prices_consult
-                RIGHT JOIN precia_sources.src_rfl_category AS category_info ON prices_consult.category_id = category_info.category_id
-                WHERE category_info.class IN({included_category_classes}) AND prices_consult.category_id NOT IN ({excluded_categories_str}) ORDER BY abs_tir_variation DESC LIMIT 20;"""
-            
         self.get_categories_details_query = """
                 SELECT {timeout_string}
                 category_id,
@@ -227,83 +127,23 @@ class IntradayTopDeltaCategory:
                 CAST(DATE_SUB(timestamp_operation, INTERVAL 5 HOUR) AS CHAR) AS timestamp_operation
                 FROM precia_process.prc_rfl_operations WHERE category_id IN({included_categories}) AND operation_date = '{today_date}' AND yield != 100 AND num_control = 1;"""
                 
-        self.get_min_max_category_isins_query = """
-                SELECT  min_results.category_id, min_results.cat_min_maturity, min_results.min_isin_code, min_results.min_instrument, min_results.min_yield, cat_max_maturity, max_isin_code, max_instrument, max_yield
-                FROM (
-                	SELECT original_data.category_id, cat_max_maturity, original_data.isin_code AS max_isin_code, original_data.instrument AS max_instrument, original_data.yield AS max_yield
-                	FROM (
-                	 	SELECT category_id, MAX(maturity_days) AS cat_max_maturity	FROM precia_published.pub_rfl_prices
-                		WHERE valuation_date = '{today_date}' AND category_id IN ({included_categories}) GROUP BY category_id ORDER BY category_id) AS max_maturity
-                	JOIN
-                		precia_published.pub_rfl_prices AS original_data
-                	ON max_maturity.category_id = original_data.category_id AND max_maturity.cat_max_maturity = original_data.maturity_days
-                	WHERE valuation_date = '{today_date}' GROUP BY max_maturity.category_id ORDER BY max_maturity.category_id) AS max_results
-                JOIN
-                	(SELECT original_data.category_id, cat_min_maturity, original_data.isin_code AS min_isin_code, original_data.instrument AS min_instrument, original_data.yield AS min_yield
-                	FROM (
-                	 	SELECT category_id, MIN(maturity_days) AS cat_min_maturity	FROM precia_published.pub_rfl_prices
-                		WHERE valuation_date = '{today_date}' AND category_id IN ({included_categories}) GROUP BY category_id ORDER BY category_id) AS min_maturity
-                	JOIN
-                		precia_published.pub_rfl_prices AS original_data
-                	ON min_maturity.category_id = original_data.category_id AND min_maturity.cat_min_maturity = original_data.maturity_days
-                	WHERE valuation_date = '{today_date}' GROUP BY min_maturity.category_id ORDER BY min_maturity.category_id) AS min_results
-                ON max_results.category_id = min_results.category_id""" 
-                
-        self.get_median_isins_query = """
-                SELECT {timeout_string} min_delta_result.category_id, normal_delta_result.isin_code, normal_delta_result.maturity_days, normal_delta_result.median_yield, normal_delta_result.median_instrument FROM 
-                	(SELECT category_med_range.category_id, MIN(ABS(cat_isin_maturity.maturity_days - category_med_range.range_average)) AS min_median_distance FROM 
-                		(SELECT using_categories.category_id, average_range.range_average from
-                			(SELECT id_expiration_range, (start_range + end_range)/2 AS range_average FROM precia_sources.src_rfl_expiration_range) AS	average_range
-                		JOIN
-                			(SELECT category_id, maturity_range FROM precia_sources.src_rfl_category WHERE category_id IN ({included_categories})) AS using_categories
-                		ON using_categories.maturity_range = average_range.id_expiration_range) AS category_med_range
-                	JOIN
-                		(SELECT category_id, isin_code, maturity_days FROM precia_published.pub_rfl_prices 
-                		WHERE valuation_date = '{today_date}' AND category_id IN ({included_categories}) GROUP BY category_id, maturity_days) AS cat_isin_maturity
-                	ON category_med_range.category_id = cat_isin_maturity.category_id GROUP BY category_med_range.category_id) AS min_delta_result
-                JOIN
-                	(SELECT category_med_range.category_id, cat_isin_maturity.isin_code, cat_isin_maturity.maturity_days, cat_isin_maturity.median_yield, ABS(cat_isin_maturity.maturity_days - category_med_range.range_average) AS median_distance, cat_isin_maturity.median_instrument FROM 
-                		(SELECT using_categories.category_id, average_range.range_average from
-                			(SELECT id_expiration_range, (start_range + end_range)/2 AS range_average FROM precia_sources.src_rfl_expiration_range) AS	average_range
-                		JOIN
-                			(SELECT category_id, maturity_range FROM precia_sources.src_rfl_category WHERE category_id IN ({included_categories})) AS using_categories
-                		ON using_categories.maturity_range = average_range.id_expiration_range) AS category_med_range
-                	JOIN
-                		(SELECT category_id, isin_code, maturity_days, yield AS median_yield, instrument AS median_instrument FROM precia_published.pub_rfl_prices 
-                		WHERE valuation_date = '{today_date}' AND category_id IN ({included_categories}) GROUP BY category_id, maturity_days) AS cat_isin_maturity
-                	ON category_med_range.category_id = cat_isin_maturity.category_id) AS normal_delta_result
-                WHERE min_delta_result.category_id = normal_delta_result.category_id AND min_delta_result.min_median_distance = normal_delta_result.median_distance"""
-        
-        self.yesterday_isines_query = """
-                SELECT {timeout_string}
-                category_id, 
-                isin_code,
-                instrument, 
-                maturity_date, 
-                yield AS yesterday_yield 
-                FROM precia_published.pub_rfl_prices WHERE isin_code IN ({detailed_isin_list}) AND valuation_date = '{yesterday_date}'"""
-                
-        self.instruments_issuer_query = """
-                SELECT {timeout_string} issuer_list.instrument, 
-                precia_sources.src_rfl_issuer.name 
-                FROM (SELECT instrument, issuer FROM precia_sources.src_rfl_instrument WHERE instrument IN ({found_instruments}) GROUP BY ISSUER) AS issuer_list
-                JOIN 
-                	precia_sources.src_rfl_issuer
-                ON issuer_list.issuer = precia_sources.src_rfl_issuer.issuer"""
-                
-        self.category_issin_counter_query = """
-                SELECT {timeout_string} category_id, COUNT(isin_code) AS isin_count from precia_published.pub_rfl_prices 
-                WHERE valuation_date = "{today_date}" 
-                AND category_id IN ({included_categories}) GROUP BY category_id """
-                
         self.top_category_intra_collection_name = "dnb-rfli-top-delta-category"
         self.details_category_intra_collection_name = "dnb-rfli-top-delta-category-details"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.market_close_time = int(get_parameter_store(get_enviroment_variable("MARKET_CLOSE_TIME")))
-        self.market_open_time = int(get_parameter_store(get_enviroment_variable("MARKET_OPEN_TIME")))
-        self.pre_eod_time = int(get_parameter_store(get_enviroment_variable("PRE_EOD_TIME")))
-        self.intra_rate_time = int(get_parameter_store(get_enviroment_variable("INTRA_RATE_TIME")))
-        self.dynamodb_session = bt3_resource("dynamodb")
+        market_schedule = get_market_schedule()
+        self.market_close_time = market_schedule["MARKET_CLOSE_TIME"]
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
+        self.probe_sources = (
+            "pub_rfl_prices",
+            "pub_rfl_yield",
+            "prc_rfl_category_margin",
+            "prc_rfl_operations",
+        )
+        self.source_fingerprint = None
+        self.snapshot_location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
 
 
     def timeout_string_query(self, seconds):
@@ -312,13 +152,32 @@ class IntradayTopDeltaCategory:
         return ""
 
 
+    @record_run_manifest("top-delta-category", "intra")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
+            source_unchanged, self.source_fingerprint = run_change_probe(
+                get_enviroment_variable("DB_SECRET"),
+                self.probe_sources,
+                self.full_valuation_date,
+                self.dynamodb_session.Table(self.version_collection_name),
+                "top-delta-category",
+                f"/*+{self.timeout_string}*/" if self.timeout_string else "",
+            )
+            if source_unchanged:
+                self.update_last_version_info(data_changed=False)
+                return
             # EXTRACT
             origin_data_top_delta, pbs_change_info, category_type, folios = self.get_origin_data()
             
             # TRANSFORM
-            data_to_insert_top_delta, data_to_insert_details = self.transform_data(origin_data_top_delta, pbs_change_info, category_type, folios)
+            data_to_insert_top_delta, data_to_insert_details = run_shadowed(
+                self,
+                self.transform_data,
+                (origin_data_top_delta, pbs_change_info, category_type, folios),
+                (self.top_category_intra_collection_name, self.details_category_intra_collection_name),
+            )
             
             # LOAD
             logger.info(f"Insertando datos de categorias. {'Sin embargo, No hay información de categorias para este momento. Insercion vacia.' if not data_to_insert_top_delta else ''}")
@@ -334,6 +193,7 @@ class IntradayTopDeltaCategory:
             logger.error(current_error.__class__.__name__ + "[" + str(exception_line) + "] " + str(current_error))
             send_error_mail()
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando extracción de información para el componente 5 - top delta category.")
         top_delta = []
@@ -341,30 +201,39 @@ class IntradayTopDeltaCategory:
         category_type = []
         folios = []
         try:
-            connection_db_credentials = get_secret(get_enviroment_variable("DB_SECRET"))
-
-            with pymysql.connect(
-                host=connection_db_credentials["host"],
-                port=int(connection_db_credentials["port"]),
-                user=connection_db_credentials["username"],
-                password=connection_db_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,) as connection:
+            with db_connection(get_enviroment_variable("DB_SECRET")) as connection:
                     
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Iniciando proceso de extracción de información - Consulta en base de datos para componente 5 Top Delta.")
+                        market_snapshot = get_market_snapshot(
+                            cursor_connection,
+                            self.full_valuation_date,
+                            self.snapshot_location,
+                            self.intra_rate_time // 2,
+                            f"/*+{self.timeout_string}*/" if self.timeout_string else "",
+                            self.source_fingerprint,
+                        )
+                        category_variations = self.get_category_variations(market_snapshot)
                         logger.info("Consultando el top categorias del día. Por volumne de isines")
-                        logger.warning(f'[get_origin_data] Query para obtener las categorías con mayor volumen de isines:\n{self.get_top_info_isines_query}')
-                        cursor_connection.execute(self.get_top_info_isines_query)
-                        top_delta_isines = cursor_connection.fetchall()
+                        top_delta_isines = sorted(
+                            category_variations,
+                            key=lambda item: (item["category_volume"] is not None, item["category_volume"] or 0),
+                            reverse=True,
+                        )[:10]
                         excluded_categories = [str(top_item.get('category_id',0)) for top_item in top_delta_isines]
-                        excluded_categories_full_string = ",".join(excluded_categories)
-                        
+
                         logger.info("Consultando el top categorias del día. Por variación")
-                        self.get_top_info_query = self.get_top_info_query.format(**{'timeout_string':self.timeout_string, 'today_date':self.full_valuation_date_str, 'yesterday_date':self.yesterday_full_valuation_date_str, 'excluded_categories_str':excluded_categories_full_string, 'included_category_classes': self.included_category_classes})
-                        logger.warning(f'[get_origin_data] Query para obtener las categorías con mayor ratio de cambio excluyendo las adquiridas en el query de isines:\n{self.get_top_info_query}')
-                        cursor_connection.execute(self.get_top_info_query)
-                        top_delta = cursor_connection.fetchall()
+                        top_delta = sorted(
+                            [
+                                item for item in category_variations
+                                if item["category_id"] is not None and str(item["category_id"]) not in excluded_categories
+                            ],
+                            key=lambda item: item["abs_tir_variation"] if item["abs_tir_variation"] is not None else Decimal(-1),
+                            reverse=True,
+                        )[:20]
+                        for top_item in top_delta_isines + top_delta:
+                            del top_item["category_volume"]
 
                         top_delta_isines.extend(top_delta)
                         
@@ -375,7 +244,7 @@ class IntradayTopDeltaCategory:
                         logger.info("Consultando definición de categorias - Historicas y calculadas.")
                         included_categories = ",".join(str(category_id) for category_id in category_id_list)
                         self.get_categories_details_query = self.get_categories_details_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'included_categories': included_categories})
-                        logger.warning(f'[get_origin_data] Query para obtener las categorías con mayor ratio de cambio excluyendo las adquiridas en el query de isines:\n{self.get_top_info_isines_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener la definición de las categorías: {truncate_text(self.get_categories_details_query)}')
                         cursor_connection.execute(self.get_categories_details_query)
                         category_type = cursor_connection.fetchall()
 
@@ -389,7 +258,7 @@ class IntradayTopDeltaCategory:
                             if k != last_key:
                                 cursor_connection.execute(self.get_curves_change_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'yesterday_date': self.yesterday_full_valuation_date_str, 'value': str(v)}))
                             else:
-                                logger.warning(f'[creo que este query se está ejecutando varias veces: {self.get_curves_change_max_query}]')
+                                logger.debug(f'[get_origin_data] Query para obtener el cambio maximo de las curvas: {truncate_text(self.get_curves_change_max_query)}')
                                 cursor_connection.execute(self.get_curves_change_max_query)
                             current_curve_result = cursor_connection.fetchall()
                             if len(current_curve_result) > 0:
@@ -399,50 +268,47 @@ class IntradayTopDeltaCategory:
                         logger.info("Consultando folios del día por categorias.")
                         included_categories = ",".join(str(category_id) for category_id in category_id_list)
                         self.get_folios_query = self.get_folios_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'included_categories': included_categories})
-                        logger.warning(f'[get_origin_data] Query para obtener los folios de las categorías:\n{self.get_folios_query}')
+                        logger.debug(f'[get_origin_data] Query para obtener los folios de las categorías: {truncate_text(self.get_folios_query)}')
                         cursor_connection.execute(self.get_folios_query)
                         folios = cursor_connection.fetchall()
                         
+                        detailed_category_ids = set(
+                            int(category_id) for category_id in category_id_list if category_id not in (None, "None")
+                        )
                         logger.info("Consultando isines minimos y máximos por categorias.")
-                        included_categories = ",".join(str(category_id) for category_id in category_id_list)
-                        self.get_min_max_category_isins_query = self.get_min_max_category_isins_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'included_categories': included_categories})
-                        logger.warning(f'[get_origin_data] Query para obtener isines minimos y máximos por categoría:\n{self.get_min_max_category_isins_query}')
-                        cursor_connection.execute(self.get_min_max_category_isins_query)
-                        self.min_max_isin_information = cursor_connection.fetchall()
-                        
+                        self.min_max_isin_information = self.get_min_max_category_isins(market_snapshot, detailed_category_ids)
+
                         logger.info("Consultando isines medios por categorias.")
-                        included_categories = ",".join(str(category_id) for category_id in category_id_list)
-                        self.get_median_isins_query = self.get_median_isins_query.format(**{'timeout_string':self.timeout_string, 'today_date': self.full_valuation_date_str, 'included_categories': included_categories})
-                        logger.warning(f'[get_origin_data] Query para obtener isines medios por categoría:\n{self.get_median_isins_query}')
-                        cursor_connection.execute(self.get_median_isins_query)
-                        self.median_isin_information = cursor_connection.fetchall()
-                        
+                        self.median_isin_information = self.get_median_category_isins(market_snapshot, detailed_category_ids)
+
                         logger.info("Consultando detalles de isines para el día anterior.")
                         detailed_isin_list = set([row["min_isin_code"] for row in self.min_max_isin_information] + [row["max_isin_code"] for row in self.min_max_isin_information] + [row["isin_code"] for row in self.median_isin_information])
-                        detailed_isin_list = [f'"{item}"' for item in detailed_isin_list]
-                        detailed_isin_str = ','.join(detailed_isin_list)
-                        self.yesterday_isines_query = self.yesterday_isines_query.format(**{'timeout_string':self.timeout_string, 'yesterday_date': self.yesterday_full_valuation_date_str, 'detailed_isin_list': detailed_isin_str})
-                        logger.warning(f'[get_origin_data] Query para obtener detalles de los isines en el día anterior:\n{self.yesterday_isines_query}')
-                        cursor_connection.execute(self.yesterday_isines_query)
-                        self.yesterday_isin_information = cursor_connection.fetchall()
-                        
+                        self.yesterday_isin_information = [
+                            {
+                                "category_id": yesterday_price["category_id"],
+                                "isin_code": yesterday_price["isin_code"],
+                                "instrument": yesterday_price["instrument"],
+                                "maturity_date": yesterday_price["maturity_date"],
+                                "yesterday_yield": yesterday_price["yield"],
+                            }
+                            for yesterday_price in market_snapshot.prices_yesterday
+                            if yesterday_price["isin_code"] in detailed_isin_list
+                        ]
+
                         logger.info("Consultando nombres de emisores de instrumentos.")
                         instruments_list = set([row["min_instrument"] for row in self.min_max_isin_information] + [row["max_instrument"] for row in self.min_max_isin_information] + [row["median_instrument"] for row in self.median_isin_information])
-                        instruments_list = [f'"{item}"' for item in instruments_list]
-                        instruments_list = ','.join(instruments_list)
-                        self.instruments_issuer_query = self.instruments_issuer_query.format(**{'timeout_string':self.timeout_string, 'found_instruments': instruments_list})
-                        logger.warning(f'[get_origin_data] Query para obtener los emisores de los instrumentos encontrados:\n{self.instruments_issuer_query}')
-                        cursor_connection.execute(self.instruments_issuer_query)
-                        self.instrument_issuer_directory = {row['instrument']:row['name'] for row in cursor_connection.fetchall()}
-                        
-                        logger.info("Consultando nombres de emisores de instrumentos.")
-                        self.category_issin_counter_query = self.category_issin_counter_query.format(**{'timeout_string':self.timeout_string, 'included_categories': included_categories, 'today_date': self.full_valuation_date_str})
-                        logger.warning(f'[get_origin_data] Query para obtener la cantidad de isines por categoría:\n{self.category_issin_counter_query}')
-                        cursor_connection.execute(self.category_issin_counter_query)
-                        self.category_isines_count_directory = {row['category_id']:row['isin_count'] for row in cursor_connection.fetchall()}
-                        
-                        
-                        
+                        issuer_names = market_snapshot.get_issuer_names()
+                        self.instrument_issuer_directory = {
+                            instrument["instrument"]: issuer_names[instrument["issuer"]]
+                            for instrument in market_snapshot.instruments
+                            if instrument["instrument"] in instruments_list and instrument["issuer"] in issuer_names
+                        }
+
+                        logger.info("Consultando la cantidad de isines por categorias.")
+                        self.category_isines_count_directory = {}
+                        for today_price in market_snapshot.prices_today:
+                            if today_price["category_id"] in detailed_category_ids and today_price["isin_code"] is not None:
+                                self.category_isines_count_directory[today_price["category_id"]] = self.category_isines_count_directory.get(today_price["category_id"], 0) + 1
 
                         return top_delta_isines, curve_change_final, category_type, folios
                         
@@ -469,6 +335,117 @@ class IntradayTopDeltaCategory:
             logger.error(current_error.__class__.__name__ + "[" + str(exception_line) + "] " + str(current_error))
             raise
 
+    @measure_stage("transform")
+    def get_category_variations(self, market_snapshot):
+        """Calcula por categoria la variacion del promedio de la tasa entre hoy y ayer, solo para las
+        clases incluidas. Las categorias sin precios en ambos dias quedan con valores nulos
+        """
+        included_classes = set(
+            int(Decimal(category_class.strip().strip("'\"")))
+            for category_class in self.included_category_classes.split(",")
+        )
+        daily_yields = {}
+        for day, prices in (("today", market_snapshot.prices_today), ("yesterday", market_snapshot.prices_yesterday)):
+            daily_yields[day] = {}
+            for price in prices:
+                category_yields = daily_yields[day].setdefault(price["category_id"], {"yields": [], "volume": 0})
+                if price["yield"] is not None:
+                    category_yields["yields"].append(price["yield"])
+                if price["isin_code"] is not None:
+                    category_yields["volume"] += 1
+        category_variations = []
+        for category in market_snapshot.categories:
+            if category["category_class"] is None or int(category["category_class"]) not in included_classes:
+                continue
+            today_yields = daily_yields["today"].get(category["category_id"])
+            yesterday_yields = daily_yields["yesterday"].get(category["category_id"])
+            category_variation = {
+                "category_id": None,
+                "tir_variation": None,
+                "abs_tir_variation": None,
+                "category_class": category["category_class"],
+                "currency_group": category["currency_group"],
+                "rate_group": category["rate_group"],
+                "rating_group": category["rating_group"],
+                "maturity_range": category["maturity_range"],
+                "category_volume": None,
+            }
+            if today_yields and yesterday_yields and today_yields["yields"] and yesterday_yields["yields"]:
+                yield_difference = (
+                    sum(today_yields["yields"]) / len(today_yields["yields"])
+                    - sum(yesterday_yields["yields"]) / len(yesterday_yields["yields"])
+                ) * 100
+                category_variation["category_id"] = category["category_id"]
+                category_variation["tir_variation"] = round_half_up(yield_difference, 2)
+                category_variation["abs_tir_variation"] = round_half_up(abs(yield_difference), 2)
+                category_variation["category_volume"] = today_yields["volume"]
+            category_variations.append(category_variation)
+        return category_variations
+
+    @measure_stage("transform")
+    def get_min_max_category_isins(self, market_snapshot, category_ids):
+        min_isines = {}
+        max_isines = {}
+        for today_price in market_snapshot.prices_today:
+            current_category = today_price["category_id"]
+            if current_category not in category_ids or today_price["maturity_days"] is None:
+                continue
+            if current_category not in min_isines or today_price["maturity_days"] < min_isines[current_category]["maturity_days"]:
+                min_isines[current_category] = today_price
+            if current_category not in max_isines or today_price["maturity_days"] > max_isines[current_category]["maturity_days"]:
+                max_isines[current_category] = today_price
+        return [
+            {
+                "category_id": category_id,
+                "cat_min_maturity": min_isines[category_id]["maturity_days"],
+                "min_isin_code": min_isines[category_id]["isin_code"],
+                "min_instrument": min_isines[category_id]["instrument"],
+                "min_yield": min_isines[category_id]["yield"],
+                "cat_max_maturity": max_isines[category_id]["maturity_days"],
+                "max_isin_code": max_isines[category_id]["isin_code"],
+                "max_instrument": max_isines[category_id]["instrument"],
+                "max_yield": max_isines[category_id]["yield"],
+            }
+            for category_id in sorted(min_isines)
+        ]
+
+    @measure_stage("transform")
+    def get_median_category_isins(self, market_snapshot, category_ids):
+        range_averages = {
+            expiration_range["id_expiration_range"]: (
+                Decimal(expiration_range["start_range"]) + Decimal(expiration_range["end_range"])
+            ) / 2
+            for expiration_range in market_snapshot.expiration_ranges
+        }
+        category_averages = {
+            category["category_id"]: range_averages[category["maturity_range"]]
+            for category in market_snapshot.categories
+            if category["category_id"] in category_ids and category["maturity_range"] in range_averages
+        }
+        category_maturities = {}
+        for today_price in market_snapshot.prices_today:
+            if today_price["category_id"] in category_averages and today_price["maturity_days"] is not None:
+                category_maturities.setdefault(today_price["category_id"], {}).setdefault(
+                    today_price["maturity_days"], today_price
+                )
+        median_isines = []
+        for category_id, maturities in category_maturities.items():
+            range_average = category_averages[category_id]
+            min_median_distance = min(abs(maturity_days - range_average) for maturity_days in maturities)
+            for maturity_days, today_price in maturities.items():
+                if abs(maturity_days - range_average) == min_median_distance:
+                    median_isines.append(
+                        {
+                            "category_id": category_id,
+                            "isin_code": today_price["isin_code"],
+                            "maturity_days": maturity_days,
+                            "median_yield": today_price["yield"],
+                            "median_instrument": today_price["instrument"],
+                        }
+                    )
+        return median_isines
+
+    @measure_stage("transform")
     def transform_data(self, origin_data_top_delta, curve_details, category_details, folios_details):
         logger.info("Generando diccionarios para la transformacion.")
         final_data_to_insert_top = []
@@ -539,7 +516,7 @@ class IntradayTopDeltaCategory:
                 index += 1
             
             final_data_to_insert_top.append({"top_category": 1, "data": data_top_to_insert})
-            logger.warning(f'Este es el final_data_to_insert_top:\n{final_data_to_insert_top}')
+            logger.info(f'Datos del top de categorias: {summarize_payload(final_data_to_insert_top)}')
             
         except Exception as transform_data_exception:
             exception_line = sys_exc_info()[2].tb_lineno
@@ -556,11 +533,11 @@ class IntradayTopDeltaCategory:
         for curve in curve_relation_regex.keys():
             curve_regex_result = re.fullmatch(curve_relation_regex[curve], category_definition_tuple)
             if curve_regex_result:
-                logger.warning(f'[find_curve_reference] Se encontró que la tupla coincide con la curva {curve} y el regex {curve_relation_regex[curve]}')
+                logger.debug(f'[find_curve_reference] Se encontró que la tupla coincide con la curva {curve} y el regex {curve_relation_regex[curve]}')
                 return curve
         return None
     
-    @debugger_wrapper('Error organizando detalles de isines para la categoria')
+    @measure_stage("transform", error_log="Error organizando detalles de isines para la categoria")
     def organize_category_isin_details(self, category_id):
         logger.info(f'Organizando la categoria: {category_id}')
         min_max_row = next(row for row in self.min_max_isin_information if row['category_id'] == category_id)
@@ -595,13 +572,14 @@ class IntradayTopDeltaCategory:
                         'variation': min_max_row['min_yield'] - max_isin_yesterday_yield}
         return min_object, median_object, max_object
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                save_changed_items(
+                    table, add_payloads(data), self.snapshot_location, self.full_valuation_date
+                )
             else:
                 logger.info("No hay data para insertar en la tabla " + collection_name)
                 
@@ -610,6 +588,7 @@ class IntradayTopDeltaCategory:
             logger.error("Error insertando datos en dynamoDB para la tabla " + collection_name + ".")
             current_error = save_data_into_dynamo_exception
             logger.error( current_error.__class__.__name__ + "[" + str(exception_line) + "] " + str(current_error))
+            raise
 
 
     def calculate_last_execution(self):
@@ -623,7 +602,8 @@ class IntradayTopDeltaCategory:
         return last_exe_final_hour
     
     
-    def update_last_version_info(self):
+    @measure_stage("version")
+    def update_last_version_info(self, data_changed=True):
         logger.info("Iniciando actualización de versión.")
         table = self.dynamodb_session.Table(self.version_collection_name)
         response = table.get_item(Key={"component": "top-delta-category"})
@@ -633,7 +613,15 @@ class IntradayTopDeltaCategory:
         if "Item" in response:
             item = response["Item"]
             logger.info("Se carga la siguiente data de versión: " + str(item))
-            item["version"] = int(item["version"]) + 1
+            if data_changed:
+                item["version"] = int(item["version"]) + 1
+                set_freshness(item, self.source_fingerprint)
+                if self.source_fingerprint is not None:
+                    item[FINGERPRINT_ATTRIBUTE] = self.source_fingerprint
+                else:
+                    item.pop(FINGERPRINT_ATTRIBUTE, None)
+            else:
+                logger.info("El origen no cambió. Se conserva la versión actual.")
             if self.full_valuation_date.timestamp() >= (current_day.timestamp() + get_seconds_from_ssm(self.calculate_last_execution())):
                 logger.info("Pasando a estado: Preliminar Fin de dia (pre_eod)")
                 item["next_update"] = int(current_day.timestamp()) + get_seconds_from_ssm(self.pre_eod_time)
@@ -652,4 +640,7 @@ class IntradayTopDeltaCategory:
 
 
 if __name__ == "__main__":
-    IntradayTopDeltaCategory().run()
+    if is_worker_mode():
+        run_intraday_worker(IntradayTopDeltaCategory)
+    else:
+        IntradayTopDeltaCategory().run()
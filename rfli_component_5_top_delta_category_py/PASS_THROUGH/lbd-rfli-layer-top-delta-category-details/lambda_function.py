@@ -1,46 +1,33 @@
-import json
 import boto3
-import os
-import logging 
-import decimal
 import datetime
-import time
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_event, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.versions import add_freshness, get_time_to_wait, get_version_item
+from rfli_lambda_utils.responses import add_etag, build_response, get_conditional_response, get_memoized_payload, get_version_tag
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
 
 TOP_CATEGORY_DETAILS_TABLE = "dnb-rfli-top-delta-category-details"
 
 
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb = boto3.resource("dynamodb")
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
-    logger.info(f'Event de entrada {event}')
+    logger.info(f'Event de entrada {summarize_event(event)}')
 
-    dynamodb = boto3.resource("dynamodb")
     table = dynamodb.Table(TOP_CATEGORY_DETAILS_TABLE)
     ranking_index = int(event["queryStringParameters"].get("ranking_index",0))
     
     logger.info(f'[lambda_handler] Se busca información para el category_id:\n{ranking_index}')
-    version_table     = dynamodb.Table('dnb-rfli-data-version-intra')
-    
-    
-    response = table.get_item(Key = {'ranking_index': ranking_index})
-        
-    if 'Item' not in response:
-        return {'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
-                'statusCode': 400,
-                'body': f'No se encontró detalle para la categoria en la posición de ranking {ranking_index}.'}
     
-    data = response['Item']
     
-    
-    version_response  = version_table.get_item(Key = {'component': 'top-delta-category'})
-    if 'Item' not in version_response:
+    version_data = get_version_item('top-delta-category')
+    if version_data is None:
         logger.info('No se encontro version en la tabla')
         return {
                 'headers':{ 'Access-Control-Allow-Headers': '*',
@@ -50,26 +37,39 @@ def lambda_handler(event, context):
                 'body': {
                     'message': 'No hay data de versión en la tabla'}
             }
-    version_data = version_response['Item']
     current_version = version_data['version']
+    next_status = version_data.get('next_status')
+    time_to_wait = get_time_to_wait(version_data)
+    
+    logger.info(f"\ncurrent_version: {current_version}\nnext_update: {time_to_wait}\nnext_status: {next_status}")
+    
+    conditional_response = get_conditional_response(event, {'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
+                                                    version_data, time_to_wait, next_status)
+    if conditional_response is not None:
+        return conditional_response
+    
+    def read_item():
+        response = table.get_item(Key = {'ranking_index': ranking_index})
+        return response.get('Item')
     
-    logger.info(f"\ncurrent_version: {current_version}\n")
+    payload = get_memoized_payload(('top-delta-category-details', get_version_tag(version_data), ranking_index), read_item)
+        
+    if payload is None:
+        return {'headers':{'Access-Control-Allow-Headers': '*', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': '*'},
+                'statusCode': 400,
+                'body': f'No se encontró detalle para la categoria en la posición de ranking {ranking_index}.'}
     
     final_object = {
                     'version': current_version,
-                    'next_update': None,
-                    'next_status': None,
-                    'data': data['data']}
+                    'next_update': time_to_wait,
+                    'next_status': next_status}
     
-    final_response = {
-        'headers':{ 
+    final_response = build_response(event, add_etag({ 
                 'Access-Control-Allow-Headers': '*', 
                 'Access-Control-Allow-Origin' : '*', 
-                'Access-Control-Allow-Methods': '*'  }, 
-                
-        'body' : json.dumps(final_object, cls=DecimalEncoder)
-       }
+                'Access-Control-Allow-Methods': '*'  }, version_data), 
+                add_freshness(final_object, version_data), payload)
      
-    logger.info(f'Respuesta de lambda {final_response}')
+    logger.info(f'Respuesta de lambda {summarize_payload(final_response["body"])}')
        
     return final_response
\ No newline at end of file
@@ -1,60 +1,22 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from email_utils.email_utils import ReportEmail
 from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_parameter_store, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " + str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -191,17 +153,19 @@ class EodSlider:
                 ) AS yesterday_prices ON today_prices.isin_code = yesterday_prices.isin_code;"
         self.slider_collection_name = "dnb-rfli-slider"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.final_eod_time = int(get_parameter_store(get_enviroment_variable("FINAL_EOD_TIME")))
-        self.pre_eod_time = int(
-            get_parameter_store(get_enviroment_variable("PRE_EOD_TIME"))
-        )
-        self.dynamodb_session = bt3_resource('dynamodb')
+        market_schedule = get_market_schedule(["FINAL_EOD_TIME", "PRE_EOD_TIME"])
+        self.final_eod_time = market_schedule["FINAL_EOD_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
 
 
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
 
 
+    @record_run_manifest("slider", "eod")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             bogota_current_datetime = get_bogota_current_time()
@@ -236,6 +200,7 @@ class EodSlider:
             )
             send_error_mail()
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info(
             "Iniciando carga de información para el componente 6 - slider."
@@ -250,7 +215,7 @@ class EodSlider:
                 port=int(connection_db_credentials["port"]),
                 user=connection_db_credentials["username"],
                 password=connection_db_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,
+                cursorclass=PlanCapturingCursor,
             ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
@@ -316,6 +281,7 @@ class EodSlider:
             raise
 
 
+    @measure_stage("transform")
     def transform_data(self, origin_data_slider):
         final_data_to_insert_slider = []
         categories_definition = self.slider_params.get('CORPORATIVE_BANKING_CATEGORIES')
@@ -349,12 +315,12 @@ class EodSlider:
         return slider_data_to_insert
 
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    batch.put_item(Item=data)
+                bulk_write_items(table, add_payloads([data]))
             else:
                 logger.info(
                     "No hay data para insertar en la tabla " + collection_name)
@@ -375,6 +341,7 @@ class EodSlider:
             )
     
     
+    @measure_stage("version")
     def update_last_version_info(self):
         try:
             logger.info("Iniciando actualización de versión.")
@@ -1,62 +1,27 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
+from decimal import Decimal
 from email_utils.email_utils import ReportEmail
 from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_optional_enviroment_variable, get_parameter_store, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.database import db_connection
+from rfli_utils.worker import is_worker_mode, run_intraday_worker
+from rfli_utils.change_probe import run_change_probe, FINGERPRINT_ATTRIBUTE
+from rfli_utils.freshness import set_freshness
+from rfli_utils.delta_writer import save_changed_items
+from rfli_utils.payload import add_payloads
+from rfli_utils.snapshot import get_market_snapshot, index_by_isin
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -137,82 +102,53 @@ class IntradaySlider:
         self.utc_time = self.full_valuation_date + dt.timedelta(
             hours=5
         )
-        self.slider_information_tes_query = f"SELECT {self.create_string_query(self.query_timeout)} top_instrument_table.instrument AS instrument,\
-                prices.isin_code AS isin_code,\
-                prices.yield AS yield,\
-                prices.pbs_change AS pbs_change,\
-                0 AS category_id\
-            FROM (\
-                    SELECT instrument,\
-                        SUM(volume) AS volume\
-                    FROM precia_process.prc_rfl_operations\
-                    WHERE operation_date >= '{self.one_month_ago_valuation_date.strftime('%Y-%m-%d')}'\
-                        AND operation_date <= '{self.full_valuation_date.strftime('%Y-%m-%d')}'\
-                        AND (\
-                            instrument LIKE 'TUVT%'\
-                            OR instrument LIKE 'TFIT%'\
-                        )\
-                    GROUP BY instrument\
-                    ORDER BY volume DESC\
-                    LIMIT 6\
-                ) AS top_instrument_table\
-                LEFT JOIN (\
-                    SELECT prices_today.instrument,\
-                        prices_today.yield,\
-                        COALESCE((prices_today.yield - prices_yesterday.yield),0)*100 AS pbs_change,\
-                        prices_today.isin_code,\
-                        prices_today.maturity_days\
-                    FROM precia_published.pub_rfl_prices AS prices_today\
-                        LEFT JOIN precia_published.pub_rfl_prices AS prices_yesterday ON prices_yesterday.isin_code = prices_today.isin_code\
-                    WHERE prices_today.valuation_date = '{self.full_valuation_date.strftime('%Y-%m-%d')}'\
-                        AND prices_yesterday.valuation_date = '{self.yesterday_full_valuation_date.strftime('%Y-%m-%d')}'\
-                ) AS prices ON top_instrument_table.instrument = prices.instrument\
-                ORDER BY prices.maturity_days ASC;"
-        self.slider_information_corporative_query =f"SELECT {self.create_string_query(self.query_timeout)} today_prices.instrument,\
-                today_prices.isin_code,\
-                today_prices.yield,\
-                COALESCE((today_prices.yield - yesterday_prices.yield),0)*100 AS pbs_change,\
-                today_prices.category_id\
-            FROM (\
-                    SELECT category_id,\
-                        instrument,\
-                        isin_code,\
-                        maturity_days,\
-                        yield\
-                    FROM precia_published.pub_rfl_prices\
-                    WHERE valuation_date = '{self.full_valuation_date.strftime('%Y-%m-%d')}'\
-                        AND category_id = %s\
-                    ORDER BY maturity_days DESC\
-                    LIMIT 1\
-                ) AS today_prices\
-                LEFT JOIN (\
-                    SELECT isin_code,\
-                        yield\
-                    FROM precia_published.pub_rfl_prices\
-                    WHERE valuation_date = '{self.yesterday_full_valuation_date.strftime('%Y-%m-%d')}'\
-                ) AS yesterday_prices ON today_prices.isin_code = yesterday_prices.isin_code;"
+        self.top_tes_instruments_query = f"SELECT {self.create_string_query(self.query_timeout)} instrument,\
+                SUM(volume) AS volume\
+            FROM precia_process.prc_rfl_operations\
+            WHERE operation_date >= '{self.one_month_ago_valuation_date.strftime('%Y-%m-%d')}'\
+                AND operation_date <= '{self.full_valuation_date.strftime('%Y-%m-%d')}'\
+                AND (\
+                    instrument LIKE 'TUVT%'\
+                    OR instrument LIKE 'TFIT%'\
+                )\
+            GROUP BY instrument\
+            ORDER BY volume DESC\
+            LIMIT 6;"
         self.slider_collection_name = "dnb-rfli-slider"
         self.version_collection_name = "dnb-rfli-data-version-intra"
-        self.market_close_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_CLOSE_TIME"))
-        )
-        self.market_open_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_OPEN_TIME"))
-        )
-        self.pre_eod_time = int(
-            get_parameter_store(get_enviroment_variable("PRE_EOD_TIME"))
+        market_schedule = get_market_schedule()
+        self.market_close_time = market_schedule["MARKET_CLOSE_TIME"]
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
+        self.dynamodb_session = get_aws_resource("dynamodb")
+        self.probe_sources = (
+            "pub_rfl_prices",
+            "prc_rfl_operations",
         )
-        self.intra_rate_time = int(
-            get_parameter_store(get_enviroment_variable("INTRA_RATE_TIME"))
-        )
-        self.dynamodb_session = bt3_resource("dynamodb")
+        self.source_fingerprint = None
+        self.snapshot_location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
         
 
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({seconds*1000}) */"
 
+    @record_run_manifest("slider", "intra")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
+            source_unchanged, self.source_fingerprint = run_change_probe(
+                get_enviroment_variable("DB_SECRET"),
+                self.probe_sources,
+                self.full_valuation_date,
+                self.dynamodb_session.Table(self.version_collection_name),
+                "slider",
+                self.create_string_query(self.query_timeout),
+            )
+            if source_unchanged:
+                self.update_last_version_info(data_changed=False)
+                return
             # EXTRACT
             origin_data_slider = self.get_origin_data()
             # TRANSFORM
@@ -239,35 +175,36 @@ class IntradaySlider:
             )
             send_error_mail()
 
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info(
             "Iniciando carga de información para el componente 6 - slider."
         )
         slider_data = []
         try:
-            connection_db_credentials = get_secret(
-                get_enviroment_variable("DB_SECRET"))
-
-            with pymysql.connect(
-                host=connection_db_credentials["host"],
-                port=int(connection_db_credentials["port"]),
-                user=connection_db_credentials["username"],
-                password=connection_db_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,
-            ) as connection:
+            with db_connection(get_enviroment_variable("DB_SECRET")) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info(
                             "Iniciando proceso de extracción de información - Consulta en base de datos para componente 6 - Slider."
                         )
                         logger.info("Consultando el top de instrument.")
-                        cursor_connection.execute(self.slider_information_tes_query)
-                        slider_tes_data = cursor_connection.fetchall()
-                        slider_data.extend(slider_tes_data)
-                        for category in self.integer_category_id_list:
-                            cursor_connection.execute(self.slider_information_corporative_query % str(category))
-                            current_corporative_item = cursor_connection.fetchall()
-                            slider_data.extend(current_corporative_item)
+                        cursor_connection.execute(self.top_tes_instruments_query)
+                        top_tes_instruments = cursor_connection.fetchall()
+                        market_snapshot = get_market_snapshot(
+                            cursor_connection,
+                            self.full_valuation_date,
+                            self.snapshot_location,
+                            self.intra_rate_time // 2,
+                            self.create_string_query(self.query_timeout),
+                            self.source_fingerprint,
+                        )
+                        slider_data.extend(
+                            self.get_tes_slider_data(market_snapshot, top_tes_instruments)
+                        )
+                        slider_data.extend(
+                            self.get_corporative_slider_data(market_snapshot)
+                        )
                         logger.info(
                             f"En total se encontraron {len(slider_data)} valores.")
                         return slider_data
@@ -318,6 +255,83 @@ class IntradaySlider:
             )
             raise
 
+    @measure_stage("transform")
+    def get_tes_slider_data(self, market_snapshot, top_tes_instruments):
+        yesterday_prices = index_by_isin(market_snapshot.prices_yesterday)
+        instrument_prices = {}
+        for today_price in market_snapshot.prices_today:
+            yesterday_price = yesterday_prices.get(today_price["isin_code"])
+            if yesterday_price is None:
+                continue
+            pbs_change = Decimal(0)
+            if today_price["yield"] is not None and yesterday_price["yield"] is not None:
+                pbs_change = (today_price["yield"] - yesterday_price["yield"]) * 100
+            instrument_prices.setdefault(today_price["instrument"], []).append(
+                {
+                    "isin_code": today_price["isin_code"],
+                    "yield": today_price["yield"],
+                    "pbs_change": pbs_change,
+                    "maturity_days": today_price["maturity_days"],
+                }
+            )
+        slider_tes_data = []
+        for top_instrument in top_tes_instruments:
+            current_prices = instrument_prices.get(
+                top_instrument["instrument"],
+                [{"isin_code": None, "yield": None, "pbs_change": None, "maturity_days": None}],
+            )
+            for current_price in current_prices:
+                slider_tes_data.append(
+                    {
+                        "instrument": top_instrument["instrument"],
+                        "isin_code": current_price["isin_code"],
+                        "yield": current_price["yield"],
+                        "pbs_change": current_price["pbs_change"],
+                        "category_id": 0,
+                        "maturity_days": current_price["maturity_days"],
+                    }
+                )
+        slider_tes_data.sort(
+            key=lambda item: (item["maturity_days"] is not None, item["maturity_days"] or 0)
+        )
+        for item in slider_tes_data:
+            del item["maturity_days"]
+        return slider_tes_data
+
+    @measure_stage("transform")
+    def get_corporative_slider_data(self, market_snapshot):
+        yesterday_prices = index_by_isin(market_snapshot.prices_yesterday)
+        longest_category_prices = {}
+        for today_price in market_snapshot.prices_today:
+            current_category = today_price["category_id"]
+            if current_category not in self.integer_category_id_list:
+                continue
+            longest_price = longest_category_prices.get(current_category)
+            if longest_price is None or (today_price["maturity_days"] or 0) > (
+                longest_price["maturity_days"] or 0
+            ):
+                longest_category_prices[current_category] = today_price
+        slider_corporative_data = []
+        for category in self.integer_category_id_list:
+            today_price = longest_category_prices.get(category)
+            if today_price is None:
+                continue
+            yesterday_yield = yesterday_prices.get(today_price["isin_code"], {}).get("yield")
+            pbs_change = Decimal(0)
+            if today_price["yield"] is not None and yesterday_yield is not None:
+                pbs_change = (today_price["yield"] - yesterday_yield) * 100
+            slider_corporative_data.append(
+                {
+                    "instrument": today_price["instrument"],
+                    "isin_code": today_price["isin_code"],
+                    "yield": today_price["yield"],
+                    "pbs_change": pbs_change,
+                    "category_id": today_price["category_id"],
+                }
+            )
+        return slider_corporative_data
+
+    @measure_stage("transform")
     def transform_data(self, origin_data_slider):
         final_data_to_insert_slider = []
         categories_definition = self.slider_params.get('CORPORATIVE_BANKING_CATEGORIES')
@@ -351,12 +365,14 @@ class IntradaySlider:
         return slider_data_to_insert
     
     
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    batch.put_item(Item=data)
+                save_changed_items(
+                    table, add_payloads([data]), self.snapshot_location, self.full_valuation_date
+                )
             else:
                 logger.info(
                     "No hay data para insertar en la tabla " + collection_name)
@@ -375,6 +391,7 @@ class IntradaySlider:
                 + "] "
                 + str(current_error)
             )
+            raise
     
     
     def calculate_last_execution(self):
@@ -388,7 +405,8 @@ class IntradaySlider:
         return last_exe_final_hour
     
     
-    def update_last_version_info(self):
+    @measure_stage("version")
+    def update_last_version_info(self, data_changed=True):
         logger.info("Iniciando actualización de versión.")
         table = self.dynamodb_session.Table(self.version_collection_name)
         response = table.get_item(Key={"component": "slider"})
@@ -400,7 +418,15 @@ class IntradaySlider:
         if "Item" in response:
             item = response["Item"]
             logger.info("Se carga la siguiente data de versión: " + str(item))
-            item["version"] = int(item["version"]) + 1
+            if data_changed:
+                item["version"] = int(item["version"]) + 1
+                set_freshness(item, self.source_fingerprint)
+                if self.source_fingerprint is not None:
+                    item[FINGERPRINT_ATTRIBUTE] = self.source_fingerprint
+                else:
+                    item.pop(FINGERPRINT_ATTRIBUTE, None)
+            else:
+                logger.info("El origen no cambió. Se conserva la versión actual.")
             if self.full_valuation_date.timestamp() >= (
                 current_day.timestamp() + get_seconds_from_ssm(self.calculate_last_execution())
             ):
@@ -430,4 +456,7 @@ class IntradaySlider:
 
 
 if __name__ == "__main__":
-    IntradaySlider().run()
+    if is_worker_mode():
+        run_intraday_worker(IntradaySlider)
+    else:
+        IntradaySlider().run()
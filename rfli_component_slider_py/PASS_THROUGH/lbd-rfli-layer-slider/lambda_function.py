@@ -1,19 +1,15 @@
-import json
-import logging  
 import boto3
-import decimal
 import time
 import datetime 
 import os
+from rfli_lambda_utils.request_logging import log_request, setup_logging
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.versions import add_freshness, get_version_item
+from rfli_lambda_utils.parameters import get_parameter_value
+from rfli_lambda_utils.responses import add_etag, build_response, get_conditional_response, get_memoized_payload, get_version_tag
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal): 
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = setup_logging()
 
 GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*', 
                     'Access-Control-Allow-Origin' : '*', 
@@ -21,22 +17,20 @@ GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*',
                     
 
 SLIDER_COLLECTION= 'dnb-rfli-slider'
-DATA_VERSION_TABLE = 'dnb-rfli-data-version-intra'
 
 
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb = boto3.resource("dynamodb")
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
-    dynamodb = boto3.resource("dynamodb")
-    param_store = boto3.client("ssm")
     market_rate_env    = os.environ['MARKET_RATE']
-    market_rate = int(param_store.get_parameter(Name=market_rate_env, WithDecryption=True)['Parameter']['Value'])
+    market_rate = int(get_parameter_value(market_rate_env))
     SLIDER_COLLECTION_table = dynamodb.Table(SLIDER_COLLECTION)
-    version_table     = dynamodb.Table(DATA_VERSION_TABLE)
-    version_response  = version_table.get_item(
-        Key = {
-                'component': 'slider'
-            }
-        )
-    if 'Item' not in version_response:
+    version_data = get_version_item('slider')
+    if version_data is None:
         logger.info('No se encontro version en la tabla')
         return {
                 'headers':{ 'Access-Control-Allow-Headers': '*',
@@ -46,7 +40,6 @@ def lambda_handler(event, context):
                 'body': {
                     'message': 'No hay data de versión en la tabla'}
             }
-    version_data = version_response['Item']
     current_version = version_data['version']
     next_status = version_data['next_status']
     next_update = version_data['next_update']
@@ -62,30 +55,25 @@ def lambda_handler(event, context):
     }    
     time_to_wait = next_update_options[next_status]
     logger.info(f"\ncurrent_version: {current_version}\nnext_update: {time_to_wait}\nnext_status: {next_status}")
-    response = SLIDER_COLLECTION_table.get_item(
-        Key = {
-            'slider_key': 1
-        }
-    )
-    if 'Item' not in response:
+    conditional_response = get_conditional_response(event, GENERIC_HEADERS, version_data, time_to_wait, next_status)
+    if conditional_response is not None:
+        return conditional_response
+    def read_item():
+        response = SLIDER_COLLECTION_table.get_item(
+            Key = {
+                'slider_key': 1
+            }
+        )
+        return response.get('Item')
+    payload = get_memoized_payload(('slider', get_version_tag(version_data)), read_item)
+    if payload is None:
         logger.info('No se encontró data para el top category')
-        final_object = {
-            'version': current_version,
-            'next_update': time_to_wait,
-            'next_status': next_status,
-            'data': None,
-        }
-    else:
-        data = response['Item']['data']
-        final_object = {
-            'version': current_version,
-            'next_update': time_to_wait,
-            'next_status': next_status,
-            'data': data
-        } 
-    final_response = {
-        'headers': GENERIC_HEADERS, 
-        'body' : json.dumps(final_object, cls=DecimalEncoder)
-       }
+    final_object = {
+        'version': current_version,
+        'next_update': time_to_wait,
+        'next_status': next_status,
+    }
+    final_response = build_response(event, add_etag(GENERIC_HEADERS, version_data),
+                                    add_freshness(final_object, version_data), payload)
     
     return final_response
\ No newline at end of file
@@ -0,0 +1,156 @@
+import json
+import logging
+
+import boto3
+
+logger = logging.getLogger()
+
+AWS_REGION = "us-east-1"
+DB_SECRET_NAME = "sm-bench-rfli-db"
+MAIL_SECRET_NAME = "sm-bench-rfli-mail"
+COMPONENTS = (
+    "isin-track",
+    "compare-curves",
+    "portfolio-track",
+    "top-delta-category",
+    "slider",
+    "isin-search",
+)
+
+# Llave de particion y (si tiene) de ordenamiento de cada tabla, como la leen los lambdas
+TABLE_KEYS = {
+    "dnb-rfli-data-version-intra": (("component", "S"),),
+    "dnb-rfli-run-manifest": (("component", "S"), ("run_timestamp", "S")),
+    "dnb-rfli-isin-track-all-isines": (("isin", "S"),),
+    "dnb-rfli-isin-track-folios": (("isin", "S"),),
+    "dnb-rfli-isin-track-user-isines": (("user_id", "S"),),
+    "dnb-rfli-isin-track-user-params": (("user_id", "S"),),
+    "dnb-rfli-curve-compare-curves-intra": (("cc_curve", "S"),),
+    "dnb-rfli-curve-compare-folios-intra": (("cc_curve", "S"),),
+    "dnb-rfli-curve-compare-curves-eod": (("cc_curve", "S"), ("valuation_date", "S")),
+    "dnb-rfli-curve-compare-folios-eod": (("cc_curve", "S"), ("valuation_date", "S")),
+    "dnb-rfli-portfolio-track-all-isines": (("isin", "S"),),
+    "dnb-rfli-portfolio-track-user-isines": (("user_id", "S"),),
+    "dnb-rfli-portfolio-track-params-isines": (("user_id", "S"),),
+    "dnb-rfli-portfolio-track-params-isines-hist": (("user_id", "S"), ("update_date", "S")),
+    "dnb-rfli-portfolio-track-params-portfolios": (("user_id", "S"),),
+    "dnb-rfli-portfolio-track-params-portfolios-hist": (("user_id", "S"), ("update_date", "S")),
+    "dnb-rfli-top-delta-category": (("top_category", "N"),),
+    "dnb-rfli-top-delta-category-details": (("ranking_index", "N"),),
+    "dnb-rfli-slider": (("slider_key", "N"),),
+    "dnb-rfli-isin-search-all-isines": (("isin", "S"),),
+    "dnb-rfli-isin-search-issuers": (("issuer", "S"),),
+}
+
+# Horarios HHMM que dejan pasar a todos los jobs sin importar la hora de la corrida
+MARKET_SCHEDULE = {
+    "MARKET_OPEN_TIME": ("ps-bench-rfli-market-open-time", "0"),
+    "MARKET_CLOSE_TIME": ("ps-bench-rfli-market-close-time", "2359"),
+    "PRE_EOD_TIME": ("ps-bench-rfli-prelim-eod-time", "0"),
+    "FINAL_EOD_TIME": ("ps-bench-rfli-final-eod-time", "2359"),
+    "INTRA_RATE_TIME": ("ps-bench-rfli-intra-rate-time", "5"),
+}
+
+
+def get_component_parameters(categories):
+    """Parametros JSON de los componentes con la misma codificacion que en Parameter Store.
+    TOP_CATEGORY_PARAMS e ISIN_SEARCH_PARAMS se guardan doblemente codificados, igual que
+    en produccion (los jobs hacen json_loads dos veces)"""
+    class_names = {str(class_id): f"SECTOR {class_id}" for class_id in range(1, 10)}
+    top_category_params = {
+        "PARAMETERS_CLASS": class_names,
+        "PARAMETERS_CURRENCY_GROUP": {"1": "PESOS", "2": "UVR", "3": "DOLARES"},
+        "PARAMETERS_RATE_GROUP": {"1": "TASA FIJA", "2": "IPC", "3": "IBR", "4": "UVR"},
+        "PARAMETERS_RATING_GROUP": {str(group): f"CALIFICACION {group}" for group in (10, 20, 30, 40, 50, 60, 70, 80, 90, 100)},
+        "PARAMETERS_MATURITY_RANGE": {str(range_id): f"PLAZO {range_id}" for range_id in range(1, 7)},
+        "MAX_MATURITY_RANGE": {"1": "365", "2": "1095", "3": "1825", "4": "3650", "5": "7300", "6": "18250"},
+        "CURVE_RELATION": {"CEC": "1,1,1", "CECUVR": "1,2,4", "BAAA2": "[2-4],1,[1-3]"},
+    }
+    slider_params = {
+        "CORPORATIVE_BANKING_CATEGORIES": {
+            str(category["category_id"]): f"CATEGORIA {category['category_id']}"
+            for category in categories[:6]
+        }
+    }
+    return {
+        "TOP_CATEGORY_PARAMS": ("ps-bench-rfli-top-category-params", json.dumps(json.dumps(top_category_params))),
+        "SLIDER_PARAMS": ("ps-bench-rfli-slider-params", json.dumps(slider_params)),
+        "ISIN_SEARCH_PARAMS": ("ps-bench-rfli-isin-search-params", json.dumps(json.dumps({"PARAMETERS_CLASS": class_names}))),
+    }
+
+
+def seed_aws(endpoint_url, dataset, db_credentials):
+    """Crea en el servidor de moto las tablas, parametros y secretos que leen los jobs
+    Parameters:
+    -----------
+    endpoint_url: str, required
+        URL del servidor de moto (ThreadedMotoServer)
+    dataset: dict, required
+        Datos sinteticos de generate_dataset
+    db_credentials: dict, required
+        Credenciales del MySQL local que se guardan en el secreto de base de datos
+
+    Returns:
+    --------
+    dict
+        Argumentos de job (sin '--') que apuntan a los recursos creados
+    """
+    session = boto3.session.Session(region_name=AWS_REGION)
+    dynamodb = session.resource("dynamodb", endpoint_url=endpoint_url)
+    ssm_client = session.client("ssm", endpoint_url=endpoint_url)
+    secrets_client = session.client("secretsmanager", endpoint_url=endpoint_url)
+
+    existing_tables = set(dynamodb.meta.client.list_tables()["TableNames"])
+    for table_name, key_definition in TABLE_KEYS.items():
+        if table_name in existing_tables:
+            dynamodb.Table(table_name).delete()
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {"AttributeName": key_name, "KeyType": key_type}
+                for (key_name, _), key_type in zip(key_definition, ("HASH", "RANGE"))
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": key_name, "AttributeType": attribute_type}
+                for key_name, attribute_type in key_definition
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    version_table = dynamodb.Table("dnb-rfli-data-version-intra")
+    for component in COMPONENTS:
+        version_table.put_item(
+            Item={"component": component, "version": 1, "next_update": 0, "next_status": "intraday"}
+        )
+    for table_name in ("dnb-rfli-isin-track-user-params", "dnb-rfli-portfolio-track-params-isines"):
+        with dynamodb.Table(table_name).batch_writer() as batch:
+            for user_params in dataset["user_params"]:
+                batch.put_item(Item=user_params)
+
+    job_arguments = {}
+    parameters = dict(MARKET_SCHEDULE)
+    parameters.update(get_component_parameters(dataset["categories"]))
+    for argument, (parameter_name, parameter_value) in parameters.items():
+        ssm_client.put_parameter(
+            Name=parameter_name, Value=parameter_value, Type="String", Overwrite=True
+        )
+        job_arguments[argument] = parameter_name
+
+    for secret_name, secret_value in (
+        (DB_SECRET_NAME, db_credentials),
+        (MAIL_SECRET_NAME, {"server": "127.0.0.1", "port": "2525", "user": "", "password": ""}),
+    ):
+        try:
+            secrets_client.create_secret(Name=secret_name, SecretString=json.dumps(secret_value))
+        except secrets_client.exceptions.ResourceExistsException:
+            secrets_client.put_secret_value(SecretId=secret_name, SecretString=json.dumps(secret_value))
+    job_arguments.update(
+        {
+            "FLASH_ORIGIN_DB": DB_SECRET_NAME,
+            "DB_SECRET": DB_SECRET_NAME,
+            "SMTP_CREDENTIALS": MAIL_SECRET_NAME,
+            "ORIGIN_MAIL": "benchmark@localhost",
+            "DESTINATION_MAIL": "benchmark@localhost",
+        }
+    )
+    logger.info(f"Recursos de AWS simulados creados en {endpoint_url}.")
+    return job_arguments
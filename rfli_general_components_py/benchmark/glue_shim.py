@@ -0,0 +1,35 @@
+import sys
+import types
+
+
+def get_resolved_options(argv, options):
+    """Reemplazo local de awsglue.utils.getResolvedOptions: lee cada '--OPCION valor' de argv
+    y falla igual que Glue cuando falta una opcion requerida"""
+    resolved_options = {}
+    for option in options:
+        option_flag = "--" + option
+        if option_flag not in argv or argv.index(option_flag) + 1 >= len(argv):
+            raise RuntimeError(f"the following arguments are required: {option_flag}")
+        resolved_options[option] = argv[argv.index(option_flag) + 1]
+    return resolved_options
+
+
+def install_glue_shim(job_arguments, script_name="glue-job"):
+    """Publica un modulo awsglue.utils falso y deja los argumentos del job en sys.argv,
+    como los recibe un job de Glue Python shell
+    Parameters:
+    -----------
+    job_arguments: dict, required
+        Argumentos del job sin el prefijo '--'
+    script_name: str, optional
+        Valor de sys.argv[0]
+    """
+    awsglue_module = types.ModuleType("awsglue")
+    utils_module = types.ModuleType("awsglue.utils")
+    utils_module.getResolvedOptions = get_resolved_options
+    awsglue_module.utils = utils_module
+    sys.modules["awsglue"] = awsglue_module
+    sys.modules["awsglue.utils"] = utils_module
+    sys.argv = [script_name]
+    for argument, value in job_arguments.items():
+        sys.argv.extend(["--" + argument, str(value)])
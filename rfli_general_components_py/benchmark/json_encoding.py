@@ -0,0 +1,191 @@
+"""Benchmark de la serializacion JSON de las respuestas de los lambdas PASS_THROUGH.
+
+Las respuestas se arman con los items de build_lambda_items, la misma forma que escriben los
+ETL, convertidos al formato AttributeValue con que responde DynamoDB. Por cada respuesta se mide:
+
+- deserialize: TypeDeserializer de boto3, lo que hace boto3.resource("dynamodb") al leer el item
+- decimal_encoder: json.dumps con el DecimalEncoder que tenian los lambdas, float(str(o)) por numero
+- encode_json: json.dumps con default=float, el encode_json de rfli_utils.serialization
+- attribute_value: from_attribute_value mas encode_json sobre la respuesta del cliente de bajo
+  nivel, sin pasar por Decimal
+
+El camino anterior de los lambdas es deserialize + decimal_encoder. Tambien se verifica que los
+tres caminos produzcan exactamente el mismo JSON. Ejemplo:
+
+    pip install -r benchmark/requirements.txt
+    python benchmark/json_encoding.py --isines 20000 --folios 50000 --output serializacion.json
+"""
+import argparse
+import datetime as dt
+import decimal
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from zoneinfo import ZoneInfo
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCHMARK_DIRECTORY))
+sys.path.insert(0, BENCHMARK_DIRECTORY)
+sys.path.insert(0, os.path.join(REPO_ROOT, "rfli_general_components_py", "rfli_utils"))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+
+from lambda_fixtures import MAX_RESPONSE_ITEMS, build_lambda_items  # noqa: E402
+from rfli_utils.serialization import encode_json, from_attribute_value  # noqa: E402
+from synthetic_data import generate_dataset  # noqa: E402
+
+logger = logging.getLogger()
+
+# Tabla que lee cada lambda y atributo del item que va en data. Sin atributo la respuesta es una
+# pagina de items, como en isin-search
+RESPONSES = {
+    "isin-track-folios": ("dnb-rfli-isin-track-folios", "folios"),
+    "isin-track-user-isines": ("dnb-rfli-isin-track-user-isines", "isines"),
+    "curve-compare-curves-intra": ("dnb-rfli-curve-compare-curves-intra", "data"),
+    "curve-compare-folios-intra": ("dnb-rfli-curve-compare-folios-intra", "data"),
+    "top-delta-category": ("dnb-rfli-top-delta-category", "data"),
+    "top-delta-category-details": ("dnb-rfli-top-delta-category-details", "data"),
+    "slider": ("dnb-rfli-slider", "data"),
+    "isin-search-isines": ("dnb-rfli-isin-search-all-isines", None),
+}
+METHODS = ("deserialize", "decimal_encoder", "encode_json", "attribute_value")
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """Encoder que tenian los lambdas antes de encode_json"""
+
+    def default(self, o):
+        if isinstance(o, decimal.Decimal):
+            return float(str(o))
+        return super(DecimalEncoder, self).default(o)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", default=",".join(RESPONSES), help="Respuestas separadas por coma")
+    parser.add_argument("--isines", type=int, default=2000)
+    parser.add_argument("--folios", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--samples", type=int, default=50, help="Respuestas medidas por lambda")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--output", help="Archivo JSON donde se guardan los resultados")
+    return parser.parse_args()
+
+
+def build_responses(table_items, table_name, data_attribute, samples):
+    """Respuestas de un lambda en formato AttributeValue, tal como las retorna DynamoDB: el
+    atributo de cada item o, sin atributo, paginas de MAX_RESPONSE_ITEMS items"""
+    serializer = TypeSerializer()
+    items = table_items[table_name]
+    if data_attribute is None:
+        page_size = int(MAX_RESPONSE_ITEMS)
+        pages = [items[start:start + page_size] for start in range(0, len(items), page_size)][:samples]
+        return [serializer.serialize(page) for page in pages]
+    return [serializer.serialize(item[data_attribute]) for item in items[:samples]]
+
+
+def run_methods(attribute_values):
+    """Ejecuta cada camino sobre todas las respuestas. Retorna los milisegundos de cada camino y
+    si los tres producen el mismo JSON"""
+    deserializer = TypeDeserializer()
+    durations = {}
+
+    start_time = time.perf_counter()
+    resource_values = [deserializer.deserialize(attribute_value) for attribute_value in attribute_values]
+    durations["deserialize"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    decimal_encoder_bodies = [
+        json.dumps({"data": resource_value}, cls=DecimalEncoder) for resource_value in resource_values
+    ]
+    durations["decimal_encoder"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    encode_json_bodies = [encode_json({"data": resource_value}) for resource_value in resource_values]
+    durations["encode_json"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    attribute_value_bodies = [
+        encode_json({"data": from_attribute_value(attribute_value)}) for attribute_value in attribute_values
+    ]
+    durations["attribute_value"] = time.perf_counter() - start_time
+
+    identical = decimal_encoder_bodies == encode_json_bodies == attribute_value_bodies
+    body_bytes = sum(len(body.encode("utf-8")) for body in decimal_encoder_bodies)
+    return {method: seconds * 1000 for method, seconds in durations.items()}, identical, body_bytes
+
+
+def measure_response(attribute_values, repetitions):
+    """Mediana por solicitud de cada camino en milisegundos, de repetitions corridas"""
+    method_runs = {method: [] for method in METHODS}
+    identical = True
+    for _ in range(repetitions):
+        durations, run_identical, body_bytes = run_methods(attribute_values)
+        identical = identical and run_identical
+        for method, duration in durations.items():
+            method_runs[method].append(duration / len(attribute_values))
+    result = {f"{method}_ms": round(statistics.median(runs), 3) for method, runs in method_runs.items()}
+    result["previous_ms"] = round(result["deserialize_ms"] + result["decimal_encoder_ms"], 3)
+    result["resource_ms"] = round(result["deserialize_ms"] + result["encode_json_ms"], 3)
+    result["encoding_speedup"] = round(result["decimal_encoder_ms"] / max(result["encode_json_ms"], 1e-9), 2)
+    result["attribute_value_speedup"] = round(result["previous_ms"] / max(result["attribute_value_ms"], 1e-9), 2)
+    result["bytes_mean"] = round(body_bytes / len(attribute_values))
+    result["responses"] = len(attribute_values)
+    result["identical"] = identical
+    return result
+
+
+def print_results(results):
+    print(
+        f"{'respuesta':28} {'bytes':>9} {'anterior':>9} {'recurso':>9} {'av':>9} "
+        f"{'x encoder':>9} {'x av':>6} iguales"
+    )
+    for response_name, result in results["responses"].items():
+        print(
+            f"{response_name:28} {result['bytes_mean']:>9} {result['previous_ms']:>9.3f} "
+            f"{result['resource_ms']:>9.3f} {result['attribute_value_ms']:>9.3f} "
+            f"{result['encoding_speedup']:>9.2f} {result['attribute_value_speedup']:>6.2f} "
+            f"{'si' if result['identical'] else 'NO'}"
+        )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    arguments = parse_arguments()
+    response_names = [name.strip() for name in arguments.responses.split(",") if name.strip()]
+    unknown_responses = set(response_names) - set(RESPONSES)
+    if unknown_responses:
+        raise SystemExit("Respuestas desconocidas: " + ", ".join(sorted(unknown_responses)))
+
+    valuation_date = dt.datetime.now(tz=ZoneInfo("America/Bogota")).date()
+    dataset = generate_dataset(valuation_date, arguments.isines, arguments.folios, arguments.users, arguments.seed)
+    table_items = build_lambda_items(dataset, valuation_date)
+    results = {
+        "valuation_date": valuation_date.strftime("%Y-%m-%d"),
+        "scale": {"isines": arguments.isines, "folios": arguments.folios, "users": arguments.users, "seed": arguments.seed},
+        "repetitions": arguments.repetitions,
+        "responses": {},
+    }
+    for response_name in response_names:
+        table_name, data_attribute = RESPONSES[response_name]
+        attribute_values = build_responses(table_items, table_name, data_attribute, arguments.samples)
+        if not attribute_values:
+            logger.warning(f"{response_name}: la tabla {table_name} no tiene items.")
+            continue
+        results["responses"][response_name] = measure_response(attribute_values, arguments.repetitions)
+        logger.info(f"{response_name}: {results['responses'][response_name]}")
+
+    print_results(results)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if not all(result["identical"] for result in results["responses"].values()):
+        raise SystemExit("Los caminos de serializacion no producen el mismo JSON")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Items de las tablas que leen los lambdas PASS_THROUGH, con la misma forma que escriben los
+ETL, construidos a partir de los datos sinteticos de generate_dataset, y eventos de API Gateway
+de cada lambda para la prueba de carga"""
+import base64
+import datetime as dt
+import importlib.util
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import boto3
+
+from aws_fixtures import AWS_REGION, COMPONENTS
+
+logger = logging.getLogger()
+
+VERSION_TABLE = "dnb-rfli-data-version-intra"
+MARKET_RATE_PARAMETER = ("ps-bench-rfli-market-rate", "60")
+RATE_TIME_PARAMETER = ("ps-bench-rfli-rate-time", "60")
+MAX_RESPONSE_ITEMS = "500"
+# Las listas de folios se recortan para que ningun item pase del limite de 400 KB de DynamoDB
+MAX_ITEM_FOLIOS = 1000
+TOP_CATEGORIES = 10
+SLIDER_INSTRUMENTS = 20
+MARGIN_TYPES = {"C": "Calculado", "H": "Historico", "A": "Actualizado"}
+
+# Carpeta de cada lambda relativa a la raiz del repositorio
+LAMBDAS = {
+    "isin-track-user-isines": "rfli_component_1_track_isin_py/PASS_THROUGH/lbd-rfli-layer-isin-track-user-isines",
+    "isin-track-user-params": "rfli_component_1_track_isin_py/PASS_THROUGH/lbd-rfli-layer-isin-track-user-params",
+    "isin-track-folios": "rfli_component_1_track_isin_py/PASS_THROUGH/lbd-rfli-layer-isin-track-folios",
+    "curve-compare-curves-intra": "rfli_component_2_curve_compare_py/PASS_THROUGH/lbd-rfli-layer-curve-compare-curves-intra",
+    "curve-compare-folios-intra": "rfli_component_2_curve_compare_py/PASS_THROUGH/lbd-rfli-layer-curve-compare-folios-intra",
+    "curve-compare-curves-eod": "rfli_component_2_curve_compare_py/PASS_THROUGH/lbd-rfli-layer-curve-compare-curves-eod",
+    "curve-compare-folios-eod": "rfli_component_2_curve_compare_py/PASS_THROUGH/lbd-rfli-layer-curve-compare-folios-eod",
+    "top-delta-category": "rfli_component_5_top_delta_category_py/PASS_THROUGH/lbd-rfli-layer-top-delta-category",
+    "top-delta-category-details": "rfli_component_5_top_delta_category_py/PASS_THROUGH/lbd-rfli-layer-top-delta-category-details",
+    "slider": "rfli_component_slider_py/PASS_THROUGH/lbd-rfli-layer-slider",
+    "isin-search-titles": "rfli_search_component_py/code/PASS_THROUGH/lbd-rfli-layer-isin-search-titles",
+    "isin-search-isines": "rfli_search_component_py/code/PASS_THROUGH/lbd-rfli-layer-isin-search-isines",
+    "isin-search-issuers": "rfli_search_component_py/code/PASS_THROUGH/lbd-rfli-layer-isin-search-issuers",
+    "portfolio-track-user-portfolios": "rfli_component_3_portfolio_track_py/PASS_THROUGH/lbd-rfli-layer-portfolio-track-user-portfolios",
+    "portfolio-track-user-params": "rfli_component_3_portfolio_track_py/PASS_THROUGH/lbd-rfli-layer-portfolio-track-user-params",
+}
+ENCRYPTED_LAMBDAS = ("portfolio-track-user-portfolios", "portfolio-track-user-params")
+
+
+def to_item_value(value):
+    # Las fechas se guardan como texto y los numeros como Decimal, igual que en los ETL
+    if isinstance(value, (dt.date, dt.datetime)):
+        return str(value)
+    if isinstance(value, float):
+        return Decimal(str(round(value, 6)))
+    return value
+
+
+def get_price_data(price_row, category_row):
+    price_data = {key: to_item_value(value) for key, value in price_row.items() if key != "isin_code"}
+    price_data["margin_type"] = MARGIN_TYPES[category_row["margin_type"]]
+    price_data["margin_origin"] = category_row["margin_origin"]
+    price_data["cc_curve"] = category_row["cc_curve"]
+    price_data["issuer"] = category_row["issuer"]
+    return price_data
+
+
+def get_folio_data(operation):
+    return {
+        "folio": operation["folio"],
+        "instrument": operation["instrument"],
+        "yield": operation["yield"],
+        "amount": operation["amount"],
+        "maturity_days": operation["maturity_days"],
+        "timestamp_operation": str(operation["timestamp_operation"]),
+        "trading_system": operation["trading_system"],
+    }
+
+
+def build_lambda_items(dataset, valuation_date):
+    """Items de cada tabla que leen los lambdas a partir de los datos sinteticos
+    Parameters:
+    -----------
+    dataset: dict, required
+        Datos sinteticos de generate_dataset
+    valuation_date: datetime.date, required
+        Fecha de valoracion de los datos
+
+    Returns:
+    --------
+    dict
+        Lista de items por tabla de DynamoDB
+    """
+    tables = dataset["tables"]
+    today_prices = [
+        row for row in tables["precia_published.pub_rfl_prices"] if row["valuation_date"] == valuation_date
+    ]
+    category_rows = {row["isin_code"]: row for row in tables["precia_process.prc_rfl_get_category"]}
+    issuer_names = {row["issuer"]: row["name"] for row in tables["precia_sources.src_rfl_issuer"]}
+    class_names = {category["category_id"]: f"SECTOR {category['class']}" for category in dataset["categories"]}
+    isin_data = {
+        price_row["isin_code"]: get_price_data(price_row, category_rows[price_row["isin_code"]])
+        for price_row in today_prices
+    }
+    instrument_curves = {row["instrument"]: row["cc_curve"] for row in tables["precia_sources.src_rfl_instrument"]}
+
+    instrument_folios = defaultdict(list)
+    curve_folios = defaultdict(list)
+    category_folios = defaultdict(list)
+    for operation in tables["precia_process.prc_rfl_operations"]:
+        folio_data = get_folio_data(operation)
+        instrument_folios[operation["instrument"]].append(folio_data)
+        curve_folios[instrument_curves[operation["instrument"]]].append(folio_data)
+        category_folios[operation["category_id"]].append(folio_data)
+
+    user_isines = [
+        {
+            "user_id": user_params["user_id"],
+            "isines": [{"isin": isin, "data": isin_data[isin]} for isin in user_params["isines"]],
+        }
+        for user_params in dataset["user_params"]
+    ]
+    default_params = dataset["user_params"][0]
+    user_isines.append(
+        {"user_id": "default", "isines": [{"isin": isin, "data": isin_data[isin]} for isin in default_params["isines"]]}
+    )
+
+    curves = {}
+    for beta_row in tables["precia_published.pub_rfl_betas"]:
+        if beta_row["curve_date"] == valuation_date:
+            curves[beta_row["cc_curve"]] = {
+                "beta_0": beta_row["beta_0"],
+                "beta_1": beta_row["beta_1"],
+                "beta_2": beta_row["beta_2"],
+                "tau": beta_row["tao_1"],
+            }
+    curve_items = [{"cc_curve": cc_curve, "data": curve_data} for cc_curve, curve_data in curves.items()]
+    curve_folio_items = [
+        {"cc_curve": cc_curve, "data": curve_folios[cc_curve][:MAX_ITEM_FOLIOS]} for cc_curve in curves
+    ]
+    eod_dates = (str(valuation_date), str(valuation_date - dt.timedelta(days=1)))
+
+    category_prices = defaultdict(list)
+    for price_row in today_prices:
+        category_prices[price_row["category_id"]].append(price_row)
+    ranked_categories = sorted(
+        category_prices, key=lambda category_id: -len(category_folios[category_id])
+    )[:TOP_CATEGORIES]
+    top_data = []
+    details_items = []
+    for ranking_index, category_id in enumerate(ranked_categories, start=1):
+        prices = category_prices[category_id]
+        category_yields = [price_row["yield"] for price_row in prices]
+        category_summary = {
+            "category_id": category_id,
+            "class_name": class_names[category_id],
+            "isines_count": len(prices),
+            "folios_count": len(category_folios[category_id]),
+            "min_yield": min(category_yields),
+            "max_yield": max(category_yields),
+        }
+        top_data.append(category_summary)
+        details_items.append(
+            {
+                "ranking_index": ranking_index,
+                "data": dict(
+                    category_summary,
+                    cc_curve=category_rows[prices[0]["isin_code"]]["cc_curve"],
+                    isines=[{"isin": price_row["isin_code"], "yield": price_row["yield"]} for price_row in prices],
+                    folios=category_folios[category_id][:MAX_ITEM_FOLIOS],
+                ),
+            }
+        )
+    slider_data = [
+        {
+            "instrument": price_row["instrument"],
+            "isin": price_row["isin_code"],
+            "yield": price_row["yield"],
+            "mean_price": price_row["mean_price"],
+            "margin_value": price_row["margin_value"],
+        }
+        for price_row in sorted(today_prices, key=lambda price_row: -price_row["category_volume"])[
+            :SLIDER_INSTRUMENTS
+        ]
+    ]
+    search_isines = [
+        {
+            "isin": isin,
+            "instrument": data["instrument"],
+            "issuer_name": issuer_names.get(data["issuer"], "NA"),
+            "class_name": class_names.get(data["category_id"], "NA"),
+            "real_rating": data["real_rating"],
+            "rate_type": data["rate_type"],
+            "currency_type": data["currency_type"],
+            "maturity_days": data["maturity_days"],
+            "maturity_date": data["maturity_date"],
+            "yield": data["yield"],
+            "mean_price": data["mean_price"],
+        }
+        for isin, data in isin_data.items()
+    ]
+    return {
+        "dnb-rfli-isin-track-all-isines": [{"isin": isin, "data": data} for isin, data in isin_data.items()],
+        "dnb-rfli-isin-track-folios": [
+            {"isin": isin, "folios": instrument_folios[data["instrument"]][:MAX_ITEM_FOLIOS]}
+            for isin, data in isin_data.items()
+        ],
+        "dnb-rfli-isin-track-user-isines": user_isines,
+        "dnb-rfli-portfolio-track-all-isines": [{"isin": isin, "data": data} for isin, data in isin_data.items()],
+        "dnb-rfli-portfolio-track-user-isines": user_isines,
+        "dnb-rfli-curve-compare-curves-intra": curve_items,
+        "dnb-rfli-curve-compare-folios-intra": curve_folio_items,
+        "dnb-rfli-curve-compare-curves-eod": [
+            dict(curve_item, valuation_date=eod_date) for curve_item in curve_items for eod_date in eod_dates
+        ],
+        "dnb-rfli-curve-compare-folios-eod": [
+            dict(folio_item, valuation_date=eod_date) for folio_item in curve_folio_items for eod_date in eod_dates
+        ],
+        "dnb-rfli-top-delta-category": [{"top_category": 1, "data": top_data}],
+        "dnb-rfli-top-delta-category-details": details_items,
+        "dnb-rfli-slider": [{"slider_key": 1, "data": slider_data}],
+        "dnb-rfli-isin-search-all-isines": search_isines,
+        "dnb-rfli-isin-search-issuers": [{"issuer": issuer_name} for issuer_name in sorted(set(issuer_names.values()))],
+    }
+
+
+def publish_version(dynamodb, version, version_interval):
+    """Publica una nueva version de todos los componentes con la proxima actualizacion dentro de
+    version_interval segundos, como lo hace cada ciclo de los ETL intradia"""
+    version_table = dynamodb.Table(VERSION_TABLE)
+    next_update = int(time.time()) + version_interval
+    for component in COMPONENTS:
+        version_table.put_item(
+            Item={
+                "component": component,
+                "version": version,
+                "next_update": next_update,
+                "next_status": "intraday",
+                "version_date": time.strftime("%Y-%m-%d"),
+            }
+        )
+
+
+def seed_encrypted_portfolios(endpoint_url, repo_root, users, isin_codes, generator):
+    """Crea una llave de KMS en moto y guarda el portafolio cifrado de cada usuario con el mismo
+    encrypt_portf de los lambdas. Retorna el ARN de la llave o None si dynamodb_encryption_sdk
+    no esta instalado, en cuyo caso los lambdas de portafolios no se pueden probar. Igual que
+    los lambdas, dynamo_encryption_utils crea su cliente con AWS_ENDPOINT_URL del entorno"""
+    try:
+        import dynamodb_encryption_sdk  # noqa: F401
+    except ImportError:
+        logger.warning("dynamodb-encryption-sdk no esta instalado: se omiten los lambdas de portafolios.")
+        return None
+    kms_client = boto3.client("kms", region_name=AWS_REGION, endpoint_url=endpoint_url)
+    kms_id = kms_client.create_key(Description="rfli-benchmark-portfolios")["KeyMetadata"]["Arn"]
+    utils_path = os.path.join(repo_root, LAMBDAS["portfolio-track-user-portfolios"], "dynamo_encryption_utils.py")
+    spec = importlib.util.spec_from_file_location("dynamo_encryption_utils", utils_path)
+    encryption_utils = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(encryption_utils)
+    for user_id in users + ["default"]:
+        portfolios = [
+            {
+                "name": f"Portafolio {portfolio_number}",
+                "isines": [
+                    {"isin": isin, "nominal_value": generator.randint(1, 500) * 1000000}
+                    for isin in generator.sample(isin_codes, min(len(isin_codes), 10))
+                ],
+            }
+            for portfolio_number in range(1, generator.randint(1, 4) + 1)
+        ]
+        encryption_utils.encrypt_portf(user_id, portfolios, "dnb-rfli-portfolio-track-params-portfolios", kms_id)
+    return kms_id
+
+
+def seed_lambda_tables(endpoint_url, repo_root, dataset, valuation_date, version_interval, seed):
+    """Llena en el servidor de moto las tablas y parametros que leen los lambdas. Las tablas ya
+    deben existir (seed_aws)
+    Parameters:
+    -----------
+    endpoint_url: str, required
+        URL del servidor de moto
+    repo_root: str, required
+        Raiz del repositorio, para cifrar los portafolios con el codigo de los lambdas
+    dataset: dict, required
+        Datos sinteticos de generate_dataset
+    valuation_date: datetime.date, required
+        Fecha de valoracion de los datos
+    version_interval: int, required
+        Segundos entre versiones publicadas
+    seed: int, required
+        Semilla de los portafolios
+
+    Returns:
+    --------
+    dict
+        'environment' con las variables de entorno de los lambdas y 'fixture' con los valores
+        con que los clientes arman sus eventos
+    """
+    session = boto3.session.Session(region_name=AWS_REGION)
+    dynamodb = session.resource("dynamodb", endpoint_url=endpoint_url)
+    ssm_client = session.client("ssm", endpoint_url=endpoint_url)
+    table_items = build_lambda_items(dataset, valuation_date)
+    for table_name, items in table_items.items():
+        with dynamodb.Table(table_name).batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+        logger.info(f"{table_name}: {len(items)} items.")
+    publish_version(dynamodb, 1, version_interval)
+    for parameter_name, parameter_value in (MARKET_RATE_PARAMETER, RATE_TIME_PARAMETER):
+        ssm_client.put_parameter(Name=parameter_name, Value=parameter_value, Type="String", Overwrite=True)
+
+    users = [user_params["user_id"] for user_params in dataset["user_params"]]
+    isin_codes = [item["isin"] for item in table_items["dnb-rfli-isin-track-all-isines"]]
+    kms_id = seed_encrypted_portfolios(endpoint_url, repo_root, users, isin_codes, random.Random(seed))
+    return {
+        "environment": {
+            "MARKET_RATE": MARKET_RATE_PARAMETER[0],
+            "RATE_TIME": RATE_TIME_PARAMETER[0],
+            "MAX_RESPONSE_ITEMS": MAX_RESPONSE_ITEMS,
+            "KMS_ID": kms_id or "",
+        },
+        "fixture": {
+            "users": users,
+            "isines": isin_codes,
+            "curves": [item["cc_curve"] for item in table_items["dnb-rfli-curve-compare-curves-intra"]],
+            "ranking_indexes": [item["ranking_index"] for item in table_items["dnb-rfli-top-delta-category-details"]],
+            "issuers": [item["issuer_name"] for item in table_items["dnb-rfli-isin-search-all-isines"]],
+            "valuation_date": str(valuation_date),
+            "encrypted_portfolios": kms_id is not None,
+        },
+    }
+
+
+def make_token(user_id):
+    # Los lambdas solo decodifican el payload del JWT (unique_name), sin validar la firma
+    payload = base64.urlsafe_b64encode(json.dumps({"unique_name": user_id}).encode("utf-8"))
+    return "benchmark." + payload.decode("utf-8").rstrip("=") + ".firma"
+
+
+def new_client(client_number, fixture, seed):
+    """Estado de un cliente simulado: usuario, isin, curva y filtros que consulta, elegidos de
+    forma reproducible con la semilla"""
+    generator = random.Random(seed * 100003 + client_number)
+    return {
+        "client_number": client_number,
+        "user_id": generator.choice(fixture["users"]),
+        "isin": generator.choice(fixture["isines"]),
+        "isines": generator.sample(fixture["isines"], min(len(fixture["isines"]), generator.randint(5, 30))),
+        "cc_curve": generator.choice(fixture["curves"]),
+        "ranking_index": generator.choice(fixture["ranking_indexes"]),
+        "issuer": generator.choice(fixture["issuers"]) if generator.random() < 0.5 else "",
+        "maturity_max": generator.choice(("", "365", "1825", "3650")),
+        "valuation_date": fixture["valuation_date"],
+        "version": 0,
+    }
+
+
+def build_event(lambda_name, client):
+    """Evento de API Gateway con que el cliente invoca el lambda. Los clientes de curvas intradia
+    envian la ultima version recibida, como el front"""
+    headers = {"Authorization": make_token(client["user_id"])}
+    if lambda_name in ("isin-track-folios", "isin-search-isines"):
+        return {"headers": headers, "queryStringParameters": {"isin": client["isin"]}}
+    if lambda_name == "curve-compare-curves-intra":
+        return {
+            "headers": headers,
+            "queryStringParameters": {"cc_curve": client["cc_curve"], "version": str(client["version"])},
+        }
+    if lambda_name == "curve-compare-folios-intra":
+        return {"headers": headers, "queryStringParameters": {"cc_curve": client["cc_curve"]}}
+    if lambda_name in ("curve-compare-curves-eod", "curve-compare-folios-eod"):
+        return {
+            "headers": headers,
+            "queryStringParameters": {"cc_curve": client["cc_curve"], "valuation_date": client["valuation_date"]},
+        }
+    if lambda_name == "top-delta-category-details":
+        return {"headers": headers, "queryStringParameters": {"ranking_index": str(client["ranking_index"])}}
+    if lambda_name == "isin-track-user-params":
+        return {"headers": headers, "body": json.dumps({"isines": client["isines"]})}
+    if lambda_name == "portfolio-track-user-params":
+        return {
+            "headers": headers,
+            "body": json.dumps(
+                {"isines": client["isines"], "portfolios": [{"name": "Portafolio 1", "isines": client["isines"][:5]}]}
+            ),
+        }
+    if lambda_name == "isin-search-titles":
+        return {
+            "headers": headers,
+            "body": json.dumps(
+                {
+                    "issuer": client["issuer"],
+                    "rating": "",
+                    "rate_type": "",
+                    "currency": "",
+                    "class_name": "",
+                    "maturity_days": {"min": "", "max": client["maturity_max"]},
+                    "yield": {"min": "", "max": ""},
+                }
+            ),
+        }
+    return {"headers": headers, "queryStringParameters": None}
@@ -0,0 +1,355 @@
+"""Prueba de carga de los lambdas PASS_THROUGH contra DynamoDB y SSM simulados con moto.
+
+Las tablas se llenan con items de la forma que escriben los ETL, construidos con los mismos datos
+sinteticos del benchmark de los ETL, y un hilo publica una version nueva de todos los
+componentes cada --version-interval segundos. Por cada lambda se mide:
+
+- Arranque en frio: --cold-starts procesos nuevos, cada uno importa el lambda e invoca dos veces
+  (importacion, primera invocacion y segunda invocacion, ya caliente). La importacion, que en
+  Lambda es el Init Duration, se separa en el tiempo de importar paquetes y el del codigo del
+  modulo, y se listan los paquetes que mas tardan en importarse. --cold-only mide solo esto.
+- Carga: --containers procesos atienden a --clients clientes durante --duration segundos. Cada
+  cliente vuelve a consultar cuando le indica next_update, de modo que todos llegan juntos al
+  publicarse cada version, como los fronts.
+
+Se reportan los percentiles 50, 95 y 99 de la latencia del handler, la espera de los clientes
+por un contenedor libre y el tamano del cuerpo de la respuesta. Ejemplo:
+
+    pip install -r benchmark/requirements.txt
+    python benchmark/load_test_lambdas.py --isines 20000 --folios 50000 --users 2000 \\
+        --clients 200 --containers 4 --output despues.json --baseline antes.json
+
+La latencia no incluye el arranque del runtime de Lambda ni la red de API Gateway, solo el
+trabajo del codigo del lambda contra moto
+"""
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCHMARK_DIRECTORY))
+sys.path.insert(0, BENCHMARK_DIRECTORY)
+
+import boto3  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from aws_fixtures import AWS_REGION, seed_aws  # noqa: E402
+from lambda_fixtures import ENCRYPTED_LAMBDAS, LAMBDAS, publish_version, seed_lambda_tables  # noqa: E402
+from run_benchmark import get_git_revision  # noqa: E402
+from synthetic_data import generate_dataset  # noqa: E402
+
+logger = logging.getLogger()
+
+COMPARED_METRICS = (
+    ("cold", "import_ms"),
+    ("cold", "imports_ms"),
+    ("cold", "module_ms"),
+    ("cold", "first_ms"),
+    ("warm", "p50_ms"),
+    ("warm", "p95_ms"),
+    ("warm", "p99_ms"),
+    ("warm", "wait_p95_ms"),
+    ("warm", "bytes_mean"),
+)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Prueba de carga de los lambdas PASS_THROUGH")
+    parser.add_argument("--lambdas", default=",".join(LAMBDAS), help="Lambdas separados por coma")
+    parser.add_argument("--isines", type=int, default=2000)
+    parser.add_argument("--folios", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--cold-starts", type=int, default=3)
+    parser.add_argument("--cold-only", action="store_true", help="Mide solo los arranques en frio")
+    parser.add_argument("--containers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=int, default=60, help="Segundos de carga por lambda")
+    parser.add_argument("--version-interval", type=int, default=15, help="Segundos entre versiones")
+    parser.add_argument("--min-poll", type=float, default=1.0, help="Espera minima entre consultas")
+    parser.add_argument("--max-poll", type=float, default=60.0, help="Espera maxima entre consultas")
+    parser.add_argument(
+        "--idle-poll",
+        type=float,
+        default=None,
+        help="Espera de los lambdas sin next_update; por defecto --version-interval",
+    )
+    parser.add_argument("--moto-port", type=int, default=5056)
+    parser.add_argument("--output", help="Archivo JSON donde se guardan los resultados")
+    parser.add_argument("--baseline", help="Resultados previos contra los que se compara")
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    # Percentil por rango mas cercano, sin interpolar
+    if not values:
+        return None
+    ordered_values = sorted(values)
+    return ordered_values[min(len(ordered_values) - 1, max(0, int(round(fraction * len(ordered_values))) - 1))]
+
+
+class VersionPublisher(threading.Thread):
+    """Publica una version nueva de todos los componentes cada version_interval segundos"""
+
+    def __init__(self, endpoint_url, version_interval):
+        super().__init__(daemon=True)
+        self.dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION, endpoint_url=endpoint_url)
+        self.version_interval = version_interval
+        self.version = 1
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.version_interval):
+            self.version += 1
+            publish_version(self.dynamodb, self.version, self.version_interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_container(configuration, work_directory, name, lambda_environment):
+    configuration_path = os.path.join(work_directory, f"{name}.json")
+    result_path = os.path.join(work_directory, f"{name}.result.json")
+    with open(configuration_path, "w", encoding="utf-8") as configuration_file:
+        json.dump(configuration, configuration_file)
+    container_process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIRECTORY, "run_lambda.py"), configuration_path, result_path],
+        env=dict(os.environ, **lambda_environment),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return container_process, result_path
+
+
+def wait_container(container_process, result_path):
+    _, stderr = container_process.communicate()
+    if not os.path.exists(result_path):
+        return {"failed": True, "error": stderr[-4000:]}
+    with open(result_path, encoding="utf-8") as result_file:
+        return json.load(result_file)
+
+
+def summarize_cold(cold_runs):
+    successful_runs = [run for run in cold_runs if not run.get("failed") and not run.get("error")]
+    if not successful_runs:
+        return {"failed": True, "error": (cold_runs[-1].get("error") if cold_runs else None)}
+    # Los paquetes se reportan con la mediana de su tiempo de importacion entre arranques
+    package_names = {name for run in successful_runs for name in run["init_packages"]}
+    init_packages = {
+        name: percentile([run["init_packages"].get(name, 0) for run in successful_runs], 0.5)
+        for name in package_names
+    }
+    return {
+        "import_ms": round(percentile([run["import_ms"] for run in successful_runs], 0.5), 3),
+        "imports_ms": round(percentile([run["imports_ms"] for run in successful_runs], 0.5), 3),
+        "module_ms": round(percentile([run["module_ms"] for run in successful_runs], 0.5), 3),
+        "init_packages": dict(sorted(init_packages.items(), key=lambda package: package[1], reverse=True)[:5]),
+        "first_ms": round(percentile([run["first_ms"] for run in successful_runs], 0.5), 3),
+        "second_ms": round(percentile([run["warm_ms"] for run in successful_runs], 0.5), 3),
+        "bytes": successful_runs[-1]["bytes"],
+        "max_rss_mb": max(run["max_rss_mb"] for run in successful_runs),
+        "samples": len(successful_runs),
+    }
+
+
+def summarize_load(container_results, duration):
+    failed_containers = [result for result in container_results if result.get("failed")]
+    invocations = [
+        invocation for result in container_results for invocation in result.get("invocations", [])
+    ]
+    if not invocations:
+        return {"failed": True, "error": failed_containers[0]["error"] if failed_containers else None}
+    # La primera invocacion de cada contenedor es en frio y se excluye de la latencia caliente
+    warm_invocations = [
+        invocation
+        for result in container_results
+        for invocation in result.get("invocations", [])[1:]
+    ] or invocations
+    latencies = [invocation["latency_ms"] for invocation in warm_invocations]
+    waits = [invocation["wait_ms"] for invocation in invocations]
+    payload_sizes = [invocation["bytes"] for invocation in invocations]
+    statuses = {}
+    for invocation in invocations:
+        statuses[invocation["status"]] = statuses.get(invocation["status"], 0) + 1
+    return {
+        "requests": len(invocations),
+        "requests_per_second": round(len(invocations) / duration, 2),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": max(latencies),
+        "wait_p50_ms": percentile(waits, 0.5),
+        "wait_p95_ms": percentile(waits, 0.95),
+        "bytes_mean": round(sum(payload_sizes) / len(payload_sizes)),
+        "bytes_max": max(payload_sizes),
+        "statuses": statuses,
+        "errors": sorted({invocation["error"] for invocation in invocations if invocation["error"]})[:10],
+        "failed_containers": len(failed_containers),
+        "max_rss_mb": max(result.get("max_rss_mb", 0) for result in container_results),
+    }
+
+
+def test_lambda(lambda_name, arguments, seeded, work_directory):
+    """Arranques en frio y carga concurrente de un lambda"""
+    lambda_environment = dict(seeded["environment"], AWS_LAMBDA_FUNCTION_NAME=f"bench-{lambda_name}")
+    base_configuration = {
+        "repo_root": REPO_ROOT,
+        "lambda_name": lambda_name,
+        "lambda_directory": LAMBDAS[lambda_name],
+        "fixture": seeded["fixture"],
+        "seed": arguments.seed,
+    }
+    cold_runs = []
+    for cold_start in range(arguments.cold_starts):
+        container_process, result_path = start_container(
+            dict(base_configuration, mode="cold", client_numbers=[cold_start]),
+            work_directory,
+            f"{lambda_name}-frio-{cold_start}",
+            dict(lambda_environment, PYTHONPROFILEIMPORTTIME="1"),
+        )
+        cold_runs.append(wait_container(container_process, result_path))
+    if arguments.cold_only:
+        return {"cold": summarize_cold(cold_runs)}
+
+    # Los contenedores importan el lambda antes de start_time para arrancar todos juntos
+    start_time = time.time() + 5
+    containers = []
+    for container_number in range(arguments.containers):
+        client_numbers = list(range(container_number, arguments.clients, arguments.containers))
+        if not client_numbers:
+            continue
+        containers.append(
+            start_container(
+                dict(
+                    base_configuration,
+                    mode="load",
+                    client_numbers=client_numbers,
+                    start_time=start_time,
+                    end_time=start_time + arguments.duration,
+                    spread=min(arguments.version_interval, arguments.duration),
+                    min_poll=arguments.min_poll,
+                    max_poll=arguments.max_poll,
+                    idle_poll=arguments.idle_poll or arguments.version_interval,
+                ),
+                work_directory,
+                f"{lambda_name}-carga-{container_number}",
+                lambda_environment,
+            )
+        )
+    container_results = [wait_container(*container) for container in containers]
+    return {
+        "cold": summarize_cold(cold_runs),
+        "warm": summarize_load(container_results, arguments.duration),
+    }
+
+
+def print_comparison(results, baseline):
+    print(f"{'lambda':32} {'medida':18} {'base':>10} {'actual':>10} {'cambio':>8}")
+    for lambda_name, lambda_result in results["lambdas"].items():
+        if lambda_result.get("skipped"):
+            print(f"{lambda_name:32} OMITIDO: {lambda_result['skipped']}")
+            continue
+        baseline_lambda = baseline.get("lambdas", {}).get(lambda_name, {}) if baseline else {}
+        for phase, metric in COMPARED_METRICS:
+            if phase not in lambda_result:
+                continue
+            if lambda_result[phase].get("failed"):
+                print(f"{lambda_name:32} {phase:18} FALLO")
+                break
+            value = lambda_result[phase].get(metric)
+            baseline_value = baseline_lambda.get(phase, {}).get(metric)
+            change = (
+                f"{(value - baseline_value) / baseline_value * 100:+.1f}%"
+                if baseline_value and value is not None
+                else ""
+            )
+            baseline_text = f"{baseline_value:.1f}" if baseline_value is not None else "-"
+            print(f"{lambda_name:32} {phase + ' ' + metric:18} {baseline_text:>10} {value:>10.1f} {change:>8}")
+        init_packages = lambda_result["cold"].get("init_packages")
+        if init_packages:
+            print(f"{lambda_name:32} paquetes: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in init_packages.items()))
+        warm_result = lambda_result.get("warm", {})
+        if not warm_result.get("failed") and warm_result.get("errors"):
+            print(f"{lambda_name:32} errores: {warm_result['errors']}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    arguments = parse_arguments()
+    lambda_names = [lambda_name.strip() for lambda_name in arguments.lambdas.split(",") if lambda_name.strip()]
+    unknown_lambdas = set(lambda_names) - set(LAMBDAS)
+    if unknown_lambdas:
+        raise SystemExit("Lambdas desconocidos: " + ", ".join(sorted(unknown_lambdas)))
+
+    valuation_date = dt.datetime.now(tz=ZoneInfo("America/Bogota")).date()
+    dataset = generate_dataset(valuation_date, arguments.isines, arguments.folios, arguments.users, arguments.seed)
+
+    moto_server = ThreadedMotoServer(ip_address="127.0.0.1", port=arguments.moto_port)
+    moto_server.start()
+    endpoint_url = f"http://127.0.0.1:{arguments.moto_port}"
+    # Los lambdas y dynamo_encryption_utils crean sus clientes con las variables de entorno
+    os.environ.update(
+        {
+            "AWS_ENDPOINT_URL": endpoint_url,
+            "AWS_DEFAULT_REGION": AWS_REGION,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+        }
+    )
+    results = {
+        "revision": get_git_revision(),
+        "valuation_date": valuation_date.strftime("%Y-%m-%d"),
+        "scale": {"isines": arguments.isines, "folios": arguments.folios, "users": arguments.users, "seed": arguments.seed},
+        "load": {
+            "containers": arguments.containers,
+            "clients": arguments.clients,
+            "duration": arguments.duration,
+            "version_interval": arguments.version_interval,
+        },
+        "lambdas": {},
+    }
+    version_publisher = None
+    try:
+        seed_aws(endpoint_url, dataset, {})
+        seeded = seed_lambda_tables(
+            endpoint_url, REPO_ROOT, dataset, valuation_date, arguments.version_interval, arguments.seed
+        )
+        version_publisher = VersionPublisher(endpoint_url, arguments.version_interval)
+        version_publisher.start()
+        with tempfile.TemporaryDirectory() as work_directory:
+            for lambda_name in lambda_names:
+                if lambda_name in ENCRYPTED_LAMBDAS and not seeded["fixture"]["encrypted_portfolios"]:
+                    results["lambdas"][lambda_name] = {"skipped": "dynamodb-encryption-sdk no instalado"}
+                    continue
+                results["lambdas"][lambda_name] = test_lambda(lambda_name, arguments, seeded, work_directory)
+                lambda_result = results["lambdas"][lambda_name]
+                logger.info(
+                    f"{lambda_name}: arranque {lambda_result['cold'].get('import_ms', 'FALLO')} ms, "
+                    f"p95 {lambda_result.get('warm', {}).get('p95_ms', '-')} ms."
+                )
+    finally:
+        if version_publisher is not None:
+            version_publisher.stop()
+        moto_server.stop()
+
+    baseline = None
+    if arguments.baseline and os.path.exists(arguments.baseline):
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    print_comparison(results, baseline)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
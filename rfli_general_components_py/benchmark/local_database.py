@@ -0,0 +1,112 @@
+import logging
+
+import pymysql
+
+logger = logging.getLogger()
+
+INSERT_CHUNK_ROWS = 5000
+
+# Solo las columnas que consultan los ETL, con los indices por fecha que tiene el origen
+TABLE_DEFINITIONS = {
+    "precia_published.pub_rfl_prices": """
+        valuation_date DATE, isin_code VARCHAR(12), instrument VARCHAR(20),
+        yield DECIMAL(20,6), equivalent_margin DECIMAL(20,6), margin_value DECIMAL(20,6),
+        spread DECIMAL(20,6), mean_price DECIMAL(20,6), clean_price DECIMAL(20,6),
+        accrued_interest DECIMAL(20,6), convexity DECIMAL(20,6), duration DECIMAL(20,6),
+        modified_duration DECIMAL(20,6), rate_type VARCHAR(5), currency_type VARCHAR(5),
+        real_rating VARCHAR(20), payment_frequency VARCHAR(5), issue_date DATE,
+        maturity_date DATE, maturity_days INT, category_id INT,
+        category_volume DECIMAL(24,2), promedio_valor DECIMAL(24,2),
+        KEY idx_valuation_date (valuation_date, isin_code)""",
+    "precia_published.pub_rfl_betas": """
+        curve_date DATE, cc_curve VARCHAR(10), beta_0 DECIMAL(20,6), beta_1 DECIMAL(20,6),
+        beta_2 DECIMAL(20,6), tao_1 DECIMAL(20,6), KEY idx_curve_date (curve_date)""",
+    "precia_published.pub_rfl_yield": """
+        rate_date DATE, cc_curve VARCHAR(10), term INT, rate DECIMAL(20,6),
+        KEY idx_rate_date (rate_date, cc_curve, term)""",
+    "precia_process.prc_rfl_operations": """
+        operation_date DATE, folio INT, instrument VARCHAR(20), num_control INT,
+        yield DECIMAL(20,6), amount DECIMAL(24,2), volume DECIMAL(24,2), category_id INT,
+        timestamp_operation DATETIME, maturity_date DATE, maturity_days INT, issue_date DATE,
+        sesion VARCHAR(2), trading_system VARCHAR(10),
+        KEY idx_operation_date (operation_date, instrument)""",
+    "precia_process.prc_rfl_basket_tes": """
+        operation_date DATE, instrument VARCHAR(20), cc_curve VARCHAR(10),
+        KEY idx_operation_date (operation_date)""",
+    "precia_process.prc_rfl_corporative_basket": """
+        operation_date DATE, instrument VARCHAR(20), cc_curve VARCHAR(10),
+        KEY idx_operation_date (operation_date)""",
+    "precia_process.prc_rfl_get_category": """
+        category_date DATE, isin_code VARCHAR(12), instrument VARCHAR(20),
+        margin_origin VARCHAR(5), margin_type VARCHAR(2), issuer VARCHAR(10),
+        cc_curve VARCHAR(10), KEY idx_category_date (category_date)""",
+    "precia_process.prc_rfl_category_margin": """
+        margin_date DATE, category_id INT, margin_type VARCHAR(2),
+        KEY idx_margin_date (margin_date)""",
+    "precia_sources.src_rfl_category": """
+        category_id INT PRIMARY KEY, class VARCHAR(3), rating_group VARCHAR(5),
+        maturity_range INT, currency_group INT, rate_group INT""",
+    "precia_sources.src_rfl_issuer": "issuer VARCHAR(10) PRIMARY KEY, name VARCHAR(100)",
+    "precia_sources.src_rfl_instrument": """
+        isin_code VARCHAR(12), instrument VARCHAR(20), issuer VARCHAR(10),
+        cc_curve VARCHAR(10), KEY idx_isin_code (isin_code)""",
+    "precia_sources.src_rfl_parameters": """
+        parameter_name VARCHAR(50) PRIMARY KEY, parameter_value VARCHAR(50)""",
+    "precia_sources.src_rfl_expiration_range": """
+        id_expiration_range INT PRIMARY KEY, start_range INT, end_range INT""",
+    "precia_sources.src_rfl_settdaysco": "business_date DATE PRIMARY KEY",
+}
+
+
+def load_dataset(credentials, tables):
+    """Crea los esquemas precia_* en el MySQL local y carga las tablas sinteticas.
+    Las tablas se recrean en cada carga para que cada escenario parta del mismo estado
+    Parameters:
+    -----------
+    credentials: dict, required
+        host, port, username y password del servidor MySQL local
+    tables: dict, required
+        Filas de cada tabla por 'esquema.tabla', como las retorna generate_dataset
+    """
+    connection = pymysql.connect(
+        host=credentials["host"],
+        port=int(credentials["port"]),
+        user=credentials["username"],
+        password=credentials["password"],
+        autocommit=True,
+    )
+    try:
+        with connection.cursor() as cursor_connection:
+            try:
+                # Varias consultas del origen agrupan sin agregar todas las columnas
+                cursor_connection.execute("SET GLOBAL sql_mode = ''")
+            except pymysql.err.MySQLError as sql_mode_error:
+                logger.warning(
+                    "No se pudo desactivar ONLY_FULL_GROUP_BY en el servidor local: "
+                    + str(sql_mode_error)
+                )
+            for schema_name in sorted({name.split(".")[0] for name in TABLE_DEFINITIONS}):
+                cursor_connection.execute(f"CREATE DATABASE IF NOT EXISTS {schema_name}")
+            for table_name, table_definition in TABLE_DEFINITIONS.items():
+                cursor_connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+                cursor_connection.execute(f"CREATE TABLE {table_name} ({table_definition})")
+                rows = tables.get(table_name, [])
+                if not rows:
+                    continue
+                column_names = list(rows[0].keys())
+                insert_query = "INSERT INTO {} ({}) VALUES ({})".format(
+                    table_name,
+                    ", ".join(f"`{column_name}`" for column_name in column_names),
+                    ", ".join(["%s"] * len(column_names)),
+                )
+                for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+                    cursor_connection.executemany(
+                        insert_query,
+                        [
+                            tuple(row[column_name] for column_name in column_names)
+                            for row in rows[start : start + INSERT_CHUNK_ROWS]
+                        ],
+                    )
+                logger.info(f"Tabla {table_name}: {len(rows)} filas cargadas.")
+    finally:
+        connection.close()
@@ -0,0 +1,254 @@
+"""Benchmark de punta a punta de los ETL de Glue con datos de mercado sinteticos.
+
+Cada job se ejecuta contra un MySQL local con las tablas precia_* generadas y contra
+DynamoDB, SSM y Secrets Manager simulados con moto, y se mide el tiempo propio de cada etapa
+(probe, extract, transform, load, version). Ejemplo:
+
+    docker run -d --name rfli-bench-db -e MYSQL_ROOT_PASSWORD=bench -p 3306:3306 mysql:8.0
+    pip install -r benchmark/requirements.txt
+    python benchmark/run_benchmark.py --isines 20000 --folios 50000 --users 500 \\
+        --output resultados.json --baseline linea_base.json
+
+Los modos opcionales se comparan pasando sus argumentos, por ejemplo
+--job-argument STREAMING_EXTRACTION=true
+"""
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from zoneinfo import ZoneInfo
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCHMARK_DIRECTORY))
+sys.path.insert(0, BENCHMARK_DIRECTORY)
+
+import boto3  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from aws_fixtures import AWS_REGION, TABLE_KEYS, seed_aws  # noqa: E402
+from local_database import load_dataset  # noqa: E402
+from synthetic_data import generate_dataset  # noqa: E402
+
+logger = logging.getLogger()
+
+JOBS = {
+    "isin-track-intra": ("rfli_component_1_track_isin_py/ETL/glue-rfli-etl-isin-track-intra.py", "IntradayIsinTrack"),
+    "isin-track-eod": ("rfli_component_1_track_isin_py/ETL/glue-rfli-etl-isin-track-eod.py", "EodIsinTrack"),
+    "isin-track-init": ("rfli_component_1_track_isin_py/ETL/glue-rfli-init-isin-track.py", "InitIsinTrack"),
+    "curve-compare-intra": ("rfli_component_2_curve_compare_py/ETL/glue-rfli-curve-compare-curves-intra.py", "IntradayCompareCurves"),
+    "curve-compare-eod": ("rfli_component_2_curve_compare_py/ETL/glue-rfli-curve-compare-curves-eod.py", "IntradayCompareCurves"),
+    "curve-compare-historical": ("rfli_component_2_curve_compare_py/ETL/glue-rfli-curve-compare-load-historical.py", "IntradayCompareCurves"),
+    "init-data-version": ("rfli_component_2_curve_compare_py/ETL/glue-rfli-init-data-version.py", "InitDataVersion"),
+    "portfolio-track-intra": ("rfli_component_3_portfolio_track_py/ETL/glue-rfli-etl-portfolio-track-intra.py", "IntradayFolios"),
+    "portfolio-track-eod": ("rfli_component_3_portfolio_track_py/ETL/glue-rfli-etl-portfolio-track-eod.py", "IntradayFolios"),
+    "portfolio-track-init": ("rfli_component_3_portfolio_track_py/ETL/glue-rfli-init-portfolio-track.py", "IntradayInitPortfolio"),
+    "top-delta-category-intra": ("rfli_component_5_top_delta_category_py/ETL/glue-rfli-etl-top-delta-category-intra.py", "IntradayTopDeltaCategory"),
+    "top-delta-category-eod": ("rfli_component_5_top_delta_category_py/ETL/glue-rfli-etl-top-delta-category-eod.py", "IntradayTopDeltaCategory"),
+    "slider-intra": ("rfli_component_slider_py/ETL/glue-rfli-etl-slider-intra.py", "IntradaySlider"),
+    "slider-eod": ("rfli_component_slider_py/ETL/glue-rfli-etl-slider-eod.py", "EodSlider"),
+    "isin-search-intra": ("rfli_search_component_py/code/ETL/glue-rfli-etl-isin-search-intra.py", "LookUp"),
+    "isin-search-eod": ("rfli_search_component_py/code/ETL/glue-rfli-etl-isin-search-eod.py", "LookUp"),
+    "isin-search-init": ("rfli_search_component_py/code/ETL/glue-rfli-init-isin-search.py", "InitIsinTrack"),
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark de los ETL de Glue con datos sinteticos")
+    parser.add_argument("--jobs", default=",".join(JOBS), help="Jobs separados por coma")
+    parser.add_argument("--isines", type=int, default=2000)
+    parser.add_argument("--folios", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--db-host", default="127.0.0.1")
+    parser.add_argument("--db-port", default="3306")
+    parser.add_argument("--db-user", default="root")
+    parser.add_argument("--db-password", default="bench")
+    parser.add_argument("--moto-port", type=int, default=5055)
+    parser.add_argument(
+        "--job-argument",
+        action="append",
+        default=[],
+        help="Argumento adicional para todos los jobs, en formato NOMBRE=valor",
+    )
+    parser.add_argument("--output", help="Archivo JSON donde se guardan los resultados")
+    parser.add_argument("--baseline", help="Resultados previos contra los que se compara")
+    return parser.parse_args()
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def count_table_items(endpoint_url):
+    dynamodb_client = boto3.client("dynamodb", region_name=AWS_REGION, endpoint_url=endpoint_url)
+    return {
+        table_name: dynamodb_client.scan(TableName=table_name, Select="COUNT")["Count"]
+        for table_name in TABLE_KEYS
+    }
+
+
+def run_job_process(job_name, job_arguments, endpoint_url, work_directory):
+    job_path, class_name = JOBS[job_name]
+    configuration_path = os.path.join(work_directory, f"{job_name}.json")
+    result_path = os.path.join(work_directory, f"{job_name}.result.json")
+    with open(configuration_path, "w", encoding="utf-8") as configuration_file:
+        json.dump(
+            {
+                "repo_root": REPO_ROOT,
+                "job_path": job_path,
+                "class_name": class_name,
+                "job_arguments": job_arguments,
+            },
+            configuration_file,
+        )
+    job_environment = dict(
+        os.environ,
+        AWS_ENDPOINT_URL=endpoint_url,
+        AWS_DEFAULT_REGION=AWS_REGION,
+        AWS_ACCESS_KEY_ID="benchmark",
+        AWS_SECRET_ACCESS_KEY="benchmark",
+    )
+    completed_process = subprocess.run(
+        [sys.executable, os.path.join(BENCHMARK_DIRECTORY, "run_job.py"), configuration_path, result_path],
+        env=job_environment,
+        capture_output=True,
+        text=True,
+    )
+    if completed_process.returncode != 0:
+        return {"failed": True, "stderr": completed_process.stderr[-4000:]}
+    with open(result_path, encoding="utf-8") as result_file:
+        return json.load(result_file)
+
+
+def summarize_runs(runs):
+    """Mediana del tiempo total y de cada etapa entre las repeticiones exitosas"""
+    successful_runs = [run for run in runs if not run.get("failed")]
+    if not successful_runs:
+        return {"failed": True, "stderr": runs[-1].get("stderr")}
+    stage_names = sorted({stage for run in successful_runs for stage in run["stages"]})
+    return {
+        "total_seconds": round(statistics.median(run["total_seconds"] for run in successful_runs), 4),
+        "stages": {
+            stage: round(
+                statistics.median(run["stages"].get(stage, {"seconds": 0.0})["seconds"] for run in successful_runs),
+                4,
+            )
+            for stage in stage_names
+        },
+        "max_rss_mb": max(run["max_rss_mb"] for run in successful_runs),
+        "errors": sorted({message for run in successful_runs for message in run["errors"]})[:20],
+        "items_written": successful_runs[-1].get("items_written", {}),
+        "repetitions": len(successful_runs),
+    }
+
+
+def print_comparison(results, baseline):
+    print(f"{'job':28} {'etapa':10} {'base (s)':>10} {'actual (s)':>11} {'cambio':>8}")
+    for job_name, job_result in results["jobs"].items():
+        if job_result.get("failed"):
+            print(f"{job_name:28} FALLO")
+            continue
+        baseline_job = baseline.get("jobs", {}).get(job_name, {}) if baseline else {}
+        rows = [("total", job_result["total_seconds"], baseline_job.get("total_seconds"))]
+        rows += [
+            (stage, seconds, baseline_job.get("stages", {}).get(stage))
+            for stage, seconds in job_result["stages"].items()
+        ]
+        for stage, seconds, baseline_seconds in rows:
+            change = (
+                f"{(seconds - baseline_seconds) / baseline_seconds * 100:+.1f}%"
+                if baseline_seconds
+                else ""
+            )
+            baseline_text = f"{baseline_seconds:.3f}" if baseline_seconds is not None else "-"
+            print(f"{job_name:28} {stage:10} {baseline_text:>10} {seconds:>11.3f} {change:>8}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    arguments = parse_arguments()
+    job_names = [job_name.strip() for job_name in arguments.jobs.split(",") if job_name.strip()]
+    unknown_jobs = set(job_names) - set(JOBS)
+    if unknown_jobs:
+        raise SystemExit("Jobs desconocidos: " + ", ".join(sorted(unknown_jobs)))
+
+    # Los jobs intradia toman la fecha de valoracion de la hora actual de Bogota
+    valuation_date = dt.datetime.now(tz=ZoneInfo("America/Bogota")).date()
+    dataset = generate_dataset(valuation_date, arguments.isines, arguments.folios, arguments.users, arguments.seed)
+    db_credentials = {
+        "host": arguments.db_host,
+        "port": arguments.db_port,
+        "username": arguments.db_user,
+        "password": arguments.db_password,
+    }
+    load_dataset(db_credentials, dataset["tables"])
+
+    moto_server = ThreadedMotoServer(ip_address="127.0.0.1", port=arguments.moto_port)
+    moto_server.start()
+    endpoint_url = f"http://127.0.0.1:{arguments.moto_port}"
+    results = {
+        "revision": get_git_revision(),
+        "valuation_date": valuation_date.strftime("%Y-%m-%d"),
+        "scale": {"isines": arguments.isines, "folios": arguments.folios, "users": arguments.users, "seed": arguments.seed},
+        "job_arguments": arguments.job_argument,
+        "jobs": {},
+    }
+    try:
+        for job_name in job_names:
+            runs = []
+            for repetition in range(arguments.repetitions):
+                # Cada repeticion parte de tablas vacias y de una ruta de fotos nueva, para que
+                # los caches entre ciclos (fotos, hashes de contenido) no favorezcan a la siguiente
+                with tempfile.TemporaryDirectory() as work_directory:
+                    job_arguments = seed_aws(endpoint_url, dataset, db_credentials)
+                    job_arguments.update(
+                        {
+                            "VALUATION_DATE": results["valuation_date"],
+                            "START_DATE": results["valuation_date"],
+                            "END_DATE": results["valuation_date"],
+                            "QUERY_TIMEOUT": "120",
+                            "SNAPSHOT_LOCATION": os.path.join(work_directory, "snapshots"),
+                            "INCLUDED_CATEGORY_CLASSES": "1,2,3",
+                            "EMPTY_ALL_ISINES": "YES",
+                            "CHANGE_PROBE": "false",
+                        }
+                    )
+                    for job_argument in arguments.job_argument:
+                        argument_name, _, argument_value = job_argument.partition("=")
+                        job_arguments[argument_name] = argument_value
+                    run = run_job_process(job_name, job_arguments, endpoint_url, work_directory)
+                    if not run.get("failed"):
+                        run["items_written"] = count_table_items(endpoint_url)
+                    runs.append(run)
+                    logger.info(f"{job_name} repeticion {repetition + 1}: {run.get('total_seconds', 'FALLO')}")
+            results["jobs"][job_name] = summarize_runs(runs)
+    finally:
+        moto_server.stop()
+
+    baseline = None
+    if arguments.baseline and os.path.exists(arguments.baseline):
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    print_comparison(results, baseline)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
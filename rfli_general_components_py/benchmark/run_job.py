@@ -0,0 +1,90 @@
+"""Ejecuta un solo job de Glue instrumentado. Lo lanza run_benchmark en un proceso nuevo por
+corrida, para que los caches a nivel de modulo (conexiones, secretos, parametros) no pasen de
+un job a otro:
+
+    python run_job.py <configuracion.json> <resultado.json>
+"""
+import glob
+import importlib.util
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIRECTORY)
+
+from glue_shim import install_glue_shim  # noqa: E402
+from stage_timer import StageTimer  # noqa: E402
+
+
+class ErrorCounter(logging.Handler):
+    """Cuenta los logs de error: los jobs capturan sus excepciones y solo las registran"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def run_job(repo_root, job_path, class_name, job_arguments):
+    """Importa el script del job, instrumenta sus etapas y ejecuta un ciclo de run()
+    Parameters:
+    -----------
+    repo_root: str, required
+        Raiz del repositorio
+    job_path: str, required
+        Ruta del script del job relativa a la raiz
+    class_name: str, required
+        Clase del job que expone run()
+    job_arguments: dict, required
+        Argumentos del job sin el prefijo '--'
+
+    Returns:
+    --------
+    dict
+        Segundos totales y por etapa, errores registrados y memoria maxima del proceso
+    """
+    install_glue_shim(job_arguments, os.path.basename(job_path))
+    sys.path.insert(0, os.path.join(repo_root, "rfli_general_components_py", "rfli_utils"))
+    sys.path.extend(glob.glob(os.path.join(repo_root, "*", "ETL", "librerias-glue", "*.whl"))[:1])
+    spec = importlib.util.spec_from_file_location("glue_job", os.path.join(repo_root, job_path))
+    job_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(job_module)
+    error_counter = ErrorCounter()
+    logging.getLogger().addHandler(error_counter)
+
+    stage_timer = StageTimer()
+    job_class = getattr(job_module, class_name)
+    stage_timer.instrument(job_module, job_class)
+    start_time = time.perf_counter()
+    job_class().run()
+    total_seconds = time.perf_counter() - start_time
+    stages = stage_timer.get_stages()
+    stages["other"] = {
+        "seconds": round(total_seconds - sum(stage["seconds"] for stage in stages.values()), 4),
+        "calls": 1,
+    }
+    return {
+        "total_seconds": round(total_seconds, 4),
+        "stages": stages,
+        "errors": error_counter.messages,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], encoding="utf-8") as configuration_file:
+        configuration = json.load(configuration_file)
+    result = run_job(
+        configuration["repo_root"],
+        configuration["job_path"],
+        configuration["class_name"],
+        configuration["job_arguments"],
+    )
+    with open(sys.argv[2], "w", encoding="utf-8") as result_file:
+        json.dump(result, result_file)
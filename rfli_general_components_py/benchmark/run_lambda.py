@@ -0,0 +1,239 @@
+"""Simula un contenedor de un lambda PASS_THROUGH. Lo lanza load_test_lambdas en un proceso
+nuevo por contenedor, de modo que la importacion del modulo y la primera invocacion miden un
+arranque en frio, y las siguientes invocaciones el contenedor caliente:
+
+    python run_lambda.py <configuracion.json> <resultado.json>
+
+En el arranque en frio el proceso corre con PYTHONPROFILEIMPORTTIME=1 y la traza de
+importaciones del lambda separa su arranque en el tiempo de importar cada paquete y el del codigo
+del modulo (clientes de boto3, lecturas de configuracion). lambda_fixtures, que importa boto3, se
+importa despues del lambda para que boto3 cuente en el arranque del lambda como en Lambda
+
+Igual que en Lambda, el contenedor atiende una invocacion a la vez. Cada cliente simulado vuelve
+a consultar cuando le indica next_update de la respuesta anterior, de modo que al publicarse una
+version todos los clientes llegan juntos
+"""
+import heapq
+import importlib.util
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import traceback
+import uuid
+from collections import defaultdict
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIRECTORY)
+
+# next_update mayor a este valor es una fecha epoch (isin-search) y no segundos de espera
+EPOCH_THRESHOLD = 10**9
+IMPORT_TIME_PREFIX = "import time:"
+INIT_PACKAGES = 10
+
+
+class LambdaContext:
+    """Contexto minimo que reciben los handlers"""
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 512
+        self.deadline = time.time() + 30
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.time()) * 1000)
+
+
+def load_handler(repo_root, lambda_directory):
+    # La carpeta del lambda va primero en sys.path, como en el paquete desplegado
+    # (dynamo_encryption_utils en los lambdas de portafolios), y despues rfli_lambda_utils, que
+    # en Lambda llega en la capa
+    lambda_path = os.path.join(repo_root, lambda_directory)
+    sys.path.insert(0, os.path.join(repo_root, "rfli_general_components_py", "rfli_lambda_utils"))
+    sys.path.insert(0, lambda_path)
+    spec = importlib.util.spec_from_file_location(
+        "lambda_function", os.path.join(lambda_path, "lambda_function.py")
+    )
+    lambda_module = importlib.util.module_from_spec(spec)
+    sys.modules["lambda_function"] = lambda_module
+    spec.loader.exec_module(lambda_module)
+    return lambda_module.lambda_handler
+
+
+def parse_import_trace(import_trace):
+    """Suma el tiempo propio de importacion por paquete de primer nivel de las lineas de
+    -X importtime ("import time: propio | acumulado | modulo", en microsegundos)"""
+    package_times = defaultdict(int)
+    for trace_line in import_trace.splitlines():
+        if not trace_line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        trace_fields = trace_line[len(IMPORT_TIME_PREFIX):].split("|")
+        # La primera linea es el encabezado de las columnas
+        if len(trace_fields) != 3 or not trace_fields[0].strip().isdigit():
+            continue
+        package_name = trace_fields[2].strip().split(".")[0]
+        package_times[package_name] += int(trace_fields[0])
+    top_packages = sorted(package_times.items(), key=lambda package: package[1], reverse=True)
+    return {
+        "imports_ms": round(sum(package_times.values()) / 1000, 3),
+        "packages": {name: round(self_us / 1000, 3) for name, self_us in top_packages[:INIT_PACKAGES]},
+    }
+
+
+def load_handler_profiled(handler_loader):
+    """Carga el lambda y mide su arranque. La traza de importaciones sale por el descriptor 2,
+    que se redirige a un archivo temporal solo mientras se importa el lambda"""
+    with tempfile.TemporaryFile() as trace_file:
+        sys.stderr.flush()
+        stderr_descriptor = os.dup(2)
+        os.dup2(trace_file.fileno(), 2)
+        import_start = time.perf_counter()
+        try:
+            handler = handler_loader()
+        finally:
+            import_ms = (time.perf_counter() - import_start) * 1000
+            sys.stderr.flush()
+            os.dup2(stderr_descriptor, 2)
+            os.close(stderr_descriptor)
+        trace_file.seek(0)
+        import_profile = parse_import_trace(trace_file.read().decode("utf-8", errors="replace"))
+    return handler, {
+        "import_ms": round(import_ms, 3),
+        "imports_ms": import_profile["imports_ms"],
+        "module_ms": round(max(import_ms - import_profile["imports_ms"], 0), 3),
+        "init_packages": import_profile["packages"],
+    }
+
+
+def get_response_body(response):
+    body = response.get("body") if isinstance(response, dict) else None
+    if body is None:
+        return "", None
+    if not isinstance(body, str):
+        body = json.dumps(body, default=str)
+    try:
+        return body, json.loads(body)
+    except ValueError:
+        return body, None
+
+
+def invoke(handler, lambda_name, client):
+    """Invoca el handler con el evento del cliente y mide la latencia y el tamano del cuerpo"""
+    from lambda_fixtures import build_event
+
+    event = build_event(lambda_name, client)
+    start_time = time.perf_counter()
+    try:
+        response = handler(event, LambdaContext(lambda_name))
+        error = None
+    except Exception as invoke_exception:
+        response = None
+        error = f"{invoke_exception.__class__.__name__}: {invoke_exception}"
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    body, payload = get_response_body(response)
+    return {
+        "latency_ms": round(latency_ms, 3),
+        "bytes": len(body.encode("utf-8")),
+        "status": "error" if error else str(response.get("statusCode", 200)),
+        "error": error,
+        "payload": payload,
+    }
+
+
+def get_next_poll(payload, configuration):
+    """Segundos hasta la siguiente consulta del cliente segun next_update, entre min_poll y
+    max_poll. Sin next_update el cliente consulta cada idle_poll segundos"""
+    next_update = payload.get("next_update") if isinstance(payload, dict) else None
+    if next_update is None:
+        wait_seconds = configuration["idle_poll"]
+    else:
+        wait_seconds = float(next_update)
+        if wait_seconds > EPOCH_THRESHOLD:
+            wait_seconds -= time.time()
+    return min(max(wait_seconds, configuration["min_poll"]), configuration["max_poll"])
+
+
+def run_cold(handler_loader, lambda_name, build_clients):
+    handler, init_profile = load_handler_profiled(handler_loader)
+    client = build_clients()[0]
+    first_invocation = invoke(handler, lambda_name, client)
+    second_invocation = invoke(handler, lambda_name, client)
+    return {
+        **init_profile,
+        "first_ms": first_invocation["latency_ms"],
+        "warm_ms": second_invocation["latency_ms"],
+        "bytes": first_invocation["bytes"],
+        "status": first_invocation["status"],
+        "error": first_invocation["error"],
+    }
+
+
+def run_load(handler_loader, lambda_name, clients, configuration):
+    """Atiende en orden de llegada las consultas de los clientes del contenedor hasta end_time.
+    La espera es el tiempo entre la hora en que el cliente quiso consultar y la hora en que el
+    contenedor lo atendio"""
+    handler = handler_loader()
+    # Los clientes arrancan repartidos en spread segundos, en un orden fijo por cliente
+    schedule = [
+        (
+            configuration["start_time"]
+            + (client["client_number"] * 7919 % 1000) / 1000 * configuration["spread"],
+            position,
+        )
+        for position, client in enumerate(clients)
+    ]
+    heapq.heapify(schedule)
+    invocations = []
+    while schedule:
+        due_time, position = heapq.heappop(schedule)
+        if due_time >= configuration["end_time"]:
+            break
+        wait_seconds = due_time - time.time()
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        start_time = time.time()
+        client = clients[position]
+        invocation = invoke(handler, lambda_name, client)
+        payload = invocation.pop("payload")
+        if isinstance(payload, dict) and payload.get("version") is not None:
+            client["version"] = payload["version"]
+        invocation["wait_ms"] = round((start_time - due_time) * 1000, 3)
+        invocation["at"] = round(start_time - configuration["start_time"], 3)
+        invocations.append(invocation)
+        heapq.heappush(schedule, (time.time() + get_next_poll(payload, configuration), position))
+    return {"invocations": invocations}
+
+
+def main():
+    with open(sys.argv[1], encoding="utf-8") as configuration_file:
+        configuration = json.load(configuration_file)
+    lambda_name = configuration["lambda_name"]
+
+    def build_clients():
+        from lambda_fixtures import new_client
+
+        return [
+            new_client(client_number, configuration["fixture"], configuration["seed"])
+            for client_number in configuration["client_numbers"]
+        ]
+
+    def handler_loader():
+        return load_handler(configuration["repo_root"], configuration["lambda_directory"])
+
+    try:
+        if configuration["mode"] == "cold":
+            result = run_cold(handler_loader, lambda_name, build_clients)
+        else:
+            result = run_load(handler_loader, lambda_name, build_clients(), configuration)
+    except Exception:
+        result = {"failed": True, "error": traceback.format_exc()[-4000:]}
+    result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(sys.argv[2], "w", encoding="utf-8") as result_file:
+        json.dump(result, result_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import functools
+import threading
+import time
+
+# Etapa de cada metodo de los jobs. Los metodos que no aparecen aqui se cuentan en la
+# etapa del metodo que los llama
+STAGE_METHODS = {
+    "extract": (
+        "get_origin_data",
+        "stream_origin_data",
+        "get_historical_data",
+        "read_all_user_params",
+        "get_yesterday_inactive_isnes",
+    ),
+    "transform": (
+        "transform_isines_folios_data",
+        "transform_isines_result",
+        "transform_curves_folios_data",
+        "transform_data",
+        "transform_user_isines",
+        "merge_all_isines_data",
+        "make_dictionary",
+        "make_user_dictionary",
+    ),
+    "load": ("save_data_into_dynamo", "insert_dynamodb_data", "empty_table_data"),
+    "version": ("update_last_version_info", "reset_versions"),
+}
+STAGE_FUNCTIONS = {"probe": ("run_change_probe",)}
+
+
+class StageTimer:
+    """Acumula el tiempo propio de cada etapa (sin el tiempo de las etapas anidadas, por
+    ejemplo un transform llamado desde get_origin_data) y el numero de llamadas"""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.local = threading.local()
+
+    def wrap(self, stage, function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            stack = getattr(self.local, "stack", None)
+            if stack is None:
+                stack = self.local.stack = []
+            stack.append(0.0)
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed_seconds = time.perf_counter() - start_time
+                nested_seconds = stack.pop()
+                if stack:
+                    stack[-1] += elapsed_seconds
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed_seconds - nested_seconds
+                self.calls[stage] = self.calls.get(stage, 0) + 1
+
+        return timed_function
+
+    def instrument(self, job_module, job_class):
+        """Envuelve los metodos de la clase del job y las funciones importadas en su modulo"""
+        for stage, method_names in STAGE_METHODS.items():
+            for method_name in method_names:
+                if method_name in vars(job_class):
+                    setattr(job_class, method_name, self.wrap(stage, vars(job_class)[method_name]))
+        for stage, function_names in STAGE_FUNCTIONS.items():
+            for function_name in function_names:
+                if hasattr(job_module, function_name):
+                    setattr(job_module, function_name, self.wrap(stage, getattr(job_module, function_name)))
+
+    def get_stages(self):
+        return {
+            stage: {"seconds": round(seconds, 4), "calls": self.calls[stage]}
+            for stage, seconds in self.seconds.items()
+        }
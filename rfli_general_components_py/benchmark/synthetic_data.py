@@ -0,0 +1,226 @@
+import datetime as dt
+import random
+from decimal import Decimal
+
+CURVES = ("CEC", "CECUVR", "BAAA2", "BAAA3", "BAAA12")
+CURVE_PARAMETERS = {
+    "curve_term_cop": "CEC",
+    "curve_term_uvr": "CECUVR",
+    "BAAA2_term": "BAAA2",
+    "BAAA3_term": "BAAA3",
+    "BAAA12_term": "BAAA12",
+}
+RATING_GROUPS = (10, 20, 30, 31, 32, 33, 40, 50, 58, 59, 60, 70, 80, 90, 100)
+EXPIRATION_RANGES = ((1, 0, 365), (2, 366, 1095), (3, 1096, 1825), (4, 1826, 3650), (5, 3651, 7300), (6, 7301, 18250))
+YIELD_TERMS = (30, 90, 180, 365, 730, 1095, 1825, 3650, 5475, 7300)
+TES_PREFIXES = ("TFIT", "TUVT")
+CORPORATIVE_PREFIXES = ("CDTBCB", "CDTDVV", "BCOLS", "BBOGS", "CDTBBO")
+
+
+def decimal_value(value, places=6):
+    return Decimal(str(round(value, places)))
+
+
+def generate_dataset(valuation_date, isines=2000, folios=5000, users=200, seed=7):
+    """Genera un dia de datos de mercado sinteticos con la forma de las tablas de origen
+    Parameters:
+    -----------
+    valuation_date: datetime.date, required
+        Fecha de valoracion. Tambien se generan precios y curvas del dia anterior
+    isines: int, optional
+        Numero de isines publicados en pub_rfl_prices
+    folios: int, optional
+        Numero de operaciones en prc_rfl_operations
+    users: int, optional
+        Numero de usuarios con isines en seguimiento
+    seed: int, optional
+        Semilla para que dos corridas generen exactamente los mismos datos
+
+    Returns:
+    --------
+    dict
+        'tables' con las filas de cada tabla por 'esquema.tabla', y 'user_params' con los
+        items de parametros de usuario para DynamoDB
+    """
+    generator = random.Random(seed)
+    yesterday_date = valuation_date - dt.timedelta(days=1)
+    category_count = min(400, max(10, isines // 25))
+    issuer_count = max(5, isines // 20)
+
+    categories = [
+        {
+            "category_id": category_id,
+            "class": str(generator.randint(1, 9)),
+            "rating_group": str(generator.choice(RATING_GROUPS)),
+            "maturity_range": generator.randint(1, len(EXPIRATION_RANGES)),
+            "currency_group": generator.randint(1, 3),
+            "rate_group": generator.randint(1, 4),
+        }
+        for category_id in range(1, category_count + 1)
+    ]
+    issuers = [
+        {"issuer": f"EM{issuer_id:05d}", "name": f"EMISOR SINTETICO {issuer_id}"}
+        for issuer_id in range(1, issuer_count + 1)
+    ]
+
+    instruments = []
+    prices = []
+    get_category = []
+    for isin_number in range(1, isines + 1):
+        isin_code = f"COS{isin_number:09d}"
+        if isin_number % 10 == 0:
+            instrument = f"{generator.choice(TES_PREFIXES)}{isin_number % 40:03d}"
+            cc_curve = "CEC" if instrument.startswith("TFIT") else "CECUVR"
+        else:
+            instrument = f"{generator.choice(CORPORATIVE_PREFIXES)}{isin_number % 97:03d}"
+            cc_curve = generator.choice(CURVES[2:])
+        issuer = generator.choice(issuers)["issuer"]
+        category = generator.choice(categories)
+        maturity_days = generator.randint(30, 7300)
+        issue_date = valuation_date - dt.timedelta(days=generator.randint(1, 3650))
+        maturity_date = valuation_date + dt.timedelta(days=maturity_days)
+        instruments.append(
+            {"isin_code": isin_code, "instrument": instrument, "issuer": issuer, "cc_curve": cc_curve}
+        )
+        yesterday_yield = generator.uniform(3, 15)
+        yesterday_price = generator.uniform(80, 120)
+        for price_date, price_yield, mean_price in (
+            (yesterday_date, yesterday_yield, yesterday_price),
+            (valuation_date, yesterday_yield + generator.gauss(0, 0.05), yesterday_price + generator.gauss(0, 0.2)),
+        ):
+            prices.append(
+                {
+                    "valuation_date": price_date,
+                    "isin_code": isin_code,
+                    "instrument": instrument,
+                    "yield": decimal_value(price_yield),
+                    "equivalent_margin": decimal_value(generator.uniform(0, 4)),
+                    "margin_value": decimal_value(generator.uniform(0, 4)),
+                    "spread": decimal_value(generator.uniform(0, 2)),
+                    "mean_price": decimal_value(mean_price),
+                    "clean_price": decimal_value(mean_price - generator.uniform(0, 2)),
+                    "accrued_interest": decimal_value(generator.uniform(0, 2)),
+                    "convexity": decimal_value(generator.uniform(0, 50)),
+                    "duration": decimal_value(maturity_days / 365),
+                    "modified_duration": decimal_value(maturity_days / 380),
+                    "rate_type": generator.choice(("FS", "IPC", "IBR", "UVR")),
+                    "currency_type": generator.choice(("COP", "UVR", "USD")),
+                    "real_rating": generator.choice(("AAA", "AA+", "AA", "A", "Nación")),
+                    "payment_frequency": generator.choice(("MV", "TV", "SV", "AV")),
+                    "issue_date": issue_date,
+                    "maturity_date": maturity_date,
+                    "maturity_days": maturity_days,
+                    "category_id": category["category_id"],
+                    "category_volume": decimal_value(generator.uniform(0, 1e9), 2),
+                    "promedio_valor": decimal_value(generator.uniform(0, 1e9), 2),
+                }
+            )
+        get_category.append(
+            {
+                "category_date": valuation_date,
+                "isin_code": isin_code,
+                "instrument": instrument,
+                "margin_origin": generator.choice(("CAT", "IND")),
+                "margin_type": generator.choice(("C", "H", "A")),
+                "issuer": issuer,
+                "cc_curve": cc_curve,
+            }
+        )
+
+    basket_instruments = sorted({row["instrument"] for row in instruments})
+    basket_tes = [
+        {"operation_date": valuation_date, "instrument": instrument, "cc_curve": "CEC" if instrument.startswith("TFIT") else "CECUVR"}
+        for instrument in basket_instruments
+        if instrument.startswith(TES_PREFIXES)
+    ]
+    corporative_basket = [
+        {"operation_date": valuation_date, "instrument": instrument, "cc_curve": generator.choice(CURVES[2:])}
+        for instrument in basket_instruments
+        if not instrument.startswith(TES_PREFIXES)
+    ]
+    market_open = dt.datetime.combine(valuation_date, dt.time(13, 0))
+    operations = []
+    for folio in range(1, folios + 1):
+        instrument = generator.choice(instruments)
+        operations.append(
+            {
+                "operation_date": valuation_date,
+                "folio": folio,
+                "instrument": instrument["instrument"],
+                "num_control": 1 if generator.random() < 0.95 else 2,
+                "yield": decimal_value(generator.uniform(3, 15)) if generator.random() < 0.98 else Decimal("100"),
+                "amount": decimal_value(generator.uniform(1e6, 1e10), 2),
+                "volume": decimal_value(generator.uniform(1e6, 1e10), 2),
+                "category_id": generator.choice(categories)["category_id"],
+                "timestamp_operation": market_open + dt.timedelta(seconds=generator.randint(0, 6 * 3600)),
+                "maturity_date": valuation_date + dt.timedelta(days=generator.randint(30, 7300)),
+                "maturity_days": generator.randint(30, 7300),
+                "issue_date": valuation_date if generator.random() < 0.05 else valuation_date - dt.timedelta(days=generator.randint(1, 3650)),
+                "sesion": generator.choice(("f", "F", "x", "G", "C", "D")),
+                "trading_system": generator.choice(("MEC", "SEN", "OTC")),
+            }
+        )
+
+    category_margin = [
+        {"margin_date": valuation_date, "category_id": category["category_id"], "margin_type": generator.choice(("C", "H"))}
+        for category in categories
+    ]
+    betas = [
+        {
+            "curve_date": curve_date,
+            "cc_curve": cc_curve,
+            "beta_0": decimal_value(generator.uniform(5, 12)),
+            "beta_1": decimal_value(generator.uniform(-3, 3)),
+            "beta_2": decimal_value(generator.uniform(-3, 3)),
+            "tao_1": decimal_value(generator.uniform(0.5, 5)),
+        }
+        for curve_date in (yesterday_date, valuation_date)
+        for cc_curve in CURVES
+    ]
+    yields = [
+        {
+            "rate_date": rate_date,
+            "cc_curve": cc_curve,
+            "term": term,
+            "rate": decimal_value(generator.uniform(3, 15)),
+        }
+        for rate_date in (yesterday_date, valuation_date)
+        for cc_curve in CURVES
+        for term in YIELD_TERMS
+    ]
+    parameters = [
+        {"parameter_name": parameter_name, "parameter_value": str(generator.choice((5, 10, 15)))}
+        for parameter_name in CURVE_PARAMETERS
+    ]
+
+    isin_codes = [row["isin_code"] for row in instruments]
+    user_params = [
+        {
+            "user_id": f"usuario-{user_number:06d}",
+            "isines": generator.sample(isin_codes, min(len(isin_codes), generator.randint(5, 30))),
+        }
+        for user_number in range(1, users + 1)
+    ]
+    return {
+        "tables": {
+            "precia_published.pub_rfl_prices": prices,
+            "precia_published.pub_rfl_betas": betas,
+            "precia_published.pub_rfl_yield": yields,
+            "precia_process.prc_rfl_operations": operations,
+            "precia_process.prc_rfl_basket_tes": basket_tes,
+            "precia_process.prc_rfl_corporative_basket": corporative_basket,
+            "precia_process.prc_rfl_get_category": get_category,
+            "precia_process.prc_rfl_category_margin": category_margin,
+            "precia_sources.src_rfl_category": categories,
+            "precia_sources.src_rfl_issuer": issuers,
+            "precia_sources.src_rfl_instrument": instruments,
+            "precia_sources.src_rfl_parameters": parameters,
+            "precia_sources.src_rfl_expiration_range": [
+                {"id_expiration_range": range_id, "start_range": start_range, "end_range": end_range}
+                for range_id, start_range, end_range in EXPIRATION_RANGES
+            ],
+            "precia_sources.src_rfl_settdaysco": [{"business_date": valuation_date}],
+        },
+        "user_params": user_params,
+        "categories": categories,
+    }
@@ -2,17 +2,70 @@ import json
 import logging
 import sys
 import os
+import time
 from precia_utils import get_enviroment_variable, get_secret
 
-import jwt
-import requests
-from cryptography.x509 import load_pem_x509_certificate
-from cryptography.hazmat.backends import default_backend
-
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+#jwt, requests y cryptography se importan al validar el primer token y no al cargar el lambda.
+#El secreto de autenticacion y las llaves publicas del tenant se guardan por contenedor. Las
+#llaves vencen a los PUBLIC_KEYS_TTL_SECONDS para que una llave revocada deje de aceptarse, y
+#un token con una llave que no esta en cache solo vuelve a pedir las llaves si pasaron
+#JWKS_REFETCH_SECONDS desde la ultima consulta, para que tokens con kid inventados no
+#disparen una consulta a Microsoft por solicitud
+SECRET_TTL_SECONDS = int(os.environ.get('SECRET_TTL_SECONDS', '3600'))
+PUBLIC_KEYS_TTL_SECONDS = int(os.environ.get('PUBLIC_KEYS_TTL_SECONDS', '86400'))
+JWKS_REFETCH_SECONDS = int(os.environ.get('JWKS_REFETCH_SECONDS', '300'))
+JWKS_TIMEOUT_SECONDS = float(os.environ.get('JWKS_TIMEOUT_SECONDS', '5'))
+AUTHENTICATION_INFO = {}
+PUBLIC_KEYS = {}
+JWKS_STATE = {'loaded_at': 0, 'fetched_at': 0}
+PEMSTART = "-----BEGIN CERTIFICATE-----\n"
+PEMEND = "\n-----END CERTIFICATE-----\n"
+
+
+def get_authentication_info():
+    if not AUTHENTICATION_INFO or time.time() - AUTHENTICATION_INFO['loaded_at'] > SECRET_TTL_SECONDS:
+        AUTHENTICATION_INFO.update(get_secret(get_enviroment_variable("SECRET_AUTENTICATION_INFO")))
+        AUTHENTICATION_INFO['loaded_at'] = time.time()
+    return AUTHENTICATION_INFO
+
+
+def fetch_public_keys(ms_tenant):
+    import requests
+    from cryptography.x509 import load_pem_x509_certificate
+    from cryptography.hazmat.backends import default_backend
+    jwks_uri = f"https://login.microsoftonline.com/{ms_tenant}/discovery/v2.0/keys"
+    uri_response = requests.get(jwks_uri, timeout=JWKS_TIMEOUT_SECONDS).json()
+    public_keys = {}
+    for key in uri_response.get("keys", []):
+        cert = PEMSTART + key["x5c"][0] + PEMEND
+        cert_obj = load_pem_x509_certificate(cert.encode(), default_backend())
+        public_keys[key["kid"]] = cert_obj.public_key()
+    return public_keys
+
+
+def get_public_key(ms_tenant, kid):
+    now = time.time()
+    keys_expired = now - JWKS_STATE['loaded_at'] > PUBLIC_KEYS_TTL_SECONDS
+    refetch_allowed = now - JWKS_STATE['fetched_at'] >= JWKS_REFETCH_SECONDS
+    if (keys_expired or kid not in PUBLIC_KEYS) and refetch_allowed:
+        JWKS_STATE['fetched_at'] = now
+        try:
+            public_keys = fetch_public_keys(ms_tenant)
+        except Exception as fetch_keys_error:
+            #Si Microsoft no responde se siguen usando las llaves en cache
+            logger.warning(f"No se pudieron consultar las llaves publicas del tenant: {fetch_keys_error}")
+        else:
+            PUBLIC_KEYS.clear()
+            PUBLIC_KEYS.update(public_keys)
+            JWKS_STATE['loaded_at'] = now
+    elif kid not in PUBLIC_KEYS:
+        logger.warning(f"Token firmado con una llave desconocida ({kid}). Las llaves se consultaron hace menos de {JWKS_REFETCH_SECONDS} segundos.")
+    return PUBLIC_KEYS.get(kid)
+
 
 def lambda_handler(event, context):
     logger.info("Iniciando lambda de validación de token.")
@@ -35,7 +88,7 @@ class lambda_object:
                                             "Resource": str()}]}}
             self.detailed_raise = ''
             self.partial_response = {}
-            logger.warning(f'event de entrada: {str(event)}')
+            logger.info(f"event de entrada: methodArn={event.get('methodArn')} type={event.get('type')}")
             self.token = event['authorizationToken']
             self.final_response['policyDocument']['Statement'][0]['Resource'] = event['methodArn']
         except Exception as init_error:
@@ -64,39 +117,30 @@ class lambda_object:
       
     
     def get_secret_information(self):
-        self.ms_tenant = get_secret(get_enviroment_variable("SECRET_AUTENTICATION_INFO"))['ms_tenant']
+        authentication_info = get_authentication_info()
+        self.ms_tenant = authentication_info['ms_tenant']
         #self.ms_tenant = "caa1dfbf-34d5-4061-9cdf-0ceaa516bf03"
         #self.client_id = "cc9cd684-7cf5-4c90-8a4d-e518e0968e63"
-        self.client_id = get_secret(get_enviroment_variable("SECRET_AUTENTICATION_INFO"))['client_id']
+        self.client_id = authentication_info['client_id']
     
     
     def check_token(self):
         try:
             logger.info("Iniciando validación de token.")
-            PEMSTART = "-----BEGIN CERTIFICATE-----\n"
-            PEMEND = "\n-----END CERTIFICATE-----\n"
+            import jwt
             
             jwt_token = self.token
-            jwks_uri = f"https://login.microsoftonline.com/{self.ms_tenant}/discovery/v2.0/keys"
             issuer = f'https://sts.windows.net/{self.ms_tenant}/'
             
-            uri_response = requests.get(jwks_uri).json()
-            keys = uri_response.get("keys", False)
+            kid = jwt.get_unverified_header(jwt_token).get("kid")
+            public_key = get_public_key(self.ms_tenant, kid)
             
-            if keys:
-                kid = jwt.get_unverified_header(jwt_token).get("kid")
-                for key in keys:
-                    if kid == key["kid"]:
-                        logger.info("Procesando token.")
-                        cert = PEMSTART + key["x5c"][0] + PEMEND
-                        cert_obj = load_pem_x509_certificate(cert.encode(), default_backend())
-                        public_key = cert_obj.public_key()
-                        decoded = jwt.decode(jwt_token, public_key, algorithms=["RS256"], audience=self.client_id, issuer=issuer) #aca cambie el tenant por client id
-                        
-                        logger.info("DECODE"+str(decoded))
-                        logger.warning(f"[check_token] El usuario {decoded['unique_name']} se autenticó correctamente")
-                        self.request_authorized = True
-                        break
+            if public_key is not None:
+                logger.info("Procesando token.")
+                decoded = jwt.decode(jwt_token, public_key, algorithms=["RS256"], audience=self.client_id, issuer=issuer) #aca cambie el tenant por client id
+                
+                logger.warning(f"[check_token] El usuario {decoded['unique_name']} se autenticó correctamente")
+                self.request_authorized = True
         except Exception as check_token_error:
             exception_line = sys.exc_info()[2].tb_lineno
             current_error = check_token_error
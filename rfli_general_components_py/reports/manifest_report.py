@@ -0,0 +1,260 @@
+"""Reporte diario de costo y latencia de los ETL a partir de dnb-rfli-run-manifest.
+
+Agrupa los manifiestos por dia, componente y modo, y compara la mediana del tiempo de cada
+componente en los ultimos --compare-days dias contra el periodo anterior, para responder
+cual componente se volvio mas lento. Ejemplo:
+
+    python reports/manifest_report.py --since 2024-03-01 --until 2024-03-14 --csv reporte.csv
+
+El costo es una estimacion: tiempo de Glue Python shell (DPU-hora) mas las unidades de
+capacidad de lectura y escritura consumidas en DynamoDB bajo demanda. Al final se listan las
+funciones de los jobs que mas capacidad consumieron, por tabla.
+"""
+import argparse
+import csv
+import datetime as dt
+import os
+import statistics
+import sys
+
+REPORTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(REPORTS_DIRECTORY), "rfli_utils"))
+
+import boto3  # noqa: E402
+from boto3.dynamodb.conditions import Key  # noqa: E402
+
+from rfli_utils.manifest import MANIFEST_COMPONENTS, RUN_MANIFEST_TABLE  # noqa: E402
+
+DEFAULT_DAYS = 14
+GLUE_PYTHON_SHELL_DPU = 0.0625
+DPU_HOUR_PRICE = 0.44
+WRITE_UNITS_MILLION_PRICE = 1.25
+READ_UNITS_MILLION_PRICE = 0.25
+TOP_CAPACITY_CALLERS = 20
+REPORT_COLUMNS = (
+    "run_date",
+    "component",
+    "mode",
+    "runs",
+    "errors",
+    "p50_seconds",
+    "p95_seconds",
+    "max_seconds",
+    "rows_read",
+    "written",
+    "skipped",
+    "megabytes",
+    "read_capacity",
+    "write_capacity",
+    "estimated_cost_usd",
+)
+
+
+def parse_arguments():
+    today = dt.date.today()
+    parser = argparse.ArgumentParser(description="Reporte de costo y latencia de los ETL")
+    parser.add_argument("--since", default=(today - dt.timedelta(days=DEFAULT_DAYS - 1)).isoformat())
+    parser.add_argument("--until", default=today.isoformat())
+    parser.add_argument(
+        "--component",
+        action="append",
+        default=[],
+        help="Componente a reportar (se puede repetir). Por defecto todos",
+    )
+    parser.add_argument("--compare-days", type=int, default=7)
+    parser.add_argument("--table-name", default=RUN_MANIFEST_TABLE)
+    parser.add_argument("--region", default=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"))
+    parser.add_argument("--endpoint-url", help="Endpoint de DynamoDB alterno, por ejemplo moto")
+    parser.add_argument("--dpu", type=float, default=GLUE_PYTHON_SHELL_DPU)
+    parser.add_argument("--dpu-hour-price", type=float, default=DPU_HOUR_PRICE)
+    parser.add_argument("--write-units-million-price", type=float, default=WRITE_UNITS_MILLION_PRICE)
+    parser.add_argument("--read-units-million-price", type=float, default=READ_UNITS_MILLION_PRICE)
+    parser.add_argument("--csv", help="Archivo CSV donde se guarda el reporte diario")
+    return parser.parse_args()
+
+
+def read_manifests(table, component, since, until):
+    """Lee los manifiestos de un componente entre dos fechas (inclusive) con Query paginado"""
+    key_condition = Key("component").eq(component) & Key("run_timestamp").between(
+        f"{since}T00:00:00", f"{until}T23:59:59.999999Z"
+    )
+    query_arguments = {"KeyConditionExpression": key_condition}
+    manifests = []
+    while True:
+        response = table.query(**query_arguments)
+        manifests.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            return manifests
+        query_arguments["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_percentile(values, percentile):
+    sorted_values = sorted(values)
+    position = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[position]
+
+
+def build_daily_report(manifests, prices):
+    """Agrupa los manifiestos por (dia, componente, modo)
+    Parameters:
+    -----------
+    manifests: list, required
+        Items de dnb-rfli-run-manifest
+    prices: dict, required
+        dpu, dpu_hour_price, write_units_million_price y read_units_million_price
+
+    Returns:
+    --------
+    list
+        Una fila por grupo con las columnas de REPORT_COLUMNS
+    """
+    groups = {}
+    for manifest in manifests:
+        group_key = (manifest["run_date"], manifest["component"], manifest["mode"])
+        groups.setdefault(group_key, []).append(manifest)
+    report_rows = []
+    for (run_date, component, mode), group in sorted(groups.items()):
+        wall_seconds = [float(manifest["wall_seconds"]) for manifest in group]
+        read_capacity = sum(float(manifest.get("total_read_capacity", 0)) for manifest in group)
+        write_capacity = sum(float(manifest.get("total_write_capacity", 0)) for manifest in group)
+        glue_cost = sum(wall_seconds) / 3600 * prices["dpu"] * prices["dpu_hour_price"]
+        dynamo_cost = (
+            read_capacity / 1_000_000 * prices["read_units_million_price"]
+            + write_capacity / 1_000_000 * prices["write_units_million_price"]
+        )
+        report_rows.append(
+            {
+                "run_date": run_date,
+                "component": component,
+                "mode": mode,
+                "runs": len(group),
+                "errors": sum(1 for manifest in group if manifest["status"] != "ok"),
+                "p50_seconds": round(statistics.median(wall_seconds), 2),
+                "p95_seconds": round(get_percentile(wall_seconds, 95), 2),
+                "max_seconds": round(max(wall_seconds), 2),
+                "rows_read": sum(int(manifest.get("rows_read", 0)) for manifest in group),
+                "written": sum(int(manifest.get("total_written", 0)) for manifest in group),
+                "skipped": sum(int(manifest.get("total_skipped", 0)) for manifest in group),
+                "megabytes": round(sum(int(manifest.get("total_bytes", 0)) for manifest in group) / 1024**2, 2),
+                "read_capacity": round(read_capacity, 1),
+                "write_capacity": round(write_capacity, 1),
+                "estimated_cost_usd": round(glue_cost + dynamo_cost, 4),
+            }
+        )
+    return report_rows
+
+
+def build_slowdown_report(manifests, until, compare_days):
+    """Compara la mediana del tiempo de cada (componente, modo) en los ultimos compare_days
+    dias contra los compare_days dias anteriores, ordenado del mayor al menor cambio"""
+    recent_start = (dt.date.fromisoformat(until) - dt.timedelta(days=compare_days - 1)).isoformat()
+    previous_start = (dt.date.fromisoformat(recent_start) - dt.timedelta(days=compare_days)).isoformat()
+    periods = {}
+    for manifest in manifests:
+        if manifest["run_date"] >= recent_start:
+            period = "recent"
+        elif manifest["run_date"] >= previous_start:
+            period = "previous"
+        else:
+            continue
+        group_periods = periods.setdefault((manifest["component"], manifest["mode"]), {"recent": [], "previous": []})
+        group_periods[period].append(float(manifest["wall_seconds"]))
+    slowdown_rows = []
+    for (component, mode), group_periods in periods.items():
+        if not group_periods["recent"] or not group_periods["previous"]:
+            continue
+        recent_median = statistics.median(group_periods["recent"])
+        previous_median = statistics.median(group_periods["previous"])
+        slowdown_rows.append(
+            {
+                "component": component,
+                "mode": mode,
+                "previous_p50": round(previous_median, 2),
+                "recent_p50": round(recent_median, 2),
+                "change_percent": round((recent_median / previous_median - 1) * 100, 1)
+                if previous_median > 0
+                else None,
+            }
+        )
+    return sorted(slowdown_rows, key=lambda row: -(row["change_percent"] or 0))
+
+
+def build_capacity_report(manifests, prices):
+    """Capacidad de DynamoDB consumida por (componente, funcion del job, tabla) en el periodo,
+    ordenada por costo estimado. Indica donde rinde mas una escritura delta, un indice o un
+    cache"""
+    capacity_totals = {}
+    for manifest in manifests:
+        for caller_name, caller_tables in manifest.get("capacity", {}).items():
+            for table_name, table_capacity in caller_tables.items():
+                totals = capacity_totals.setdefault(
+                    (manifest["component"], caller_name, table_name),
+                    {"read_capacity": 0.0, "write_capacity": 0.0},
+                )
+                totals["read_capacity"] += float(table_capacity.get("read_capacity", 0))
+                totals["write_capacity"] += float(table_capacity.get("write_capacity", 0))
+    capacity_rows = [
+        {
+            "component": component,
+            "caller": caller_name,
+            "table_name": table_name,
+            "read_capacity": round(totals["read_capacity"], 1),
+            "write_capacity": round(totals["write_capacity"], 1),
+            "estimated_cost_usd": round(
+                totals["read_capacity"] / 1_000_000 * prices["read_units_million_price"]
+                + totals["write_capacity"] / 1_000_000 * prices["write_units_million_price"],
+                4,
+            ),
+        }
+        for (component, caller_name, table_name), totals in capacity_totals.items()
+    ]
+    return sorted(capacity_rows, key=lambda row: -row["estimated_cost_usd"])[:TOP_CAPACITY_CALLERS]
+
+
+def print_table(rows, columns):
+    if not rows:
+        print("Sin datos en el periodo.")
+        return
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+def main():
+    arguments = parse_arguments()
+    table = boto3.resource(
+        "dynamodb", region_name=arguments.region, endpoint_url=arguments.endpoint_url
+    ).Table(arguments.table_name)
+    components = arguments.component or MANIFEST_COMPONENTS
+    manifests = []
+    for component in components:
+        manifests.extend(read_manifests(table, component, arguments.since, arguments.until))
+    prices = {
+        "dpu": arguments.dpu,
+        "dpu_hour_price": arguments.dpu_hour_price,
+        "write_units_million_price": arguments.write_units_million_price,
+        "read_units_million_price": arguments.read_units_million_price,
+    }
+    daily_report = build_daily_report(manifests, prices)
+    print(f"Corridas del {arguments.since} al {arguments.until}: {len(manifests)}\n")
+    print_table(daily_report, REPORT_COLUMNS)
+    print(f"\nCambio de la mediana en los ultimos {arguments.compare_days} dias contra el periodo anterior:\n")
+    print_table(
+        build_slowdown_report(manifests, arguments.until, arguments.compare_days),
+        ("component", "mode", "previous_p50", "recent_p50", "change_percent"),
+    )
+    print("\nFunciones con mayor capacidad consumida en DynamoDB:\n")
+    print_table(
+        build_capacity_report(manifests, prices),
+        ("component", "caller", "table_name", "read_capacity", "write_capacity", "estimated_cost_usd"),
+    )
+    if arguments.csv:
+        with open(arguments.csv, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(daily_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import json
+import os
+import time
+
+import boto3
+
+from rfli_lambda_utils.request_logging import get_json_logger
+
+CONSUMED_CAPACITY = {}
+CAPACITY_READ_OPERATIONS = ("GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems")
+
+metrics_logger = get_json_logger("rfli.metrics")
+
+
+def request_consumed_capacity(params, model, **kwargs):
+    """Pide a DynamoDB la capacidad consumida en cada operacion que la soporta"""
+    if model.input_shape is not None and "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def record_consumed_capacity(parsed, model, **kwargs):
+    """Acumula la capacidad consumida por tabla y operacion durante la invocacion"""
+    consumed_capacity = parsed.get("ConsumedCapacity") or []
+    if isinstance(consumed_capacity, dict):
+        consumed_capacity = [consumed_capacity]
+    for table_capacity in consumed_capacity:
+        capacity_key = (table_capacity["TableName"], model.name)
+        CONSUMED_CAPACITY[capacity_key] = CONSUMED_CAPACITY.get(capacity_key, 0) + float(
+            table_capacity.get("CapacityUnits", 0)
+        )
+
+
+def emit_consumed_capacity():
+    """Metricas EMF con la capacidad consumida por tabla y operacion en la invocacion"""
+    for (table_name, operation), capacity_units in CONSUMED_CAPACITY.items():
+        metric_name = "ReadCapacity" if operation in CAPACITY_READ_OPERATIONS else "WriteCapacity"
+        metrics_logger.info(
+            json.dumps(
+                {
+                    "_aws": {
+                        "Timestamp": int(time.time() * 1000),
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": "RFLI/Lambda",
+                                "Dimensions": [["Function", "Table", "Operation"]],
+                                "Metrics": [{"Name": metric_name, "Unit": "Count"}],
+                            }
+                        ],
+                    },
+                    "Function": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local"),
+                    "Table": table_name,
+                    "Operation": operation,
+                    metric_name: round(capacity_units, 3),
+                }
+            )
+        )
+    CONSUMED_CAPACITY.clear()
+
+
+def report_consumed_capacity(handler):
+    """Decorador del handler que emite la capacidad consumida al terminar cada invocacion,
+    aunque la invocacion falle"""
+
+    def wrapper(event, context):
+        CONSUMED_CAPACITY.clear()
+        try:
+            return handler(event, context)
+        finally:
+            emit_consumed_capacity()
+
+    return wrapper
+
+
+# Los clientes de DynamoDB heredan los eventos de la sesion por defecto al crearse, asi que el
+# lambda importa este modulo antes de crear sus clientes y recursos
+if boto3.DEFAULT_SESSION is None:
+    boto3.setup_default_session()
+boto3.DEFAULT_SESSION.events.register("provide-client-params.dynamodb", request_consumed_capacity)
+boto3.DEFAULT_SESSION.events.register("after-call.dynamodb", record_consumed_capacity)
@@ -0,0 +1,27 @@
+import os
+import time
+
+import boto3
+
+PARAMETER_CACHE_SECONDS = float(os.environ.get("PARAMETER_CACHE_SECONDS", "300"))
+PARAMETER_CACHE = {}
+
+# Cliente de AWS creado una vez por contenedor y reusado en cada invocacion
+param_store = boto3.client("ssm")
+
+
+def get_parameter_value(parameter_name):
+    """Valor de Parameter Store, descifrado, guardado en el contenedor por
+    PARAMETER_CACHE_SECONDS"""
+    cached_parameter = PARAMETER_CACHE.get(parameter_name)
+    now = time.time()
+    if cached_parameter is not None and now < cached_parameter["expires_at"]:
+        return cached_parameter["value"]
+    parameter_value = param_store.get_parameter(Name=parameter_name, WithDecryption=True)[
+        "Parameter"
+    ]["Value"]
+    PARAMETER_CACHE[parameter_name] = {
+        "value": parameter_value,
+        "expires_at": now + PARAMETER_CACHE_SECONDS,
+    }
+    return parameter_value
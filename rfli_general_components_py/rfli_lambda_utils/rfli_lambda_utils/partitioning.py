@@ -0,0 +1,33 @@
+ACTIVE_DATE_ATTRIBUTE = "active_date"
+TTL_ATTRIBUTE = "expires_at"
+PARTITION_SEPARATOR = "#"
+
+
+def get_partition_key(version_data, key_value):
+    """Llave del item en las tablas particionadas por fecha, '<fecha activa>#<isin>', con la
+    fecha activa del item de versiones. Sin fecha activa la tabla no esta particionada y la
+    llave es el valor sin prefijo
+    Parameters:
+    -----------
+    version_data: dict, required
+        Item de versiones del componente
+    key_value: str, required
+        Valor de la llave sin particion, por ejemplo el isin
+
+    Returns:
+    --------
+    str
+        Llave del item en la tabla
+    """
+    active_date = version_data.get(ACTIVE_DATE_ATTRIBUTE)
+    return f"{active_date}{PARTITION_SEPARATOR}{key_value}" if active_date else key_value
+
+
+def remove_partition(item, key_name="isin"):
+    """Copia del item sin los atributos de la particion: la llave sin el prefijo de fecha, el
+    TTL y active_date, tal como lo escribian los ETL antes de particionar las tablas"""
+    item = dict(item)
+    item[key_name] = item[key_name].split(PARTITION_SEPARATOR)[-1]
+    item.pop(TTL_ATTRIBUTE, None)
+    item.pop(ACTIVE_DATE_ATTRIBUTE, None)
+    return item
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import random
+import time
+from sys import stdout as sys_stdout
+
+LAMBDA_LOG_FORMAT = (
+    "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s) [%(correlation_id)s]: %(message)s"
+)
+LOG_MAX_CHARS = int(os.environ.get("LOG_MAX_CHARS", "1000"))
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+REQUEST_LOG_CONTEXT = {"correlation_id": "-", "sampled": True}
+
+
+class RequestLogFilter(logging.Filter):
+    """Agrega a cada log el id de correlacion de la solicitud y descarta los logs INFO y DEBUG
+    de las solicitudes que no salieron sorteadas segun LOG_SAMPLE_RATE. WARNING y ERROR siempre
+    van"""
+
+    def filter(self, record):
+        record.correlation_id = REQUEST_LOG_CONTEXT["correlation_id"]
+        return REQUEST_LOG_CONTEXT["sampled"] or record.levelno >= logging.WARNING
+
+
+def setup_logging(level=logging.INFO):
+    """Reemplaza los handlers del logger raiz por uno a stdout con el formato de Precia, que
+    incluye el id de correlacion de la solicitud, y con el filtro de RequestLogFilter
+    Parameters:
+    -----------
+    level: int, optional
+        Nivel del logger raiz, INFO por defecto
+
+    Returns:
+    --------
+    logging.Logger
+        Logger raiz
+    """
+    root_logger = logging.getLogger()
+    for log_handler in list(root_logger.handlers):
+        root_logger.removeHandler(log_handler)
+    request_handler = logging.StreamHandler(sys_stdout)
+    request_handler.setFormatter(logging.Formatter(LAMBDA_LOG_FORMAT))
+    request_handler.addFilter(RequestLogFilter())
+    root_logger.addHandler(request_handler)
+    root_logger.setLevel(level)
+    return root_logger
+
+
+def get_json_logger(name):
+    """Logger que escribe cada mensaje tal cual, una linea JSON por registro, para que
+    CloudWatch interprete el resumen de las solicitudes y las metricas EMF. No propaga al
+    logger raiz, asi que no pasa por su formato ni por el muestreo de LOG_SAMPLE_RATE"""
+    json_logger = logging.getLogger(name)
+    if not json_logger.handlers:
+        json_handler = logging.StreamHandler(sys_stdout)
+        json_handler.setFormatter(logging.Formatter("%(message)s"))
+        json_logger.addHandler(json_handler)
+        json_logger.setLevel(logging.INFO)
+        json_logger.propagate = False
+    return json_logger
+
+
+request_logger = get_json_logger("rfli.request")
+
+
+def summarize_payload(payload):
+    """Resumen de un objeto para los logs en lugar del objeto completo: tipo, numero de
+    elementos y un extracto de a lo sumo LOG_MAX_CHARS caracteres"""
+    if isinstance(payload, str):
+        return f"str de {len(payload)} caracteres: {payload[:LOG_MAX_CHARS]}"
+    if isinstance(payload, dict):
+        return f"dict de {len(payload)} llaves: {list(payload)[:20]}"
+    if isinstance(payload, (list, tuple)):
+        return f"{type(payload).__name__} de {len(payload)} elementos"
+    return str(payload)[:LOG_MAX_CHARS]
+
+
+def summarize_event(event):
+    """Parametros de la solicitud sin encabezados, que traen el token del usuario"""
+    body = event.get("body")
+    return (
+        f"queryStringParameters={event.get('queryStringParameters')} "
+        f"body={len(body) if isinstance(body, str) else 0} caracteres"
+    )
+
+
+def log_request(handler):
+    """Decorador del handler que fija el id de correlacion de la solicitud (X-Correlation-Id
+    del front, requestId de API Gateway o el de Lambda), sortea si la solicitud registra sus
+    logs INFO y al terminar escribe una linea JSON con la duracion, el estado y el tamano de la
+    respuesta
+    Parameters:
+    -----------
+    handler: function, required
+        Handler del lambda, handler(event, context)
+
+    Returns:
+    --------
+    function
+        Handler con el registro de la solicitud
+    """
+
+    def wrapper(event, context):
+        headers = event.get("headers") or {}
+        REQUEST_LOG_CONTEXT["correlation_id"] = (
+            headers.get("X-Correlation-Id")
+            or headers.get("x-correlation-id")
+            or (event.get("requestContext") or {}).get("requestId")
+            or getattr(context, "aws_request_id", "-")
+        )
+        REQUEST_LOG_CONTEXT["sampled"] = random.random() < LOG_SAMPLE_RATE
+        start_time = time.time()
+        request_summary = {"status": "error", "body_chars": 0}
+        try:
+            response = handler(event, context)
+            if isinstance(response, dict):
+                body = response.get("body")
+                request_summary["status"] = response.get("statusCode", 200)
+                request_summary["body_chars"] = (
+                    len(body) if isinstance(body, str) else len(str(body))
+                )
+            return response
+        finally:
+            request_logger.info(
+                json.dumps(
+                    {
+                        "message": "solicitud atendida",
+                        "function": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local"),
+                        "correlation_id": REQUEST_LOG_CONTEXT["correlation_id"],
+                        "duration_ms": round((time.time() - start_time) * 1000, 1),
+                        "sampled": REQUEST_LOG_CONTEXT["sampled"],
+                        **request_summary,
+                    }
+                )
+            )
+
+    return wrapper
+
@@ -0,0 +1,245 @@
+import base64
+import os
+import struct
+import zlib
+from collections import OrderedDict
+
+from rfli_lambda_utils.partitioning import ACTIVE_DATE_ATTRIBUTE
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import add_freshness
+
+RESPONSE_MEMO_MAX_ENTRIES = int(os.environ.get("RESPONSE_MEMO_MAX_ENTRIES", "64"))
+RESPONSE_MEMO = OrderedDict()
+# Respuestas en gzip con la data comprimida por el ETL. Requiere que el API declare los tipos
+# binarios (binaryMediaTypes) para decodificar el cuerpo en base64
+GZIP_RESPONSES = os.environ.get("GZIP_RESPONSES", "false").lower() == "true"
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+PAYLOAD_ATTRIBUTE = "data_deflate"
+PAYLOAD_PREFIX = '{"data": '
+VERSION_DATE_ATTRIBUTE = "version_date"
+
+
+def build_payload(item):
+    """Inicio de la respuesta, '{"data": <data>', en JSON y en DEFLATE terminado en
+    Z_SYNC_FLUSH. El ETL lo publica comprimido en data_deflate; los items sin ese atributo se
+    serializan aqui
+    Parameters:
+    -----------
+    item: dict, required
+        Item leido con boto3.resource("dynamodb"), con data_deflate o data
+
+    Returns:
+    --------
+    dict
+        JSON de la data, bloques DEFLATE, CRC y largo del inicio de la respuesta
+    """
+    if PAYLOAD_ATTRIBUTE in item:
+        deflated = getattr(item[PAYLOAD_ATTRIBUTE], "value", item[PAYLOAD_ATTRIBUTE])
+        head = zlib.decompressobj(-zlib.MAX_WBITS).decompress(deflated)
+    else:
+        head = (PAYLOAD_PREFIX + encode_json(item["data"])).encode("utf-8")
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(head) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return {
+        "json": head[len(PAYLOAD_PREFIX) :].decode("utf-8"),
+        "deflated": deflated,
+        "crc": zlib.crc32(head),
+        "size": len(head),
+    }
+
+
+def get_memoized_payload(memo_key, read_item):
+    """Payload de la respuesta para la llave (componente, fecha y version, parametros). La data
+    es igual para todos los usuarios mientras no cambie la version, asi que se lee de DynamoDB
+    y se prepara una sola vez por contenedor y version. La version va con su fecha porque init
+    la reinicia en 1 cada dia: un contenedor que sigue vivo al dia siguiente no debe retornar
+    la data de ayer. Al llegar una version nueva se descartan las entradas del componente con
+    otra version y, con el memo lleno, la usada hace mas tiempo. Los items inexistentes (None)
+    no se guardan
+    Parameters:
+    -----------
+    memo_key: tuple, required
+        (componente, get_version_tag del item de versiones, parametros de la solicitud...)
+    read_item: function, required
+        Lee el item de DynamoDB; se llama solo si la llave no esta en el memo
+
+    Returns:
+    --------
+    dict | None
+        Payload de build_payload o None si el item no existe
+    """
+    if memo_key in RESPONSE_MEMO:
+        RESPONSE_MEMO.move_to_end(memo_key)
+        return RESPONSE_MEMO[memo_key]
+    item = read_item()
+    if item is None:
+        return None
+    payload = build_payload(item)
+    component, version_tag = memo_key[:2]
+    for stale_key in [
+        key for key in RESPONSE_MEMO if key[0] == component and key[1] != version_tag
+    ]:
+        del RESPONSE_MEMO[stale_key]
+    RESPONSE_MEMO[memo_key] = payload
+    while len(RESPONSE_MEMO) > RESPONSE_MEMO_MAX_ENTRIES:
+        RESPONSE_MEMO.popitem(last=False)
+    return payload
+
+
+def accepts_gzip(event):
+    return GZIP_RESPONSES and any(
+        header_name.lower() == "accept-encoding" and "gzip" in (header_value or "")
+        for header_name, header_value in (event.get("headers") or {}).items()
+    )
+
+
+def get_envelope_fields(final_object):
+    """Campos del objeto en JSON sin las llaves que lo encierran, '"version": 3, ...', o texto
+    vacio si el objeto no tiene campos"""
+    return encode_json(final_object)[1:-1]
+
+
+def dump_response(final_object, payload):
+    """Cuerpo de la respuesta con la data ya serializada al final, sin volver a codificarla"""
+    fields = get_envelope_fields(final_object)
+    data = payload["json"] if payload else "null"
+    return f'{{{fields}, "data": {data}}}' if fields else f'{{"data": {data}}}'
+
+
+def build_response(event, headers, final_object, payload):
+    """Respuesta con el resto del objeto (version, next_update...) y la data del payload. Al
+    cliente que acepta gzip se le retorna la data comprimida tal cual: el stream gzip es el
+    payload seguido del resto de la respuesta comprimido en cada solicitud, y el CRC del total
+    se calcula a partir del CRC del payload"""
+    if payload is None or not accepts_gzip(event):
+        return {"headers": headers, "body": dump_response(final_object, payload)}
+    fields = get_envelope_fields(final_object)
+    tail = (f", {fields}}}" if fields else "}").encode("utf-8")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    gzip_body = b"".join(
+        [
+            GZIP_HEADER,
+            payload["deflated"],
+            compressor.compress(tail) + compressor.flush(),
+            struct.pack(
+                "<II",
+                zlib.crc32(tail, payload["crc"]),
+                (payload["size"] + len(tail)) & 0xFFFFFFFF,
+            ),
+        ]
+    )
+    return {
+        "headers": {
+            **headers,
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Vary": "Accept-Encoding",
+        },
+        "isBase64Encoded": True,
+        "body": base64.b64encode(gzip_body).decode("ascii"),
+    }
+
+
+def get_requested_version(event):
+    """Version que ya tiene el cliente segun el parametro version"""
+    return (event.get("queryStringParameters") or {}).get("version")
+
+
+def is_unchanged(client_version, current_version):
+    """Las versiones se comparan como numero, de modo que '3' y Decimal('3.0') son la misma"""
+    try:
+        return client_version not in (None, "") and float(client_version) == float(
+            current_version
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+def get_version_tag(version_data):
+    """Identificador de la version vigente, '<fecha>-<version>'. Init reinicia las versiones en
+    1 cada dia, asi que la version sola repetiria el ETag de dias anteriores. Los items sin
+    version_date ni active_date usan solo la version"""
+    version = float(version_data["version"])
+    version_text = str(int(version)) if version.is_integer() else str(version)
+    version_date = version_data.get(VERSION_DATE_ATTRIBUTE) or version_data.get(
+        ACTIVE_DATE_ATTRIBUTE
+    )
+    return f"{version_date}-{version_text}" if version_date else version_text
+
+
+def get_etag_headers(version_data):
+    """ETag debil: el cuerpo de una misma version cambia con la codificacion (gzip o no) y
+    con next_update, que se calcula en cada solicitud"""
+    return {
+        "ETag": f'W/"{get_version_tag(version_data)}"',
+        "Access-Control-Expose-Headers": "ETag",
+    }
+
+
+def add_etag(headers, version_data):
+    return {**headers, **get_etag_headers(version_data)}
+
+
+def is_not_modified(event, version_data):
+    """El encabezado If-None-Match contiene el ETag de la version vigente, con la comparacion
+    debil del RFC 9110: se ignora el prefijo W/"""
+    current_tag = get_version_tag(version_data)
+    for header_name, header_value in (event.get("headers") or {}).items():
+        if header_name.lower() == "if-none-match" and header_value:
+            return any(
+                entity_tag.strip() == "*"
+                or entity_tag.strip().replace("W/", "", 1).strip('"') == current_tag
+                for entity_tag in header_value.split(",")
+            )
+    return False
+
+
+def not_modified_response(headers, version_data):
+    """304 sin cuerpo para el cliente que envia el ETag de la version vigente"""
+    return {"statusCode": 304, "headers": add_etag(headers, version_data), "body": ""}
+
+
+def unchanged_response(headers, version_data, next_update, next_status):
+    """Respuesta sin data para el cliente que ya tiene la version vigente: solo la version y
+    cuando volver a consultar, sin leer las tablas de datos"""
+    final_object = {
+        "version": version_data["version"],
+        "next_update": next_update,
+        "next_status": next_status,
+        "data": None,
+        "unchanged": True,
+    }
+    return {
+        "statusCode": 200,
+        "headers": add_etag(headers, version_data),
+        "body": encode_json(add_freshness(final_object, version_data)),
+    }
+
+
+def get_conditional_response(event, headers, version_data, next_update, next_status):
+    """Respuesta para el cliente que ya tiene la version vigente o None si hay que enviarle la
+    data. Con If-None-Match se responde 304 sin cuerpo; con el parametro version, 200 con la
+    version y cuando volver a consultar (unchanged_response)
+    Parameters:
+    -----------
+    event: dict, required
+        Evento de API Gateway
+    headers: dict, required
+        Encabezados de la respuesta (CORS)
+    version_data: dict, required
+        Item de versiones del componente
+    next_update: float | None, required
+        Segundos hasta la siguiente version
+    next_status: str | None, required
+        Estado de la siguiente version
+
+    Returns:
+    --------
+    dict | None
+        Respuesta de API Gateway o None
+    """
+    if is_not_modified(event, version_data):
+        return not_modified_response(headers, version_data)
+    if is_unchanged(get_requested_version(event), version_data["version"]):
+        return unchanged_response(headers, version_data, next_update, next_status)
+    return None
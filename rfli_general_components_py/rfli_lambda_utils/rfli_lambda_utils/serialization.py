@@ -0,0 +1,58 @@
+import base64
+import json
+
+
+def encode_json(payload):
+    """Serializa a JSON un objeto con los Decimal de DynamoDB como float. float(Decimal) da el
+    mismo numero que float(str(Decimal)) sin pasar por el texto, y no se crea un encoder por
+    llamada"""
+    return json.dumps(payload, default=float)
+
+
+def from_attribute_value(attribute_value):
+    """Convierte un valor en el formato AttributeValue del cliente de bajo nivel de DynamoDB
+    ({"N": "1.5"}, {"M": {...}}, {"L": [...]}) a tipos de JSON con los numeros como float, el
+    mismo resultado que encode_json sobre el item del recurso, sin crear un Decimal por numero.
+    Los binarios (B, BS), que JSON no admite, quedan como texto en base64
+    Parameters:
+    -----------
+    attribute_value: dict, required
+        Valor con una sola llave de tipo de DynamoDB
+
+    Returns:
+    --------
+    object
+        Valor con tipos de JSON
+    """
+    if "S" in attribute_value:
+        return attribute_value["S"]
+    if "N" in attribute_value:
+        return float(attribute_value["N"])
+    if "M" in attribute_value:
+        return {key: from_attribute_value(value) for key, value in attribute_value["M"].items()}
+    if "L" in attribute_value:
+        return [from_attribute_value(value) for value in attribute_value["L"]]
+    if "NULL" in attribute_value:
+        return None
+    if "BOOL" in attribute_value:
+        return attribute_value["BOOL"]
+    if "NS" in attribute_value:
+        return [float(number) for number in attribute_value["NS"]]
+    if "SS" in attribute_value:
+        return list(attribute_value["SS"])
+    if "B" in attribute_value:
+        return base64.b64encode(attribute_value["B"]).decode("ascii")
+    if "BS" in attribute_value:
+        return [base64.b64encode(value).decode("ascii") for value in attribute_value["BS"]]
+    raise TypeError(f"Tipo de DynamoDB no soportado en JSON: {list(attribute_value)}")
+
+
+def from_attribute_item(item):
+    """Item completo del cliente de bajo nivel ({atributo: AttributeValue}) con tipos de JSON.
+    Los atributos binarios del item (B, BS), como el payload comprimido data_deflate, no son
+    data de la respuesta y se omiten"""
+    return {
+        attribute: from_attribute_value(value)
+        for attribute, value in item.items()
+        if "B" not in value and "BS" not in value
+    }
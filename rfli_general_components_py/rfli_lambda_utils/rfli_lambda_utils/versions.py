@@ -0,0 +1,68 @@
+import os
+import time
+
+import boto3
+
+# Importado antes de crear el recurso para que sus lecturas reporten la capacidad consumida
+import rfli_lambda_utils.capacity  # noqa: F401
+
+DATA_VERSION_TABLE = "dnb-rfli-data-version-intra"
+SOURCE_WATERMARK_ATTRIBUTE = "source_watermark"
+FRESHNESS_LAG_ATTRIBUTE = "freshness_lag_seconds"
+
+VERSION_CACHE_MAX_SECONDS = float(os.environ.get("VERSION_CACHE_MAX_SECONDS", "60"))
+VERSION_CACHE_MIN_SECONDS = float(os.environ.get("VERSION_CACHE_MIN_SECONDS", "1"))
+VERSION_CACHE = {}
+
+# Recurso de AWS creado una vez por contenedor y reusado en cada invocacion
+dynamodb = boto3.resource("dynamodb")
+
+
+def get_version_item(component, table_name=DATA_VERSION_TABLE):
+    """Item de versiones del componente, guardado en el contenedor hasta su next_update, cuando
+    el ETL publica la siguiente version, y a lo sumo VERSION_CACHE_MAX_SECONDS. Si el ETL se
+    atrasa y next_update ya paso, el item se guarda solo VERSION_CACHE_MIN_SECONDS
+    Parameters:
+    -----------
+    component: str, required
+        Componente en la tabla de versiones (compare-curves, slider, isin-search...)
+    table_name: str, optional
+        Tabla de versiones, por defecto la intradia
+
+    Returns:
+    --------
+    dict | None
+        Item de versiones o None si el componente no tiene version
+    """
+    cache_key = (table_name, component)
+    cached_version = VERSION_CACHE.get(cache_key)
+    now = time.time()
+    if cached_version is not None and now < cached_version["expires_at"]:
+        return cached_version["item"]
+    version_item = dynamodb.Table(table_name).get_item(Key={"component": component}).get("Item")
+    if version_item is not None:
+        expires_at = now + VERSION_CACHE_MIN_SECONDS
+        if version_item.get("next_update") is not None:
+            expires_at = max(
+                expires_at,
+                min(float(version_item["next_update"]), now + VERSION_CACHE_MAX_SECONDS),
+            )
+        VERSION_CACHE[cache_key] = {"item": version_item, "expires_at": expires_at}
+    return version_item
+
+
+def get_time_to_wait(version_data):
+    """Segundos hasta que el ETL publique la siguiente version segun el next_update del item,
+    el valor que retornan los lambdas en next_update. Si el ETL se atrasa retorna 0"""
+    if version_data.get("next_update") is None:
+        return None
+    return max(int(version_data["next_update"]) - int(time.time()), 0)
+
+
+def add_freshness(final_object, version_data):
+    """Agrega a la respuesta la marca de agua del origen y el rezago con que se publico la
+    version, si el ETL los registro"""
+    if SOURCE_WATERMARK_ATTRIBUTE in version_data:
+        final_object[SOURCE_WATERMARK_ATTRIBUTE] = version_data[SOURCE_WATERMARK_ATTRIBUTE]
+        final_object[FRESHNESS_LAG_ATTRIBUTE] = version_data.get(FRESHNESS_LAG_ATTRIBUTE)
+    return final_object
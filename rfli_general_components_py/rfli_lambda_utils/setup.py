@@ -0,0 +1,7 @@
+from setuptools import setup, find_packages
+
+setup(
+    name="rfli_lambda_utils",
+    version="0.1",
+    packages=find_packages(),
+)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Los modulos crean sus clientes de AWS al importarse; sin region boto3 no los puede crear
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+import base64
+import gzip
+import json
+
+from rfli_lambda_utils import responses
+
+
+def build_test_payload():
+    return responses.build_payload({"data": [1.5, {"isin": "COB01CB00026"}]})
+
+
+def test_dump_response_keeps_fields_before_data():
+    body = responses.dump_response({"version": 3, "next_status": "intraday"}, build_test_payload())
+    assert json.loads(body) == {
+        "version": 3,
+        "next_status": "intraday",
+        "data": [1.5, {"isin": "COB01CB00026"}],
+    }
+
+
+def test_dump_response_with_empty_object():
+    assert json.loads(responses.dump_response({}, build_test_payload())) == {
+        "data": [1.5, {"isin": "COB01CB00026"}]
+    }
+    assert json.loads(responses.dump_response({}, None)) == {"data": None}
+
+
+def test_gzip_response_with_empty_object(monkeypatch):
+    monkeypatch.setattr(responses, "GZIP_RESPONSES", True)
+    event = {"headers": {"Accept-Encoding": "gzip, deflate"}}
+    for final_object in ({}, {"version": 3}):
+        response = responses.build_response(event, {}, final_object, build_test_payload())
+        body = gzip.decompress(base64.b64decode(response["body"])).decode("utf-8")
+        assert json.loads(body) == {**final_object, "data": [1.5, {"isin": "COB01CB00026"}]}
@@ -0,0 +1,320 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from botocore.exceptions import ClientError
+
+from rfli_utils.capacity import capacity_caller
+from rfli_utils.manifest import record_table_write
+from rfli_utils.metrics import get_caller_name
+
+logger = logging.getLogger()
+
+BATCH_SIZE = 25
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 10
+DEFAULT_STREAM_CHUNK_ITEMS = 1000
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 5
+THROTTLING_ERROR_CODES = (
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+)
+
+
+class BulkWriteError(Exception):
+    """Error cuando quedan items sin escribir despues de agotar los reintentos"""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+class AdaptiveConcurrency:
+    """Limita las escrituras en vuelo. Aumenta el limite de a uno con cada serie de lotes
+    aceptados y lo reduce a la mitad con cada senal de throttling (AIMD)
+    """
+
+    def __init__(self, max_concurrency, min_concurrency=1):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.success_streak = 0
+        self.lowest_limit = max_concurrency
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                self.lowest_limit = min(self.lowest_limit, self.limit)
+                self.success_streak = 0
+            else:
+                self.success_streak += 1
+                if self.success_streak >= self.limit:
+                    self.limit = min(self.max_concurrency, self.limit + 1)
+                    self.success_streak = 0
+            self.condition.notify_all()
+
+
+def get_backoff_seconds(attempt):
+    """Backoff exponencial con jitter completo"""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2**attempt))
+
+
+def chunked(items, chunk_size):
+    """Agrupa un iterable en listas de hasta chunk_size elementos, sin materializarlo completo"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def split_batches(requests):
+    return [
+        requests[start : start + BATCH_SIZE]
+        for start in range(0, len(requests), BATCH_SIZE)
+    ]
+
+
+def get_unique_items(items, key_names):
+    unique_items = {}
+    for item in items:
+        unique_items[tuple(item[key] for key in key_names)] = item
+    return list(unique_items.values())
+
+
+def bulk_write_items(
+    table,
+    items,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    max_retries=DEFAULT_MAX_RETRIES,
+    overwrite_by_pkeys=None,
+):
+    """Escribe los items en lotes de 25 repartidos en un pool de hilos. Los UnprocessedItems y
+    los errores de throttling se reintentan con backoff exponencial con jitter, y la
+    concurrencia se ajusta segun el throttling recibido. Reemplaza al ciclo sobre
+    table.batch_writer()
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla de destino
+    items: list, required
+        Items a escribir
+    max_concurrency: int, optional
+        Maximo de lotes en vuelo al mismo tiempo
+    max_retries: int, optional
+        Reintentos por lote antes de darlo por fallido
+    overwrite_by_pkeys: list, optional
+        Llave primaria para descartar duplicados (se conserva el ultimo), igual que batch_writer
+
+    Returns:
+    --------
+    dict
+        Estadisticas de la escritura: items, lotes, reintentos, eventos de throttling,
+        items fallidos, segundos y items por segundo
+
+    Raises:
+    -------
+    BulkWriteError
+        Si algun lote no se pudo escribir despues de max_retries reintentos
+    """
+    if overwrite_by_pkeys:
+        items = get_unique_items(items, overwrite_by_pkeys)
+    return bulk_write_requests(
+        table,
+        [{"PutRequest": {"Item": item}} for item in items],
+        max_concurrency,
+        max_retries,
+    )
+
+
+def bulk_delete_keys(
+    table,
+    keys,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    max_retries=DEFAULT_MAX_RETRIES,
+):
+    """Elimina los items por llave con el mismo escritor paralelo de bulk_write_items
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla de destino
+    keys: list, required
+        Llaves primarias de los items a eliminar
+    max_concurrency: int, optional
+        Maximo de lotes en vuelo al mismo tiempo
+    max_retries: int, optional
+        Reintentos por lote antes de darlo por fallido
+
+    Returns:
+    --------
+    dict
+        Estadisticas de la eliminacion, con el mismo formato de bulk_write_items
+    """
+    return bulk_write_requests(
+        table,
+        [{"DeleteRequest": {"Key": key}} for key in keys],
+        max_concurrency,
+        max_retries,
+    )
+
+
+def bulk_write_stream(
+    table,
+    items,
+    chunk_items=DEFAULT_STREAM_CHUNK_ITEMS,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    max_retries=DEFAULT_MAX_RETRIES,
+):
+    """Escribe un iterable de items (por ejemplo un generador) en bloques de chunk_items con
+    bulk_write_items, de modo que en memoria solo se mantiene el bloque en escritura
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla de destino
+    items: iterable, required
+        Items a escribir
+    chunk_items: int, optional
+        Items materializados por bloque
+    max_concurrency: int, optional
+        Maximo de lotes en vuelo al mismo tiempo
+    max_retries: int, optional
+        Reintentos por lote antes de darlo por fallido
+
+    Returns:
+    --------
+    dict
+        Estadisticas acumuladas de todos los bloques, con el mismo formato de bulk_write_items
+    """
+    start_time = time.monotonic()
+    stream_stats = {
+        "items": 0,
+        "batches": 0,
+        "written": 0,
+        "retries": 0,
+        "throttle_events": 0,
+        "failed": 0,
+        "lowest_concurrency": max_concurrency,
+    }
+    for chunk in chunked(items, chunk_items):
+        chunk_stats = bulk_write_requests(
+            table,
+            [{"PutRequest": {"Item": item}} for item in chunk],
+            max_concurrency,
+            max_retries,
+        )
+        for stat_name in ("items", "batches", "written", "retries", "throttle_events"):
+            stream_stats[stat_name] += chunk_stats[stat_name]
+        stream_stats["lowest_concurrency"] = min(
+            stream_stats["lowest_concurrency"], chunk_stats["lowest_concurrency"]
+        )
+    stream_stats["elapsed_seconds"] = round(time.monotonic() - start_time, 3)
+    stream_stats["items_per_second"] = (
+        round(stream_stats["written"] / stream_stats["elapsed_seconds"], 1)
+        if stream_stats["elapsed_seconds"] > 0
+        else float(stream_stats["written"])
+    )
+    logger.info(f"Escritura en streaming en {table.name}: {stream_stats}")
+    return stream_stats
+
+
+def bulk_write_requests(table, requests, max_concurrency, max_retries):
+    start_time = time.monotonic()
+    batches = split_batches(requests)
+    client = table.meta.client
+    concurrency = AdaptiveConcurrency(max(1, min(max_concurrency, len(batches))))
+    stats_lock = threading.Lock()
+    stats = {
+        "items": sum(len(batch) for batch in batches),
+        "batches": len(batches),
+        "written": 0,
+        "retries": 0,
+        "throttle_events": 0,
+        "failed": 0,
+    }
+    failed_requests = []
+    caller_name = get_caller_name()
+
+    def write_batch(batch_requests):
+        with capacity_caller(caller_name):
+            write_batch_requests(batch_requests)
+
+    def write_batch_requests(batch_requests):
+        pending_requests = batch_requests
+        attempt = 0
+        while pending_requests:
+            throttled = False
+            concurrency.acquire()
+            try:
+                response = client.batch_write_item(
+                    RequestItems={table.name: pending_requests}
+                )
+                unprocessed_requests = response.get("UnprocessedItems", {}).get(
+                    table.name, []
+                )
+                throttled = len(unprocessed_requests) > 0
+                with stats_lock:
+                    stats["written"] += len(pending_requests) - len(unprocessed_requests)
+                pending_requests = unprocessed_requests
+            except ClientError as batch_write_error:
+                if (
+                    batch_write_error.response["Error"]["Code"]
+                    not in THROTTLING_ERROR_CODES
+                ):
+                    raise
+                throttled = True
+            finally:
+                concurrency.release(throttled)
+            if not pending_requests:
+                return
+            with stats_lock:
+                stats["throttle_events"] += 1
+            if attempt >= max_retries:
+                with stats_lock:
+                    stats["failed"] += len(pending_requests)
+                    failed_requests.extend(pending_requests)
+                return
+            with stats_lock:
+                stats["retries"] += 1
+            time.sleep(get_backoff_seconds(attempt))
+            attempt += 1
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=concurrency.max_concurrency) as executor:
+            for batch_result in [
+                executor.submit(write_batch, batch) for batch in batches
+            ]:
+                batch_result.result()
+    stats["elapsed_seconds"] = round(time.monotonic() - start_time, 3)
+    stats["items_per_second"] = (
+        round(stats["written"] / stats["elapsed_seconds"], 1)
+        if stats["elapsed_seconds"] > 0
+        else float(stats["written"])
+    )
+    stats["lowest_concurrency"] = concurrency.lowest_limit
+    logger.info(f"Escritura masiva en {table.name}: {stats}")
+    is_delete = len(requests) > 0 and "DeleteRequest" in requests[0]
+    record_table_write(
+        table.name,
+        **{"deleted" if is_delete else "written": stats["written"], "failed": stats["failed"]},
+    )
+    if failed_requests:
+        raise BulkWriteError(
+            f"{stats['failed']} items no se pudieron escribir en {table.name}", stats
+        )
+    return stats
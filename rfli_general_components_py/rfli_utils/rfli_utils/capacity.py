@@ -0,0 +1,137 @@
+import contextlib
+import logging
+import threading
+
+from rfli_utils.metrics import add_sent_bytes, emit_metrics, get_caller_name, is_collecting
+
+logger = logging.getLogger()
+
+READ_OPERATIONS = ("GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems")
+SIZED_WRITE_OPERATIONS = ("BatchWriteItem", "PutItem")
+IGNORED_CALLER_MODULES = ("boto3", "botocore", "threading", "concurrent")
+
+_capacity_lock = threading.Lock()
+_consumed_capacity = {}
+_caller_context = threading.local()
+
+
+def request_consumed_capacity(params, model, **kwargs):
+    """Agrega ReturnConsumedCapacity=TOTAL a cada operacion de DynamoDB que lo soporta,
+    mientras alguien consuma las metricas"""
+    if (
+        is_collecting()
+        and model.input_shape is not None
+        and "ReturnConsumedCapacity" in model.input_shape.members
+    ):
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def record_consumed_capacity(parsed, model, **kwargs):
+    """Acumula la capacidad consumida de la respuesta por (tabla, funcion del job, operacion).
+    Las operaciones por lotes retornan una lista con una entrada por tabla"""
+    consumed_capacity = parsed.get("ConsumedCapacity") if parsed else None
+    if not consumed_capacity:
+        return
+    if isinstance(consumed_capacity, dict):
+        consumed_capacity = [consumed_capacity]
+    caller_name = (
+        get_caller_name(IGNORED_CALLER_MODULES)
+        or getattr(_caller_context, "caller_name", None)
+        or "desconocida"
+    )
+    with _capacity_lock:
+        for table_capacity in consumed_capacity:
+            capacity_totals = _consumed_capacity.setdefault(
+                (table_capacity["TableName"], caller_name, model.name),
+                {"calls": 0, "capacity_units": 0.0},
+            )
+            capacity_totals["calls"] += 1
+            capacity_totals["capacity_units"] += float(table_capacity.get("CapacityUnits", 0))
+
+
+def record_sent_bytes(request, **kwargs):
+    """Suma el cuerpo de cada solicitud de escritura tal como se envia, para los bytes de las
+    etapas de carga sin volver a serializar los items"""
+    if is_collecting() and request.body:
+        add_sent_bytes(len(request.body))
+
+
+def track_consumed_capacity(dynamodb_client):
+    """Registra en el cliente de DynamoDB los eventos que piden y acumulan la capacidad
+    consumida y los bytes enviados en las escrituras. Las tablas de un resource usan su
+    cliente, resource.meta.client
+    Parameters:
+    -----------
+    dynamodb_client: botocore.client.BaseClient, required
+        Cliente de DynamoDB
+
+    Returns:
+    --------
+    botocore.client.BaseClient
+        El mismo cliente
+    """
+    dynamodb_client.meta.events.register(
+        "provide-client-params.dynamodb", request_consumed_capacity
+    )
+    dynamodb_client.meta.events.register("after-call.dynamodb", record_consumed_capacity)
+    for operation in SIZED_WRITE_OPERATIONS:
+        dynamodb_client.meta.events.register(
+            f"before-send.dynamodb.{operation}", record_sent_bytes
+        )
+    return dynamodb_client
+
+
+@contextlib.contextmanager
+def capacity_caller(caller_name):
+    """Atribuye a caller_name la capacidad consumida en el hilo actual cuando la pila no tiene
+    una funcion del job, como en los hilos del escritor paralelo"""
+    previous_caller = getattr(_caller_context, "caller_name", None)
+    _caller_context.caller_name = caller_name
+    try:
+        yield
+    finally:
+        _caller_context.caller_name = previous_caller
+
+
+def flush_consumed_capacity():
+    """Emite la capacidad consumida acumulada, una medicion por tabla y funcion del job con
+    ReadCapacity y WriteCapacity, y reinicia los acumulados. Se llama al terminar la corrida
+
+    Returns:
+    --------
+    dict
+        Capacidad consumida por (tabla, funcion, operacion) desde la ultima emision
+    """
+    global _consumed_capacity
+    with _capacity_lock:
+        consumed_capacity = _consumed_capacity
+        _consumed_capacity = {}
+    caller_totals = {}
+    for (table_name, caller_name, operation), capacity_totals in consumed_capacity.items():
+        capacity_kind = "ReadCapacity" if operation in READ_OPERATIONS else "WriteCapacity"
+        totals = caller_totals.setdefault(
+            (table_name, caller_name),
+            {"ReadCapacity": 0.0, "WriteCapacity": 0.0, "operations": {}},
+        )
+        totals[capacity_kind] += capacity_totals["capacity_units"]
+        totals["operations"][operation] = capacity_totals["calls"]
+    for (table_name, caller_name), totals in caller_totals.items():
+        emit_metrics(
+            "capacity",
+            {
+                "ReadCapacity": round(totals["ReadCapacity"], 3),
+                "WriteCapacity": round(totals["WriteCapacity"], 3),
+            },
+            {"table_name": table_name, "caller": caller_name, "operations": totals["operations"]},
+            dimensions=("table_name", "caller"),
+        )
+    if caller_totals:
+        logger.info(
+            "Capacidad consumida en DynamoDB: "
+            + ", ".join(
+                f"{table_name} ({caller_name}) lectura {totals['ReadCapacity']:.1f} "
+                f"escritura {totals['WriteCapacity']:.1f}"
+                for (table_name, caller_name), totals in caller_totals.items()
+            )
+        )
+    return consumed_capacity
@@ -0,0 +1,225 @@
+import logging
+import time
+from sys import exc_info as sys_exc_info
+
+from rfli_utils.config import get_optional_enviroment_variable
+from rfli_utils.database import db_connection
+from rfli_utils.metrics import StageMetrics
+
+logger = logging.getLogger()
+
+FINGERPRINT_ATTRIBUTE = "source_fingerprint"
+
+_last_probe_time = None
+
+PROBE_QUERIES = {
+    "pub_rfl_prices": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', isin_code, instrument, yield, equivalent_margin,\
+                    margin_value, spread, mean_price, clean_price, accrued_interest, convexity,\
+                    duration, modified_duration, real_rating, maturity_days, category_id))) AS checksum\
+            FROM precia_published.pub_rfl_prices\
+            WHERE valuation_date = '{today_date}';",
+    "prc_rfl_operations": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                CAST(MAX(timestamp_operation) AS CHAR) AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', folio, instrument, num_control, yield, amount,\
+                    volume, category_id, timestamp_operation))) AS checksum\
+            FROM precia_process.prc_rfl_operations\
+            WHERE operation_date = '{today_date}';",
+    "prc_rfl_get_category": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', isin_code, instrument, margin_origin, margin_type,\
+                    issuer, cc_curve))) AS checksum\
+            FROM precia_process.prc_rfl_get_category\
+            WHERE category_date = '{today_date}';",
+    "prc_rfl_basket_tes": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', instrument, cc_curve))) AS checksum\
+            FROM precia_process.prc_rfl_basket_tes\
+            WHERE operation_date = '{today_date}';",
+    "prc_rfl_corporative_basket": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', instrument, cc_curve))) AS checksum\
+            FROM precia_process.prc_rfl_corporative_basket\
+            WHERE operation_date = '{today_date}';",
+    "prc_rfl_category_margin": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', category_id, margin_type))) AS checksum\
+            FROM precia_process.prc_rfl_category_margin\
+            WHERE margin_date = '{today_date}';",
+    "pub_rfl_betas": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', cc_curve, beta_0, beta_1, beta_2, tao_1))) AS checksum\
+            FROM precia_published.pub_rfl_betas\
+            WHERE curve_date = '{today_date}';",
+    "pub_rfl_yield": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', cc_curve, term, rate))) AS checksum\
+            FROM precia_published.pub_rfl_yield\
+            WHERE rate_date = '{today_date}';",
+    "src_rfl_parameters": "SELECT {timeout_string} \
+                COUNT(*) AS row_count,\
+                NULL AS max_timestamp,\
+                BIT_XOR(CRC32(CONCAT_WS('|', parameter_name, parameter_value))) AS checksum\
+            FROM precia_sources.src_rfl_parameters;",
+}
+
+
+def is_change_probe_enabled():
+    """Indica si el sondeo de cambios esta activo. Se desactiva con --CHANGE_PROBE false"""
+    return get_optional_enviroment_variable("CHANGE_PROBE", "true").lower() == "true"
+
+
+def get_source_fingerprint(
+    cursor_connection,
+    source_names,
+    valuation_date,
+    timeout_string="",
+    record_probe_time=True,
+):
+    """Calcula la huella de las tablas de origen del componente para la fecha de valoracion:
+    numero de filas, ultima marca de tiempo (si la tabla la tiene) y checksum de las columnas
+    que consumen los ETL. Cada consulta agrega sobre los indices de fecha, sin traer filas.
+    Las tablas maestras (src_rfl_category, src_rfl_instrument, src_rfl_issuer) no se sondean
+    Parameters:
+    -----------
+    cursor_connection: pymysql.cursors.DictCursor, required
+        Cursor abierto contra la base de datos de origen
+    source_names: iterable, required
+        Nombres de las tablas de PROBE_QUERIES de las que depende el componente
+    valuation_date: datetime, required
+        Fecha de valoracion del ciclo
+    timeout_string: str, optional
+        Hint de tiempo maximo de ejecucion de cada consulta
+    record_probe_time: bool, optional
+        Si el sondeo cuenta como el sondeo del ciclo en get_last_probe_time. La foto de
+        mercado sondea sin registrarlo
+
+    Returns:
+    --------
+    dict
+        Huella por tabla, en texto para guardarla tal cual en DynamoDB
+    """
+    query_values = {
+        "timeout_string": timeout_string,
+        "today_date": valuation_date.strftime("%Y-%m-%d"),
+    }
+    if record_probe_time:
+        global _last_probe_time
+        _last_probe_time = int(time.time())
+    source_fingerprint = {"valuation_date": query_values["today_date"]}
+    for source_name in source_names:
+        with StageMetrics("query", query_name=f"probe_{source_name}"):
+            cursor_connection.execute(PROBE_QUERIES[source_name].format(**query_values))
+            probe_row = cursor_connection.fetchone()
+        source_fingerprint[source_name] = "|".join(
+            str(probe_row[column])
+            for column in ("row_count", "max_timestamp", "checksum")
+        )
+    logger.info("Huella de las tablas de origen: " + str(source_fingerprint))
+    return source_fingerprint
+
+
+def get_last_probe_time():
+    """Epoch del ultimo sondeo del proceso, o None si no se ha sondeado"""
+    return _last_probe_time
+
+
+def is_source_unchanged(version_table, component, source_fingerprint):
+    """Compara la huella calculada con la guardada en la ultima version del componente
+    Parameters:
+    -----------
+    version_table: boto3.resources.factory.dynamodb.Table, required
+        Tabla dnb-rfli-data-version-intra
+    component: str, required
+        Llave del componente en la tabla de versiones
+    source_fingerprint: dict, required
+        Huella calculada con get_source_fingerprint
+
+    Returns:
+    --------
+    bool
+        True solo si existe una huella previa identica
+    """
+    try:
+        response = version_table.get_item(Key={"component": component})
+        previous_fingerprint = response.get("Item", {}).get(FINGERPRINT_ATTRIBUTE)
+    except Exception as read_fingerprint_exception:
+        exception_line = sys_exc_info()[2].tb_lineno
+        current_error = read_fingerprint_exception
+        logger.warning(
+            "No se pudo leer la huella previa. Se ejecuta el ciclo completo. "
+            + current_error.__class__.__name__
+            + "["
+            + str(exception_line)
+            + "] "
+            + str(current_error)
+        )
+        return False
+    return previous_fingerprint is not None and previous_fingerprint == source_fingerprint
+
+
+def run_change_probe(
+    secret_name,
+    source_names,
+    valuation_date,
+    version_table,
+    component,
+    timeout_string="",
+):
+    """Sondea las tablas de origen del componente antes de la extraccion completa.
+    Si el sondeo falla el ciclo se ejecuta completo, igual que sin sondeo
+    Parameters:
+    -----------
+    secret_name: str, required
+        Secreto con las credenciales de la base de datos de origen
+    source_names: iterable, required
+        Nombres de las tablas de PROBE_QUERIES de las que depende el componente
+    valuation_date: datetime, required
+        Fecha de valoracion del ciclo
+    version_table: boto3.resources.factory.dynamodb.Table, required
+        Tabla dnb-rfli-data-version-intra
+    component: str, required
+        Llave del componente en la tabla de versiones
+    timeout_string: str, optional
+        Hint de tiempo maximo de ejecucion de cada consulta
+
+    Returns:
+    --------
+    tuple(bool, dict | None)
+        Si el origen no cambio y la huella calculada para guardar con la nueva version
+    """
+    if not is_change_probe_enabled():
+        return False, None
+    try:
+        with db_connection(secret_name) as connection:
+            with connection.cursor() as cursor_connection:
+                source_fingerprint = get_source_fingerprint(
+                    cursor_connection, source_names, valuation_date, timeout_string
+                )
+    except Exception as change_probe_exception:
+        exception_line = sys_exc_info()[2].tb_lineno
+        current_error = change_probe_exception
+        logger.warning(
+            "No se pudo sondear el origen. Se ejecuta el ciclo completo. "
+            + current_error.__class__.__name__
+            + "["
+            + str(exception_line)
+            + "] "
+            + str(current_error)
+        )
+        return False, None
+    source_unchanged = is_source_unchanged(version_table, component, source_fingerprint)
+    if source_unchanged:
+        logger.info(
+            f"Las tablas de origen de '{component}' no cambiaron desde el ultimo ciclo."
+        )
+    return source_unchanged, source_fingerprint
@@ -0,0 +1,298 @@
+import logging
+import time
+from json import loads as json_loads
+from sys import argv as sys_argv, exc_info as sys_exc_info
+from threading import Lock
+
+from boto3 import client as bt3_client, resource as bt3_resource
+
+logger = logging.getLogger()
+
+SECRET_TTL_SECONDS = 900
+PARAMETER_TTL_SECONDS = 300
+SSM_GET_PARAMETERS_MAX_NAMES = 10
+MARKET_SCHEDULE_ARGUMENTS = [
+    "MARKET_OPEN_TIME",
+    "MARKET_CLOSE_TIME",
+    "PRE_EOD_TIME",
+    "INTRA_RATE_TIME",
+]
+
+_cache_lock = Lock()
+_aws_clients = {}
+_aws_resources = {}
+_enviroment_cache = {}
+_secrets_cache = {}
+_parameters_cache = {}
+_cache_stats = {
+    "secret_hits": 0,
+    "secret_misses": 0,
+    "parameter_hits": 0,
+    "parameter_misses": 0,
+    "ssm_calls": 0,
+    "secrets_manager_calls": 0,
+}
+
+
+def get_aws_client(service_name):
+    """Retorna un cliente boto3 reutilizable para el proceso
+    Parameters:
+    -----------
+    service_name: str, required
+        Nombre del servicio de AWS (ssm, secretsmanager, dynamodb, ...)
+
+    Returns:
+    --------
+    botocore.client.BaseClient
+        Cliente creado una sola vez por proceso. El de DynamoDB registra la capacidad consumida
+    """
+    with _cache_lock:
+        if service_name not in _aws_clients:
+            _aws_clients[service_name] = bt3_client(service_name)
+            if service_name == "dynamodb":
+                from rfli_utils.capacity import track_consumed_capacity
+
+                track_consumed_capacity(_aws_clients[service_name])
+        return _aws_clients[service_name]
+
+
+def get_aws_resource(service_name):
+    """Retorna un resource boto3 reutilizable para el proceso
+    Parameters:
+    -----------
+    service_name: str, required
+        Nombre del servicio de AWS (dynamodb, s3, ...)
+
+    Returns:
+    --------
+    boto3.resources.base.ServiceResource
+        Resource creado una sola vez por proceso. El de DynamoDB registra la capacidad consumida
+    """
+    with _cache_lock:
+        if service_name not in _aws_resources:
+            _aws_resources[service_name] = bt3_resource(service_name)
+            if service_name == "dynamodb":
+                from rfli_utils.capacity import track_consumed_capacity
+
+                track_consumed_capacity(_aws_resources[service_name].meta.client)
+        return _aws_resources[service_name]
+
+
+def get_enviroment_variable(variable):
+    """Obtiene un argumento del job de Glue, resolviendo sys.argv una sola vez por variable
+    Parameters:
+    -----------
+    variable: str, required
+        Nombre del argumento del job sin el prefijo '--'
+
+    Returns:
+    --------
+    str
+        Valor del argumento
+    """
+    if variable not in _enviroment_cache:
+        from awsglue.utils import getResolvedOptions
+
+        _enviroment_cache[variable] = getResolvedOptions(sys_argv, [variable])[variable]
+    return _enviroment_cache[variable]
+
+
+def has_job_argument(variable, arguments=None):
+    """Indica si el job recibio el argumento, como '--X valor' o como '--X=valor', las dos
+    formas que acepta getResolvedOptions
+    Parameters:
+    -----------
+    variable: str, required
+        Nombre del argumento del job sin el prefijo '--'
+    arguments: list, optional
+        Argumentos de la linea de comandos, por defecto sys.argv
+
+    Returns:
+    --------
+    bool
+        True si el argumento esta presente
+    """
+    option = "--" + variable
+    return any(
+        argument == option or argument.startswith(option + "=")
+        for argument in (sys_argv if arguments is None else arguments)
+    )
+
+
+def get_optional_enviroment_variable(variable, default=None):
+    """Obtiene un argumento opcional del job de Glue
+    Parameters:
+    -----------
+    variable: str, required
+        Nombre del argumento del job sin el prefijo '--'
+    default: str, optional
+        Valor retornado cuando el job no recibe el argumento
+
+    Returns:
+    --------
+    str
+        Valor del argumento o el valor por defecto
+    """
+    if variable not in _enviroment_cache and not has_job_argument(variable):
+        return default
+    return get_enviroment_variable(variable)
+
+
+def get_secret(secret_name, ttl_seconds=SECRET_TTL_SECONDS):
+    """Obtiene un secreto de Secrets Manager usando un cache con TTL a nivel de proceso
+    Parameters:
+    -----------
+    secret_name: str, required
+        Nombre del secreto
+    ttl_seconds: int, optional
+        Segundos que el secreto se mantiene en cache
+
+    Returns:
+    --------
+    dict
+        Contenido del secreto. Diccionario vacio si no se pudo obtener
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached_secret = _secrets_cache.get(secret_name)
+        if cached_secret is not None and cached_secret[1] > now:
+            _cache_stats["secret_hits"] += 1
+            return cached_secret[0]
+        _cache_stats["secret_misses"] += 1
+    parameters = {}
+    try:
+        secrets_manager_client = get_aws_client("secretsmanager")
+        get_secret_value_response = secrets_manager_client.get_secret_value(
+            SecretId=secret_name
+        )
+        _cache_stats["secrets_manager_calls"] += 1
+        secret = get_secret_value_response["SecretString"]
+        parameters = json_loads(secret)
+        with _cache_lock:
+            _secrets_cache[secret_name] = (parameters, now + ttl_seconds)
+    except Exception as sec_exc:
+        error_msg = "No se pudo obtener el secreto " + secret_name
+        logger.error(error_msg)
+        logger.error(sec_exc)
+    return parameters
+
+
+def get_parameters_store(parameter_names, ttl_seconds=PARAMETER_TTL_SECONDS):
+    """Obtiene varios parametros de SSM en lotes de GetParameters, usando el cache con TTL
+    Parameters:
+    -----------
+    parameter_names: list, required
+        Nombres de los parametros en Parameter Store
+    ttl_seconds: int, optional
+        Segundos que cada parametro se mantiene en cache
+
+    Returns:
+    --------
+    dict
+        Valor de cada parametro indexado por su nombre
+
+    Raises:
+    -------
+    KeyError
+        Si alguno de los parametros no existe en Parameter Store
+    """
+    now = time.monotonic()
+    parameters = {}
+    missing_names = []
+    with _cache_lock:
+        for parameter_name in dict.fromkeys(parameter_names):
+            cached_parameter = _parameters_cache.get(parameter_name)
+            if cached_parameter is not None and cached_parameter[1] > now:
+                _cache_stats["parameter_hits"] += 1
+                parameters[parameter_name] = cached_parameter[0]
+            else:
+                _cache_stats["parameter_misses"] += 1
+                missing_names.append(parameter_name)
+    if missing_names:
+        logger.info("Intentando leer los parametros: " + ", ".join(missing_names))
+        ssm_client = get_aws_client("ssm")
+        for start in range(0, len(missing_names), SSM_GET_PARAMETERS_MAX_NAMES):
+            names_chunk = missing_names[start : start + SSM_GET_PARAMETERS_MAX_NAMES]
+            response = ssm_client.get_parameters(Names=names_chunk, WithDecryption=True)
+            _cache_stats["ssm_calls"] += 1
+            if response.get("InvalidParameters"):
+                raise KeyError(
+                    "No se encontraron los parametros: "
+                    + ", ".join(response["InvalidParameters"])
+                )
+            with _cache_lock:
+                for parameter in response["Parameters"]:
+                    _parameters_cache[parameter["Name"]] = (
+                        parameter["Value"],
+                        now + ttl_seconds,
+                    )
+                    parameters[parameter["Name"]] = parameter["Value"]
+        logger.info("Los parametros tienen el valor: " + str(parameters))
+    return parameters
+
+
+def get_parameter_store(parameter_name, ttl_seconds=PARAMETER_TTL_SECONDS):
+    """Obtiene un parametro de SSM usando el cache con TTL
+    Parameters:
+    -----------
+    parameter_name: str, required
+        Nombre del parametro en Parameter Store
+    ttl_seconds: int, optional
+        Segundos que el parametro se mantiene en cache
+
+    Returns:
+    --------
+    str
+        Valor del parametro
+    """
+    return get_parameters_store([parameter_name], ttl_seconds)[parameter_name]
+
+
+def get_market_schedule(arguments=None):
+    """Lee en una sola llamada a SSM los horarios de mercado configurados como argumentos del job
+    Parameters:
+    -----------
+    arguments: list, optional
+        Argumentos del job que contienen el nombre de cada parametro. Por defecto
+        MARKET_OPEN_TIME, MARKET_CLOSE_TIME, PRE_EOD_TIME e INTRA_RATE_TIME
+
+    Returns:
+    --------
+    dict
+        Valor entero de cada horario indexado por el nombre del argumento
+    """
+    arguments = arguments or MARKET_SCHEDULE_ARGUMENTS
+    try:
+        parameter_names = {
+            argument: get_enviroment_variable(argument) for argument in arguments
+        }
+        parameters = get_parameters_store(list(parameter_names.values()))
+        return {
+            argument: int(parameters[parameter_name])
+            for argument, parameter_name in parameter_names.items()
+        }
+    except Exception as get_market_schedule_exception:
+        exception_line = sys_exc_info()[2].tb_lineno
+        logger.error("No se pudieron cargar los horarios de mercado.")
+        current_error = get_market_schedule_exception
+        logger.error(
+            current_error.__class__.__name__
+            + "["
+            + str(exception_line)
+            + "] "
+            + str(current_error)
+        )
+        raise
+
+
+def get_cache_stats():
+    """Retorna una copia de los contadores de aciertos y fallos del cache"""
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def clear_cache():
+    """Vacia los caches de secretos y parametros sin reiniciar los contadores"""
+    with _cache_lock:
+        _secrets_cache.clear()
+        _parameters_cache.clear()
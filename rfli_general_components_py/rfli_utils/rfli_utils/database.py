@@ -0,0 +1,78 @@
+import logging
+from contextlib import contextmanager
+from threading import Lock
+
+import pymysql.cursors
+
+from rfli_utils.config import get_secret
+from rfli_utils.query_plans import PlanCapturingCursor
+
+logger = logging.getLogger()
+
+_connections_lock = Lock()
+_connections = {}
+
+
+def get_db_connection(secret_name):
+    """Retorna una conexion pymysql reutilizable entre ciclos para el secreto indicado.
+    La conexion se valida con ping antes de entregarla y se reconecta si fue cerrada
+    Parameters:
+    -----------
+    secret_name: str, required
+        Nombre del secreto con host, port, username y password de la base de datos
+
+    Returns:
+    --------
+    pymysql.connections.Connection
+        Conexion en modo autocommit, para que cada consulta vea los datos mas recientes
+    """
+    with _connections_lock:
+        connection = _connections.get(secret_name)
+        if connection is not None:
+            try:
+                connection.ping(reconnect=True)
+                return connection
+            except pymysql.err.MySQLError as ping_error:
+                logger.warning(
+                    "Se descarta la conexion existente a base de datos: " + str(ping_error)
+                )
+                _connections.pop(secret_name, None)
+        connection_credentials = get_secret(secret_name)
+        connection = pymysql.connect(
+            host=connection_credentials["host"],
+            port=int(connection_credentials["port"]),
+            user=connection_credentials["username"],
+            password=connection_credentials["password"],
+            cursorclass=PlanCapturingCursor,
+            autocommit=True,
+        )
+        _connections[secret_name] = connection
+        return connection
+
+
+@contextmanager
+def db_connection(secret_name):
+    """Entrega la conexion reutilizable del secreto sin cerrarla al salir del bloque.
+    Si el bloque falla la conexion se descarta para que el siguiente ciclo abra una nueva
+    Parameters:
+    -----------
+    secret_name: str, required
+        Nombre del secreto con las credenciales de la base de datos
+    """
+    connection = get_db_connection(secret_name)
+    try:
+        yield connection
+    except Exception:
+        close_db_connection(secret_name)
+        raise
+
+
+def close_db_connection(secret_name):
+    """Cierra y olvida la conexion reutilizable del secreto si existe"""
+    with _connections_lock:
+        connection = _connections.pop(secret_name, None)
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception as close_error:
+            logger.warning("No se pudo cerrar la conexion a base de datos: " + str(close_error))
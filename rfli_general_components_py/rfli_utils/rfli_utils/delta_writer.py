@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import logging
+from decimal import Decimal
+from json import dumps as json_dumps, loads as json_loads
+
+from rfli_utils.bulk_writer import bulk_write_items
+from rfli_utils.config import get_optional_enviroment_variable
+from rfli_utils.manifest import record_table_write
+from rfli_utils.partitioning import COLLECTION_KEY_NAMES
+from rfli_utils.snapshot import delete_object, read_object, write_object
+
+logger = logging.getLogger()
+
+HASH_PREFIX = "content-hash"
+
+_key_names_by_table = {}
+
+
+def encode_hash_value(value):
+    """Normaliza los Decimal para que 1.50 y 1.5 produzcan el mismo hash, igual que en DynamoDB"""
+    if isinstance(value, Decimal):
+        return str(value.normalize())
+    return str(value)
+
+
+def get_content_hash(item):
+    """Hash estable del contenido del item, independiente del orden de sus llaves"""
+    item_body = json_dumps(
+        item, sort_keys=True, separators=(",", ":"), default=encode_hash_value
+    )
+    return hashlib.blake2b(item_body.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_key_names(table):
+    """Retorna los atributos de la llave primaria de la tabla. Las colecciones de
+    COLLECTION_KEY_NAMES no consultan DynamoDB; las demas leen table.key_schema, que requiere
+    dynamodb:DescribeTable, una sola vez por tabla"""
+    if table.name in COLLECTION_KEY_NAMES:
+        return COLLECTION_KEY_NAMES[table.name]
+    if table.name not in _key_names_by_table:
+        _key_names_by_table[table.name] = [
+            key_element["AttributeName"] for key_element in table.key_schema
+        ]
+    return _key_names_by_table[table.name]
+
+
+def get_item_key(item, key_names):
+    return "|".join(str(item[key_name]) for key_name in key_names)
+
+
+def get_hash_key(table_name, valuation_date):
+    return f"{HASH_PREFIX}/{valuation_date.strftime('%Y-%m-%d')}/{table_name}.json.gz"
+
+
+def reset_content_hashes(table_name, valuation_date, location=None):
+    """Elimina los hashes del dia de la tabla para que el siguiente ciclo intradia la reescriba
+    completa. La llaman los init despues de vaciar, depurar o reescribir una tabla: sin esto
+    los items que no cambiaron desde el primer ciclo del dia no se vuelven a escribir
+    Parameters:
+    -----------
+    table_name: str, required
+        Nombre de la tabla de DynamoDB
+    valuation_date: datetime, required
+        Fecha de valoracion del ciclo
+    location: str, optional
+        Ruta s3://bucket/prefijo o directorio local de los hashes. Por defecto
+        --SNAPSHOT_LOCATION
+    """
+    if location is None:
+        location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
+    if not location:
+        logger.warning(
+            f"Sin --SNAPSHOT_LOCATION no se reinician los hashes de contenido de {table_name}."
+        )
+        return
+    delete_object(location, get_hash_key(table_name, valuation_date))
+    logger.info(f"Hashes de contenido de {table_name} reiniciados.")
+
+
+def load_content_hashes(location, hash_key):
+    try:
+        hash_body = read_object(location, hash_key)
+    except Exception as load_hashes_exception:
+        logger.warning(
+            "No se pudieron leer los hashes de contenido. Se escriben todos los items: "
+            + str(load_hashes_exception)
+        )
+        return {}
+    if hash_body is None:
+        return {}
+    return json_loads(gzip.decompress(hash_body).decode("utf-8"))
+
+
+def save_changed_items(table, data, location, valuation_date):
+    """Escribe en DynamoDB solo los items cuyo contenido cambio desde la ultima escritura.
+    Los hashes por llave se guardan junto a la foto de mercado (no en el item, porque los
+    lambdas retornan los items completos) y se reinician cada dia, de modo que el primer
+    ciclo del dia siempre reescribe la tabla completa. Los init que modifican la tabla los
+    reinician con reset_content_hashes
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla de destino
+    data: list, required
+        Items a guardar
+    location: str | None, required
+        Ruta s3://bucket/prefijo o directorio local de los hashes. Sin ubicacion no hay
+        hashes guardados y se escriben todos los items
+    valuation_date: datetime, required
+        Fecha de valoracion del ciclo
+
+    Returns:
+    --------
+    dict
+        Cantidad de items escritos y omitidos por no tener cambios
+    """
+    key_names = get_key_names(table)
+    if not location:
+        bulk_write_items(table, data, overwrite_by_pkeys=key_names)
+        logger.info(f"Tabla {table.name}: {len(data)} items escritos, sin hashes de contenido.")
+        return {"written": len(data), "skipped": 0}
+    hash_key = get_hash_key(table.name, valuation_date)
+    previous_hashes = load_content_hashes(location, hash_key)
+    current_hashes = {}
+    changed_items = []
+    for item in data:
+        item_key = get_item_key(item, key_names)
+        current_hashes[item_key] = get_content_hash(item)
+        if previous_hashes.get(item_key) != current_hashes[item_key]:
+            changed_items.append(item)
+    if changed_items:
+        bulk_write_items(table, changed_items, overwrite_by_pkeys=key_names)
+    write_stats = {
+        "written": len(changed_items),
+        "skipped": len(data) - len(changed_items),
+    }
+    record_table_write(table.name, skipped=write_stats["skipped"])
+    if write_stats["written"] > 0 or not previous_hashes:
+        previous_hashes.update(current_hashes)
+        try:
+            write_object(
+                location,
+                hash_key,
+                gzip.compress(json_dumps(previous_hashes).encode("utf-8")),
+            )
+        except Exception as save_hashes_exception:
+            logger.warning(
+                "No se pudieron guardar los hashes de contenido: "
+                + str(save_hashes_exception)
+            )
+    logger.info(
+        f"Tabla {table.name}: {write_stats['written']} items escritos, "
+        f"{write_stats['skipped']} items sin cambios."
+    )
+    return write_stats
@@ -0,0 +1,113 @@
+import datetime as dt
+import logging
+import time
+
+from rfli_utils.change_probe import FINGERPRINT_ATTRIBUTE, get_last_probe_time
+from rfli_utils.metrics import emit_metrics
+
+logger = logging.getLogger()
+
+WATERMARK_ATTRIBUTE = "source_watermark"
+SOURCE_WATERMARKS_ATTRIBUTE = "source_watermarks"
+PUBLISHED_AT_ATTRIBUTE = "published_at"
+FRESHNESS_LAG_ATTRIBUTE = "freshness_lag_seconds"
+FRESHNESS_ATTRIBUTES = (
+    WATERMARK_ATTRIBUTE,
+    SOURCE_WATERMARKS_ATTRIBUTE,
+    PUBLISHED_AT_ATTRIBUTE,
+    FRESHNESS_LAG_ATTRIBUTE,
+)
+# Las marcas de tiempo de origen estan en hora de Bogota, que no tiene horario de verano
+BOGOTA_TIMEZONE = dt.timezone(dt.timedelta(hours=-5))
+
+
+def parse_source_timestamp(max_timestamp):
+    """Epoch de una marca de tiempo DATETIME de origen en hora de Bogota, o None si la tabla
+    no tiene marca de tiempo"""
+    if max_timestamp in (None, "", "None"):
+        return None
+    source_datetime = dt.datetime.strptime(max_timestamp[:19], "%Y-%m-%d %H:%M:%S")
+    return int(source_datetime.replace(tzinfo=BOGOTA_TIMEZONE).timestamp())
+
+
+def get_source_watermarks(source_fingerprint, previous_item, observed_at):
+    """Marca de agua de cada tabla de origen a partir de su huella: la ultima marca de tiempo
+    de la tabla si la tiene (MAX(timestamp_operation) en prc_rfl_operations). Las tablas sin
+    marca de tiempo toman el momento del sondeo en que su huella cambio por primera vez, y
+    conservan la marca anterior mientras su huella no cambie
+    Parameters:
+    -----------
+    source_fingerprint: dict, required
+        Huella calculada con get_source_fingerprint
+    previous_item: dict, required
+        Item de versiones del componente antes de actualizarlo
+    observed_at: int, required
+        Epoch del sondeo
+
+    Returns:
+    --------
+    dict
+        Epoch de la marca de agua por tabla. Las tablas sin filas no tienen marca
+    """
+    previous_fingerprint = previous_item.get(FINGERPRINT_ATTRIBUTE) or {}
+    previous_watermarks = previous_item.get(SOURCE_WATERMARKS_ATTRIBUTE) or {}
+    source_watermarks = {}
+    for source_name, fingerprint_value in source_fingerprint.items():
+        if source_name == "valuation_date":
+            continue
+        row_count, max_timestamp, _ = fingerprint_value.split("|")
+        if row_count == "0":
+            continue
+        source_timestamp = parse_source_timestamp(max_timestamp)
+        if source_timestamp is not None:
+            source_watermarks[source_name] = source_timestamp
+        elif (
+            previous_fingerprint.get(source_name) == fingerprint_value
+            and source_name in previous_watermarks
+        ):
+            source_watermarks[source_name] = int(previous_watermarks[source_name])
+        else:
+            source_watermarks[source_name] = observed_at
+    return source_watermarks
+
+
+def set_freshness(version_item, source_fingerprint):
+    """Guarda en el item de versiones la marca de agua del origen de la nueva version y el
+    rezago entre esa marca y la publicacion, y emite la metrica FreshnessLag. Se llama antes
+    de reemplazar la huella del item, porque la huella anterior decide las marcas de las
+    tablas sin marca de tiempo. Sin huella (sondeo desactivado o fallido) se quitan los
+    atributos para no publicar un rezago viejo
+    Parameters:
+    -----------
+    version_item: dict, required
+        Item del componente en dnb-rfli-data-version-intra
+    source_fingerprint: dict | None, required
+        Huella calculada en el sondeo del ciclo
+
+    Returns:
+    --------
+    int | None
+        Rezago en segundos
+    """
+    published_at = int(time.time())
+    source_watermarks = {}
+    if source_fingerprint is not None:
+        source_watermarks = get_source_watermarks(
+            source_fingerprint, version_item, get_last_probe_time() or published_at
+        )
+    if not source_watermarks:
+        for attribute in FRESHNESS_ATTRIBUTES:
+            version_item.pop(attribute, None)
+        return None
+    newest_source = max(source_watermarks, key=source_watermarks.get)
+    source_watermark = source_watermarks[newest_source]
+    freshness_lag = max(0, published_at - source_watermark)
+    version_item[SOURCE_WATERMARKS_ATTRIBUTE] = source_watermarks
+    version_item[WATERMARK_ATTRIBUTE] = source_watermark
+    version_item[PUBLISHED_AT_ATTRIBUTE] = published_at
+    version_item[FRESHNESS_LAG_ATTRIBUTE] = freshness_lag
+    emit_metrics("freshness", {"FreshnessLag": freshness_lag}, {"watermark_source": newest_source})
+    logger.info(
+        f"Rezago de la version: {freshness_lag} segundos desde el ultimo cambio en {newest_source}."
+    )
+    return freshness_lag
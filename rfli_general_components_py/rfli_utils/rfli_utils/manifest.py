@@ -0,0 +1,278 @@
+import datetime as dt
+import functools
+import logging
+import threading
+import time
+from decimal import Decimal
+from sys import argv as sys_argv
+
+from rfli_utils.capacity import flush_consumed_capacity
+from rfli_utils.config import get_aws_resource, get_optional_enviroment_variable
+from rfli_utils.metrics import add_metrics_listener, get_job_name, remove_metrics_listener
+from rfli_utils.structured_logging import get_correlation_id
+
+logger = logging.getLogger()
+
+RUN_MANIFEST_TABLE = "dnb-rfli-run-manifest"
+VERSION_TABLE = "dnb-rfli-data-version-intra"
+MANIFEST_RETENTION_DAYS = 180
+MANIFEST_COMPONENTS = (
+    "isin-track",
+    "compare-curves",
+    "portfolio-track",
+    "top-delta-category",
+    "slider",
+    "isin-search",
+    "data-version",
+)
+TABLE_COUNTERS = (
+    "written",
+    "deleted",
+    "skipped",
+    "failed",
+    "bytes",
+    "read_capacity",
+    "write_capacity",
+)
+
+_current_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def is_manifest_enabled():
+    """Indica si se registra el manifiesto de cada corrida. --RUN_MANIFEST true|false decide
+    explicitamente; sin ese argumento solo se registra dentro de Glue (--JOB_NAME)"""
+    explicit_value = get_optional_enviroment_variable("RUN_MANIFEST")
+    if explicit_value is not None:
+        return explicit_value.lower() == "true"
+    return "--JOB_NAME" in sys_argv
+
+
+def to_dynamo_number(value):
+    if isinstance(value, float):
+        return Decimal(str(round(value, 3)))
+    return value
+
+
+class ErrorLogCounter(logging.Handler):
+    """Cuenta los logs de error de la corrida: los jobs capturan sus excepciones y solo las
+    registran, de modo que run() termina sin error aunque la corrida haya fallado"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.errors = 0
+
+    def emit(self, record):
+        self.errors += 1
+
+
+class RunManifest:
+    """Acumula lo que leyo, escribio y gasto una corrida de un job y lo guarda en
+    dnb-rfli-run-manifest con llave (component, run_timestamp)
+    Parameters:
+    -----------
+    component: str, required
+        Componente del job, igual que en dnb-rfli-data-version-intra
+    mode: str, required
+        Modo del job: intra, eod o init
+    """
+
+    def __init__(self, component, mode):
+        self.component = component
+        self.mode = mode
+        self.run_timestamp = None
+        self.start_time = None
+        self.status = "ok"
+        self.stages = {}
+        self.queries = {}
+        self.tables = {}
+        self.capacity = {}
+        self.shadow = {}
+        self.freshness_lag = None
+        self.error_counter = ErrorLogCounter()
+
+    def start(self):
+        global _current_manifest
+        self.run_timestamp = dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        self.start_time = time.perf_counter()
+        add_metrics_listener(self.record_metrics)
+        logging.getLogger().addHandler(self.error_counter)
+        _current_manifest = self
+
+    def record_metrics(self, stage, values, properties):
+        with _manifest_lock:
+            if "FreshnessLag" in values:
+                self.freshness_lag = values["FreshnessLag"]
+                return
+            if stage == "capacity":
+                self.record_capacity(values, properties)
+                return
+            if stage == "shadow":
+                # Duraciones y diferencias del modo sombra por funcion comparada
+                self.shadow[properties.get("function", "sin_nombre")] = {
+                    "engine": properties.get("engine"),
+                    "status": properties.get("Status"),
+                    "current_ms": values.get("Duration"),
+                    "shadow_ms": values.get("ShadowDuration"),
+                    "mismatches": values.get("ShadowMismatches"),
+                    "report": properties.get("report"),
+                }
+                return
+            if "Duration" not in values:
+                return
+            if stage == "query":
+                query_totals = self.queries.setdefault(
+                    properties.get("query_name", "sin_nombre"),
+                    {"calls": 0, "rows": 0, "duration_ms": 0.0},
+                )
+                query_totals["calls"] += 1
+                query_totals["rows"] += values.get("RowsOut", 0)
+                query_totals["duration_ms"] += values.get("Duration", 0)
+                return
+            stage_totals = self.stages.setdefault(
+                stage, {"calls": 0, "rows_in": 0, "rows_out": 0, "duration_ms": 0.0}
+            )
+            stage_totals["calls"] += 1
+            stage_totals["rows_in"] += values.get("RowsIn", 0)
+            stage_totals["rows_out"] += values.get("RowsOut", 0)
+            stage_totals["duration_ms"] += values.get("Duration", 0)
+            if values.get("Bytes") and properties.get("target"):
+                self.get_table_totals(properties["target"])["bytes"] += values["Bytes"]
+
+    def record_capacity(self, values, properties):
+        # Capacidad por tabla en tables y por funcion del job y tabla en capacity
+        table_totals = self.get_table_totals(properties["table_name"])
+        table_totals["read_capacity"] += values.get("ReadCapacity", 0)
+        table_totals["write_capacity"] += values.get("WriteCapacity", 0)
+        caller_totals = self.capacity.setdefault(properties["caller"], {})
+        caller_totals[properties["table_name"]] = {
+            "read_capacity": values.get("ReadCapacity", 0),
+            "write_capacity": values.get("WriteCapacity", 0),
+            "operations": properties.get("operations", {}),
+        }
+
+    def get_table_totals(self, table_name):
+        return self.tables.setdefault(
+            table_name, {counter: 0 for counter in TABLE_COUNTERS}
+        )
+
+    def record_table(self, table_name, counters):
+        with _manifest_lock:
+            table_totals = self.get_table_totals(table_name)
+            for counter, value in counters.items():
+                table_totals[counter] += value
+
+    def get_version(self):
+        try:
+            response = get_aws_resource("dynamodb").Table(VERSION_TABLE).get_item(
+                Key={"component": self.component}
+            )
+        except Exception as version_exception:
+            logger.warning(f"No se pudo leer la version para el manifiesto: {version_exception}")
+            return None
+        return response.get("Item", {}).get("version")
+
+    def build_item(self):
+        wall_seconds = time.perf_counter() - self.start_time
+        run_datetime = dt.datetime.strptime(self.run_timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+        manifest_item = {
+            "component": self.component,
+            "run_timestamp": self.run_timestamp,
+            "run_date": self.run_timestamp[:10],
+            "mode": self.mode,
+            "job_name": get_job_name(),
+            "correlation_id": get_correlation_id(),
+            "status": "error" if self.error_counter.errors > 0 else self.status,
+            "errors": self.error_counter.errors,
+            "wall_seconds": wall_seconds,
+            "stages": self.stages,
+            "queries": self.queries,
+            "tables": self.tables,
+            "capacity": self.capacity,
+            "rows_read": sum(query["rows"] for query in self.queries.values()),
+            "expires_at": int(
+                (run_datetime + dt.timedelta(days=MANIFEST_RETENTION_DAYS))
+                .replace(tzinfo=dt.timezone.utc)
+                .timestamp()
+            ),
+        }
+        for counter in TABLE_COUNTERS:
+            manifest_item[f"total_{counter}"] = sum(
+                table[counter] for table in self.tables.values()
+            )
+        if self.freshness_lag is not None:
+            manifest_item["freshness_lag_seconds"] = self.freshness_lag
+        if self.shadow:
+            manifest_item["shadow"] = self.shadow
+        version = self.get_version()
+        if version is not None:
+            manifest_item["version"] = version
+        return convert_numbers(manifest_item)
+
+    def finish(self):
+        global _current_manifest
+        flush_consumed_capacity()
+        _current_manifest = None
+        remove_metrics_listener(self.record_metrics)
+        logging.getLogger().removeHandler(self.error_counter)
+        try:
+            manifest_item = self.build_item()
+            get_aws_resource("dynamodb").Table(RUN_MANIFEST_TABLE).put_item(Item=manifest_item)
+            logger.info(
+                f"Manifiesto de corrida registrado: {self.component} {self.mode} "
+                f"{self.run_timestamp}, {manifest_item['wall_seconds']} segundos."
+            )
+        except Exception as manifest_exception:
+            logger.warning(f"No se pudo registrar el manifiesto de la corrida: {manifest_exception}")
+
+
+def convert_numbers(value):
+    """Convierte los float anidados a Decimal, el unico tipo numerico que acepta DynamoDB"""
+    if isinstance(value, dict):
+        return {key: convert_numbers(element) for key, element in value.items()}
+    if isinstance(value, list):
+        return [convert_numbers(element) for element in value]
+    return to_dynamo_number(value)
+
+
+def record_table_write(table_name, **counters):
+    """Suma contadores de escritura (written, deleted, skipped, failed) a la tabla indicada en
+    el manifiesto de la corrida en curso. Sin corrida en curso no hace nada"""
+    current_manifest = _current_manifest
+    if current_manifest is not None:
+        current_manifest.record_table(table_name, counters)
+
+
+def record_run_manifest(component, mode):
+    """Decorador para el run() de los jobs: abre el manifiesto de la corrida antes de ejecutar
+    y lo guarda al terminar, incluso si run() lanza una excepcion. Al terminar tambien emite
+    la capacidad de DynamoDB consumida en la corrida
+    Parameters:
+    -----------
+    component: str, required
+        Componente del job, igual que en dnb-rfli-data-version-intra
+    mode: str, required
+        Modo del job: intra, eod o init
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not is_manifest_enabled():
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    flush_consumed_capacity()
+            run_manifest = RunManifest(component, mode)
+            run_manifest.start()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                run_manifest.status = "error"
+                raise
+            finally:
+                run_manifest.finish()
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,248 @@
+import functools
+import logging
+import os
+import threading
+import time
+import traceback
+from json import dumps as json_dumps
+from sys import _getframe as sys_getframe, argv as sys_argv, stdout as sys_stdout, exc_info as sys_exc_info
+
+from rfli_utils.config import get_optional_enviroment_variable
+from rfli_utils.structured_logging import get_correlation_id
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = "RFLI/ETL"
+METRICS_DIMENSIONS = ["Job", "Stage"]
+METRIC_UNITS = {
+    "Duration": "Milliseconds",
+    "RowsIn": "Count",
+    "RowsOut": "Count",
+    "Bytes": "Bytes",
+    "FreshnessLag": "Seconds",
+    "PlanChanges": "Count",
+    "FullScans": "Count",
+    "RowsExamined": "Count",
+    "QueryTimeouts": "Count",
+    "ReadCapacity": "Count",
+    "WriteCapacity": "Count",
+    "ShadowDuration": "Milliseconds",
+    "ShadowMismatches": "Count",
+}
+
+_metrics_enabled = None
+_metrics_listeners = []
+_sent_bytes_lock = threading.Lock()
+_sent_bytes = 0
+
+
+def is_metrics_enabled():
+    """Indica si se emiten metricas EMF. --EMIT_METRICS true|false decide explicitamente; sin
+    ese argumento solo se emiten dentro de Glue, que siempre pasa --JOB_NAME. En corridas
+    locales (benchmark, pruebas manuales) las metricas no hacen nada"""
+    global _metrics_enabled
+    if _metrics_enabled is None:
+        explicit_value = get_optional_enviroment_variable("EMIT_METRICS")
+        if explicit_value is not None:
+            _metrics_enabled = explicit_value.lower() == "true"
+        else:
+            _metrics_enabled = "--JOB_NAME" in sys_argv
+    return _metrics_enabled
+
+
+def add_metrics_listener(listener):
+    """Registra una funcion listener(stage, values, properties) que recibe cada medicion,
+    aunque la salida EMF este deshabilitada (la usa el manifiesto de corrida)"""
+    _metrics_listeners.append(listener)
+
+
+def remove_metrics_listener(listener):
+    if listener in _metrics_listeners:
+        _metrics_listeners.remove(listener)
+
+
+def is_collecting():
+    """Indica si alguien consume las mediciones: salida EMF o algun listener registrado"""
+    return is_metrics_enabled() or len(_metrics_listeners) > 0
+
+
+def add_sent_bytes(sent_bytes):
+    """Suma los bytes de una solicitud de escritura ya serializada por botocore. La llama el
+    evento que registra capacity.track_consumed_capacity en el cliente de DynamoDB"""
+    global _sent_bytes
+    with _sent_bytes_lock:
+        _sent_bytes += sent_bytes
+
+
+def get_sent_bytes():
+    """Bytes de escritura enviados a DynamoDB desde el inicio del proceso"""
+    return _sent_bytes
+
+
+def get_job_name():
+    job_name = get_optional_enviroment_variable("JOB_NAME")
+    if job_name:
+        return job_name
+    return os.path.splitext(os.path.basename(sys_argv[0]))[0] or "local"
+
+
+def get_caller_name(ignored_modules=()):
+    """Funcion del job que hizo la llamada: el primer marco de la pila fuera de rfli_utils y de
+    los modulos indicados (pymysql, boto3, botocore, ...). None si toda la pila es ajena al job,
+    por ejemplo en los hilos de un pool"""
+    frame = sys_getframe(1)
+    while frame is not None:
+        module_name = frame.f_globals.get("__name__", "")
+        if not module_name.startswith(("rfli_utils", *ignored_modules)):
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+def count_rows(value):
+    """Filas de un valor retornado o recibido: largo de listas y diccionarios, sumado para
+    tuplas de resultados. Textos, generadores y escalares no cuentan"""
+    if isinstance(value, (list, dict, set)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(count_rows(element) for element in value)
+    return 0
+
+
+def emit_metrics(stage, values, properties=None, dimensions=()):
+    """Escribe una linea JSON en formato CloudWatch Embedded Metric Format (EMF)
+    Parameters:
+    -----------
+    stage: str, required
+        Etapa medida (run, extract, transform, load, version, query, ...)
+    values: dict, required
+        Valor de cada metrica de METRIC_UNITS
+    properties: dict, optional
+        Propiedades de contexto que se guardan en el log sin ser dimension
+    dimensions: tuple, optional
+        Propiedades que ademas de Job y Stage son dimension de las metricas
+    """
+    if not is_collecting():
+        return
+    metric_values = {name: value for name, value in values.items() if value is not None}
+    for listener in list(_metrics_listeners):
+        listener(stage, metric_values, properties or {})
+    if not is_metrics_enabled():
+        return
+    metrics_record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [METRICS_DIMENSIONS + list(dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": METRIC_UNITS[name]}
+                        for name in metric_values
+                    ],
+                }
+            ],
+        },
+        "Job": get_job_name(),
+        "Stage": stage,
+        "correlation_id": get_correlation_id(),
+        **metric_values,
+        **(properties or {}),
+    }
+    sys_stdout.write(json_dumps(metrics_record, default=str) + "\n")
+    sys_stdout.flush()
+
+
+class StageMetrics:
+    """Mide una etapa como contexto: duracion al salir y filas/bytes que informe el bloque
+    Parameters:
+    -----------
+    stage: str, required
+        Etapa medida
+    **properties: optional
+        Propiedades de contexto, por ejemplo query_name o table_name
+    """
+
+    def __init__(self, stage, **properties):
+        self.stage = stage
+        self.properties = properties
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes = None
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        duration = (time.perf_counter() - self.start_time) * 1000
+        emit_metrics(
+            self.stage,
+            {
+                "Duration": round(duration, 3),
+                "RowsIn": self.rows_in,
+                "RowsOut": self.rows_out,
+                "Bytes": self.bytes,
+            },
+            {**self.properties, "Status": "error" if exception_type else "ok"},
+        )
+        return False
+
+
+def measure_stage(stage, error_log=None, measure_bytes=False):
+    """Decorador que mide la duracion de un metodo de los jobs y sus filas de entrada y salida
+    (listas y diccionarios recibidos y retornados). El primer argumento de texto, si existe,
+    se registra como 'target' (nombre de la tabla o consulta)
+    Parameters:
+    -----------
+    stage: str, required
+        Etapa del metodo: run, extract, transform, load o version
+    error_log: str, optional
+        Si se indica, ante un error se registra el mensaje con la linea del fallo y se lanza
+        Exception(error_log), igual que el antiguo debugger_wrapper
+    measure_bytes: bool, optional
+        Registra los bytes que las escrituras de la etapa enviaron a DynamoDB, medidos sobre
+        las solicitudes que botocore ya serializo (solo para etapas de carga)
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            arguments = list(args[1:]) + list(kwargs.values())
+            target = next((value for value in arguments if isinstance(value, str)), None)
+            properties = {"function": function.__name__}
+            if target is not None:
+                properties["target"] = target
+            with StageMetrics(stage, **properties) as stage_metrics:
+                if is_collecting():
+                    stage_metrics.rows_in = sum(count_rows(value) for value in arguments)
+                sent_bytes_before = get_sent_bytes()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception as stage_error:
+                    if error_log is None:
+                        raise
+                    logger.error(
+                        f"[{function.__name__}] {error_log}, linea: "
+                        f"{get_error_line(function.__name__)}, motivo: {str(stage_error)}"
+                    )
+                    raise Exception(f"{error_log}") from stage_error
+                if is_collecting():
+                    stage_metrics.rows_out = count_rows(result)
+                    if measure_bytes:
+                        stage_metrics.bytes = get_sent_bytes() - sent_bytes_before
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def get_error_line(function_name):
+    """Linea del error dentro de la funcion indicada en el traceback en curso"""
+    _, _, exception_traceback = sys_exc_info()
+    for trace in traceback.extract_tb(exception_traceback):
+        if trace.name == function_name:
+            return str(trace.lineno)
+    return None
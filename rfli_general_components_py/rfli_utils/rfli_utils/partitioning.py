@@ -0,0 +1,130 @@
+import datetime as dt
+
+from rfli_utils.config import get_optional_enviroment_variable
+
+ACTIVE_DATE_ATTRIBUTE = "active_date"
+TTL_ATTRIBUTE = "expires_at"
+PARTITION_SEPARATOR = "#"
+DEFAULT_TTL_DAYS = 7
+
+# Colecciones intradia que se particionan por fecha de valoracion y su llave de particion
+PARTITIONED_COLLECTIONS = {
+    "dnb-rfli-isin-track-all-isines": "isin",
+    "dnb-rfli-isin-track-folios": "isin",
+    "dnb-rfli-portfolio-track-all-isines": "isin",
+    "dnb-rfli-isin-search-all-isines": "isin",
+}
+# Colecciones con un item por isin. Los jobs de init eliminan de ellas solo los isines vencidos
+# en lugar de vaciarlas, salvo con --EMPTY_ALL_ISINES YES
+ISIN_COLLECTIONS = frozenset(
+    collection_name
+    for collection_name, key_name in PARTITIONED_COLLECTIONS.items()
+    if key_name == "isin"
+)
+# Llave primaria de las colecciones que escriben los ETL, para no consultar DescribeTable en
+# cada job. Las tablas que no estan aqui se resuelven con table.key_schema
+COLLECTION_KEY_NAMES = {
+    "dnb-rfli-isin-track-all-isines": ["isin"],
+    "dnb-rfli-isin-track-folios": ["isin"],
+    "dnb-rfli-isin-track-user-isines": ["user_id"],
+    "dnb-rfli-curve-compare-curves-intra": ["cc_curve"],
+    "dnb-rfli-curve-compare-folios-intra": ["cc_curve"],
+    "dnb-rfli-curve-compare-curves-eod": ["cc_curve", "valuation_date"],
+    "dnb-rfli-curve-compare-folios-eod": ["cc_curve", "valuation_date"],
+    "dnb-rfli-portfolio-track-all-isines": ["isin"],
+    "dnb-rfli-portfolio-track-user-isines": ["user_id"],
+    "dnb-rfli-top-delta-category": ["top_category"],
+    "dnb-rfli-top-delta-category-details": ["ranking_index"],
+    "dnb-rfli-slider": ["slider_key"],
+    "dnb-rfli-isin-search-all-isines": ["isin"],
+    "dnb-rfli-isin-search-issuers": ["issuer"],
+}
+# Colecciones particionadas con un indice global sobre active_date, para que los lectores
+# consulten solo los items de la fecha activa en lugar de escanear todas las fechas retenidas
+DATE_INDEXED_COLLECTIONS = {
+    "dnb-rfli-isin-search-all-isines": "active_date-index",
+}
+
+
+def is_partitioned_mode():
+    """Indica si los jobs fueron lanzados con --PARTITIONED_TABLES true"""
+    return (
+        get_optional_enviroment_variable("PARTITIONED_TABLES", "false").lower()
+        == "true"
+    )
+
+
+def get_partition_date(valuation_date):
+    return valuation_date.strftime("%Y-%m-%d")
+
+
+def get_partition_key(partition_date, key_value):
+    return f"{partition_date}{PARTITION_SEPARATOR}{key_value}"
+
+
+def partition_items(collection_name, data, valuation_date):
+    """Agrega la fecha de valoracion como prefijo de la llave y el atributo TTL a los items de
+    las colecciones particionadas, y el atributo active_date a las de DATE_INDEXED_COLLECTIONS.
+    Sin --PARTITIONED_TABLES true retorna los items sin cambios
+    Parameters:
+    -----------
+    collection_name: str, required
+        Tabla de destino
+    data: list | iterable, required
+        Items a guardar. Si no es una lista se procesa de forma perezosa (modo streaming)
+    valuation_date: datetime, required
+        Fecha de valoracion del ciclo
+
+    Returns:
+    --------
+    list | generator
+        Items listos para guardar en la tabla, del mismo tipo recibido
+    """
+    if not is_partitioned_mode() or collection_name not in PARTITIONED_COLLECTIONS:
+        return data
+    key_name = PARTITIONED_COLLECTIONS[collection_name]
+    partition_date = get_partition_date(valuation_date)
+    ttl_days = int(
+        get_optional_enviroment_variable("PARTITION_TTL_DAYS", str(DEFAULT_TTL_DAYS))
+    )
+    expires_at = int(
+        (
+            dt.datetime.strptime(partition_date, "%Y-%m-%d")
+            + dt.timedelta(days=ttl_days)
+        ).timestamp()
+    )
+    date_attributes = {}
+    if collection_name in DATE_INDEXED_COLLECTIONS:
+        date_attributes[ACTIVE_DATE_ATTRIBUTE] = partition_date
+    partitioned_items = (
+        {
+            **item,
+            key_name: get_partition_key(partition_date, item[key_name]),
+            TTL_ATTRIBUTE: expires_at,
+            **date_attributes,
+        }
+        for item in data
+    )
+    if isinstance(data, list):
+        return list(partitioned_items)
+    return partitioned_items
+
+
+def set_active_date(version_item, valuation_date):
+    """Actualiza la fecha activa del item de version que usan los lectores para resolver la
+    particion. Solo avanza, para que un reproceso de una fecha pasada no oculte los datos
+    del dia. Sin --PARTITIONED_TABLES true elimina el atributo y los lectores vuelven a las
+    llaves sin prefijo
+    Parameters:
+    -----------
+    version_item: dict, required
+        Item del componente en dnb-rfli-data-version-intra
+    valuation_date: datetime, required
+        Fecha de valoracion de los datos escritos
+    """
+    if not is_partitioned_mode():
+        version_item.pop(ACTIVE_DATE_ATTRIBUTE, None)
+        return
+    partition_date = get_partition_date(valuation_date)
+    if version_item.get(ACTIVE_DATE_ATTRIBUTE, "") <= partition_date:
+        version_item[ACTIVE_DATE_ATTRIBUTE] = partition_date
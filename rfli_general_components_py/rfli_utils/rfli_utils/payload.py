@@ -0,0 +1,61 @@
+import logging
+import zlib
+
+from rfli_utils.serialization import encode_json
+
+logger = logging.getLogger()
+
+PAYLOAD_ATTRIBUTE = "data_deflate"
+PAYLOAD_PREFIX = '{"data": '
+COMPRESSION_LEVEL = 9
+# Tope del payload comprimido para que el item no se acerque al limite de 400 KB de DynamoDB
+MAX_PAYLOAD_BYTES = 100_000
+
+
+def build_payload(data):
+    """Inicio del cuerpo de la respuesta de los lambdas, '{"data": <data>', comprimido en
+    DEFLATE sin encabezado y terminado en Z_SYNC_FLUSH. El stream queda abierto para que el
+    lambda agregue el resto de la respuesta (version, next_update...) en cada solicitud y
+    retorne la data comprimida tal cual, sin volver a serializarla
+    Parameters:
+    -----------
+    data: object, required
+        Data de la respuesta, la misma que se guarda en el atributo data del item
+
+    Returns:
+    --------
+    bytes
+        Bloques DEFLATE del inicio de la respuesta
+    """
+    head = (PAYLOAD_PREFIX + encode_json(data)).encode("utf-8")
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(head) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def add_payloads(items, data_attribute="data"):
+    """Copia de los items con la respuesta ya serializada y comprimida en data_deflate. Los
+    items cuyo payload supera MAX_PAYLOAD_BYTES o no se puede serializar se guardan sin payload
+    y el lambda los serializa
+
+    Returns:
+    --------
+    list
+        Items con el atributo data_deflate
+    """
+    items_with_payload = []
+    for item in items:
+        try:
+            payload = build_payload(item[data_attribute])
+        except (KeyError, TypeError, ValueError) as payload_exception:
+            logger.warning(f"No se pudo construir el payload del item: {payload_exception}")
+            items_with_payload.append(item)
+            continue
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            logger.warning(
+                f"Payload de {len(payload)} bytes supera el maximo de {MAX_PAYLOAD_BYTES}. "
+                "El item se guarda sin payload."
+            )
+            items_with_payload.append(item)
+            continue
+        items_with_payload.append({**item, PAYLOAD_ATTRIBUTE: payload})
+    return items_with_payload
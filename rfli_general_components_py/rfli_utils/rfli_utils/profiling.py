@@ -0,0 +1,193 @@
+import cProfile
+import datetime as dt
+import functools
+import io
+import logging
+import os
+import pstats
+import resource
+import tempfile
+import time
+import tracemalloc
+from json import dumps as json_dumps
+
+from rfli_utils.config import get_optional_enviroment_variable
+from rfli_utils.metrics import add_metrics_listener, get_job_name, remove_metrics_listener
+from rfli_utils.snapshot import write_object
+
+logger = logging.getLogger()
+
+DEFAULT_PROFILE_LOCATION = os.path.join(tempfile.gettempdir(), "rfli-profiles")
+DEFAULT_TOP_N = 30
+TRACEMALLOC_FRAMES = 5
+
+
+def is_profile_mode():
+    """Indica si el job fue lanzado con --PROFILE true"""
+    return get_optional_enviroment_variable("PROFILE", "false").lower() == "true"
+
+
+def get_profile_location():
+    """Ruta s3://bucket/prefijo o directorio local de --PROFILE_LOCATION donde se guardan
+    los perfiles. Por defecto un directorio temporal local"""
+    return get_optional_enviroment_variable("PROFILE_LOCATION", DEFAULT_PROFILE_LOCATION)
+
+
+def get_top_n():
+    return int(get_optional_enviroment_variable("PROFILE_TOP_N", str(DEFAULT_TOP_N)))
+
+
+def get_peak_rss_mb():
+    # ru_maxrss esta en KB en Linux, el sistema de los jobs de Glue
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class MemoryPeakTracker:
+    """Toma la foto de tracemalloc al cierre de la etapa medida con mas memoria viva. Al
+    terminar run() los datos de la corrida ya se liberaron, de modo que una foto final no
+    muestra que ciclo o estructura domino la memoria"""
+
+    def __init__(self):
+        self.largest_traced = 0
+        self.memory_snapshot = None
+        self.snapshot_stage = None
+
+    def on_stage(self, stage, values, properties):
+        current_traced, _ = tracemalloc.get_traced_memory()
+        if current_traced > self.largest_traced:
+            self.largest_traced = current_traced
+            self.memory_snapshot = tracemalloc.take_snapshot()
+            self.snapshot_stage = f"{stage}:{properties.get('function', properties.get('query_name'))}"
+
+
+def format_cpu_report(profiler, top_n):
+    """Funciones con mayor tiempo acumulado y con mayor tiempo propio"""
+    report_stream = io.StringIO()
+    profile_stats = pstats.Stats(profiler, stream=report_stream).strip_dirs()
+    report_stream.write("Funciones por tiempo acumulado\n")
+    profile_stats.sort_stats("cumulative").print_stats(top_n)
+    report_stream.write("Funciones por tiempo propio\n")
+    profile_stats.sort_stats("tottime").print_stats(top_n)
+    return report_stream.getvalue()
+
+
+def format_memory_report(memory_snapshot, top_n):
+    """Lineas con mas memoria viva en la foto, con su traza"""
+    report_lines = []
+    for position, statistic in enumerate(
+        memory_snapshot.statistics("traceback")[:top_n], start=1
+    ):
+        report_lines.append(
+            f"#{position}: {statistic.size / 1024:.1f} KiB en {statistic.count} bloques"
+        )
+        report_lines.extend(f"    {line}" for line in statistic.traceback.format())
+    return "\n".join(report_lines) + "\n"
+
+
+def save_profile(profiler, memory_snapshot, snapshot_stage, traced_peak, wall_seconds):
+    """Guarda el perfil de la corrida bajo profiles/<job>/<fecha y hora UTC>/:
+    run.pstats (abrir con pstats o snakeviz), cpu.txt, memory.txt y summary.json
+    Parameters:
+    -----------
+    profiler: cProfile.Profile, required
+        Perfil de CPU de la corrida
+    memory_snapshot: tracemalloc.Snapshot, required
+        Asignaciones de memoria vivas en el cierre de etapa con mas memoria
+    snapshot_stage: str, required
+        Etapa y funcion en cuyo cierre se tomo la foto de memoria
+    traced_peak: int, required
+        Pico de memoria rastreada por tracemalloc en bytes
+    wall_seconds: float, required
+        Duracion de la corrida
+
+    Returns:
+    --------
+    str
+        Prefijo donde se guardo el perfil
+    """
+    location = get_profile_location()
+    top_n = get_top_n()
+    profile_prefix = (
+        f"profiles/{get_job_name()}/{dt.datetime.utcnow().strftime('%Y-%m-%dT%H-%M-%S')}"
+    )
+    with tempfile.NamedTemporaryFile(suffix=".pstats", delete=False) as pstats_file:
+        pstats_path = pstats_file.name
+    try:
+        profiler.dump_stats(pstats_path)
+        with open(pstats_path, "rb") as pstats_file:
+            write_object(location, f"{profile_prefix}/run.pstats", pstats_file.read())
+    finally:
+        os.remove(pstats_path)
+    write_object(
+        location,
+        f"{profile_prefix}/cpu.txt",
+        format_cpu_report(profiler, top_n).encode("utf-8"),
+    )
+    write_object(
+        location,
+        f"{profile_prefix}/memory.txt",
+        format_memory_report(memory_snapshot, top_n).encode("utf-8"),
+    )
+    profile_summary = {
+        "job_name": get_job_name(),
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_mb": get_peak_rss_mb(),
+        "traced_peak_mb": round(traced_peak / 1024**2, 1),
+        "memory_snapshot_stage": snapshot_stage,
+        "top_allocations": [
+            {
+                "location": str(statistic.traceback[0]),
+                "size_kb": round(statistic.size / 1024, 1),
+                "count": statistic.count,
+            }
+            for statistic in memory_snapshot.statistics("lineno")[:top_n]
+        ],
+    }
+    write_object(
+        location,
+        f"{profile_prefix}/summary.json",
+        json_dumps(profile_summary, indent=2).encode("utf-8"),
+    )
+    return f"{location}/{profile_prefix}"
+
+
+def profile_run(function):
+    """Decorador para el run() de los jobs: con --PROFILE true ejecuta la corrida bajo
+    cProfile y tracemalloc y guarda el perfil al terminar. Sin --PROFILE no agrega costo.
+    Un error al guardar el perfil solo se registra, nunca cambia el resultado del job"""
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not is_profile_mode():
+            return function(*args, **kwargs)
+        logger.info("Modo perfilamiento: la corrida se ejecuta bajo cProfile y tracemalloc.")
+        profiler = cProfile.Profile()
+        peak_tracker = MemoryPeakTracker()
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        add_metrics_listener(peak_tracker.on_stage)
+        start_time = time.perf_counter()
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            wall_seconds = time.perf_counter() - start_time
+            remove_metrics_listener(peak_tracker.on_stage)
+            if peak_tracker.memory_snapshot is None:
+                peak_tracker.memory_snapshot = tracemalloc.take_snapshot()
+                peak_tracker.snapshot_stage = "fin de la corrida"
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            try:
+                profile_path = save_profile(
+                    profiler,
+                    peak_tracker.memory_snapshot,
+                    peak_tracker.snapshot_stage,
+                    traced_peak,
+                    wall_seconds,
+                )
+                logger.info(f"Perfil de la corrida guardado en {profile_path}")
+            except Exception as save_profile_exception:
+                logger.warning(
+                    f"No se pudo guardar el perfil de la corrida: {save_profile_exception}"
+                )
+
+    return wrapper
@@ -0,0 +1,260 @@
+import datetime as dt
+import hashlib
+import logging
+import re
+from json import dumps as json_dumps, loads as json_loads
+from threading import Lock
+
+import pymysql.cursors
+
+from rfli_utils.config import get_optional_enviroment_variable
+from rfli_utils.metrics import emit_metrics, get_caller_name
+from rfli_utils.snapshot import read_object, write_object
+
+logger = logging.getLogger()
+
+PLANS_PREFIX = "query-plans"
+FULL_SCAN_MIN_ROWS = 1000
+QUERY_TIMEOUT_ERROR = 3024
+EXPLAINABLE_STATEMENTS = ("SELECT", "WITH")
+
+_captured_lock = Lock()
+_captured_today = {}
+
+HINT_PATTERN = re.compile(r"/\*.*?\*/", re.S)
+STRING_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'")
+NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+VALUE_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+TABLE_PATTERN = re.compile(r"\bFROM\s+(?:\w+\.)?(\w+)", re.I)
+
+
+def get_plan_location():
+    """Ruta s3://bucket/prefijo o directorio local de los planes: --PLAN_LOCATION o, si no
+    se indica, --SNAPSHOT_LOCATION. Sin ninguna de las dos no se capturan planes"""
+    return get_optional_enviroment_variable(
+        "PLAN_LOCATION", get_optional_enviroment_variable("SNAPSHOT_LOCATION")
+    )
+
+
+def is_plan_capture_enabled():
+    """La captura de planes esta activa si hay ruta de planes, salvo con --PLAN_CAPTURE false"""
+    return (
+        get_optional_enviroment_variable("PLAN_CAPTURE", "true").lower() == "true"
+        and get_plan_location() is not None
+    )
+
+
+def normalize_query(query):
+    """Texto de la consulta sin hints, comentarios ni literales, para que la misma consulta
+    con otra fecha o con otra lista de categorias tenga el mismo nombre"""
+    normalized_query = HINT_PATTERN.sub(" ", query)
+    normalized_query = STRING_PATTERN.sub("?", normalized_query)
+    normalized_query = NUMBER_PATTERN.sub("?", normalized_query)
+    normalized_query = VALUE_LIST_PATTERN.sub("(?)", normalized_query)
+    return " ".join(normalized_query.split()).upper()
+
+
+def get_query_name(query):
+    """Nombre estable de la consulta: funcion que la ejecuta, primera tabla y hash del texto
+    normalizado, por ejemplo get_origin_data.pub_rfl_prices.3fa2b1c9"""
+    normalized_query = normalize_query(query)
+    table_match = TABLE_PATTERN.search(normalized_query)
+    table_name = table_match.group(1).lower() if table_match else "sin_tabla"
+    query_hash = hashlib.sha1(normalized_query.encode("utf-8")).hexdigest()[:8]
+    caller_name = get_caller_name(("pymysql",)) or "desconocida"
+    return f"{caller_name}.{table_name}.{query_hash}"
+
+
+def get_plan_tables(plan_node, tables=None):
+    """Recorre el EXPLAIN FORMAT=JSON y retorna el acceso a cada tabla en orden de join"""
+    if tables is None:
+        tables = []
+    if isinstance(plan_node, dict):
+        table_node = plan_node.get("table")
+        if isinstance(table_node, dict) and "table_name" in table_node:
+            tables.append(
+                {
+                    "table_name": table_node["table_name"],
+                    "access_type": table_node.get("access_type"),
+                    "key": table_node.get("key"),
+                    "rows_examined": int(table_node.get("rows_examined_per_scan", 0)),
+                }
+            )
+        for child_node in plan_node.values():
+            get_plan_tables(child_node, tables)
+    elif isinstance(plan_node, list):
+        for child_node in plan_node:
+            get_plan_tables(child_node, tables)
+    return tables
+
+
+def summarize_plan(explain_json):
+    """Huella del plan (tablas, tipo de acceso e indice, sin estimados de filas), estimados
+    de filas y costo, y las tablas leidas completas"""
+    plan = json_loads(explain_json)
+    tables = get_plan_tables(plan)
+    plan_shape = "|".join(
+        f"{table['table_name']}:{table['access_type']}:{table['key']}" for table in tables
+    )
+    return {
+        "fingerprint": hashlib.sha1(plan_shape.encode("utf-8")).hexdigest()[:12],
+        "query_cost": plan.get("query_block", {}).get("cost_info", {}).get("query_cost"),
+        "rows_examined": sum(table["rows_examined"] for table in tables),
+        "tables": tables,
+        "full_scans": [
+            table["table_name"]
+            for table in tables
+            if table["access_type"] == "ALL" and table["rows_examined"] >= FULL_SCAN_MIN_ROWS
+        ],
+    }
+
+
+def read_latest_plan(location, query_name):
+    latest_body = read_object(location, f"{PLANS_PREFIX}/{query_name}/latest.json")
+    return json_loads(latest_body) if latest_body else None
+
+
+def record_plan(query_name, query, explain_json, previous_plan):
+    """Guarda el plan del dia y lo compara con el ultimo guardado. Un cambio de huella o una
+    lectura completa de tabla se registran como advertencia y como metricas PlanChanges y
+    FullScans
+    Parameters:
+    -----------
+    query_name: str, required
+        Nombre de la consulta calculado con get_query_name
+    query: str, required
+        Texto de la consulta
+    explain_json: str, required
+        Resultado de EXPLAIN FORMAT=JSON
+    previous_plan: dict | None, required
+        Ultimo resumen guardado de la consulta
+
+    Returns:
+    --------
+    dict
+        Resumen del plan guardado en latest.json
+    """
+    location = get_plan_location()
+    today_date = dt.date.today().isoformat()
+    plan_summary = summarize_plan(explain_json)
+    plan_changed = (
+        previous_plan is not None and previous_plan["fingerprint"] != plan_summary["fingerprint"]
+    )
+    plan_summary.update(
+        {
+            "query_name": query_name,
+            "captured_date": today_date,
+            "query": query,
+            "previous_fingerprint": previous_plan["fingerprint"]
+            if plan_changed
+            else (previous_plan or {}).get("previous_fingerprint"),
+            "plan_since": today_date
+            if previous_plan is None or plan_changed
+            else previous_plan.get("plan_since", previous_plan["captured_date"]),
+        }
+    )
+    write_object(location, f"{PLANS_PREFIX}/{query_name}/{today_date}.json", explain_json.encode("utf-8"))
+    write_object(
+        location,
+        f"{PLANS_PREFIX}/{query_name}/latest.json",
+        json_dumps(plan_summary, default=str).encode("utf-8"),
+    )
+    if plan_changed:
+        logger.warning(
+            f"Cambio de plan en la consulta {query_name}: {previous_plan['fingerprint']} -> "
+            f"{plan_summary['fingerprint']}, filas estimadas {previous_plan['rows_examined']} -> "
+            f"{plan_summary['rows_examined']}."
+        )
+    if plan_summary["full_scans"]:
+        logger.warning(
+            f"La consulta {query_name} lee completas las tablas {plan_summary['full_scans']}."
+        )
+    emit_metrics(
+        "plan",
+        {
+            "PlanChanges": int(plan_changed),
+            "FullScans": len(plan_summary["full_scans"]),
+            "RowsExamined": plan_summary["rows_examined"],
+        },
+        {"query_name": query_name, "plan_fingerprint": plan_summary["fingerprint"]},
+    )
+    return plan_summary
+
+
+def trace_query_timeout(query_name):
+    """Registra el plan vigente de una consulta que excedio MAX_EXECUTION_TIME (error 3024):
+    desde cuando esta vigente, la huella anterior y las tablas leidas completas"""
+    emit_metrics("plan", {"QueryTimeouts": 1}, {"query_name": query_name})
+    try:
+        latest_plan = read_latest_plan(get_plan_location(), query_name)
+    except Exception as read_plan_exception:
+        logger.warning(f"No se pudo leer el plan de la consulta {query_name}: {read_plan_exception}")
+        return
+    if latest_plan is None:
+        logger.error(f"La consulta {query_name} excedio el tiempo maximo y no tiene plan capturado.")
+        return
+    logger.error(
+        f"La consulta {query_name} excedio el tiempo maximo. Plan {latest_plan['fingerprint']} "
+        f"vigente desde {latest_plan.get('plan_since')}, plan anterior "
+        f"{latest_plan.get('previous_fingerprint')}, filas estimadas "
+        f"{latest_plan['rows_examined']}, tablas leidas completas {latest_plan['full_scans']}."
+    )
+
+
+class PlanCaptureMixin:
+    """Antes de ejecutar una consulta SELECT por primera vez en el dia corre EXPLAIN
+    FORMAT=JSON sobre ella y guarda su plan; la fecha de la ultima captura se lee del plan
+    guardado, porque cada corrida de Glue es un proceso nuevo. Si la consulta falla por
+    MAX_EXECUTION_TIME (error 3024) registra el plan vigente y lo vuelve a capturar para
+    detectar un cambio de plan durante el dia. Un error en la captura nunca afecta la
+    consulta del job"""
+
+    def execute(self, query, args=None):
+        if not is_plan_capture_enabled() or not query.lstrip().upper().startswith(EXPLAINABLE_STATEMENTS):
+            return super().execute(query, args)
+        query_text = self.mogrify(query, args) if args is not None else query
+        query_name = get_query_name(query_text)
+        today = dt.date.today().isoformat()
+        with _captured_lock:
+            already_checked = _captured_today.get(query_name) == today
+        # El dia se marca solo si la captura termina; si falla se reintenta en la siguiente
+        # ejecucion de la consulta
+        if not already_checked and self.capture_plan(query_name, query_text):
+            with _captured_lock:
+                _captured_today[query_name] = today
+        try:
+            return super().execute(query, args)
+        except pymysql.err.OperationalError as query_error:
+            if query_error.args and query_error.args[0] == QUERY_TIMEOUT_ERROR:
+                trace_query_timeout(query_name)
+                self.capture_plan(query_name, query_text, force=True)
+            raise
+
+    def capture_plan(self, query_name, query_text, force=False):
+        """Retorna True si el plan del dia quedo capturado, ahora o en una corrida anterior"""
+        try:
+            previous_plan = read_latest_plan(get_plan_location(), query_name)
+            if (
+                not force
+                and previous_plan is not None
+                and previous_plan["captured_date"] == dt.date.today().isoformat()
+            ):
+                return True
+            super().execute("EXPLAIN FORMAT=JSON " + query_text)
+            explain_row = self.fetchone()
+            self.fetchall()
+            record_plan(query_name, query_text, explain_row["EXPLAIN"], previous_plan)
+            return True
+        except Exception as capture_plan_exception:
+            logger.warning(
+                f"No se pudo capturar el plan de la consulta {query_name}: {capture_plan_exception}"
+            )
+            return False
+
+
+class PlanCapturingCursor(PlanCaptureMixin, pymysql.cursors.DictCursor):
+    """DictCursor con captura diaria de planes"""
+
+
+class PlanCapturingSSCursor(PlanCaptureMixin, pymysql.cursors.SSDictCursor):
+    """SSDictCursor (lectura en streaming) con captura diaria de planes"""
@@ -0,0 +1,72 @@
+import base64
+import json
+
+
+def encode_json(value, **dumps_arguments):
+    """Serializa a JSON un objeto con los Decimal de DynamoDB como float. float(Decimal) da el
+    mismo numero que el float(str(Decimal)) del DecimalEncoder de los lambdas, sin pasar por el
+    texto del numero ni crear un JSONEncoder en cada llamada
+    Parameters:
+    -----------
+    value: object, required
+        Objeto a serializar, por ejemplo un item leido con boto3.resource("dynamodb")
+    dumps_arguments: dict, optional
+        Argumentos adicionales de json.dumps (indent, separators...)
+
+    Returns:
+    --------
+    str
+        JSON del objeto
+    """
+    return json.dumps(value, default=float, **dumps_arguments)
+
+
+def from_attribute_value(attribute_value):
+    """Convierte un valor en el formato AttributeValue del cliente de bajo nivel de DynamoDB
+    ({"N": "1.5"}, {"M": {...}}, {"L": [...]}) directamente a tipos de JSON, con los numeros
+    como float. Reemplaza el TypeDeserializer de boto3, que crea un Decimal por numero que luego
+    hay que volver a convertir para serializar. Los conjuntos (SS, NS, BS) quedan como listas y
+    los binarios (B, BS), que JSON no admite, como texto en base64
+    Parameters:
+    -----------
+    attribute_value: dict, required
+        Valor con una sola llave de tipo de DynamoDB
+
+    Returns:
+    --------
+    object
+        Valor con tipos de JSON
+    """
+    # Los tipos se revisan en orden de frecuencia en los items de los ETL
+    if "S" in attribute_value:
+        return attribute_value["S"]
+    if "N" in attribute_value:
+        return float(attribute_value["N"])
+    if "M" in attribute_value:
+        return {key: from_attribute_value(value) for key, value in attribute_value["M"].items()}
+    if "L" in attribute_value:
+        return [from_attribute_value(value) for value in attribute_value["L"]]
+    if "NULL" in attribute_value:
+        return None
+    if "BOOL" in attribute_value:
+        return attribute_value["BOOL"]
+    if "NS" in attribute_value:
+        return [float(number) for number in attribute_value["NS"]]
+    if "SS" in attribute_value:
+        return list(attribute_value["SS"])
+    if "B" in attribute_value:
+        return base64.b64encode(attribute_value["B"]).decode("ascii")
+    if "BS" in attribute_value:
+        return [base64.b64encode(value).decode("ascii") for value in attribute_value["BS"]]
+    raise TypeError(f"Tipo de DynamoDB no soportado en JSON: {list(attribute_value)}")
+
+
+def from_attribute_item(item):
+    """Item completo del cliente de bajo nivel ({atributo: AttributeValue}) con tipos de JSON.
+    Los atributos binarios del item (B, BS), como el payload comprimido data_deflate, no son
+    data de la respuesta y se omiten"""
+    return {
+        attribute: from_attribute_value(value)
+        for attribute, value in item.items()
+        if "B" not in value and "BS" not in value
+    }
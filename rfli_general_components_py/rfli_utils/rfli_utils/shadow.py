@@ -0,0 +1,271 @@
+import copy
+import datetime as dt
+import importlib
+import logging
+import os
+import tempfile
+import time
+from decimal import Decimal
+from json import dumps as json_dumps
+
+from rfli_utils.config import get_aws_resource, get_optional_enviroment_variable
+from rfli_utils.delta_writer import get_item_key, get_key_names
+from rfli_utils.metrics import emit_metrics, get_job_name
+from rfli_utils.snapshot import write_object
+
+logger = logging.getLogger()
+
+CURRENT_ENGINE = "current"
+DEFAULT_SHADOW_LOCATION = os.path.join(tempfile.gettempdir(), "rfli-shadow")
+DEFAULT_TOLERANCE = "1e-9"
+REPORTED_DIFFERENCES = 20
+
+
+def get_shadow_engine_path():
+    """Motor sombra de --SHADOW_ENGINE: 'paquete.modulo:funcion' (modulo entregado con
+    --extra-py-files) o 'current' para comparar el motor actual contra si mismo. Sin el
+    argumento no hay modo sombra"""
+    return get_optional_enviroment_variable("SHADOW_ENGINE")
+
+
+def get_tolerance():
+    """Diferencia absoluta maxima entre dos numeros para considerarlos iguales (--SHADOW_TOLERANCE)"""
+    return Decimal(get_optional_enviroment_variable("SHADOW_TOLERANCE", DEFAULT_TOLERANCE))
+
+
+def get_shadow_location():
+    """Ruta s3://bucket/prefijo o directorio local de --SHADOW_LOCATION donde se guardan los
+    reportes de diferencias. Por defecto un directorio temporal local"""
+    return get_optional_enviroment_variable("SHADOW_LOCATION", DEFAULT_SHADOW_LOCATION)
+
+
+def load_shadow_engine(engine_path, current_engine):
+    """Funcion engine(job, *inputs) del motor sombra
+    Parameters:
+    -----------
+    engine_path: str, required
+        'paquete.modulo:funcion' o 'current'
+    current_engine: function, required
+        Metodo del job con el motor actual
+
+    Returns:
+    --------
+    function
+        Motor sombra con la misma firma del motor actual mas el job como primer argumento
+    """
+    if engine_path == CURRENT_ENGINE:
+        return lambda job, *inputs: current_engine(*inputs)
+    module_name, function_name = engine_path.split(":", 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def is_number(value):
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def find_differences(current_value, shadow_value, tolerance, path=""):
+    """Rutas donde difieren dos valores de un payload. Los numeros se comparan como Decimal con
+    la tolerancia indicada, de modo que 1.50 y 1.5, o un float y su Decimal, son iguales
+    Parameters:
+    -----------
+    current_value: object, required
+        Valor producido por el motor actual
+    shadow_value: object, required
+        Valor producido por el motor sombra
+    tolerance: Decimal, required
+        Diferencia absoluta maxima entre numeros
+    path: str, optional
+        Ruta del valor dentro del item
+
+    Returns:
+    --------
+    list
+        Tuplas (ruta, valor actual, valor sombra)
+    """
+    if is_number(current_value) and is_number(shadow_value):
+        if abs(Decimal(str(current_value)) - Decimal(str(shadow_value))) <= tolerance:
+            return []
+        return [(path, current_value, shadow_value)]
+    if isinstance(current_value, dict) and isinstance(shadow_value, dict):
+        differences = []
+        for attribute in sorted(set(current_value) | set(shadow_value), key=str):
+            attribute_path = f"{path}.{attribute}" if path else str(attribute)
+            if attribute not in current_value or attribute not in shadow_value:
+                differences.append(
+                    (attribute_path, current_value.get(attribute), shadow_value.get(attribute))
+                )
+                continue
+            differences.extend(
+                find_differences(
+                    current_value[attribute], shadow_value[attribute], tolerance, attribute_path
+                )
+            )
+        return differences
+    if isinstance(current_value, list) and isinstance(shadow_value, list):
+        if len(current_value) != len(shadow_value):
+            return [(f"{path}[]", len(current_value), len(shadow_value))]
+        differences = []
+        for position, (current_element, shadow_element) in enumerate(zip(current_value, shadow_value)):
+            differences.extend(
+                find_differences(current_element, shadow_element, tolerance, f"{path}[{position}]")
+            )
+        return differences
+    if current_value != shadow_value:
+        return [(path, current_value, shadow_value)]
+    return []
+
+
+def compare_table_items(current_items, shadow_items, key_names, tolerance):
+    """Compara item por item, por llave primaria, los items de una tabla de ambos motores. Si
+    una llave se repite gana el ultimo item, igual que al escribirlo en DynamoDB
+
+    Returns:
+    --------
+    dict
+        Conteo de items iguales, distintos y presentes en un solo motor, con las primeras
+        diferencias encontradas
+    """
+    current_by_key = {get_item_key(item, key_names): item for item in current_items or []}
+    shadow_by_key = {get_item_key(item, key_names): item for item in shadow_items or []}
+    comparison = {
+        "current_items": len(current_by_key),
+        "shadow_items": len(shadow_by_key),
+        "equal": 0,
+        "different": 0,
+        "only_current": 0,
+        "only_shadow": len(set(shadow_by_key) - set(current_by_key)),
+        "differences": [],
+    }
+    for item_key, current_item in current_by_key.items():
+        if item_key not in shadow_by_key:
+            comparison["only_current"] += 1
+            continue
+        item_differences = find_differences(current_item, shadow_by_key[item_key], tolerance)
+        if not item_differences:
+            comparison["equal"] += 1
+            continue
+        comparison["different"] += 1
+        if len(comparison["differences"]) < REPORTED_DIFFERENCES:
+            comparison["differences"].append(
+                {
+                    "key": item_key,
+                    "attributes": [
+                        {"path": path, "current": current_value, "shadow": shadow_value}
+                        for path, current_value, shadow_value in item_differences[:REPORTED_DIFFERENCES]
+                    ],
+                }
+            )
+    for item_key in sorted(set(shadow_by_key) - set(current_by_key))[:REPORTED_DIFFERENCES]:
+        comparison["differences"].append({"key": item_key, "attributes": [], "only": "shadow"})
+    return comparison
+
+
+def save_shadow_report(engine_name, shadow_report):
+    report_key = (
+        f"shadow/{get_job_name()}/{dt.datetime.utcnow().strftime('%Y-%m-%dT%H-%M-%S')}"
+        f"/{engine_name}.json"
+    )
+    write_object(
+        get_shadow_location(),
+        report_key,
+        json_dumps(shadow_report, indent=2, default=str).encode("utf-8"),
+    )
+    return f"{get_shadow_location()}/{report_key}"
+
+
+def run_shadowed(job, current_engine, inputs, output_tables):
+    """Ejecuta el motor actual de una etapa y, con --SHADOW_ENGINE, tambien el motor sombra
+    sobre una copia de las mismas entradas. Compara los payloads de DynamoDB de ambos item por
+    item y registra las dos duraciones. Solo se retorna, y por lo tanto solo se escribe, la
+    salida del motor actual; un error del motor sombra se registra y nunca afecta la corrida
+    Parameters:
+    -----------
+    job: object, required
+        Instancia del job, que recibe el motor sombra como primer argumento
+    current_engine: function, required
+        Metodo del job con el motor actual, por ejemplo self.transform_data
+    inputs: tuple, required
+        Entradas extraidas de la etapa
+    output_tables: tuple, required
+        Tabla de DynamoDB de cada elemento de la salida, en el mismo orden. Con una sola tabla
+        la salida es la lista de items
+
+    Returns:
+    --------
+    object
+        Salida del motor actual
+    """
+    engine_path = get_shadow_engine_path()
+    if not engine_path:
+        return current_engine(*inputs)
+    engine_name = current_engine.__name__
+    try:
+        shadow_engine = load_shadow_engine(engine_path, current_engine)
+        shadow_inputs = copy.deepcopy(inputs)
+    except Exception as load_shadow_exception:
+        logger.error(f"No se pudo cargar el motor sombra {engine_path}: {load_shadow_exception}")
+        return current_engine(*inputs)
+
+    start_time = time.perf_counter()
+    current_output = current_engine(*inputs)
+    current_duration = (time.perf_counter() - start_time) * 1000
+    try:
+        start_time = time.perf_counter()
+        shadow_output = shadow_engine(job, *shadow_inputs)
+        shadow_duration = (time.perf_counter() - start_time) * 1000
+        if len(output_tables) == 1:
+            current_output_items, shadow_output_items = (current_output,), (shadow_output,)
+        else:
+            current_output_items, shadow_output_items = current_output, shadow_output
+        tolerance = get_tolerance()
+        table_comparisons = {}
+        for table_name, current_items, shadow_items in zip(
+            output_tables, current_output_items, shadow_output_items
+        ):
+            key_names = get_key_names(get_aws_resource("dynamodb").Table(table_name))
+            table_comparisons[table_name] = compare_table_items(
+                current_items, shadow_items, key_names, tolerance
+            )
+        mismatches = sum(
+            comparison["different"] + comparison["only_current"] + comparison["only_shadow"]
+            for comparison in table_comparisons.values()
+        )
+        shadow_report = {
+            "engine": engine_path,
+            "function": engine_name,
+            "current_ms": round(current_duration, 3),
+            "shadow_ms": round(shadow_duration, 3),
+            "tolerance": str(tolerance),
+            "mismatches": mismatches,
+            "tables": table_comparisons,
+        }
+        report_path = save_shadow_report(engine_name, shadow_report)
+    except Exception as shadow_exception:
+        logger.error(
+            f"Fallo el motor sombra {engine_path} en {engine_name}: "
+            f"{shadow_exception.__class__.__name__} {shadow_exception}"
+        )
+        emit_metrics(
+            "shadow",
+            {"Duration": round(current_duration, 3)},
+            {"function": engine_name, "engine": engine_path, "Status": "error"},
+        )
+        return current_output
+    emit_metrics(
+        "shadow",
+        {
+            "Duration": round(current_duration, 3),
+            "ShadowDuration": round(shadow_duration, 3),
+            "ShadowMismatches": mismatches,
+        },
+        {"function": engine_name, "engine": engine_path, "report": report_path, "Status": "ok"},
+    )
+    log_message = (
+        f"Modo sombra {engine_name}: actual {current_duration:.0f} ms, sombra "
+        f"{shadow_duration:.0f} ms, {mismatches} items distintos. Reporte en {report_path}"
+    )
+    if mismatches:
+        logger.warning(log_message)
+    else:
+        logger.info(log_message)
+    return current_output
@@ -0,0 +1,430 @@
+import datetime as dt
+import gzip
+import logging
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from io import BytesIO
+from json import dumps as json_dumps, loads as json_loads
+from os import makedirs, path as os_path, remove
+
+from botocore.exceptions import ClientError
+
+from rfli_utils.config import get_aws_client
+from rfli_utils.metrics import StageMetrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger()
+
+EXCLUDED_INSTRUMENTS = ("TIDISDVL", "CERTS")
+MANIFEST_NAME = "manifest.json"
+MISSING_OBJECT_CODES = ("NoSuchKey", "404", "AccessDenied", "403")
+# Tablas sondeables de la foto. Las maestras (categorias, emisores, instrumentos y rangos) no se
+# sondean, igual que en change_probe
+SNAPSHOT_PROBE_SOURCES = ("pub_rfl_prices",)
+
+SNAPSHOT_QUERIES = {
+    "prices": "SELECT {timeout_string} \
+                cast(valuation_date As CHAR) AS valuation_date,\
+                isin_code,\
+                instrument,\
+                yield,\
+                equivalent_margin,\
+                margin_value,\
+                spread,\
+                mean_price,\
+                clean_price,\
+                accrued_interest,\
+                convexity,\
+                duration,\
+                modified_duration,\
+                rate_type,\
+                currency_type,\
+                real_rating,\
+                payment_frequency,\
+                cast(issue_date As CHAR) AS issue_date,\
+                cast(maturity_date As CHAR) AS maturity_date,\
+                maturity_days,\
+                category_id\
+            FROM precia_published.pub_rfl_prices\
+            WHERE valuation_date IN ('{today_date}', '{yesterday_date}');",
+    "categories": "SELECT {timeout_string} \
+                category_id,\
+                CONVERT(class,DECIMAL(3,0)) AS category_class,\
+                rating_group,\
+                maturity_range,\
+                currency_group,\
+                rate_group\
+            FROM precia_sources.src_rfl_category;",
+    "issuers": "SELECT {timeout_string} issuer, name\
+            FROM precia_sources.src_rfl_issuer;",
+    "instruments": "SELECT {timeout_string} isin_code, instrument, issuer, cc_curve\
+            FROM precia_sources.src_rfl_instrument;",
+    "expiration_ranges": "SELECT {timeout_string} id_expiration_range, start_range, end_range\
+            FROM precia_sources.src_rfl_expiration_range;",
+}
+
+
+def filter_published_isines(rows):
+    """Aplica el filtro comun de los componentes: isin no vacio y sin instrumentos excluidos"""
+    return [
+        row
+        for row in rows
+        if row["isin_code"] != "" and row["instrument"] not in EXCLUDED_INSTRUMENTS
+    ]
+
+
+def coalesce(*values):
+    """Primer valor que no es None, como COALESCE de SQL: los textos vacios y los ceros se
+    conservan"""
+    return next((value for value in values if value is not None), None)
+
+
+def index_by_isin(rows, key="isin_code"):
+    """Indexa las filas por codigo isin. Si hay duplicados se conserva la ultima fila"""
+    return {row[key]: row for row in rows}
+
+
+class MarketSnapshot:
+    """Foto de mercado de un ciclo intradia: precios de hoy y ayer, categorias, emisores,
+    instrumentos y rangos de vencimiento, leidos una sola vez desde la base de datos y
+    compartidos entre los componentes como archivos columnares (Parquet) en S3 o en disco local.
+    La foto guarda la huella de SNAPSHOT_PROBE_SOURCES tomada antes de extraerla, para que un
+    componente solo la reutilice si su propio sondeo ve los mismos datos
+    """
+
+    def __init__(self, valuation_date, tables, created_at=None, source_fingerprint=None):
+        self.valuation_date = valuation_date.strftime("%Y-%m-%d")
+        self.yesterday_date = (valuation_date - dt.timedelta(days=1)).strftime(
+            "%Y-%m-%d"
+        )
+        self.tables = tables
+        self.created_at = created_at if created_at is not None else time.time()
+        self.source_fingerprint = source_fingerprint
+
+    @property
+    def prices_today(self):
+        return [
+            row
+            for row in self.tables["prices"]
+            if row["valuation_date"] == self.valuation_date
+        ]
+
+    @property
+    def prices_yesterday(self):
+        return [
+            row
+            for row in self.tables["prices"]
+            if row["valuation_date"] == self.yesterday_date
+        ]
+
+    @property
+    def categories(self):
+        return self.tables["categories"]
+
+    @property
+    def issuers(self):
+        return self.tables["issuers"]
+
+    @property
+    def instruments(self):
+        return self.tables["instruments"]
+
+    @property
+    def expiration_ranges(self):
+        return self.tables["expiration_ranges"]
+
+    def get_issuer_names(self):
+        """Retorna el nombre de cada emisor indexado por su codigo"""
+        return {row["issuer"]: row["name"] for row in self.issuers}
+
+    @classmethod
+    def build(
+        cls, cursor_connection, valuation_date, timeout_string="", probe_sources=False
+    ):
+        """Construye la foto ejecutando una sola vez cada consulta de origen
+        Parameters:
+        -----------
+        cursor_connection: pymysql.cursors.DictCursor, required
+            Cursor abierto contra la base de datos de origen
+        valuation_date: datetime, required
+            Fecha de valoracion del ciclo
+        timeout_string: str, optional
+            Hint de tiempo maximo de ejecucion de cada consulta
+        probe_sources: bool, optional
+            Si se sondea SNAPSHOT_PROBE_SOURCES antes de las consultas. El sondeo va primero
+            para que la foto nunca tenga datos mas viejos que su huella
+
+        Returns:
+        --------
+        MarketSnapshot
+        """
+        query_values = {
+            "timeout_string": timeout_string,
+            "today_date": valuation_date.strftime("%Y-%m-%d"),
+            "yesterday_date": (valuation_date - dt.timedelta(days=1)).strftime(
+                "%Y-%m-%d"
+            ),
+        }
+        source_fingerprint = None
+        if probe_sources:
+            # Importacion local: change_probe -> database -> query_plans importa este modulo
+            from rfli_utils.change_probe import get_source_fingerprint
+
+            source_fingerprint = get_source_fingerprint(
+                cursor_connection,
+                SNAPSHOT_PROBE_SOURCES,
+                valuation_date,
+                timeout_string,
+                record_probe_time=False,
+            )
+        tables = {}
+        for table_name, query in SNAPSHOT_QUERIES.items():
+            logger.info(f"Consultando {table_name} para la foto de mercado.")
+            with StageMetrics("query", query_name=table_name) as query_metrics:
+                cursor_connection.execute(query.format(**query_values))
+                tables[table_name] = list(cursor_connection.fetchall())
+                query_metrics.rows_out = len(tables[table_name])
+        logger.info(
+            "Foto de mercado construida: "
+            + str({name: len(rows) for name, rows in tables.items()})
+        )
+        return cls(valuation_date, tables, source_fingerprint=source_fingerprint)
+
+    def save(self, location):
+        """Guarda cada tabla de la foto y al final el manifiesto que la hace visible
+        Parameters:
+        -----------
+        location: str, required
+            Ruta s3://bucket/prefijo o directorio local
+        """
+        file_format = "parquet" if pq is not None else "json"
+        for table_name, rows in self.tables.items():
+            write_object(
+                location,
+                f"{self.valuation_date}/{table_name}.{file_format}",
+                serialize_rows(rows, file_format),
+            )
+        manifest = {
+            "valuation_date": self.valuation_date,
+            "created_at": self.created_at,
+            "format": file_format,
+            "tables": {name: len(rows) for name, rows in self.tables.items()},
+            "source_fingerprint": self.source_fingerprint,
+        }
+        write_object(
+            location,
+            f"{self.valuation_date}/{MANIFEST_NAME}",
+            json_dumps(manifest).encode("utf-8"),
+        )
+        logger.info(f"Foto de mercado guardada en {location}/{self.valuation_date}")
+
+    @classmethod
+    def load(cls, location, valuation_date, max_age_seconds, source_fingerprint=None):
+        """Carga la foto de la fecha si existe, no es mas antigua que max_age_seconds y su
+        huella coincide con la del sondeo del componente
+        Parameters:
+        -----------
+        location: str, required
+            Ruta s3://bucket/prefijo o directorio local
+        valuation_date: datetime, required
+            Fecha de valoracion del ciclo
+        max_age_seconds: int, required
+            Edad maxima aceptada para reutilizar la foto
+        source_fingerprint: dict | None, optional
+            Huella del sondeo del componente. Si incluye alguna tabla de SNAPSHOT_PROBE_SOURCES
+            con un valor distinto al de la foto, la foto no se reutiliza
+
+        Returns:
+        --------
+        MarketSnapshot | None
+            None si no existe una foto vigente
+        """
+        valuation_date_str = valuation_date.strftime("%Y-%m-%d")
+        manifest_body = read_object(location, f"{valuation_date_str}/{MANIFEST_NAME}")
+        if manifest_body is None:
+            return None
+        manifest = json_loads(manifest_body)
+        snapshot_age = time.time() - manifest["created_at"]
+        if snapshot_age > max_age_seconds:
+            logger.info(
+                f"La foto de mercado tiene {int(snapshot_age)} segundos. Se debe reconstruir."
+            )
+            return None
+        if not matches_fingerprint(manifest.get("source_fingerprint"), source_fingerprint):
+            logger.info(
+                "El origen cambio desde que se construyo la foto de mercado. Se debe reconstruir."
+            )
+            return None
+        tables = {}
+        for table_name in manifest["tables"]:
+            table_body = read_object(
+                location, f"{valuation_date_str}/{table_name}.{manifest['format']}"
+            )
+            if table_body is None:
+                return None
+            tables[table_name] = deserialize_rows(table_body, manifest["format"])
+        logger.info(
+            f"Se reutiliza la foto de mercado creada hace {int(snapshot_age)} segundos."
+        )
+        return cls(
+            valuation_date,
+            tables,
+            manifest["created_at"],
+            manifest.get("source_fingerprint"),
+        )
+
+
+def matches_fingerprint(snapshot_fingerprint, source_fingerprint):
+    """Indica si la foto tiene los mismos datos que vio el sondeo del componente en las tablas
+    de SNAPSHOT_PROBE_SOURCES que ambos sondearon. Sin huella del componente no hay con que
+    comparar; una foto sin huella solo se acepta en ese caso"""
+    if source_fingerprint is None:
+        return True
+    shared_sources = [name for name in SNAPSHOT_PROBE_SOURCES if name in source_fingerprint]
+    if not shared_sources:
+        return True
+    if snapshot_fingerprint is None:
+        return False
+    return all(
+        snapshot_fingerprint.get(name) == source_fingerprint[name]
+        for name in shared_sources
+    )
+
+
+def get_market_snapshot(
+    cursor_connection,
+    valuation_date,
+    location,
+    max_age_seconds,
+    timeout_string="",
+    source_fingerprint=None,
+):
+    """Retorna la foto de mercado vigente del ciclo. La construye y la publica solo si
+    ningun otro componente lo hizo dentro de max_age_seconds con los mismos datos que vio el
+    sondeo del componente, para que la huella guardada con la version describa los datos
+    publicados. Sin ubicacion (el job no recibe
+    --SNAPSHOT_LOCATION) la foto se extrae directamente de la base de datos y no se comparte
+    Parameters:
+    -----------
+    cursor_connection: pymysql.cursors.DictCursor, required
+        Cursor abierto contra la base de datos de origen
+    valuation_date: datetime, required
+        Fecha de valoracion del ciclo
+    location: str | None, required
+        Ruta s3://bucket/prefijo o directorio local, o None para no compartir la foto
+    max_age_seconds: int, required
+        Edad maxima aceptada para reutilizar una foto existente
+    timeout_string: str, optional
+        Hint de tiempo maximo de ejecucion de cada consulta
+    source_fingerprint: dict | None, optional
+        Huella calculada por run_change_probe en el ciclo
+
+    Returns:
+    --------
+    MarketSnapshot
+    """
+    if not location:
+        return MarketSnapshot.build(cursor_connection, valuation_date, timeout_string)
+    try:
+        snapshot = MarketSnapshot.load(
+            location, valuation_date, max_age_seconds, source_fingerprint
+        )
+    except Exception as load_snapshot_exception:
+        logger.warning(
+            "No se pudo leer la foto de mercado existente: "
+            + str(load_snapshot_exception)
+        )
+        snapshot = None
+    if snapshot is None:
+        snapshot = MarketSnapshot.build(
+            cursor_connection, valuation_date, timeout_string, probe_sources=True
+        )
+        snapshot.save(location)
+    return snapshot
+
+
+def serialize_rows(rows, file_format):
+    if file_format == "parquet":
+        buffer = BytesIO()
+        pq.write_table(pa.Table.from_pylist(rows), buffer)
+        return buffer.getvalue()
+    return gzip.compress(json_dumps(rows, default=encode_json_value).encode("utf-8"))
+
+
+def encode_json_value(value):
+    if isinstance(value, Decimal):
+        if value.as_tuple().exponent >= 0:
+            return int(value)
+        return float(value)
+    return str(value)
+
+
+def deserialize_rows(body, file_format):
+    if file_format == "parquet":
+        return pq.read_table(pa.BufferReader(body)).to_pylist()
+    return json_loads(gzip.decompress(body).decode("utf-8"), parse_float=Decimal)
+
+
+def split_s3_location(location):
+    bucket, _, prefix = location[len("s3://") :].partition("/")
+    return bucket, prefix.strip("/")
+
+
+def write_object(location, key, body):
+    if location.startswith("s3://"):
+        bucket, prefix = split_s3_location(location)
+        get_aws_client("s3").put_object(
+            Bucket=bucket, Key=f"{prefix}/{key}" if prefix else key, Body=body
+        )
+        return
+    file_path = os_path.join(location, key)
+    makedirs(os_path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as snapshot_file:
+        snapshot_file.write(body)
+
+
+def read_object(location, key):
+    if location.startswith("s3://"):
+        bucket, prefix = split_s3_location(location)
+        s3_client = get_aws_client("s3")
+        try:
+            response = s3_client.get_object(
+                Bucket=bucket, Key=f"{prefix}/{key}" if prefix else key
+            )
+        except ClientError as read_object_error:
+            # Sin s3:ListBucket S3 responde 403 (AccessDenied) en lugar de 404 (NoSuchKey)
+            # cuando el objeto no existe, asi que ambos se tratan como objeto ausente
+            if read_object_error.response.get("Error", {}).get("Code") in MISSING_OBJECT_CODES:
+                return None
+            raise
+        return response["Body"].read()
+    file_path = os_path.join(location, key)
+    if not os_path.exists(file_path):
+        return None
+    with open(file_path, "rb") as snapshot_file:
+        return snapshot_file.read()
+
+
+def delete_object(location, key):
+    if location.startswith("s3://"):
+        bucket, prefix = split_s3_location(location)
+        get_aws_client("s3").delete_object(
+            Bucket=bucket, Key=f"{prefix}/{key}" if prefix else key
+        )
+        return
+    file_path = os_path.join(location, key)
+    if os_path.exists(file_path):
+        remove(file_path)
+
+
+def round_half_up(value, digits):
+    """Redondea igual que ROUND de MySQL para valores DECIMAL. Conserva los valores nulos"""
+    if value is None:
+        return None
+    return Decimal(value).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP)
@@ -0,0 +1,55 @@
+import logging
+
+from rfli_utils.config import get_optional_enviroment_variable
+from rfli_utils.query_plans import PlanCapturingSSCursor
+
+logger = logging.getLogger()
+
+DEFAULT_FETCH_SIZE = 2000
+
+
+def is_streaming_mode():
+    """Indica si los jobs fueron lanzados con --STREAMING_EXTRACTION true"""
+    return (
+        get_optional_enviroment_variable("STREAMING_EXTRACTION", "false").lower()
+        == "true"
+    )
+
+
+def get_fetch_size():
+    return int(
+        get_optional_enviroment_variable("STREAMING_FETCH_SIZE", str(DEFAULT_FETCH_SIZE))
+    )
+
+
+def stream_query(connection, query, fetch_size=None):
+    """Ejecuta la consulta con un cursor del lado del servidor (SSDictCursor) y entrega las
+    filas de a bloques de fetchmany, sin cargar el resultado completo en memoria. Mientras
+    el generador no se agote la conexion queda ocupada con este resultado, por lo que no se
+    debe ejecutar otra consulta en la misma conexion hasta consumirlo
+    Parameters:
+    -----------
+    connection: pymysql.connections.Connection, required
+        Conexion abierta contra la base de datos de origen
+    query: str, required
+        Consulta a ejecutar
+    fetch_size: int, optional
+        Filas leidas por cada fetchmany. Por defecto --STREAMING_FETCH_SIZE o 2000
+
+    Yields:
+    -------
+    dict
+        Cada fila del resultado
+    """
+    fetch_size = fetch_size or get_fetch_size()
+    streamed_rows = 0
+    with connection.cursor(PlanCapturingSSCursor) as cursor_connection:
+        cursor_connection.execute(query)
+        while True:
+            rows = cursor_connection.fetchmany(fetch_size)
+            if not rows:
+                break
+            streamed_rows += len(rows)
+            yield from rows
+    logger.info(f"Se leyeron {streamed_rows} filas en modo streaming.")
+
@@ -0,0 +1,159 @@
+import logging
+import random
+import uuid
+from json import dumps as json_dumps
+from sys import stdout as sys_stdout
+
+from rfli_utils.config import get_optional_enviroment_variable
+
+PRECIA_LOG_FORMAT = (
+    "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s) [%(correlation_id)s]: %(message)s"
+)
+DEFAULT_MAX_CHARS = 2000
+PREVIEW_KEYS = 20
+
+_correlation_id = None
+
+
+def get_correlation_id():
+    """Id de correlacion de la corrida: el JOB_RUN_ID que Glue pasa a cada corrida o, fuera de
+    Glue, un id aleatorio. Va en cada log, en las metricas y en el manifiesto de la corrida"""
+    global _correlation_id
+    if _correlation_id is None:
+        _correlation_id = get_optional_enviroment_variable("JOB_RUN_ID") or uuid.uuid4().hex[:16]
+    return _correlation_id
+
+
+def get_max_chars():
+    return int(get_optional_enviroment_variable("LOG_MAX_CHARS", str(DEFAULT_MAX_CHARS)))
+
+
+def get_sample_rates():
+    """Fraccion de corridas que registran cada nivel, de --LOG_SAMPLE_RATE en formato
+    'INFO=0.2,DEBUG=0'. Los niveles no indicados se registran siempre"""
+    sample_rates = {}
+    for level_rate in get_optional_enviroment_variable("LOG_SAMPLE_RATE", "").split(","):
+        if "=" not in level_rate:
+            continue
+        level_name, rate = level_rate.split("=", 1)
+        sample_rates[logging.getLevelName(level_name.strip().upper())] = float(rate)
+    return sample_rates
+
+
+def truncate_text(text, max_chars=None):
+    """Texto recortado a max_chars caracteres (--LOG_MAX_CHARS por defecto), indicando su largo
+    original cuando se recorta"""
+    max_chars = max_chars or get_max_chars()
+    text = str(text)
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... ({len(text)} caracteres)"
+
+
+def summarize_payload(payload, max_chars=None):
+    """Resumen de un objeto para los logs en lugar del objeto completo: tipo, numero de
+    elementos y un extracto. Las listas y diccionarios no se serializan, de modo que resumir
+    un payload grande no cuesta CPU
+    Parameters:
+    -----------
+    payload: object, required
+        Objeto a resumir: texto, lista, diccionario u otro
+    max_chars: int, optional
+        Largo maximo del extracto. Por defecto --LOG_MAX_CHARS
+
+    Returns:
+    --------
+    str
+        Resumen en JSON
+    """
+    summary = {"type": type(payload).__name__}
+    if isinstance(payload, (str, bytes)):
+        summary["chars"] = len(payload)
+        summary["preview"] = payload[: (max_chars or get_max_chars())]
+    elif isinstance(payload, dict):
+        summary["items"] = len(payload)
+        summary["keys"] = list(payload)[:PREVIEW_KEYS]
+    elif isinstance(payload, (list, tuple, set)):
+        summary["items"] = len(payload)
+        if isinstance(payload, (list, tuple)) and payload and isinstance(payload[0], dict):
+            summary["keys"] = list(payload[0])[:PREVIEW_KEYS]
+    else:
+        summary["preview"] = truncate_text(payload, max_chars)
+    return json_dumps(summary, default=str)
+
+
+def log_fields(**fields):
+    """Campos estructurados de un log: logger.info("mensaje", extra=log_fields(tabla=...))"""
+    return {"fields": fields}
+
+
+class RunLogFilter(logging.Filter):
+    """Agrega a cada log el id de correlacion y descarta los niveles que no salieron
+    sorteados para la corrida segun --LOG_SAMPLE_RATE. El sorteo es uno por corrida y nivel,
+    para que una corrida registrada tenga todos sus logs; ERROR y CRITICAL siempre se registran"""
+
+    def __init__(self):
+        super().__init__()
+        self.sampled_levels = {
+            level: random.random() < rate for level, rate in get_sample_rates().items()
+        }
+
+    def filter(self, record):
+        record.correlation_id = get_correlation_id()
+        if record.levelno >= logging.ERROR:
+            return True
+        return self.sampled_levels.get(record.levelno, True)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato de texto de Precia con los campos estructurados al final como clave=valor"""
+
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """Una linea JSON por log, con los campos estructurados como atributos, para consultar los
+    logs con CloudWatch Logs Insights"""
+
+    def format(self, record):
+        log_record = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "file": record.filename,
+            "function": record.funcName,
+            "correlation_id": getattr(record, "correlation_id", None),
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            log_record["exception"] = self.formatException(record.exc_info)
+        return json_dumps(log_record, default=str)
+
+
+def setup_logging():
+    """Configura el logger raiz de los jobs: salida estandar, nivel --LOG_LEVEL (INFO por
+    defecto), formato --LOG_FORMAT text|json (text por defecto) y el filtro de correlacion y
+    muestreo
+
+    Returns:
+    --------
+    logging.Logger
+        Logger raiz
+    """
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    precia_handler = logging.StreamHandler(sys_stdout)
+    if get_optional_enviroment_variable("LOG_FORMAT", "text").lower() == "json":
+        precia_handler.setFormatter(JsonFormatter())
+    else:
+        precia_handler.setFormatter(TextFormatter(PRECIA_LOG_FORMAT))
+    precia_handler.addFilter(RunLogFilter())
+    logger.addHandler(precia_handler)
+    logger.setLevel(get_optional_enviroment_variable("LOG_LEVEL", "INFO").upper())
+    return logger
@@ -0,0 +1,112 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from rfli_utils.bulk_writer import bulk_delete_keys
+from rfli_utils.capacity import capacity_caller
+from rfli_utils.metrics import get_caller_name
+
+logger = logging.getLogger()
+
+DEFAULT_TOTAL_SEGMENTS = 8
+
+
+def get_key_names(table):
+    """Retorna la llave de particion y la llave de ordenamiento (None si no tiene) de la tabla"""
+    hash_key = None
+    range_key = None
+    for key_element in table.key_schema:
+        if key_element["KeyType"] == "HASH":
+            hash_key = key_element["AttributeName"]
+        elif key_element["KeyType"] == "RANGE":
+            range_key = key_element["AttributeName"]
+    return hash_key, range_key
+
+
+def scan_table_keys(table, total_segments=DEFAULT_TOTAL_SEGMENTS):
+    """Escanea solo las llaves de la tabla con un scan paralelo (Segment/TotalSegments)
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla a escanear
+    total_segments: int, optional
+        Numero de segmentos escaneados en paralelo
+
+    Returns:
+    --------
+    list
+        Llaves primarias de todos los items de la tabla
+    """
+    key_names = [key_name for key_name in get_key_names(table) if key_name is not None]
+    attribute_names = {f"#key{index}": key_name for index, key_name in enumerate(key_names)}
+    client = table.meta.client
+    caller_name = get_caller_name()
+
+    def scan_segment(segment):
+        with capacity_caller(caller_name):
+            return scan_segment_keys(segment)
+
+    def scan_segment_keys(segment):
+        segment_keys = []
+        scan_arguments = {
+            "TableName": table.name,
+            "ProjectionExpression": ", ".join(attribute_names),
+            "ExpressionAttributeNames": attribute_names,
+            "Segment": segment,
+            "TotalSegments": total_segments,
+        }
+        while True:
+            response = client.scan(**scan_arguments)
+            segment_keys.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                return segment_keys
+            scan_arguments["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        segments_keys = list(executor.map(scan_segment, range(total_segments)))
+    return [key for segment_keys in segments_keys for key in segment_keys]
+
+
+def wipe_table(table, total_segments=DEFAULT_TOTAL_SEGMENTS):
+    """Elimina todos los items de la tabla: scan paralelo de llaves y eliminacion paralela
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla a limpiar
+    total_segments: int, optional
+        Numero de segmentos escaneados en paralelo
+
+    Returns:
+    --------
+    dict
+        Estadisticas de la eliminacion
+    """
+    table_keys = scan_table_keys(table, total_segments)
+    logger.info(f"Se encontraron {len(table_keys)} items para eliminar en {table.name}.")
+    return bulk_delete_keys(table, table_keys)
+
+
+def delete_isines(table, isines, total_segments=DEFAULT_TOTAL_SEGMENTS):
+    """Elimina de la tabla los items de los isines recibidos. Si la llave de la tabla es solo
+    el isin se eliminan directamente por llave, sin escanear la tabla
+    Parameters:
+    -----------
+    table: boto3.resources.factory.dynamodb.Table, required
+        Tabla a depurar
+    isines: list, required
+        Codigos isin a eliminar
+    total_segments: int, optional
+        Numero de segmentos del scan paralelo cuando la tabla tiene llave de ordenamiento
+
+    Returns:
+    --------
+    dict
+        Estadisticas de la eliminacion
+    """
+    hash_key, range_key = get_key_names(table)
+    if range_key is None:
+        return bulk_delete_keys(table, [{hash_key: isin} for isin in set(isines)])
+    isines = set(isines)
+    return bulk_delete_keys(
+        table,
+        [key for key in scan_table_keys(table, total_segments) if key[hash_key] in isines],
+    )
@@ -0,0 +1,72 @@
+import logging
+import time
+from sys import exc_info as sys_exc_info
+
+from rfli_utils.config import get_optional_enviroment_variable
+
+logger = logging.getLogger()
+
+
+def is_worker_mode():
+    """Indica si el job fue lanzado con --WORKER_MODE true"""
+    return get_optional_enviroment_variable("WORKER_MODE", "false").lower() == "true"
+
+
+def is_last_cycle(etl):
+    """Indica si el ciclo ejecutado por el ETL ya alcanzo la ultima ejecucion intradia del dia,
+    con el mismo criterio que usa update_last_version_info para pasar a pre_eod
+    """
+    last_execution = etl.calculate_last_execution()
+    current_execution = etl.full_valuation_date.hour * 100 + etl.full_valuation_date.minute
+    return current_execution >= last_execution
+
+
+def run_intraday_worker(etl_class, sleep=time.sleep):
+    """Ejecuta el ETL intradia en un ciclo persistente hasta la ultima ejecucion del dia.
+    Cada ciclo crea una nueva instancia del ETL (fechas y consultas del momento), mientras
+    los clientes boto3, secretos, parametros y conexiones a base de datos de rfli_utils
+    permanecen abiertos entre ciclos
+    Parameters:
+    -----------
+    etl_class: type, required
+        Clase del ETL intradia. Debe exponer run, calculate_last_execution,
+        full_valuation_date e intra_rate_time
+    sleep: callable, optional
+        Funcion usada para esperar entre ciclos
+    """
+    worker_interval = get_optional_enviroment_variable("WORKER_INTERVAL")
+    interval_seconds = int(worker_interval) if worker_interval else None
+    cycle_number = 0
+    while True:
+        cycle_number += 1
+        cycle_start = time.monotonic()
+        logger.info(f"Iniciando ciclo {cycle_number} del worker intradia.")
+        try:
+            etl = etl_class()
+            etl.run()
+        except Exception as worker_cycle_exception:
+            exception_line = sys_exc_info()[2].tb_lineno
+            current_error = worker_cycle_exception
+            logger.error(
+                current_error.__class__.__name__
+                + "["
+                + str(exception_line)
+                + "] "
+                + str(current_error)
+            )
+            if cycle_number == 1:
+                raise
+            etl = None
+        if etl is not None:
+            if is_last_cycle(etl):
+                logger.info("Se alcanzó la última ejecución intradia. Finaliza el worker.")
+                return cycle_number
+            if worker_interval is None:
+                interval_seconds = etl.intra_rate_time
+        elapsed_seconds = time.monotonic() - cycle_start
+        wait_seconds = max(interval_seconds - elapsed_seconds, 0)
+        logger.info(
+            f"Ciclo {cycle_number} terminado en {elapsed_seconds:.2f} segundos. "
+            f"Siguiente ciclo en {wait_seconds:.2f} segundos."
+        )
+        sleep(wait_seconds)
@@ -0,0 +1,26 @@
+from rfli_utils import config
+
+
+def test_has_job_argument_accepts_both_forms():
+    assert config.has_job_argument("PARTITIONED_TABLES", ["job.py", "--PARTITIONED_TABLES", "true"])
+    assert config.has_job_argument("PARTITIONED_TABLES", ["job.py", "--PARTITIONED_TABLES=true"])
+
+
+def test_has_job_argument_ignores_other_arguments():
+    arguments = ["job.py", "--PARTITIONED_TABLES_DAYS=7", "--JOB_NAME", "PARTITIONED_TABLES"]
+    assert not config.has_job_argument("PARTITIONED_TABLES", arguments)
+
+
+def test_optional_variable_returns_default_without_argument(monkeypatch):
+    monkeypatch.setattr(config, "sys_argv", ["job.py", "--JOB_NAME", "init"])
+    monkeypatch.setattr(config, "_enviroment_cache", {})
+    assert config.get_optional_enviroment_variable("PARTITIONED_TABLES", "false") == "false"
+
+
+def test_optional_variable_reads_equals_form(monkeypatch):
+    monkeypatch.setattr(config, "sys_argv", ["job.py", "--PARTITIONED_TABLES=true"])
+    monkeypatch.setattr(config, "_enviroment_cache", {})
+    monkeypatch.setattr(
+        config, "get_enviroment_variable", lambda variable: {"PARTITIONED_TABLES": "true"}[variable]
+    )
+    assert config.get_optional_enviroment_variable("PARTITIONED_TABLES", "false") == "true"
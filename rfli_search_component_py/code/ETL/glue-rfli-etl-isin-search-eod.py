@@ -1,62 +1,23 @@
 import datetime as dt
 import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
 from email_utils.email_utils import *
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_parameter_store, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.bulk_writer import bulk_write_items, bulk_write_stream
+from rfli_utils.partitioning import partition_items, set_active_date
+from rfli_utils.streaming import is_streaming_mode, stream_query
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.query_plans import PlanCapturingCursor
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -126,10 +87,9 @@ class LookUp:
         self.yesterday_full_valuation_date = self.full_valuation_date - dt.timedelta(
             days=1
         )
-        self.final_eod_time = int(
-            get_parameter_store(get_enviroment_variable("FINAL_EOD_TIME"))
-        )
-        self.pre_eod_time = int(get_parameter_store(get_enviroment_variable("PRE_EOD_TIME")))
+        market_schedule = get_market_schedule(["FINAL_EOD_TIME", "PRE_EOD_TIME"])
+        self.final_eod_time = market_schedule["FINAL_EOD_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
         self.body = f"Se ha generado un error al limpiar las tablas para isin_track. \
             Por favor informar para su respectiva revision.\n\
             Mensaje enviado por servicio ETL Intradia a la fecha y hora"
@@ -199,31 +159,73 @@ class LookUp:
         }
         self.version_collection_name = "dnb-rfli-data-version-intra"
         self.all_isines_isin_search_collection = "dnb-rfli-isin-search-all-isines"
-        self.dynamodb_session = bt3_resource("dynamodb")
+        self.dynamodb_session = get_aws_resource("dynamodb")
         self.isin_search_params = json_loads(json_loads(
             get_parameter_store(get_enviroment_variable("ISIN_SEARCH_PARAMS"))
         ))
         
         
-    def transform_isines_result(self, isines, categories, issuers):
-        rating_group_dictionary = {x["category_id"]:x["rating_group"] for x in categories}
-        maturity_range_dictionary = {x["category_id"]:x["maturity_range"] for x in categories}
-        class_dictionary = {x["category_id"]:x["category_class"] for x in categories}
-        issuers_dictionary = {x["isin_code"]:x["issuer_name"] for x in issuers}
+    def get_transform_lookups(self, categories, issuers):
+        return {
+            "rating_group": {x["category_id"]:x["rating_group"] for x in categories},
+            "maturity_range": {x["category_id"]:x["maturity_range"] for x in categories},
+            "category_class": {x["category_id"]:x["category_class"] for x in categories},
+            "issuer_name": {x["isin_code"]:x["issuer_name"] for x in issuers},
+        }
+
+
+    def transform_isin(self, isin, lookups):
         category_class_definition = self.isin_search_params["PARAMETERS_CLASS"]
+        current_category_id = isin["category_id"]
+        current_isin_code = isin["isin"]
+        isin['real_rating'] = self.category_definition.get(
+            int(lookups["rating_group"].get(current_category_id))
+            ) if lookups["rating_group"].get(current_category_id) else 'NA'
+        isin['maturity_range'] = lookups["maturity_range"].get(current_category_id,0)
+        isin['issuer_name'] = lookups["issuer_name"].get(current_isin_code,'NA')
+        isin['class_name']=category_class_definition.get(str(lookups["category_class"].get(current_category_id)),'NA')
+        del isin['category_id']
+        return isin
+
+
+    @measure_stage("transform")
+    def transform_isines_result(self, isines, categories, issuers):
+        lookups = self.get_transform_lookups(categories, issuers)
         for i in range(len(isines)):
-            current_category_id = isines[i]["category_id"]
-            current_isin_code = isines[i]["isin"]
-            isines[i]['real_rating'] = self.category_definition.get(
-                int(rating_group_dictionary.get(current_category_id))
-                ) if rating_group_dictionary.get(current_category_id) else 'NA'
-            isines[i]['maturity_range'] = maturity_range_dictionary.get(current_category_id,0)
-            isines[i]['issuer_name'] = issuers_dictionary.get(current_isin_code,'NA')
-            isines[i]['class_name']=category_class_definition.get(str(class_dictionary.get(current_category_id)),'NA')
-            del isines[i]['category_id']
+            isines[i] = self.transform_isin(isines[i], lookups)
         return isines
     
     
+    # Version en streaming de get_origin_data (--STREAMING_EXTRACTION true): categorias y
+    # emisores se cargan completos por ser maestras pequenas; los isines del dia se leen con
+    # un cursor del lado del servidor y se transforman fila a fila mientras se escriben
+    @measure_stage("extract")
+    def stream_origin_data(self):
+        logger.info("Iniciando carga de información en modo streaming.")
+        db_credentials = get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))
+        with pymysql.connect(
+            host=db_credentials["host"],
+            port=int(db_credentials["port"]),
+            user=db_credentials["username"],
+            password=db_credentials["password"],
+            cursorclass=PlanCapturingCursor,
+        ) as connection:
+            with connection.cursor() as cursor_connection:
+                logger.info("Consultando información de las categorias.")
+                cursor_connection.execute(self.get_categories_query)
+                categories = cursor_connection.fetchall()
+                logger.info("Consultando información de los issuers.")
+                cursor_connection.execute(self.get_issuer_info)
+                issuers = cursor_connection.fetchall()
+            lookups = self.get_transform_lookups(categories, issuers)
+            del categories, issuers
+            logger.info("Consultando información de curvas.")
+            for isin in stream_query(connection, self.get_data_intradia):
+                yield self.transform_isin(isin, lookups)
+        logger.info("Se terminó el proceso de carga de información.")
+
+
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información.")
         isines = []
@@ -234,7 +236,7 @@ class LookUp:
                 port=int(db_credentials["port"]),
                 user=db_credentials["username"],
                 password=db_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,
+                cursorclass=PlanCapturingCursor,
             ) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
@@ -279,6 +281,7 @@ class LookUp:
             )
             raise
 
+    @measure_stage("version")
     def update_last_version_info(self):
         try:
             logger.info("Iniciando actualización de versión.")
@@ -291,6 +294,7 @@ class LookUp:
                 item = response["Item"]
                 logger.info("Se carga la siguiente data de versión: " + str(item))
                 item["version"] = int(item["version"]) + 1
+                set_active_date(item, self.full_valuation_date)
                 item["next_update"] = int(
                     current_day.timestamp()
                 ) + get_seconds_from_ssm(self.final_eod_time)
@@ -320,14 +324,16 @@ class LookUp:
             )
             raise
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
+            data = partition_items(collection_name, data, self.full_valuation_date)
             logger.info("Comienza escritura en Dynamo")
-            if len(data) > 0:
+            if not isinstance(data, list):
+                bulk_write_stream(self.dynamodb_session.Table(collection_name), data)
+            elif len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                bulk_write_items(table, data)
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -348,6 +354,9 @@ class LookUp:
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({int(seconds)*1000}) */"
 
+    @record_run_manifest("isin-search", "eod")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
             bogota_current_datetime = get_bogota_current_time()
@@ -355,7 +364,10 @@ class LookUp:
                 hour=0, minute=0, second=0, microsecond=0
             ).timestamp()+get_seconds_from_ssm(self.pre_eod_time))
             if bogota_current_datetime.timestamp()>=prelim_start_timestamp:
-                data = self.get_origin_data()
+                if is_streaming_mode():
+                    data = self.stream_origin_data()
+                else:
+                    data = self.get_origin_data()
                 self.save_data_into_dynamo(self.all_isines_isin_search_collection, data)
                 self.update_last_version_info()
             else:
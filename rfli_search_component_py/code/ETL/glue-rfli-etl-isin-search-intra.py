@@ -1,62 +1,25 @@
 import datetime as dt
-import pymysql.cursors
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from dateutil import tz
-from awsglue.utils import getResolvedOptions
 from json import loads as json_loads
-from boto3 import client as bt3_client, resource as bt3_resource
 from email_utils.email_utils import *
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_utils.config import get_enviroment_variable, get_optional_enviroment_variable, get_parameter_store, get_secret, get_market_schedule, get_aws_resource
+from rfli_utils.database import db_connection
+from rfli_utils.worker import is_worker_mode, run_intraday_worker
+from rfli_utils.change_probe import run_change_probe, FINGERPRINT_ATTRIBUTE
+from rfli_utils.freshness import set_freshness
+from rfli_utils.delta_writer import save_changed_items
+from rfli_utils.partitioning import partition_items, set_active_date
+from rfli_utils.snapshot import coalesce, get_market_snapshot, filter_published_isines, index_by_isin
+from rfli_utils.metrics import measure_stage
+from rfli_utils.manifest import record_run_manifest
+from rfli_utils.profiling import profile_run
+from rfli_utils.structured_logging import setup_logging
 
 
 logger = setup_logging()
 
 
-def get_secret(secret_name):
-    parameters = {}
-    try:
-        secrets_manager_client = bt3_client("secretsmanager")
-        get_secret_value_response = secrets_manager_client.get_secret_value(
-            SecretId=secret_name
-        )
-        secret = get_secret_value_response["SecretString"]
-        parameters = json_loads(secret)
-    except Exception as sec_exc:
-        error_msg = "No se pudo obtener el secreto " + secret_name
-        logger.error(error_msg)
-        logger.error(sec_exc)
-    return parameters
-
-
-def get_parameter_store(parameter_name):
-    logger.info("Intentando leer el parametro: " + parameter_name)
-    ssm_client = bt3_client("ssm")
-    response = ssm_client.get_parameter(
-        Name=parameter_name, WithDecryption=True)
-    logger.info("El parametro tiene el valor: " +
-                str(response["Parameter"]["Value"]))
-    return response["Parameter"]["Value"]
-
-
-def get_enviroment_variable(variable):
-    variable_value = getResolvedOptions(sys_argv, [variable])
-    return variable_value[variable]
-
-
 def send_error_mail(timeout=False):
     try:
         logger.info("Iniciando envío de mensaje.")
@@ -128,69 +91,16 @@ class LookUp:
         self.yesterday_full_valuation_date = self.full_valuation_date - dt.timedelta(
             days=1
         )
-        self.market_open_time=int(
-            get_parameter_store(get_enviroment_variable("MARKET_OPEN_TIME"))
-        )
-        self.market_close_time = int(
-            get_parameter_store(get_enviroment_variable("MARKET_CLOSE_TIME"))
-        )
-        self.pre_eod_time = int(
-            get_parameter_store(get_enviroment_variable("PRE_EOD_TIME"))
-        )
-        self.intra_rate_time = int(
-            get_parameter_store(get_enviroment_variable("INTRA_RATE_TIME"))
-        )
+        market_schedule = get_market_schedule()
+        self.market_open_time = market_schedule["MARKET_OPEN_TIME"]
+        self.market_close_time = market_schedule["MARKET_CLOSE_TIME"]
+        self.pre_eod_time = market_schedule["PRE_EOD_TIME"]
+        self.intra_rate_time = market_schedule["INTRA_RATE_TIME"]
 
         self.body = f"Se ha generado un error al limpiar las tablas para isin_track. \
             Por favor informar para su respectiva revision.\n\
             Mensaje enviado por servicio ETL Intradia a la fecha y hora"
 
-        self.get_data_intradia = f"SELECT {self.create_string_query(self.query_timeout)} \
-                    today_prices.isin_code as isin,\
-                    today_prices.instrument as nemo,\
-                    cast(today_prices.issue_date As CHAR) AS issue_date,\
-                    cast(today_prices.maturity_date As CHAR) AS maturity_date,\
-                    today_prices.maturity_days,\
-                    today_prices.margin_value as margin,\
-                    IF(today_prices.rate_type='FS', 'NA', today_prices.equivalent_margin) AS equivalent_margin,\
-                    today_prices.mean_price,\
-                    today_prices.clean_price,\
-                    today_prices.accrued_interest,\
-                    today_prices.convexity,\
-                    today_prices.duration,\
-                    today_prices.modified_duration,\
-                    today_prices.rate_type,\
-                    today_prices.category_id as category_id,\
-                    today_prices.currency_type,\
-                    today_prices.yield,\
-                    COALESCE(today_prices.real_rating, yesterday_prices.yesterday_real_rating, 'NA') AS real_rating\
-                    FROM \
-                        precia_published.pub_rfl_prices AS today_prices\
-                    LEFT JOIN (\
-                        SELECT isin_code AS yesterday_isin_code,\
-                            real_rating AS yesterday_real_rating\
-                        FROM precia_published.pub_rfl_prices\
-                        WHERE valuation_date = '{self.yesterday_full_valuation_date.date().strftime('%Y-%m-%d')}'\
-                            AND isin_code != ''\
-                            AND instrument NOT IN('TIDISDVL', 'CERTS')\
-                    ) AS yesterday_prices ON today_prices.isin_code = yesterday_prices.yesterday_isin_code\
-                WHERE today_prices.valuation_date = '{self.full_valuation_date.date().strftime('%Y-%m-%d')}'\
-                    AND today_prices.isin_code != ''\
-                    AND today_prices.instrument NOT IN('TIDISDVL', 'CERTS');"
-        self.get_issuer_info = f"SELECT {self.create_string_query(self.query_timeout)} \
-                        DISTINCT instrument_table.isin_code AS isin_code,\
-                        COALESCE(issuer_table.name, 'NA') AS issuer_name\
-                    FROM\
-                        precia_sources.src_rfl_instrument AS instrument_table\
-                        LEFT JOIN\
-                        precia_sources.src_rfl_issuer AS issuer_table\
-                        ON instrument_table.issuer=issuer_table.issuer;"
-        self.get_categories_query = f"SELECT {self.create_string_query(self.query_timeout)} \
-                    CONVERT(class,DECIMAL(3,0)) AS category_class,\
-                    category_id,\
-                    rating_group,\
-                    maturity_range\
-                FROM precia_sources.src_rfl_category;"
         self.category_definition = {
             10:"Sin calificación",
             20:"E",
@@ -210,12 +120,67 @@ class LookUp:
         }
         self.version_collection_name = "dnb-rfli-data-version-intra"
         self.all_isines_isin_search_collection = "dnb-rfli-isin-search-all-isines"
-        self.dynamodb_session = bt3_resource("dynamodb")
+        self.dynamodb_session = get_aws_resource("dynamodb")
+        self.probe_sources = (
+            "pub_rfl_prices",
+        )
+        self.source_fingerprint = None
+        self.snapshot_location = get_optional_enviroment_variable("SNAPSHOT_LOCATION")
         self.isin_search_params = json_loads(json_loads(
             get_parameter_store(get_enviroment_variable("ISIN_SEARCH_PARAMS"))
         ))
         
         
+    @measure_stage("transform")
+    def get_today_isines(self, market_snapshot):
+        yesterday_prices = index_by_isin(
+            filter_published_isines(market_snapshot.prices_yesterday)
+        )
+        isines = []
+        for today_price in filter_published_isines(market_snapshot.prices_today):
+            yesterday_price = yesterday_prices.get(today_price["isin_code"], {})
+            isines.append(
+                {
+                    "isin": today_price["isin_code"],
+                    "nemo": today_price["instrument"],
+                    "issue_date": today_price["issue_date"],
+                    "maturity_date": today_price["maturity_date"],
+                    "maturity_days": today_price["maturity_days"],
+                    "margin": today_price["margin_value"],
+                    "equivalent_margin": "NA"
+                    if today_price["rate_type"] == "FS"
+                    else today_price["equivalent_margin"],
+                    "mean_price": today_price["mean_price"],
+                    "clean_price": today_price["clean_price"],
+                    "accrued_interest": today_price["accrued_interest"],
+                    "convexity": today_price["convexity"],
+                    "duration": today_price["duration"],
+                    "modified_duration": today_price["modified_duration"],
+                    "rate_type": today_price["rate_type"],
+                    "category_id": today_price["category_id"],
+                    "currency_type": today_price["currency_type"],
+                    "yield": today_price["yield"],
+                    "real_rating": coalesce(
+                        today_price["real_rating"],
+                        yesterday_price.get("real_rating"),
+                        "NA",
+                    ),
+                }
+            )
+        return isines
+
+    @measure_stage("transform")
+    def get_isin_issuers(self, market_snapshot):
+        issuer_names = market_snapshot.get_issuer_names()
+        return [
+            {
+                "isin_code": instrument["isin_code"],
+                "issuer_name": coalesce(issuer_names.get(instrument["issuer"]), "NA"),
+            }
+            for instrument in market_snapshot.instruments
+        ]
+
+    @measure_stage("transform")
     def transform_isines_result(self, isines, categories, issuers):
         rating_group_dictionary = {x["category_id"]:x["rating_group"] for x in categories}
         maturity_range_dictionary = {x["category_id"]:x["maturity_range"] for x in categories}
@@ -235,30 +200,29 @@ class LookUp:
         return isines
     
     
+    @measure_stage("extract")
     def get_origin_data(self):
         logger.info("Iniciando carga de información.")
         isines = []
         try:
-            db_credentials = get_secret(get_enviroment_variable("FLASH_ORIGIN_DB"))
-            with pymysql.connect(
-                host=db_credentials["host"],
-                port=int(db_credentials["port"]),
-                user=db_credentials["username"],
-                password=db_credentials["password"],
-                cursorclass=pymysql.cursors.DictCursor,
-            ) as connection:
+            with db_connection(get_enviroment_variable("FLASH_ORIGIN_DB")) as connection:
                 with connection.cursor() as cursor_connection:
                     try:
                         logger.info("Consultando información de curvas.")
-                        cursor_connection.execute(self.get_data_intradia)
-                        if cursor_connection.rowcount > 0:
-                            isines = cursor_connection.fetchall()
+                        market_snapshot = get_market_snapshot(
+                            cursor_connection,
+                            self.full_valuation_date,
+                            self.snapshot_location,
+                            self.intra_rate_time // 2,
+                            self.create_string_query(self.query_timeout),
+                            self.source_fingerprint,
+                        )
+                        isines = self.get_today_isines(market_snapshot)
+                        if len(isines) > 0:
                             logger.info("Consultando información de las categorias.")
-                            cursor_connection.execute(self.get_categories_query)
-                            categories = cursor_connection.fetchall()
+                            categories = market_snapshot.categories
                             logger.info("Consultando información de los issuers.")
-                            cursor_connection.execute(self.get_issuer_info)
-                            issuers = cursor_connection.fetchall()
+                            issuers = self.get_isin_issuers(market_snapshot)
                             isines = self.transform_isines_result(isines, categories, issuers)
                         logger.info("Se terminó el proceso de carga de información.")
                         return isines
@@ -301,7 +265,8 @@ class LookUp:
         return last_exe_final_hour
     
     
-    def update_last_version_info(self):
+    @measure_stage("version")
+    def update_last_version_info(self, data_changed=True):
         logger.info("Iniciando actualización de versión.")
         table = self.dynamodb_session.Table(self.version_collection_name)
         response = table.get_item(Key={"component": "isin-search"})
@@ -313,7 +278,16 @@ class LookUp:
         if "Item" in response:
             item = response["Item"]
             logger.info("Se carga la siguiente data de versión: " + str(item))
-            item["version"] = int(item["version"]) + 1
+            if data_changed:
+                item["version"] = int(item["version"]) + 1
+                set_active_date(item, self.full_valuation_date)
+                set_freshness(item, self.source_fingerprint)
+                if self.source_fingerprint is not None:
+                    item[FINGERPRINT_ATTRIBUTE] = self.source_fingerprint
+                else:
+                    item.pop(FINGERPRINT_ATTRIBUTE, None)
+            else:
+                logger.info("El origen no cambió. Se conserva la versión actual.")
             if self.full_valuation_date.timestamp() >= (
                 current_day.timestamp() + get_seconds_from_ssm(self.calculate_last_execution())
             ):
@@ -341,14 +315,16 @@ class LookUp:
                 "No se encontró información de versión para 'isin-search'. No se cambia el versionado."
             )
 
+    @measure_stage("load", measure_bytes=True)
     def save_data_into_dynamo(self, collection_name, data):
         try:
+            data = partition_items(collection_name, data, self.full_valuation_date)
             logger.info("Comienza escritura en Dynamo")
             if len(data) > 0:
                 table = self.dynamodb_session.Table(collection_name)
-                with table.batch_writer() as batch:
-                    for item in data:
-                        batch.put_item(Item=item)
+                save_changed_items(
+                    table, data, self.snapshot_location, self.full_valuation_date
+                )
         except Exception as save_data_into_dynamo_exception:
             exception_line = sys_exc_info()[2].tb_lineno
             logger.error(
@@ -369,8 +345,22 @@ class LookUp:
     def create_string_query(self, seconds):
         return f"/*+ MAX_EXECUTION_TIME({int(seconds)*1000}) */"
 
+    @record_run_manifest("isin-search", "intra")
+    @profile_run
+    @measure_stage("run")
     def run(self):
         try:
+            source_unchanged, self.source_fingerprint = run_change_probe(
+                get_enviroment_variable("FLASH_ORIGIN_DB"),
+                self.probe_sources,
+                self.full_valuation_date,
+                self.dynamodb_session.Table(self.version_collection_name),
+                "isin-search",
+                self.create_string_query(self.query_timeout),
+            )
+            if source_unchanged:
+                self.update_last_version_info(data_changed=False)
+                return
             data = self.get_origin_data()
             self.save_data_into_dynamo("dnb-rfli-isin-search-all-isines", data)
             self.update_last_version_info()
@@ -389,5 +379,7 @@ class LookUp:
 
 
 if __name__ == "__main__":
-    running = LookUp()
-    running.run()
+    if is_worker_mode():
+        run_intraday_worker(LookUp)
+    else:
+        LookUp().run()
@@ -1,42 +1,30 @@
-import os
-import json
-import boto3
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info, argv as sys_argv
 from boto3 import client as bt3_client, resource as bt3_resource
-import decimal
 from decimal import Decimal
-
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
+from rfli_lambda_utils.request_logging import log_request, setup_logging
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import add_freshness, get_version_item
+from rfli_lambda_utils.responses import get_conditional_response, get_etag_headers
+from rfli_lambda_utils.partitioning import get_partition_key, remove_partition
 
 
 logger = setup_logging()
 
 
-def get_only_item(URL):
+def get_only_item(URL, version_item):
     collection_name = "dnb-rfli-isin-search-all-isines"
     try:
         if (
             "queryStringParameters" in URL
             and URL["queryStringParameters"]["isin"] is not None
         ):
-            dynamodb_resource = bt3_resource("dynamodb")
             table = dynamodb_resource.Table("dnb-rfli-isin-search-all-isines")
-            element = table.get_item(Key={"isin": URL["queryStringParameters"]["isin"]})
+            element = table.get_item(
+                Key={"isin": get_partition_key(version_item, URL["queryStringParameters"]["isin"])}
+            )
             if "Item" in element:
-                    return element["Item"]
+                    return remove_partition(element["Item"])
             else:
                 return {
                 "error": {
@@ -67,26 +55,20 @@ def get_only_item(URL):
         raise
 
 
-def get_version():
-    dynamodb_resource = bt3_resource("dynamodb")
-    table1 = dynamodb_resource.Table("dnb-rfli-data-version-intra")
-    version = table1.get_item(Key={"component": "isin-search"})
-    return version["Item"]
-
-
-def create_answer_request(event):
+def create_answer_request(event, version_item):
     collection_name = "dnb-rfli-isin-search-all-isines"
     try:
-        only_item = get_only_item(event)
-        version_item = get_version()
+        # Sin item de versiones la respuesta va sin version y el isin se lee sin particion
+        version_data = version_item or {}
+        only_item = get_only_item(event, version_data)
         answer = {
-            "next_status": version_item["next_status"],
-            "version": version_item["version"],
-            "next_update": version_item["next_update"],
+            "next_status": version_data.get("next_status"),
+            "version": version_data.get("version"),
+            "next_update": version_data.get("next_update"),
             "data": only_item,
         }
         # print("Json de respuesta:", answer)
-        return answer
+        return add_freshness(answer, version_data)
     except Exception as create_string_query_exception:
         exception_line = sys_exc_info()[2].tb_lineno
         logger.error(
@@ -103,16 +85,28 @@ def create_answer_request(event):
         raise
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb_resource = bt3_resource("dynamodb")
 
 
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     try:
-        element = create_answer_request(event)
+        version_item = get_version_item("isin-search")
+        if version_item is None:
+            # Sin item de versiones no hay con que validar el ETag, asi que el isin se lee en
+            # cada solicitud y se responde sin ETag
+            logger.warning(
+                "No se encontro la version de isin-search. Se consulta el isin sin ETag."
+            )
+        else:
+            conditional_response = get_conditional_response(
+                event, {}, version_item, version_item["next_update"], version_item["next_status"]
+            )
+            if conditional_response is not None:
+                return conditional_response
+        element = create_answer_request(event, version_item)
         
         if 'error' in element['data']:
             
@@ -127,9 +121,11 @@ def lambda_handler(event, context):
                 })
             };
         
-        return {"statusCode": 200, "body": json.dumps(element, cls=DecimalEncoder)}
+        return {
+            "statusCode": 200,
+            "headers": get_etag_headers(version_item) if version_item is not None else {},
+            "body": encode_json(element),
+        }
     except Exception:
-        logger.error(
-            "Error iniciando el Glue para la inicializacion de la información de versiones - Aplicación intradia"
-        )
+        logger.error("Error consultando el isin de isin-search.")
         raise
@@ -1,38 +1,25 @@
-import os
-import json
-import boto3
-from sys import stdout as sys_stdout, exc_info as sys_exc_info, argv as sys_argv
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info, argv as sys_argv
 from boto3 import client as bt3_client, resource as bt3_resource
-import decimal
 from decimal import Decimal
-
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
-
+from rfli_lambda_utils.request_logging import log_request, setup_logging
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import get_version_item
+from rfli_lambda_utils.responses import (
+    get_etag_headers,
+    get_requested_version,
+    get_version_tag,
+    is_not_modified,
+    is_unchanged,
+    not_modified_response,
+)
 
 logger = setup_logging()
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
     
 def get_data_request(json_request):
     collection_name = "dnb-rfli-isin-search-issuers"
-    dynamodb_client = bt3_client("dynamodb")
     try:
         logger.info("Comienza lectura en Dynamo")
         response = dynamodb_client.scan(**json_request)
@@ -62,6 +49,28 @@ def convert_clean_json(dictionary_list):
     ]
     return clean_list
 
+
+ISSUERS_MEMO = {}
+
+
+def get_memoized_issuers(json_request, version_tag):
+    # Los emisores son iguales para todos los usuarios mientras no cambie la version de
+    # isin-search, asi que se leen y se serializan una sola vez por contenedor y version. La
+    # llave lleva la fecha porque init reinicia la version en 1 cada dia
+    if ISSUERS_MEMO.get("version_tag") != version_tag:
+        element = get_data_request(json_request)
+        ISSUERS_MEMO.update(
+            {"version_tag": version_tag, "body": encode_json(element)}
+        )
+    return ISSUERS_MEMO["body"]
+
+
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb_client = bt3_client("dynamodb")
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     request = {
         "TableName": "dnb-rfli-isin-search-issuers",
@@ -69,14 +78,31 @@ def lambda_handler(event, context):
         "ExpressionAttributeNames": {"#issuer":"issuer"}
     }
     try:
-        element = get_data_request(request)
+        version_item = get_version_item("isin-search")
+        headers = {
+            'Access-Control-Allow-Headers': '*',
+            'Access-Control-Allow-Origin' : '*', 
+            'Access-Control-Allow-Methods': '*',
+        }
+        if version_item is None:
+            # Sin item de versiones no hay con que validar el memo ni el ETag, asi que los
+            # emisores se leen en cada solicitud
+            logger.warning(
+                "No se encontro la version de isin-search. Se consultan los emisores sin memo."
+            )
+            return {
+                "headers": headers,
+                "statusCode": 200, "body": encode_json(get_data_request(request))}
+        version = version_item["version"]
+        # El cuerpo es la lista de emisores, sin lugar para la version, asi que el cliente con la
+        # version vigente (If-None-Match o el parametro version) recibe 304 sin cuerpo
+        if is_not_modified(event, version_item) or is_unchanged(
+            get_requested_version(event), version
+        ):
+            return not_modified_response(headers, version_item)
         return {
-            'headers':{ 'Access-Control-Allow-Headers': '*',
-                            'Access-Control-Allow-Origin' : '*', 
-                            'Access-Control-Allow-Methods': '*'},
-            "statusCode": 200, "body": json.dumps(element, cls=DecimalEncoder)}
+            "headers": {**headers, **get_etag_headers(version_item)},
+            "statusCode": 200, "body": get_memoized_issuers(request, get_version_tag(version_item))}
     except Exception:
-        logger.error(
-            "Error iniciando el Glue para la inicializacion de la información de versiones - Aplicación intradia"
-        )
+        logger.error("Error consultando los emisores de isin-search.")
         raise
@@ -1,41 +1,29 @@
 import os
 import json
-from sys import stdout as sys_stdout, exc_info as sys_exc_info
-from logging import getLogger, StreamHandler, Formatter, INFO
+from sys import exc_info as sys_exc_info
 from boto3 import resource as bt3_resource
-from boto3.dynamodb.conditions import And, Attr
+from boto3.dynamodb.conditions import And, Attr, Key
 from boto3.dynamodb.types import DYNAMODB_CONTEXT
-from decimal import Decimal, Inexact, Rounded
+from decimal import Inexact, Rounded
 from functools import reduce
+from rfli_lambda_utils.request_logging import log_request, setup_logging, summarize_payload
+from rfli_lambda_utils.capacity import report_consumed_capacity
+from rfli_lambda_utils.serialization import encode_json
+from rfli_lambda_utils.versions import get_version_item
+from rfli_lambda_utils.partitioning import ACTIVE_DATE_ATTRIBUTE, remove_partition
 
 
-def setup_logging():
-    PRECIA_LOG_FORMAT = (
-        "%(asctime)s [%(levelname)s] [%(filename)s](%(funcName)s): %(message)s"
-    )
-    logger = getLogger()
-    for handler in logger.handlers:
-        logger.removeHandler(handler)
-    precia_handler = StreamHandler(sys_stdout)
-    precia_handler.setFormatter(Formatter(PRECIA_LOG_FORMAT))
-    logger.addHandler(precia_handler)
-    logger.setLevel(INFO)
-    return logger
-
 DYNAMODB_CONTEXT.traps[Inexact] = 0
 DYNAMODB_CONTEXT.traps[Rounded] = 0
 
 logger = setup_logging()
+
 GENERIC_HEADERS = { 'Access-Control-Allow-Headers': '*', 
                     'Access-Control-Allow-Origin' : '*', 
                     'Access-Control-Allow-Methods': '*'  }
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return float(str(o))
-        return super(DecimalEncoder, self).default(o)
+ACTIVE_DATE_INDEX     = 'active_date-index'
 
 
 def build_filter_conditions(entry_body):
@@ -96,7 +84,7 @@ def build_filter_conditions(entry_body):
             conditions_list.append(
                 Attr('yield').gte(DYNAMODB_CONTEXT.create_decimal(entry_body['yield']['min']))
             )
-        logger.info(f"La lista resultante es: {conditions_list}")
+        logger.info(f"La lista resultante es: {summarize_payload(conditions_list)}")
         return conditions_list
     except Exception as build_filter_conditions_exception:
         exception_line = sys_exc_info()[2].tb_lineno
@@ -114,29 +102,31 @@ def build_filter_conditions(entry_body):
         raise 
     
     
-def get_dynamo_db_data(filters, current_last_key={}):
+def get_dynamo_db_data(filters, active_date=None, current_last_key={}):
+    # Con tablas particionadas se consulta el indice active_date-index con la fecha activa:
+    # la tabla retiene varios dias y un scan leeria todas las fechas para descartarlas en el
+    # filtro. Sin fecha activa la tabla solo tiene el dia vigente y se escanea
     try:
         all_table_items = []
         last_key = None
         collection_name = "dnb-rfli-isin-search-all-isines"
-        dynamodb = bt3_resource('dynamodb')
-        table = dynamodb.Table(collection_name)
+        table = dynamodb_resource.Table(collection_name)
+        read_arguments = {}
         if filters:
-            if current_last_key:
-                response = table.scan(FilterExpression=reduce(And,(filters)), ExclusiveStartKey=current_last_key)
-            else:
-                response = table.scan(FilterExpression=reduce(And,(filters)))
+            read_arguments["FilterExpression"] = reduce(And, (filters))
+        if current_last_key:
+            read_arguments["ExclusiveStartKey"] = current_last_key
+        if active_date:
+            read_arguments["IndexName"] = ACTIVE_DATE_INDEX
+            read_arguments["KeyConditionExpression"] = Key(ACTIVE_DATE_ATTRIBUTE).eq(active_date)
+            read_table = table.query
         else:
-            if current_last_key:
-                response = table.scan(ExclusiveStartKey=current_last_key)
-            else:
-                response = table.scan()
+            read_table = table.scan
+        response = read_table(**read_arguments)
         all_table_items.extend([{k: item[k] for k in item} for item in response['Items']])
         while 'LastEvaluatedKey' in response:
-            if filters:
-                response = table.scan(FilterExpression=reduce(And,(filters)), ExclusiveStartKey=response['LastEvaluatedKey'])
-            else:
-                response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+            read_arguments["ExclusiveStartKey"] = response['LastEvaluatedKey']
+            response = read_table(**read_arguments)
             all_table_items.extend([{k: item[k] for k in item} for item in response['Items']])
             last_key = response['LastEvaluatedKey'] if 'LastEvaluatedKey' in response else None
             if len(all_table_items)>int(os.environ["MAX_RESPONSE_ITEMS"]):
@@ -158,16 +148,10 @@ def get_dynamo_db_data(filters, current_last_key={}):
         raise
     
     
-def get_version():
-    dynamodb_resource = bt3_resource("dynamodb")
-    version_table = dynamodb_resource.Table("dnb-rfli-data-version-intra")
-    version = version_table.get_item(Key={"component": "isin-search"})
-    return version["Item"]
 
 
-def create_answer_request(list_item, last_key):
+def create_answer_request(list_item, last_key, version_item):
     try:
-        version_item = get_version()
         answer = {
             "next_status": version_item["next_status"],
             "version": version_item["version"],
@@ -191,16 +175,24 @@ def create_answer_request(list_item, last_key):
         raise 
 
 
+#Recursos de AWS creados una vez por contenedor y reusados en cada invocacion
+dynamodb_resource = bt3_resource("dynamodb")
+
+
+@log_request
+@report_consumed_capacity
 def lambda_handler(event, context):
     entry_body = json.loads(event["body"])
     try:
         entry_body = json.loads(event["body"])
         # current_last_key = {"isin":entry_body['last_key']} if entry_body['last_key'] else {}
         # logger.info(current_last_key)
+        version_item = get_version_item("isin-search")
         filters = build_filter_conditions(entry_body)
-        data, last_key = get_dynamo_db_data(filters)
-        response = create_answer_request(data, last_key)
-        return {'headers': GENERIC_HEADERS,"statusCode": 200, "body": json.dumps(response, cls=DecimalEncoder)}
+        data, last_key = get_dynamo_db_data(filters, version_item.get(ACTIVE_DATE_ATTRIBUTE))
+        data = [remove_partition(item) for item in data]
+        response = create_answer_request(data, last_key, version_item)
+        return {'headers': GENERIC_HEADERS,"statusCode": 200, "body": encode_json(response)}
     except Exception as main_exception:
         exception_line = sys_exc_info()[2].tb_lineno
         logger.error(
@@ -214,4 +206,4 @@ def lambda_handler(event, context):
             + "] "
             + str(current_error)
         )
-        return {'headers': GENERIC_HEADERS,"statusCode": 500, "body": json.dumps({}, cls=DecimalEncoder)}
\ No newline at end of file
+        return {'headers': GENERIC_HEADERS,"statusCode": 500, "body": encode_json({})}
\ No newline at end of file
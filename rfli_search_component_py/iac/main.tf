@@ -41,6 +41,21 @@ data "archive_file" "layer_isines" {
   output_path = format("lbd-rfli-layer-%s-isines.zip", var.component)
 }
 
+# Capa con rfli_lambda_utils, los utilitarios comunes de los lambdas PASS_THROUGH. Lambda agrega
+# la carpeta python de la capa al sys.path
+data "archive_file" "lambda_utils" {
+  type = "zip"
+  output_path = "rfli-lambda-utils.zip"
+
+  dynamic "source" {
+    for_each = fileset("../../rfli_general_components_py/rfli_lambda_utils/rfli_lambda_utils", "*.py")
+    content {
+      content  = file(format("../../rfli_general_components_py/rfli_lambda_utils/rfli_lambda_utils/%s", source.value))
+      filename = format("python/rfli_lambda_utils/%s", source.value)
+    }
+  }
+}
+
 #------------------------------------------------------------------------------------------------------------------------------
 # SSM Parameter
 
@@ -167,6 +182,20 @@ resource "aws_dynamodb_table" "all_isines" {
     name = "isin"
     type = "S"
   }
+  attribute {
+    name = "active_date"
+    type = "S"
+  }
+  global_secondary_index {
+    name            = "active_date-index"
+    hash_key        = "active_date"
+    range_key       = "isin"
+    projection_type = "ALL"
+  }
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
 }
 
 resource "aws_dynamodb_table" "issuers" {
@@ -179,6 +208,27 @@ resource "aws_dynamodb_table" "issuers" {
   }
 }
 
+# Manifiesto de corridas de los ETL (rfli_utils.manifest). Lo escriben los ETL de todos los
+# componentes; se crea aqui, junto a las demas tablas de DynamoDB de la aplicacion
+resource "aws_dynamodb_table" "run_manifest" {
+  name             = "dnb-rfli-run-manifest"
+  hash_key         = "component"
+  range_key        = "run_timestamp"
+  billing_mode     = "PAY_PER_REQUEST"
+  attribute {
+    name = "component"
+    type = "S"
+  }
+  attribute {
+    name = "run_timestamp"
+    type = "S"
+  }
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
 ################################################################################################################################
 # S3 to code
 ################################################################################################################################
@@ -325,7 +375,7 @@ resource "aws_glue_job" "etl_intra" {
   glue_version = "3.0"
   execution_class = "STANDARD"
   max_retries = 0
-  timeout = 10
+  timeout = var.intra_worker_mode ? 600 : 10
   connections = var.vpc_app
   command {
     name = "pythonshell"
@@ -347,6 +397,11 @@ resource "aws_glue_job" "etl_intra" {
     "--ORIGIN_MAIL" = "${var.mail_from}"
     "--PRE_EOD_TIME" = "${data.aws_ssm_parameter.prelim_eod_time.name}"
     "--SMTP_CREDENTIALS" = "${aws_secretsmanager_secret.mail.name}"
+    "--SNAPSHOT_LOCATION" = format("s3://%s/market-snapshot", var.market_snapshot_bucket)
+    "--PARTITIONED_TABLES" = var.partitioned_tables ? "true" : "false"
+    "--WORKER_MODE" = var.intra_worker_mode ? "true" : "false"
+    "--PROFILE" = "false"
+    "--PROFILE_LOCATION" = format("s3://%s", var.market_snapshot_bucket)
   }
 }
 
@@ -385,13 +440,49 @@ resource "aws_iam_policy" "specify_etl_intra" {
                 "dynamodb:GetItem",
                 "dynamodb:PutItem",
                 "dynamodb:BatchWriteItem",
-                "dynamodb:Scan"
+                "dynamodb:Scan",
+                "dynamodb:DescribeTable"
             ],
             "Effect"= "Allow",
             "Resource"= [
               "${data.aws_dynamodb_table.data_version_intra.arn}",
+              "${aws_dynamodb_table.run_manifest.arn}",
               "${aws_dynamodb_table.all_isines.arn}"             
             ]
+        },
+        {
+            Action = [
+              "s3:GetObject",
+              "s3:PutObject"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}/market-snapshot/*"
+            ]
+        },
+        {
+            # Con ListBucket un objeto inexistente (plan o hashes del dia) responde 404 y no 403
+            Action = [
+              "s3:ListBucket"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}"
+            ]
+            Condition = {
+              StringLike = {
+                "s3:prefix" = ["market-snapshot/*"]
+              }
+            }
+        },
+        {
+            Action = [
+              "s3:PutObject"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}/profiles/*"
+            ]
         }
     ]
   })
@@ -479,6 +570,9 @@ resource "aws_glue_job" "etl_eod" {
     "--FLASH_ORIGIN_DB" = "${aws_secretsmanager_secret.db.name}"
     "--FINAL_EOD_TIME" = "${data.aws_ssm_parameter.final_eod_time.name}"
     "--ORIGIN_MAIL" = "${var.mail_from}"
+    "--PARTITIONED_TABLES" = var.partitioned_tables ? "true" : "false"
+    "--PROFILE" = "false"
+    "--PROFILE_LOCATION" = format("s3://%s", var.market_snapshot_bucket)
     "--SMTP_CREDENTIALS" = "${aws_secretsmanager_secret.mail.name}"
   }
 }
@@ -515,13 +609,24 @@ resource "aws_iam_policy" "specify_etl_eod" {
                 "dynamodb:GetItem",
                 "dynamodb:PutItem",
                 "dynamodb:BatchWriteItem",
-                "dynamodb:Scan"
+                "dynamodb:Scan",
+                "dynamodb:DescribeTable"
             ],
             "Effect"= "Allow",
             "Resource"= [
               "${data.aws_dynamodb_table.data_version_intra.arn}",
+              "${aws_dynamodb_table.run_manifest.arn}",
               "${aws_dynamodb_table.all_isines.arn}"             
             ]
+        },
+        {
+            Action = [
+              "s3:PutObject"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}/profiles/*"
+            ]
         }
     ]
   })
@@ -608,7 +713,12 @@ resource "aws_glue_job" "etl_init" {
     "--DESTINATION_MAIL" = "${var.mail_to}"
     "--FLASH_ORIGIN_DB" = "${aws_secretsmanager_secret.db.name}"
     "--ORIGIN_MAIL" = "${var.mail_from}"
+    "--PARTITIONED_TABLES" = var.partitioned_tables ? "true" : "false"
+    "--PLAN_CAPTURE" = "false"
+    "--PROFILE" = "false"
+    "--PROFILE_LOCATION" = format("s3://%s", var.market_snapshot_bucket)
     "--SMTP_CREDENTIALS" = "${aws_secretsmanager_secret.mail.name}"
+    "--SNAPSHOT_LOCATION" = format("s3://%s/market-snapshot", var.market_snapshot_bucket)
   }
 }
 
@@ -643,6 +753,59 @@ resource "aws_iam_policy" "specify_etl_init" {
               "${aws_dynamodb_table.issuers.arn}"  ,
               "${aws_dynamodb_table.all_isines.arn}"             
             ]
+        },
+        {
+            "Action"= [
+                "dynamodb:GetItem",
+                "dynamodb:PutItem"
+            ],
+            "Effect"= "Allow",
+            "Resource"= [
+              "${data.aws_dynamodb_table.data_version_intra.arn}",
+              "${aws_dynamodb_table.run_manifest.arn}"
+            ]
+        },
+        {
+            Action = [
+              "s3:PutObject"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}/profiles/*"
+            ]
+        },
+        {
+            Action = [
+              "s3:DeleteObject"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}/market-snapshot/content-hash/*"
+            ]
+        },
+        {
+            Action = [
+              "s3:GetObject",
+              "s3:PutObject"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}/market-snapshot/query-plans/*"
+            ]
+        },
+        {
+            Action = [
+              "s3:ListBucket"
+            ]
+            Effect = "Allow"
+            Resource = [
+              "arn:aws:s3:::${var.market_snapshot_bucket}"
+            ]
+            Condition = {
+              StringLike = {
+                "s3:prefix" = ["market-snapshot/query-plans/*"]
+              }
+            }
         }
     ]
   })
@@ -903,6 +1066,14 @@ resource "aws_iam_role" "layer_issuers" {
   })
 }
 
+# Lambda layer
+resource "aws_lambda_layer_version" "lambda_utils" {
+  filename            = data.archive_file.lambda_utils.output_path
+  source_code_hash    = data.archive_file.lambda_utils.output_base64sha256
+  layer_name          = format("lyr-%s-rfli-lambda-utils-%s", var.environment, var.component)
+  compatible_runtimes = ["python3.9"]
+}
+
 # Lambda
 resource "aws_lambda_function" "layer_issuers" {
   filename      = data.archive_file.layer_issuers.output_path
@@ -911,6 +1082,7 @@ resource "aws_lambda_function" "layer_issuers" {
   role          = aws_iam_role.layer_issuers.arn
   handler       = "lambda_function.lambda_handler"  
   runtime       = "python3.9"
+  layers        = [aws_lambda_layer_version.lambda_utils.arn]
 
    vpc_config {    
     subnet_ids         = var.subnet_app
@@ -935,6 +1107,15 @@ resource "aws_iam_policy" "specify_layer_issuers" {
         "Resource"= [
           "${aws_dynamodb_table.issuers.arn}"             
         ]
+      },
+      {
+        "Action"= [
+            "dynamodb:GetItem"
+        ],
+        "Effect"= "Allow",
+        "Resource"= [
+          "${data.aws_dynamodb_table.data_version_intra.arn}"
+        ]
       }
     ]
   })
@@ -987,6 +1168,7 @@ resource "aws_lambda_function" "layer_isines" {
   role          = aws_iam_role.layer_isines.arn
   handler       = "lambda_function.lambda_handler"  
   runtime       = "python3.9"
+  layers        = [aws_lambda_layer_version.lambda_utils.arn]
 
    vpc_config {    
     subnet_ids         = var.subnet_app
@@ -1079,6 +1261,7 @@ resource "aws_lambda_function" "layer_titles" {
   role          = aws_iam_role.layer_titles.arn
   handler       = "lambda_function.lambda_handler"  
   runtime       = "python3.9"
+  layers        = [aws_lambda_layer_version.lambda_utils.arn]
   timeout       = 10
 
    vpc_config {    
@@ -1115,11 +1298,13 @@ resource "aws_iam_policy" "specify_layer_titles" {
       {
         "Action"= [
           "dynamodb:GetItem",
+          "dynamodb:Query",
           "dynamodb:Scan"
         ],
         "Effect"= "Allow",
         "Resource"= [
           "${aws_dynamodb_table.all_isines.arn}",
+          "${aws_dynamodb_table.all_isines.arn}/index/active_date-index",
           "${data.aws_dynamodb_table.data_version_intra.arn}"           
         ]
       }
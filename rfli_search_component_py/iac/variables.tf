@@ -28,6 +28,24 @@ variable "security_group" {
   default = "sg-0591b309a73f15dd4"
 }
 
+# Bucket compartido para la foto de mercado intradia
+variable "market_snapshot_bucket" {
+  type = string
+  default = "s3-dev-rfli-market-snapshot"
+}
+
+# Ejecuta el ETL intradia como worker persistente durante la jornada
+variable "intra_worker_mode" {
+  type = bool
+  default = false
+}
+
+# Tablas intradia particionadas por fecha de valoracion, con expiracion por TTL
+variable "partitioned_tables" {
+  type = bool
+  default = false
+}
+
 #---------------------------------------------------------------
 # Component
 variable "component" {